@@ -1,19 +1,43 @@
 from flask import Flask, session, render_template
 from flask_cors import CORS
+import click
+import json
 import os
+import sqlite3
+
+from app.utils.logs import configure_logging
+
+configure_logging()
 
 app = Flask(__name__)
 app.config["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY")
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 1024 * 1024))
 app.secret_key = os.environ.get("SECRET_KEY", "bharatvaidya")  # Set a secret key for session management
  # Set a secret key for session management
 CORS(app)
 
 # Importing and registering blueprints after Flask app creation
 # to avoid circular imports.
-from app.routes import chat_gpt_routes, form_routes
+from app.routes import chat_gpt_routes, form_routes, health_routes, metrics_routes, retrieval_routes
 
 app.register_blueprint(chat_gpt_routes.chatgpt_bp)
 app.register_blueprint(form_routes.form_bp)
+app.register_blueprint(retrieval_routes.retrieval_bp)
+app.register_blueprint(metrics_routes.metrics_bp)
+app.register_blueprint(health_routes.health_bp)
+
+@app.cli.command("dump-products")
+def dump_products() -> None:
+    """Print every product in the catalog as JSON lines, for debugging."""
+    from app.services.database import get_database
+    from app.services.product_catalog import iter_products
+
+    try:
+        for product in iter_products(get_database().read_connection()):
+            click.echo(json.dumps(product, default=str))
+    except sqlite3.Error as e:
+        raise click.ClickException(f"Could not read the product catalog: {e}")
+
 
 # Route to serve the chatbot HTML page
 @app.route('/chatbot')
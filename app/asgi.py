@@ -0,0 +1,309 @@
+"""
+Module serving the app over ASGI, with the chat route on asyncio.
+
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker run:application
+    (or ./run_app.sh --async)
+
+A threaded WSGI worker holds a thread for every chat request while it waits
+on OpenAI and Milvus, so its thread pool caps the requests it can keep
+waiting. Here `/api/chat_gpt/chat/` and `/api/search_products` run as
+coroutines (`chat_gpt_routes.achat_with_gpt` and `asearch_products`): the
+question is embedded, searched and answered through the async OpenAI and
+Milvus clients, so one worker keeps thousands of questions waiting on its
+event loop. SQLite reads and CPU-bound steps run on the loop's thread pool.
+
+Every other route is served by the Flask app, called on that thread pool, so
+the synchronous routes and their streaming responses are unchanged. The
+async routes open and save the session through the Flask app's session
+interface and their responses pass its after-request functions (CORS), so
+ingredients remembered by either chat route are found by either product
+search. Request bodies longer than the app's MAX_CONTENT_LENGTH are
+rejected with 413 before they are buffered.
+
+Classes:
+  AsgiApp: ASGI application dispatching to the async routes or a WSGI app.
+
+Attributes:
+  application: The AsgiApp serving `app.app`.
+
+Environment Variables:
+  ASGI_THREADS: Threads running Flask requests and blocking steps per worker (default: 32).
+"""
+
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, MutableMapping, Optional, Tuple
+
+from flask import Flask
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Response
+
+from app import app as flask_app
+from app.routes import chat_gpt_routes
+from app.services import serving
+from app.utils.metrics import REQUEST_SECONDS
+from app.utils.timing import StageTimer, reset_current_timer, set_current_timer
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# A route handler takes the decoded JSON payload and the session, and returns the body, status and extra headers.
+Handler = Callable[
+    [Optional[Any], MutableMapping[str, Any]], Awaitable[Tuple[Dict[str, Any], int, Dict[str, str]]]
+]
+
+ASYNC_ROUTES: Dict[Tuple[str, str], Handler] = {
+    ("POST", "/api/chat_gpt/chat/"): chat_gpt_routes.achat_with_gpt,
+    ("POST", "/api/search_products"): chat_gpt_routes.asearch_products,
+}
+
+
+class AsgiApp:
+    """
+    ASGI application serving the async routes, and every other request with a WSGI app.
+
+    Args:
+        wsgi_app (Flask): The Flask app; its session cookie and JSON settings are shared.
+        routes (Dict[Tuple[str, str], Handler]): Async handlers by method and path.
+        threads (int): Size of the thread pool set on the event loop at startup.
+    """
+
+    def __init__(self, wsgi_app: Flask, routes: Dict[Tuple[str, str], Handler], threads: int = 32):
+        self.wsgi_app = wsgi_app
+        self.routes = routes
+        self.threads = threads
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            try:
+                body = await _read_body(scope, receive, self.wsgi_app.config["MAX_CONTENT_LENGTH"])
+            except RequestEntityTooLarge as e:
+                await _send_response(send, e.get_response())
+                return
+            handler = self.routes.get((scope["method"], scope["path"]))
+            if handler is not None:
+                await self._call_handler(handler, scope, body, send)
+            else:
+                await self._call_wsgi(scope, body, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="asgi")
+                )
+                # A no-op if gunicorn's post_worker_init hook has warmed the worker up already.
+                await asyncio.to_thread(serving.warm_up)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.to_thread(serving.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _call_handler(self, handler: Handler, scope: Scope, body: bytes, send: Send) -> None:
+        """
+        Serve a request with an async route handler.
+
+        The session is opened and saved by the Flask app's session interface,
+        and the response goes through the app's after-request functions, so
+        session lifetime and the CORS settings apply as they do to Flask routes.
+        """
+        app = self.wsgi_app
+        timer = StageTimer()
+        token = set_current_timer(timer)
+        start = time.perf_counter()
+        try:
+            # Like Flask's own async views, the handler runs in the request context, which opens the session.
+            with app.request_context(_wsgi_environ(scope, body)) as context:
+                try:
+                    payload, status, extra_headers = await handler(_json(app, body), context.session)
+                except Exception as e:
+                    logging.exception(f"Unhandled error in {scope['method']} {scope['path']}: {e}")
+                    payload, status, extra_headers = {
+                        "error": "There was an error processing your request. Please try again later."
+                    }, 500, {}
+                response = app.process_response(
+                    app.response_class(app.json.dumps(payload), status, extra_headers, mimetype="application/json")
+                )
+            server_timing = timer.server_timing()
+            if server_timing:
+                response.headers["Server-Timing"] = server_timing
+
+            await _send_response(send, response)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, endpoint=scope["path"], method=scope["method"], status=str(status)
+            )
+        finally:
+            reset_current_timer(token)
+
+    async def _call_wsgi(self, scope: Scope, body: bytes, receive: Receive, send: Send) -> None:
+        """
+        Serve a request with the WSGI app on one pool thread, relaying its response.
+
+        The whole response is produced on the same thread, since Flask's
+        request context (kept by streaming responses) lives in that thread's
+        context variables. Chunks are relayed as they are produced; a client
+        that disconnects stops the response at its next chunk.
+        """
+        environ = _wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        chunks: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        disconnected = threading.Event()
+        response_start: Dict[str, Any] = {}
+
+        def put(kind: str, value: Any = None) -> None:
+            loop.call_soon_threadsafe(chunks.put_nowait, (kind, value))
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable[[bytes], None]:
+            response_start["status"], response_start["headers"] = status, headers
+            return lambda data: put("body", data)
+
+        def run() -> None:
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if disconnected.is_set():
+                            break
+                        put("body", chunk)
+                finally:
+                    if hasattr(iterable, "close"):
+                        iterable.close()
+            except BaseException as e:
+                put("error", e)
+            else:
+                put("end")
+
+        worker = loop.run_in_executor(None, run)
+        watcher = asyncio.ensure_future(_wait_for_disconnect(receive, disconnected))
+        started = False
+        try:
+            while True:
+                kind, value = await chunks.get()
+                if kind == "error":
+                    raise value
+                if not started:
+                    status = int(response_start["status"].split(" ", 1)[0])
+                    headers = [(name.lower().encode("latin-1"), header.encode("latin-1"))
+                               for name, header in response_start["headers"]]
+                    await send({"type": "http.response.start", "status": status, "headers": headers})
+                    started = True
+                if kind == "end":
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    break
+                if value:
+                    await send({"type": "http.response.body", "body": value, "more_body": True})
+        finally:
+            disconnected.set()
+            watcher.cancel()
+            await worker
+
+
+def _headers(scope: Scope) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1").lower(), value.decode("latin-1")
+        separator = "; " if name == "cookie" else ", "
+        headers[name] = f"{headers[name]}{separator}{value}" if name in headers else value
+    return headers
+
+
+def _json(app: Flask, body: bytes) -> Optional[Any]:
+    """The decoded JSON payload, or None if the body is empty or not JSON."""
+    if not body:
+        return None
+    try:
+        return app.json.loads(body)
+    except ValueError:
+        return None
+
+
+async def _read_body(scope: Scope, receive: Receive, max_length: Optional[int]) -> bytes:
+    """
+    The request body, read in full.
+
+    Raises:
+        RequestEntityTooLarge: If the body is longer than `max_length` (the app's MAX_CONTENT_LENGTH).
+    """
+    declared = _headers(scope).get("content-length", "")
+    if max_length is not None and declared.isdigit() and int(declared) > max_length:
+        raise RequestEntityTooLarge()
+    chunks = []
+    length = 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        length += len(chunk)
+        if max_length is not None and length > max_length:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send_response(send: Send, response: Response) -> None:
+    """Send a complete (non-streaming) werkzeug response."""
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers],
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def _wait_for_disconnect(receive: Receive, disconnected: threading.Event) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
+
+
+def _wsgi_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """The WSGI environ of an ASGI HTTP request (PEP 3333 strings are latin-1 decoded bytes)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in _headers(scope).items():
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length" and name != "transfer-encoding":
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+    # The body has been read in full, so its length is known even for a chunked request.
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+application = AsgiApp(flask_app, ASYNC_ROUTES, threads=int(os.environ.get("ASGI_THREADS", 32)))
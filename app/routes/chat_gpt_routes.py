@@ -1,32 +1,415 @@
-from typing import Optional, Dict, Any, Tuple, List
-from flask import Blueprint, request, jsonify, Response, session
+from typing import Optional, Dict, Any, Iterator, Mapping, MutableMapping, Tuple, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from flask import Blueprint, request, jsonify, Response, session, stream_with_context
+from langchain_core.documents import Document
+import json
 import sqlite3
 import logging
-from app.services import chat_gpt_service
-from app.utils.util import get_context
-import re
-
-logging.basicConfig(level=logging.DEBUG)
+import math
+import os
+import time
+import requests
+from app.services import chat_gpt_service, product_catalog, rag_pipeline
+from app.services.chunk_metadata import filters_key, parse_filters
+from app.services.database import get_database
+from app.services.ingredient_extractor import IngredientExtractor
+from app.services.retrieval_service import get_retrieval_service
+from app.services.semantic_cache import SemanticCache, get_semantic_cache
+from app.services.single_flight import AsyncSingleFlight, SingleFlight, coalescing_key
+from app.utils.logs import log_payload
+from app.utils.metrics import CACHE_REQUESTS, ERRORS
+from app.utils.timing import StageTimer, current_timer, span
 
 chatgpt_bp = Blueprint("chatgpt_routes", __name__)
 
-DATABASE = 'products.db'
+# Products returned per /api/search_products page, by default and at most.
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
 
+# Questions accepted per /api/chat_gpt/batch/ request, and unique questions answered concurrently per request.
+MAX_BATCH_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 50))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
 
-def get_db_connection():
-    try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        logging.debug("Database connection established.")
-        return conn
-    except sqlite3.Error as e:
-        logging.error(f"Failed to connect to the database: {e}")
-        raise
+_ingredient_extractor = IngredientExtractor(lambda: get_database().read_connection())
+
+
+def preload() -> None:
+    """Build the ingredient matcher now, e.g. before a preforking server starts its workers."""
+    _ingredient_extractor.refresh()
+
+# Identical questions in flight at the same time share one pipeline run.
+_in_flight_answers: SingleFlight[Tuple[rag_pipeline.PipelineResult, List[str]]] = SingleFlight(
+    "chat", timeout=float(os.environ.get("CHAT_COALESCING_TIMEOUT", 90))
+)
+_in_flight_async_answers: AsyncSingleFlight[Tuple[rag_pipeline.PipelineResult, List[str]]] = AsyncSingleFlight(
+    "chat", timeout=float(os.environ.get("CHAT_COALESCING_TIMEOUT", 90))
+)
 
 
 @chatgpt_bp.route("/api/chat_gpt/chat/", methods=["POST"])
 def chat_with_gpt() -> Tuple[Response, int]:
-    data: Optional[Dict[str, Any]] = request.json
+    try:
+        message_content, model, mode, filters = parse_chat_request(request.json)
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": str(e)}), 400
+
+    logging.info(f"Processing a message of {len(message_content)} characters.")
+    log_payload("Message", message_content)
+
+    # Cached answers are keyed by the question alone, so filtered questions bypass the cache.
+    cache = get_semantic_cache() if filters is None else None
+    cached_response = _lookup_cached_response(cache, message_content, model, mode)
+    if cached_response is not None:
+        session['ingredients'] = cached_response["ingredients"]
+        return jsonify({**cached_response, "cached": True}), 200
+
+    def answer() -> Tuple[rag_pipeline.PipelineResult, List[str]]:
+        return _answer_and_cache(message_content, model, mode, cache, filters=filters)
+
+    try:
+        if os.environ.get("CHAT_COALESCING_ENABLED", "true").lower() == "false":
+            (pipeline_result, ingredients), shared = answer(), False
+        else:
+            start = time.perf_counter()
+            (pipeline_result, ingredients), shared = _in_flight_answers.do(
+                _answer_key(message_content, model, mode, filters), answer
+            )
+            timer = current_timer()
+            if shared and timer is not None:
+                timer.record("coalesced_wait", time.perf_counter() - start)
+    except TimeoutError as e:
+        logging.warning(str(e))
+        return jsonify({"error": "The request timed out. Please try again later."}), 504
+
+    session['ingredients'] = ingredients
+
+    response = jsonify(_answer_body(pipeline_result, ingredients, shared))
+    if pipeline_result.retry_after is not None:
+        response.headers["Retry-After"] = str(math.ceil(pipeline_result.retry_after))
+        return response, 429
+    return response, 200
+
+
+def parse_chat_request(
+        data: Optional[Mapping[str, Any]]
+) -> Tuple[str, str, str, Optional[Dict[str, str]]]:
+    """
+    Validate the payload of a chat request.
+
+    Args:
+        data (Optional[Mapping[str, Any]]): The decoded JSON payload.
+
+    Returns:
+        Tuple[str, str, str, Optional[Dict[str, str]]]: The message, model,
+        pipeline mode and filters (None if there are none).
+
+    Raises:
+        ValueError: With the error to return to the client, if the payload is invalid.
+    """
+    if data is None:
+        raise ValueError("Invalid or missing JSON payload")
+    message_content: Optional[str] = data.get("message_content")
+    if message_content is None:
+        raise ValueError("Missing field: message_content")
+    mode = rag_pipeline.get_pipeline_mode(data.get("pipeline"))
+    filters = parse_filters(data.get("filters")) or None
+    return message_content, data.get("model", "gpt-4o"), mode, filters
+
+
+def _answer_key(message_content: str, model: str, mode: str, filters: Optional[Mapping[str, str]]) -> str:
+    """The coalescing key of a question; questions with different filters get different answers."""
+    if filters:
+        return coalescing_key(message_content, model, mode, filters_key(filters))
+    return coalescing_key(message_content, model, mode)
+
+
+def _answer_body(pipeline_result: rag_pipeline.PipelineResult, ingredients: List[str], shared: bool) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "message": pipeline_result.message,
+        "ingredients": ingredients,
+        "pipeline": pipeline_result.mode,
+        "timings": pipeline_result.timings,
+        "usage": pipeline_result.usage,
+    }
+    if shared:
+        body["coalesced"] = True
+    return body
+
+
+def _answer_and_cache(
+        message_content: str,
+        model: str,
+        mode: str,
+        cache: Optional[SemanticCache],
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> Tuple[rag_pipeline.PipelineResult, List[str]]:
+    """Answer a question and cache the answer; run once per group of coalesced requests."""
+    pipeline_result = rag_pipeline.answer_question(
+        message_content, model, mode, timer=current_timer(), retrieved_docs=retrieved_docs, filters=filters
+    )
+    log_payload("Response from ChatGPT", pipeline_result.message)
+
+    ingredients = extract_ingredients_from_response(pipeline_result.message)
+    logging.info(f"Extracted ingredients: {ingredients}")
+
+    if cache is not None and not pipeline_result.error:
+        _store_cached_response(cache, message_content, model, mode, pipeline_result.message, ingredients)
+    return pipeline_result, ingredients
+
+
+async def achat_with_gpt(
+        data: Optional[Mapping[str, Any]], session_data: MutableMapping[str, Any]
+) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """
+    Answer a chat request on asyncio; served by app.asgi in place of `chat_with_gpt`.
+
+    Takes the same payload and returns the same body, but waits on OpenAI and
+    Milvus without holding a thread. Once the question is embedded, the
+    semantic cache lookup and the retrieval run concurrently, and the
+    retrieval is cancelled if the cache answers.
+
+    Args:
+        data (Optional[Mapping[str, Any]]): The decoded JSON payload.
+        session_data (MutableMapping[str, Any]): The client's session; receives the answer's ingredients.
+
+    Returns:
+        Tuple[Dict[str, Any], int, Dict[str, str]]: The response body, status and extra headers.
+    """
+    try:
+        message_content, model, mode, filters = parse_chat_request(data)
+    except ValueError as e:
+        logging.warning(str(e))
+        return {"error": str(e)}, 400, {}
+
+    logging.info(f"Processing a message of {len(message_content)} characters.")
+    log_payload("Message", message_content)
+
+    cache = get_semantic_cache() if filters is None else None
+    retrieval: Optional["asyncio.Future[List[Document]]"] = None
+    if cache is not None:
+        # The lookup and the retrieval both embed the question; embed it once, then run them together.
+        await get_retrieval_service().aprefetch_embedding(message_content)
+        retrieval = asyncio.ensure_future(_aretrieve(message_content, filters))
+        cached_response = await asyncio.to_thread(_lookup_cached_response, cache, message_content, model, mode)
+        if cached_response is not None:
+            _discard(retrieval)
+            session_data['ingredients'] = cached_response["ingredients"]
+            return {**cached_response, "cached": True}, 200, {}
+
+    # Set once `answer` runs: the retrieval then belongs to the (possibly coalesced) answer, not to this request.
+    answering = False
+
+    async def answer() -> Tuple[rag_pipeline.PipelineResult, List[str]]:
+        nonlocal answering
+        answering = True
+        retrieved_docs = await retrieval if retrieval is not None else None
+        return await _aanswer_and_cache(message_content, model, mode, cache, retrieved_docs, filters)
+
+    try:
+        if os.environ.get("CHAT_COALESCING_ENABLED", "true").lower() == "false":
+            (pipeline_result, ingredients), shared = await answer(), False
+        else:
+            start = time.perf_counter()
+            (pipeline_result, ingredients), shared = await _in_flight_async_answers.do(
+                _answer_key(message_content, model, mode, filters), answer
+            )
+            timer = current_timer()
+            if shared and timer is not None:
+                timer.record("coalesced_wait", time.perf_counter() - start)
+    except TimeoutError as e:
+        logging.warning(str(e))
+        return {"error": "The request timed out. Please try again later."}, 504, {}
+    finally:
+        # A coalesced request uses the leader's retrieval instead of its own. The leader's
+        # retrieval is left to the shared answer, which outlives the leader's request.
+        if retrieval is not None and not answering:
+            _discard(retrieval)
+
+    session_data['ingredients'] = ingredients
+
+    body = _answer_body(pipeline_result, ingredients, shared)
+    if pipeline_result.retry_after is not None:
+        return body, 429, {"Retry-After": str(math.ceil(pipeline_result.retry_after))}
+    return body, 200, {}
+
+
+async def _aretrieve(message_content: str, filters: Optional[Mapping[str, str]]) -> List[Document]:
+    with span("retrieval"):
+        return await get_retrieval_service().aretrieve(message_content, filters)
+
+
+def _discard(future: "asyncio.Future[Any]") -> None:
+    """Cancel a future whose result is no longer needed, without leaving its error unretrieved."""
+    if not future.cancel() and not future.cancelled():
+        future.exception()
+
+
+async def _aanswer_and_cache(
+        message_content: str,
+        model: str,
+        mode: str,
+        cache: Optional[SemanticCache],
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> Tuple[rag_pipeline.PipelineResult, List[str]]:
+    """Async version of `_answer_and_cache`; ingredient extraction and caching run on a worker thread."""
+    pipeline_result = await rag_pipeline.aanswer_question(
+        message_content, model, mode, timer=current_timer(), retrieved_docs=retrieved_docs, filters=filters
+    )
+    log_payload("Response from ChatGPT", pipeline_result.message)
+
+    ingredients = await asyncio.to_thread(extract_ingredients_from_response, pipeline_result.message)
+    logging.info(f"Extracted ingredients: {ingredients}")
+
+    if cache is not None and not pipeline_result.error:
+        await asyncio.to_thread(
+            _store_cached_response, cache, message_content, model, mode, pipeline_result.message, ingredients
+        )
+    return pipeline_result, ingredients
+
+
+def _store_cached_response(
+        cache: SemanticCache, message_content: str, model: str, mode: str, message: str, ingredients: List[str]
+) -> None:
+    try:
+        cache.store(
+            message_content, _cache_partition(model, mode),
+            {"message": message, "ingredients": ingredients, "pipeline": mode},
+        )
+    except Exception as e:
+        logging.error(f"Failed to store response in the semantic cache: {e}")
+
+
+@chatgpt_bp.route("/api/chat_gpt/batch/", methods=["POST"])
+def chat_with_gpt_batch() -> Tuple[Response, int]:
+    """
+    Answer a list of questions in one request.
+
+    Accepts `questions`, a list of strings, with the `model`, `pipeline` and
+    `filters` fields of `/api/chat_gpt/chat/`; the filters apply to every question. Questions that differ only in case or
+    whitespace are answered once. The questions not in the semantic cache
+    are embedded and searched in one batch, then answered on at most
+    BATCH_CONCURRENCY threads, whose completions share the OpenAI client's
+    rate limits. Answers are returned together in request order, or with
+    `"stream": true` as NDJSON lines in the order they finish, each carrying
+    its question's `index`.
+    """
+    data: Optional[Dict[str, Any]] = request.get_json(silent=True)
+    if data is None:
+        logging.warning("Received empty JSON payload.")
+        return jsonify({"error": "Invalid or missing JSON payload"}), 400
+
+    questions = data.get("questions")
+    if not isinstance(questions, list) or not questions or not all(
+            isinstance(question, str) and question.strip() for question in questions):
+        return jsonify({"error": "questions must be a non-empty list of non-empty strings"}), 400
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} questions are accepted per batch"}), 400
+    model: str = data.get("model", "gpt-4o")
+
+    try:
+        mode = rag_pipeline.get_pipeline_mode(data.get("pipeline"))
+        filters = parse_filters(data.get("filters")) or None
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": str(e)}), 400
+
+    groups: Dict[str, List[int]] = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(_answer_key(question, model, mode, filters), []).append(index)
+    logging.info(f"Processing a batch of {len(questions)} questions, {len(groups)} unique.")
+
+    cache = get_semantic_cache() if filters is None else None
+    answers: Dict[str, Dict[str, Any]] = {}
+    pending: List[str] = []
+    for key, indices in groups.items():
+        cached_response = _lookup_cached_response(cache, questions[indices[0]], model, mode)
+        if cached_response is not None:
+            answers[key] = {**cached_response, "cached": True}
+        else:
+            pending.append(key)
+    retrieved = _retrieve_batch([questions[groups[key][0]] for key in pending], filters)
+
+    def answer(key: str, retrieved_docs: Optional[List[Document]]) -> Dict[str, Any]:
+        question = questions[groups[key][0]]
+        try:
+            (pipeline_result, ingredients), shared = _in_flight_answers.do(
+                key, lambda: _answer_and_cache(question, model, mode, cache, retrieved_docs, filters)
+            )
+        except TimeoutError as e:
+            logging.warning(str(e))
+            return {"error": "The request timed out. Please try again later."}
+        except Exception as e:
+            ERRORS.inc(stage="batch")
+            logging.error(f"Failed to answer a batched question: {e}")
+            return {"error": "There was an error processing your request. Please try again later."}
+        body = _answer_body(pipeline_result, ingredients, shared)
+        if pipeline_result.retry_after is not None:
+            body["retry_after"] = math.ceil(pipeline_result.retry_after)
+        return body
+
+    def completed() -> Iterator[Tuple[str, Dict[str, Any]]]:
+        yield from answers.items()
+        if not pending:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(pending)), thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(answer, key, docs): key for key, docs in zip(pending, retrieved)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # A client that disconnects from the stream cancels the questions not yet started.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if data.get("stream"):
+        def generate() -> Iterator[str]:
+            for key, body in completed():
+                for index in groups[key]:
+                    yield json.dumps({"index": index, "question": questions[index], **body}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson"), 200
+
+    answers.update(completed())
+    results = [
+        {"index": index, "question": question, **answers[_answer_key(question, model, mode, filters)]}
+        for index, question in enumerate(questions)
+    ]
+    log_payload("Batch results", results)
+    return jsonify({"results": results, "unique_questions": len(groups)}), 200
+
+
+def _retrieve_batch(
+        questions: List[str], filters: Optional[Mapping[str, str]] = None
+) -> List[Optional[List[Document]]]:
+    """Retrieve the documents of every question at once; on failure each question retrieves its own."""
+    if not questions:
+        return []
+    try:
+        with span("batch_retrieval"):
+            documents: List[Optional[List[Document]]] = list(get_retrieval_service().retrieve_many(questions, filters))
+            return documents
+    except Exception as e:
+        ERRORS.inc(stage="batch_retrieval")
+        logging.error(f"Batched retrieval failed, retrieving per question: {e}")
+        return [None] * len(questions)
+
+
+@chatgpt_bp.route("/api/chat_gpt/chat/stream/", methods=["GET", "POST"])
+def chat_with_gpt_stream() -> Tuple[Response, int]:
+    """
+    Stream the chat response as Server-Sent Events.
+
+    Accepts the same JSON payload as `/api/chat_gpt/chat/` via POST, or
+    `message_content`, `model`, `pipeline` and JSON-encoded `filters` query
+    parameters via GET for EventSource clients. Emits `token` events carrying HTML fragments, then an
+    `ingredients` event and a final `done` event. Because the session cookie
+    is sent before the body, the ingredients are not stored in the session;
+    clients pass them to `/api/search_products` explicitly.
+    """
+    data: Optional[Mapping[str, Any]] = request.get_json(silent=True) if request.method == "POST" else request.args
     if data is None:
         logging.warning("Received empty JSON payload.")
         return jsonify({"error": "Invalid or missing JSON payload"}), 400
@@ -38,131 +421,204 @@ def chat_with_gpt() -> Tuple[Response, int]:
         logging.warning("Missing 'message_content' in the payload.")
         return jsonify({"error": "Missing field: message_content"}), 400
 
-    logging.info(f"Processing message: {message_content}")
-
-    milvus_context = get_context(message_content)
-    logging.debug(f"Context from Milvus: {milvus_context}")
-
-    conversation = [{"role": "user", "content": message_content}]
-    if milvus_context and "CURE NOT FOUND IN DATABASE" not in milvus_context:
-        logging.info("Cure found in Milvus, asking ChatGPT to simplify the response without modifying treatment.")
-        conversation.append({
-            "role": "system",
-            "content": (
-                """You are an assistant that helps explain Ayurvedic treatments in simple terms. 
-                Your task is to simplify the following Ayurvedic text for a common person to understand. 
-                Strictly ensure that you do not modify any treatment details or suggest any changes, even if the treatments appear incorrect. 
-                Only simplify the names of herbs and concepts in plain language.\n\n"""
-                f"Original text:\n{milvus_context}"
+    try:
+        mode = rag_pipeline.get_pipeline_mode(data.get("pipeline"))
+        raw_filters = data.get("filters")
+        filters = parse_filters(json.loads(raw_filters) if isinstance(raw_filters, str) else raw_filters) or None
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": str(e)}), 400
+
+    logging.info(f"Streaming a response to a message of {len(message_content)} characters.")
+    log_payload("Message", message_content)
+
+    cache = get_semantic_cache() if filters is None else None
+    cached_response = _lookup_cached_response(cache, message_content, model, mode)
+
+    def generate() -> Iterator[str]:
+        if cached_response is not None:
+            yield _sse("token", {"html": cached_response["message"]})
+            yield _sse("ingredients", {"ingredients": cached_response["ingredients"], "cached": True})
+            yield _sse("done", {})
+            return
+
+        timer = StageTimer()
+        try:
+            conversation = rag_pipeline.prepare_conversation(
+                message_content, mode, timer, {}, model, filters=filters
             )
-        })
-    else:
-        logging.info("Cure not found in Milvus, proceeding with normal ChatGPT conversation.")
-        conversation.append({
-            "role": "system",
-            "content": milvus_context or "No specific context found in Milvus. Proceeding with default conversation."
-        })
-
-    response = chat_gpt_service.chat_with_gpt(conversation, model)
-    chat_response = response['message']
-    logging.debug(f"Response from ChatGPT: {chat_response}")
-
-    ingredients = extract_ingredients_from_response(chat_response)
-    logging.info(f"Extracted ingredients: {ingredients}")
-
-    session['ingredients'] = ingredients
-    logging.debug(f"Ingredients stored in session: {session['ingredients']}")
-
-    return jsonify({"message": chat_response, "ingredients": ingredients}), 200
+        except Exception as e:
+            ERRORS.inc(stage="retrieval")
+            logging.error(f"Failed to fetch context for streamed response: {e}")
+            yield _sse("error", {"error": "There was an error processing your request. Please try again later."})
+            return
+
+        formatter = chat_gpt_service.HtmlStreamFormatter()
+        raw_message = ""
+        try:
+            with timer.stage("completion"):
+                for delta in chat_gpt_service.stream_chat_with_gpt(conversation, model):
+                    raw_message += delta
+                    html = formatter.feed(delta)
+                    if html:
+                        yield _sse("token", {"html": html})
+        except requests.exceptions.RequestException as e:
+            ERRORS.inc(stage="completion")
+            logging.error(f"An error occurred while streaming from the OpenAI API: {e}")
+            yield _sse("error", {"error": "There was an error processing your request. Please try again later."})
+            return
+
+        html = formatter.flush()
+        if html:
+            yield _sse("token", {"html": html})
+
+        chat_response = chat_gpt_service.format_response_to_html(raw_message)
+        with timer.stage("ingredients"):
+            ingredients = _ingredient_extractor.extract(chat_response)
+        logging.info(f"Extracted ingredients: {ingredients}")
+        yield _sse("ingredients", {"ingredients": ingredients})
+        yield _sse("done", {})
+
+        if cache is not None:
+            _store_cached_response(cache, message_content, model, mode, chat_response, ingredients)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers), 200
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chatgpt_bp.route("/api/chat_gpt/cache/stats", methods=["GET"])
+def semantic_cache_stats() -> Tuple[Response, int]:
+    cache = get_semantic_cache()
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cache.stats()}), 200
+
+
+def _cache_partition(model: str, mode: str) -> str:
+    """The semantic cache partition of a question; the pipeline mode changes the answer as much as the model."""
+    return f"{model}/{mode}"
+
+
+def _lookup_cached_response(
+        cache: Optional[SemanticCache], message_content: str, model: str, mode: str
+) -> Optional[Dict[str, Any]]:
+    if cache is None:
+        return None
+    try:
+        with span("semantic_cache"):
+            cached_response = cache.lookup(message_content, _cache_partition(model, mode))
+    except Exception as e:
+        CACHE_REQUESTS.inc(cache="semantic", result="error")
+        logging.error(f"Semantic cache lookup failed, answering without it: {e}")
+        return None
+    CACHE_REQUESTS.inc(cache="semantic", result="miss" if cached_response is None else "hit")
+    return cached_response
 
 
 @chatgpt_bp.route("/api/search_products", methods=["POST"])
 def search_products() -> Tuple[Response, int]:
-    data: Optional[Dict[str, Any]] = request.json
-    ingredients = data.get('ingredients') if data else None
-
-    if not ingredients:
-        ingredients = session.get('ingredients', [])
-        logging.debug(f"Ingredients retrieved from session: {ingredients}")
-        if not ingredients:
-            logging.warning("No ingredients provided for search and none found in session.")
-            return jsonify({"error": "Invalid or missing ingredients data"}), 400
+    try:
+        ingredients, limit, offset = parse_search_request(request.json, session.get('ingredients', []))
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": str(e)}), 400
 
     logging.info(f"Searching products with ingredients: {ingredients}")
 
-    results = search_products_by_ingredients(ingredients)
+    results = search_products_by_ingredients(ingredients, limit=limit, offset=offset)
 
-    logging.debug(f"Search results: {results}")
-    return jsonify({"results": results}), 200
+    log_payload("Search results", results)
+    return jsonify({"results": results, "limit": limit, "offset": offset}), 200
 
 
-def extract_ingredients_from_response(response: str) -> List[str]:
-    possible_ingredients = [
-        'Mahanila Taila', 'bibhitaka', 'amalaka', 'triphala', 'neem', 'honey', 'lemon', 'cinnamon',
-        'dmalaka juice', 'pippali', 'candana', 'utpala', 'lotus pollens', 'madhuka', 'ghee', 'rock salt',
-        'triphala water', 'bhallataka', 'guktamla', 'sesamum', 'iron powder', 'rice', 'cyavanapraga',
-        'trivrt', 'haritaki', 'danti'
-    ]
+async def asearch_products(
+        data: Optional[Mapping[str, Any]], session_data: MutableMapping[str, Any]
+) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """
+    Search products on asyncio; served by app.asgi in place of `search_products`.
 
-    ingredient_pattern = re.compile(
-        r'\b(?:' + '|'.join(re.escape(ingredient) for ingredient in possible_ingredients) + r')\b', re.IGNORECASE)
-    found_ingredients = ingredient_pattern.findall(response)
+    The SQLite search runs on a worker thread.
 
-    unique_ingredients = list(set(found_ingredients))
-    logging.debug(f"Ingredients extracted: {unique_ingredients}")
-    return unique_ingredients
+    Args:
+        data (Optional[Mapping[str, Any]]): The decoded JSON payload.
+        session_data (MutableMapping[str, Any]): The client's session, holding the last answer's ingredients.
 
+    Returns:
+        Tuple[Dict[str, Any], int, Dict[str, str]]: The response body, status and extra headers.
+    """
+    try:
+        ingredients, limit, offset = parse_search_request(data, session_data.get('ingredients', []))
+    except ValueError as e:
+        logging.warning(str(e))
+        return {"error": str(e)}, 400, {}
 
-def search_products_by_ingredients(ingredients: List[str]) -> List[Dict[str, Any]]:
-    if not ingredients:
-        logging.info("No ingredients provided for search.")
-        return []
+    logging.info(f"Searching products with ingredients: {ingredients}")
+
+    results = await asyncio.to_thread(search_products_by_ingredients, ingredients, limit, offset)
 
-    ingredients = [ingredient.lower().strip() for ingredient in ingredients]
-    logging.debug(f"Normalized ingredients for search: {ingredients}")
+    log_payload("Search results", results)
+    return {"results": results, "limit": limit, "offset": offset}, 200, {}
 
-    query = "SELECT product_category, product_name, price, link, ingredients FROM products WHERE"
-    conditions = [" LOWER(ingredients) LIKE ?" for _ in ingredients]
-    query += " OR ".join(conditions)
 
-    params = [f"%{ingredient}%" for ingredient in ingredients]
-    logging.debug(f"SQL query: {query}")
-    logging.debug(f"Query parameters: {params}")
+def parse_search_request(
+        data: Optional[Mapping[str, Any]], session_ingredients: List[str]
+) -> Tuple[List[str], int, int]:
+    """
+    Validate the payload of a product search.
+
+    Args:
+        data (Optional[Mapping[str, Any]]): The decoded JSON payload.
+        session_ingredients (List[str]): The ingredients of the session's last
+            answer, searched if the payload names none.
+
+    Returns:
+        Tuple[List[str], int, int]: The ingredients, page size and offset.
+
+    Raises:
+        ValueError: With the error to return to the client, if the payload is invalid.
+    """
+    ingredients = data.get('ingredients') if data else None
+    if not ingredients:
+        ingredients = session_ingredients
+        if not ingredients:
+            raise ValueError("Invalid or missing ingredients data")
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
-
-        logging.debug(f"Number of rows fetched: {len(rows)}")
-        if len(rows) == 0:
-            logging.info("No products found for the given ingredients.")
+        limit = int(data.get('limit', SEARCH_PAGE_SIZE)) if data else SEARCH_PAGE_SIZE
+        offset = int(data.get('offset', 0)) if data else 0
+    except (TypeError, ValueError):
+        raise ValueError("limit and offset must be integers")
+    if not 0 < limit <= MAX_SEARCH_PAGE_SIZE or offset < 0:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_PAGE_SIZE} and offset non-negative")
+    return ingredients, limit, offset
 
-        results = [dict(row) for row in rows]
-        logging.debug(f"Products found: {results}")
-        return results
 
-    except sqlite3.Error as e:
-        logging.error(f"An error occurred while searching products: {e}")
-        return []
+def extract_ingredients_from_response(response: str) -> List[str]:
+    with span("ingredients"):
+        return _ingredient_extractor.extract(response)
 
 
-# Helper function to print all products for debugging purposes
-def print_all_products():
+def search_products_by_ingredients(ingredients: List[str], limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    if not ingredients:
+        logging.info("No ingredients provided for search.")
+        return []
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM products")
-        rows = cursor.fetchall()
-        conn.close()
-
-        products = [dict(row) for row in rows]
-        logging.debug(f"All products in the database: {products}")
-    except sqlite3.Error as e:
-        logging.error(f"An error occurred while fetching all products: {e}")
+        with span("product_search"):
+            results = product_catalog.search_by_ingredients(
+                get_database().read_connection(), ingredients, limit=limit, offset=offset
+            )
 
+        logging.debug(f"Number of products found: {len(results)}")
+        if len(results) == 0:
+            logging.info("No products found for the given ingredients.")
+        return results
 
-# Call this function to debug and check the products
-print_all_products()
+    except sqlite3.Error as e:
+        ERRORS.inc(stage="product_search")
+        logging.error(f"An error occurred while searching products: {e}")
+        return []
@@ -0,0 +1,41 @@
+"""
+Module to define the liveness and readiness routes of a worker.
+
+`/healthz` answers as long as the worker can serve requests, without
+calling any dependency, so a slow Milvus or OpenAI API never gets a worker
+restarted. `/readyz` checks Milvus, the catalog database and the OpenAI API
+and fails until the worker has warmed up, while a dependency it needs is
+down, and while the worker drains before shutting down, so a load balancer
+only routes requests to workers that can answer them.
+"""
+
+from typing import Tuple
+
+from flask import Blueprint, Response, jsonify
+
+from app.services import serving
+
+health_bp = Blueprint("health_routes", __name__)
+
+
+@health_bp.route("/healthz", methods=["GET"])
+def healthz() -> Tuple[Response, int]:
+    """
+    Report that the worker is alive, with its last readiness report.
+
+    Returns:
+        Tuple[Response, int]: The liveness report and 200.
+    """
+    return jsonify(serving.health_report()), 200
+
+
+@health_bp.route("/readyz", methods=["GET"])
+def readyz() -> Tuple[Response, int]:
+    """
+    Report whether the worker is ready to serve chat requests.
+
+    Returns:
+        Tuple[Response, int]: The readiness report and 200, or 503 if not ready.
+    """
+    report = serving.check_readiness()
+    return jsonify(report), 200 if report["ok"] else 503
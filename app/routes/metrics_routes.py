@@ -0,0 +1,60 @@
+"""
+Module to define the metrics route and per-request timing.
+
+Every request gets a StageTimer that services record their stages into
+through `app.utils.timing.span`. The recorded stages are returned in a
+Server-Timing header, and the request duration is observed in the request
+latency histogram. `/metrics` exposes all metrics of this worker in the
+Prometheus text format.
+"""
+
+import time
+from typing import Optional
+
+from flask import Blueprint, Response, g, request
+
+from app.utils.metrics import REGISTRY, REQUEST_SECONDS
+from app.utils.timing import StageTimer, reset_current_timer, set_current_timer
+
+metrics_bp = Blueprint("metrics_routes", __name__)
+
+
+@metrics_bp.before_app_request
+def _start_request_timer() -> None:
+    g.stage_timer = StageTimer()
+    g.stage_timer_token = set_current_timer(g.stage_timer)
+    g.request_start = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def _add_server_timing(response: Response) -> Response:
+    timer: Optional[StageTimer] = g.get("stage_timer")
+    if timer is not None:
+        server_timing = timer.server_timing()
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
+    start = g.get("request_start")
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start, endpoint=endpoint, method=request.method, status=str(response.status_code)
+        )
+    return response
+
+
+@metrics_bp.teardown_app_request
+def _reset_request_timer(exception: Optional[BaseException]) -> None:
+    token = g.pop("stage_timer_token", None)
+    if token is not None:
+        reset_current_timer(token)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics() -> Response:
+    """
+    Expose the metrics of this worker in the Prometheus text format.
+
+    Returns:
+        Response: The rendered metrics.
+    """
+    return Response(REGISTRY.render(), mimetype=None, content_type=REGISTRY.CONTENT_TYPE)
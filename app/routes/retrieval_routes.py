@@ -0,0 +1,101 @@
+"""
+Module to define routes for inspecting and reconfiguring the retrieval stack.
+
+The health route reports whether the worker's Milvus connection is usable.
+The configuration route swaps retrieval settings in a running worker; it is
+disabled unless an ADMIN_TOKEN environment variable is set, and requests must
+present that token in the X-Admin-Token header.
+"""
+
+import dataclasses
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request
+
+from app.services.milvus_params import MilvusIndexConfig
+from app.services.retrieval_service import RetrievalSettings, get_retrieval_service
+
+retrieval_bp = Blueprint("retrieval_routes", __name__)
+
+_SETTING_FIELDS = {field.name: field.type for field in dataclasses.fields(RetrievalSettings)}
+
+
+@retrieval_bp.route("/api/retrieval/health", methods=["GET"])
+def retrieval_health() -> Tuple[Response, int]:
+    """
+    Report the health of the retrieval stack.
+
+    Returns:
+        Tuple[Response, int]: The health report and 200, or 503 if unhealthy.
+    """
+    report = get_retrieval_service().health_check()
+    return jsonify(report), 200 if report["ok"] else 503
+
+
+@retrieval_bp.route("/api/retrieval/config", methods=["GET", "POST"])
+def retrieval_config() -> Tuple[Response, int]:
+    """
+    Show or update the retrieval settings of this worker.
+
+    Returns:
+        Tuple[Response, int]: The settings in effect, or an error.
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token or request.headers.get("X-Admin-Token") != admin_token:
+        return jsonify({"error": "Forbidden"}), 403
+
+    service = get_retrieval_service()
+    if request.method == "GET":
+        return jsonify(dataclasses.asdict(service.settings)), 200
+
+    data: Optional[Dict[str, Any]] = request.json
+    if not data:
+        return jsonify({"error": "Invalid or missing JSON payload"}), 400
+
+    unknown = sorted(set(data) - set(_SETTING_FIELDS))
+    if unknown:
+        return jsonify({"error": f"Unknown settings: {', '.join(unknown)}"}), 400
+
+    try:
+        changes = {name: _coerce(name, value, service.settings) for name, value in data.items()}
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid setting value: {e}"}), 400
+
+    logging.info(f"Reconfiguring retrieval stack: {changes}")
+    settings = service.reconfigure(**changes)
+    return jsonify(dataclasses.asdict(settings)), 200
+
+
+def _coerce(name: str, value: Any, current: RetrievalSettings) -> Any:
+    field_type = _SETTING_FIELDS[name]
+    if field_type in (bool, "bool"):
+        if not isinstance(value, bool):
+            raise TypeError(f"{name} must be true or false")
+        return value
+    if field_type in (MilvusIndexConfig, "MilvusIndexConfig"):
+        return _coerce_milvus_index(value, current.milvus_index)
+    if field_type in (int, "int"):
+        return int(value)
+    if field_type in (float, "float"):
+        return float(value)
+    return str(value)
+
+
+def _coerce_milvus_index(value: Any, current: MilvusIndexConfig) -> MilvusIndexConfig:
+    if not isinstance(value, dict):
+        raise TypeError("milvus_index must be an object")
+    fields = {field.name: field.type for field in dataclasses.fields(MilvusIndexConfig)}
+    unknown = sorted(set(value) - set(fields))
+    if unknown:
+        raise ValueError(f"unknown milvus_index parameters: {', '.join(unknown)}")
+    changes: Dict[str, Any] = {}
+    for name, parameter in value.items():
+        if fields[name] in (int, "int"):
+            if isinstance(parameter, bool):
+                raise TypeError(f"milvus_index.{name} must be an integer")
+            changes[name] = int(parameter)
+        else:
+            changes[name] = str(parameter).upper()
+    return dataclasses.replace(current, **changes)
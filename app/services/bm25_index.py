@@ -0,0 +1,204 @@
+"""
+Module providing a lexical BM25 index over the retrieval chunks.
+
+Embedding search often misses exact Ayurvedic terms such as "Mahaneel
+Tailam" or "bhallataka". A BM25 index over the same chunks finds them by
+the words themselves. The ingestion pipeline builds it next to the vector
+index and writes it atomically as one JSON file; `BM25Index.load` reads it,
+and `ReloadingBM25Index` swaps in a newer file without a restart.
+
+Classes:
+  BM25Index: In-memory Okapi BM25 index.
+  ReloadingBM25Index: A BM25 index file that is reloaded when it changes.
+
+Functions:
+  tokenize: Splits text into lower-case index terms.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.chunk_metadata import matches
+
+# Word characters plus the Devanagari block, whose vowel signs are not \w.
+_TOKEN = re.compile(r"[\w\u0900-\u097F]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower-case index terms, dropping stopwords and single characters.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: The terms, in order.
+    """
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index.
+
+    Args:
+        documents (Sequence[Document]): The chunks to index.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for index, document in enumerate(self.documents):
+            terms = tokenize(document.page_content)
+            self._lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self._postings.setdefault(term, []).append((index, frequency))
+        self._prepare()
+
+    def _prepare(self) -> None:
+        count = len(self.documents)
+        self._average_length = sum(self._lengths) / count if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+            self, query: str, k: int = 10, filters: Optional[Mapping[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Rank the chunks containing any query term by BM25 score.
+
+        Args:
+            query (str): The query text.
+            k (int): Maximum number of chunks to return.
+            filters (Optional[Mapping[str, str]]): Metadata values the chunks
+                must have (see app.services.chunk_metadata).
+
+        Returns:
+            List[Tuple[Document, float]]: Chunks and scores, best first.
+        """
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self._postings[term]:
+                norm = 1 - self.b + self.b * self._lengths[index] / (self._average_length or 1.0)
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        if filters:
+            scores = {index: score for index, score in scores.items() if matches(self.documents[index].metadata, filters)}
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[index], score) for index, score in best]
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a JSON file, atomically replacing any previous one.
+
+        Args:
+            path (str): The index file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "documents": [{"text": d.page_content, "metadata": d.metadata} for d in self.documents],
+            "lengths": self._lengths,
+            "postings": self._postings,
+        }
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8") as file:
+            json.dump(payload, file, ensure_ascii=False)
+            temp_path = file.name
+        os.replace(temp_path, path)
+        logging.info(f"Wrote BM25 index with {len(self.documents)} chunks and {len(self._postings)} terms to {path}.")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Read an index written by `save`.
+
+        Args:
+            path (str): The index file.
+
+        Returns:
+            BM25Index: The loaded index.
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            payload = json.load(file)
+        index = cls.__new__(cls)
+        index.documents = [Document(page_content=d["text"], metadata=d["metadata"]) for d in payload["documents"]]
+        index.k1 = payload["k1"]
+        index.b = payload["b"]
+        index._lengths = payload["lengths"]
+        index._postings = {term: [tuple(p) for p in postings] for term, postings in payload["postings"].items()}
+        index._prepare()
+        return index
+
+
+class ReloadingBM25Index:
+    """
+    A BM25 index file that is reloaded when it changes on disk.
+
+    Args:
+        path (str): The index file written by `BM25Index.save`.
+        reload_interval (float): Minimum seconds between checks for a new file.
+
+    Raises:
+        FileNotFoundError: If the index file does not exist.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._mtime = os.stat(path).st_mtime_ns
+        self._index = BM25Index.load(path)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def search(
+            self, query: str, k: int = 10, filters: Optional[Mapping[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        return self._current().search(query, k, filters)
+
+    def _current(self) -> BM25Index:
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return self._index
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._mtime:
+                with self._lock:
+                    if mtime != self._mtime:
+                        self._index = BM25Index.load(self.path)
+                        self._mtime = mtime
+                        logging.info(f"Reloaded BM25 index with {len(self._index)} chunks from {self.path}.")
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to reload BM25 index, keeping the loaded one: {e}")
+        return self._index
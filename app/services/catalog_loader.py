@@ -0,0 +1,280 @@
+"""
+Module for bulk loading vendor product catalogs.
+
+Catalogs are streamed from CSV or JSON lines files and written in batches:
+each batch is inserted into a temporary staging table with one
+`executemany` and merged into `products` with a few set-based statements,
+so millions of rows load without a Python round trip per row. Products are
+matched by their `link`: a product whose link is already in the catalog is
+updated when any of its fields changed and left untouched otherwise, and
+the last row wins when a batch repeats a link.
+
+Every batch is its own transaction. The catalog database runs in WAL mode,
+so searches keep reading the last committed batch while the load runs.
+
+A load into an empty catalog defers the ingredient index: its secondary
+indexes are dropped, and the entries of every loaded product are written
+in term order once all products are in. A delta load into a live catalog
+indexes each batch's products in the batch's transaction instead, so a
+search never sees a product without its ingredients.
+
+Classes:
+  LoadReport: Row counts and throughput of a load.
+
+Functions:
+  read_catalog: Streams the records of a CSV or JSON lines catalog file.
+  load_catalog: Upserts catalog records by link, in batched transactions.
+"""
+
+import csv
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from app.services.product_catalog import create_lookup_indexes, drop_lookup_indexes, index_ingredients
+
+DEFAULT_BATCH_SIZE = 5000
+
+FIELDS = ("product_category", "product_name", "price", "link", "ingredients")
+
+_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+@dataclass
+class LoadReport:
+    """Row counts and throughput of a load."""
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    indexed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_second:,.0f} rows/s): "
+            f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, "
+            f"{self.duplicates} duplicates, {self.skipped} skipped"
+        )
+
+
+def read_catalog(path: str, format: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the records of a catalog file.
+
+    CSV files need a header row naming the product fields. JSON lines files
+    hold one object per line; their ingredients may also be a list.
+
+    Args:
+        path (str): The catalog file.
+        format (Optional[str]): "csv" or "jsonl"; defaults to the file's extension.
+
+    Yields:
+        Dict[str, Any]: Each record.
+
+    Raises:
+        ValueError: If the format is unknown or a line is not valid JSON.
+    """
+    format = format or _FORMATS.get(os.path.splitext(path)[1].lower())
+    if format == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            yield from csv.DictReader(file)
+    elif format == "jsonl":
+        with open(path, encoding="utf-8") as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+    else:
+        raise ValueError(f"Unknown catalog format of {path}; expected .csv or .jsonl")
+
+
+def load_catalog(
+        conn: sqlite3.Connection,
+        records: Iterable[Mapping[str, Any]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        defer_indexes: Optional[bool] = None,
+        progress: Optional[Callable[[LoadReport], None]] = None,
+) -> LoadReport:
+    """
+    Upserts catalog records by link, in batched transactions.
+
+    Records missing a field, or with a price that is not a finite number,
+    are skipped and logged.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database, with its schema in place.
+        records (Iterable[Mapping[str, Any]]): The products, e.g. from `read_catalog`.
+        batch_size (int): Records per transaction.
+        defer_indexes (Optional[bool]): Whether to build the ingredient index
+            after the load; defaults to whether the catalog is empty.
+        progress (Optional[Callable[[LoadReport], None]]): Called after each batch.
+
+    Returns:
+        LoadReport: What the load did.
+    """
+    start = time.perf_counter()
+    report = LoadReport()
+    if defer_indexes is None:
+        defer_indexes = conn.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None
+    conn.executescript(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS catalog_staging (
+            seq INTEGER PRIMARY KEY,
+            product_category TEXT, product_name TEXT, price REAL, link TEXT, ingredients TEXT
+        );
+        CREATE TEMP TABLE IF NOT EXISTS catalog_pending (id INTEGER PRIMARY KEY);
+        DELETE FROM temp.catalog_staging;
+        DELETE FROM temp.catalog_pending;
+        """
+    )
+    if defer_indexes:
+        drop_lookup_indexes(conn)
+    try:
+        batch: List[Tuple[Any, ...]] = []
+        for record in records:
+            report.rows += 1
+            row = _product_row(record)
+            if row is None:
+                report.skipped += 1
+                logging.warning(f"Skipping catalog row {report.rows}: missing or invalid fields.")
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _merge_batch(conn, batch, report, index_now=not defer_indexes)
+                batch = []
+                report.seconds = time.perf_counter() - start
+                if progress:
+                    progress(report)
+        if batch:
+            _merge_batch(conn, batch, report, index_now=not defer_indexes)
+        if defer_indexes:
+            report.indexed += _index_pending(conn, batch_size)
+    finally:
+        if defer_indexes:
+            create_lookup_indexes(conn)
+            conn.execute("PRAGMA optimize")
+        conn.executescript("DELETE FROM temp.catalog_staging; DELETE FROM temp.catalog_pending;")
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def _product_row(record: Mapping[str, Any]) -> Optional[Tuple[Any, ...]]:
+    ingredients = record.get("ingredients")
+    if isinstance(ingredients, (list, tuple)):
+        ingredients = ", ".join(str(ingredient) for ingredient in ingredients)
+    values: Dict[str, Any] = {field: record.get(field) for field in FIELDS}
+    values["ingredients"] = ingredients
+    for field in ("product_category", "product_name", "link", "ingredients"):
+        values[field] = str(values[field]).strip() if values[field] is not None else ""
+        if not values[field]:
+            return None
+    try:
+        values["price"] = float(values["price"])
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(values["price"]):
+        return None
+    return tuple(values[field] for field in FIELDS)
+
+
+def _merge_batch(
+        conn: sqlite3.Connection, batch: List[Tuple[Any, ...]], report: LoadReport, index_now: bool
+) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT INTO temp.catalog_staging (product_category, product_name, price, link, ingredients) "
+            "VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+        # The last row of a link in the batch wins.
+        duplicates = conn.execute(
+            "DELETE FROM temp.catalog_staging "
+            "WHERE seq NOT IN (SELECT MAX(seq) FROM temp.catalog_staging GROUP BY link)"
+        ).rowcount
+        # Setting `ingredients` fires the trigger that drops a product's index
+        # entries, so only products whose ingredients changed are updated with it.
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO temp.catalog_pending (id)
+            SELECT p.id FROM products AS p JOIN temp.catalog_staging AS s ON s.link = p.link
+            WHERE p.ingredients IS NOT s.ingredients
+            """
+        )
+        updated = conn.execute(
+            """
+            UPDATE products
+            SET product_category = s.product_category, product_name = s.product_name,
+                price = s.price, ingredients = s.ingredients
+            FROM temp.catalog_staging AS s
+            WHERE products.link = s.link AND products.ingredients IS NOT s.ingredients
+            """
+        ).rowcount
+        updated += conn.execute(
+            """
+            UPDATE products
+            SET product_category = s.product_category, product_name = s.product_name, price = s.price
+            FROM temp.catalog_staging AS s
+            WHERE products.link = s.link
+              AND (products.product_category IS NOT s.product_category
+                   OR products.product_name IS NOT s.product_name
+                   OR products.price IS NOT s.price)
+            """
+        ).rowcount
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0]
+        inserted = conn.execute(
+            """
+            INSERT INTO products (product_category, product_name, price, link, ingredients)
+            SELECT product_category, product_name, price, link, ingredients
+            FROM temp.catalog_staging AS s
+            WHERE NOT EXISTS (SELECT 1 FROM products AS p WHERE p.link = s.link)
+            ORDER BY seq
+            """
+        ).rowcount
+        conn.execute("INSERT INTO temp.catalog_pending (id) SELECT id FROM products WHERE id > ?", (last_id,))
+        if index_now:
+            pending = conn.execute(
+                "SELECT p.id, p.ingredients FROM temp.catalog_pending JOIN products AS p USING (id)"
+            ).fetchall()
+            index_ingredients(conn, pending)
+            report.indexed += len(pending)
+            conn.execute("DELETE FROM temp.catalog_pending")
+        conn.execute("DELETE FROM temp.catalog_staging")
+
+    report.duplicates += duplicates
+    report.inserted += inserted
+    report.updated += updated
+    report.unchanged += len(batch) - duplicates - inserted - updated
+
+
+def _index_pending(conn: sqlite3.Connection, batch_size: int) -> int:
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT p.id, p.ingredients FROM temp.catalog_pending AS pending JOIN products AS p ON p.id = pending.id
+            WHERE pending.id > ? ORDER BY pending.id LIMIT ?
+            """,
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return indexed
+        with conn:
+            index_ingredients(conn, rows)
+        indexed += len(rows)
+        last_id = rows[-1][0]
@@ -1,28 +1,26 @@
-import os
 import requests
 import json
+import logging
+from typing import Iterator
 
-def chat_with_gpt(conversation_history: list, model: str = "gpt-4o") -> dict:
+from app.services.openai_client import OpenAIError, OpenAIRateLimitError, get_async_openai_client, get_openai_client
+from app.utils.tokens import count_message_tokens
+
+# Completion tokens reserved from the token budget for each request.
+COMPLETION_TOKEN_ESTIMATE = 1000
+
+
+def _chat_completions_request(conversation_history: list, model: str) -> tuple[dict, int]:
     """
-    Sends a request to OpenAI's GPT model to generate a chat response
-    for a multi-turn conversation.
+    Build the body of a chat completion request.
 
     Args:
         conversation_history (list): The conversation history to send to the GPT model.
-        model (str, optional): The identifier of the GPT model to use.
-            Defaults to 'gpt-4o-mini'.
+        model (str): The identifier of the GPT model to use.
 
     Returns:
-        dict: A dictionary containing the formatted response from the GPT model.
+        tuple[dict, int]: The JSON body of the request and its estimated token usage.
     """
-    openai_api_key = os.environ.get("OPENAI_API_KEY")
-
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {openai_api_key}",
-    }
-
     # Pre-prompt to instruct ChatGPT to act as an Ayurvedic assistant
     pre_prompt = {
         "role": "system",
@@ -37,24 +35,165 @@ def chat_with_gpt(conversation_history: list, model: str = "gpt-4o") -> dict:
         "messages": conversation_with_pre_prompt,
         "temperature": 0.7,
     }
+    estimated_tokens = count_message_tokens(conversation_with_pre_prompt, model) + COMPLETION_TOKEN_ESTIMATE
+    return data, estimated_tokens
+
+
+def chat_with_gpt(conversation_history: list, model: str = "gpt-4o") -> dict:
+    """
+    Sends a request to OpenAI's GPT model to generate a chat response
+    for a multi-turn conversation.
+
+    Args:
+        conversation_history (list): The conversation history to send to the GPT model.
+        model (str, optional): The identifier of the GPT model to use.
+            Defaults to 'gpt-4o-mini'.
+
+    Returns:
+        dict: A dictionary containing the formatted response from the GPT model
+        and the token usage reported by the API.
+    """
+    data, estimated_tokens = _chat_completions_request(conversation_history, model)
 
     try:
-        response = requests.post(
-            url, headers=headers, data=json.dumps(data), verify=False, timeout=15
-        )
-        response.raise_for_status()
-        response_data = response.json()
+        response = get_openai_client().post("/chat/completions", data, estimated_tokens)
+        return _chat_response(response.json())
+    except requests.exceptions.RequestException as e:
+        return _chat_error(e)
 
-        # Extract the message content
-        assistant_message = response_data["choices"][0]["message"]["content"]
 
-        # Format response to HTML
-        formatted_message = format_response_to_html(assistant_message)
+async def achat_with_gpt(conversation_history: list, model: str = "gpt-4o") -> dict:
+    """
+    Async version of `chat_with_gpt`, for the asyncio request path.
 
-        return {"message": formatted_message}
+    The request waits on the event loop rather than a thread, so a slow
+    completion does not hold a worker thread.
+
+    Args:
+        conversation_history (list): The conversation history to send to the GPT model.
+        model (str, optional): The identifier of the GPT model to use.
+
+    Returns:
+        dict: The formatted response and token usage, as returned by `chat_with_gpt`.
+    """
+    data, estimated_tokens = _chat_completions_request(conversation_history, model)
+
+    try:
+        return _chat_response(await get_async_openai_client().post("/chat/completions", data, estimated_tokens))
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred while contacting the OpenAI API: {e}")
-        return {"message": "There was an error processing your request. Please try again later."}
+        return _chat_error(e)
+
+
+def _chat_response(response_data: dict) -> dict:
+    # Extract the message content
+    assistant_message = response_data["choices"][0]["message"]["content"]
+
+    # Format response to HTML
+    formatted_message = format_response_to_html(assistant_message)
+
+    return {"message": formatted_message, "usage": response_data.get("usage", {})}
+
+
+def _chat_error(e: requests.exceptions.RequestException) -> dict:
+    if isinstance(e, OpenAIRateLimitError):
+        logging.warning(f"The OpenAI API is rate limiting requests: {e}")
+        return {
+            "message": "We are receiving too many requests right now. Please try again shortly.",
+            "error": str(e),
+            "retry_after": e.retry_after,
+        }
+    logging.error(f"An error occurred while contacting the OpenAI API: {e}")
+    return {
+        "message": "There was an error processing your request. Please try again later.",
+        "error": str(e),
+    }
+
+
+def stream_chat_with_gpt(conversation_history: list, model: str = "gpt-4o") -> Iterator[str]:
+    """
+    Streams a chat response from OpenAI's GPT model as it is generated.
+
+    Only the time between two tokens is bounded by the read timeout, so long
+    answers are not cut off the way a single blocking request would be.
+    Failures before the first token are retried by the shared client.
+
+    Args:
+        conversation_history (list): The conversation history to send to the GPT model.
+        model (str, optional): The identifier of the GPT model to use.
+
+    Yields:
+        str: Raw text deltas of the assistant's message, in order.
+
+    Raises:
+        requests.exceptions.RequestException: If the API cannot be reached,
+            returns an error status or sends an event that is not valid JSON.
+    """
+    data, estimated_tokens = _chat_completions_request(conversation_history, model)
+    data["stream"] = True
+
+    with get_openai_client().post("/chat/completions", data, estimated_tokens, stream=True) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                choices = json.loads(payload).get("choices") or []
+            except ValueError as e:
+                raise OpenAIError(f"Malformed streamed event from the OpenAI API: {e}") from e
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                yield content
+
+
+class HtmlStreamFormatter:
+    """
+    Incrementally converts streamed GPT text to the HTML produced by
+    `format_response_to_html`.
+
+    A `**` marker may be split across two chunks, so a trailing `*` is held
+    back until the next chunk shows whether it starts a marker.
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self._bold = False
+
+    def feed(self, text: str) -> str:
+        """
+        Format a chunk of text.
+
+        Args:
+            text (str): The next chunk of raw text.
+
+        Returns:
+            str: HTML for the part of the text that can be formatted so far.
+        """
+        text = self._pending + text
+        self._pending = ""
+        if text.endswith("*") and not text.endswith("**"):
+            text, self._pending = text[:-1], "*"
+
+        parts = text.replace("\n", "<br>").split("**")
+        html = parts[0]
+        for part in parts[1:]:
+            self._bold = not self._bold
+            html += ("<strong>" if self._bold else "</strong>") + part
+        return html
+
+    def flush(self) -> str:
+        """
+        Format any held-back text and close an unterminated bold section.
+
+        Returns:
+            str: The remaining HTML.
+        """
+        html, self._pending = self._pending, ""
+        if self._bold:
+            html += "</strong>"
+            self._bold = False
+        return html
 
 
 def format_response_to_html(response: str) -> str:
@@ -68,8 +207,5 @@ def format_response_to_html(response: str) -> str:
         str: A string formatted with HTML.
     """
     # Convert specific markers to HTML tags for better formatting
-    response = response.replace("\n", "<br>")
-    response = response.replace("**", "<strong>").replace("**", "</strong>")
-    # Further processing can be done here to parse lists, headers, etc.
-
-    return response
+    formatter = HtmlStreamFormatter()
+    return formatter.feed(response) + formatter.flush()
@@ -0,0 +1,248 @@
+"""
+Module describing the scalar fields of `ayurvedic_diagnosis` chunks and the filters over them.
+
+Ingestion tags every chunk with these fields, stored as Milvus scalar fields
+(and in the local index and BM25 metadata):
+
+  book: The source text, named after its TEI file; the Milvus partition key,
+    so a search filtered to one book only scans that book's partition.
+  chapter: The chapter heading the chunk belongs to.
+  language: "english", "devanagari" (Sanskrit or Hindi, which the script
+    alone does not tell apart) or "mixed".
+  body_system, dosha, topic: The label of each vocabulary below whose terms
+    the chunk mentions most; empty if it mentions none.
+
+A retrieval filter maps some of these fields to the value a chunk must have.
+Filters come from the request, or are inferred from the terms of the
+question; inferred filters only narrow a search that still returns enough
+documents.
+
+Functions:
+  tag_chunk: The language and vocabulary tags of a chunk's text.
+  book_name: The book name of a source document.
+  parse_filters: Validates the filters of a request.
+  infer_filters: Filters implied by the terms of a question.
+  milvus_expr: A Milvus boolean expression selecting the filtered chunks.
+  matches: Whether a chunk's metadata satisfies filters.
+  filters_key: A stable string form of filters, for cache and coalescing keys.
+"""
+
+import os
+import re
+from typing import Any, Dict, Mapping, Optional, Pattern, Sequence, Tuple
+
+FILTER_FIELDS = ("book", "chapter", "language", "body_system", "dosha", "topic")
+
+# Filters inferred from a question; a chapter or book is only ever asked for explicitly.
+INFERRED_FIELDS = ("body_system", "dosha")
+
+# Latin terms are regex fragments matched as whole words; Devanagari terms match anywhere,
+# since vowel signs are not word characters.
+_Vocabulary = Sequence[Tuple[str, Sequence[str], Sequence[str]]]
+
+DOSHAS: _Vocabulary = (
+    ("vata", (r"vata\w*", r"vayu", r"vaata"), ("वात", "वायु")),
+    ("pitta", (r"pitta\w*", r"pitha"), ("पित्त",)),
+    ("kapha", (r"kapha\w*", r"shleshma\w*", r"sleshma\w*"), ("कफ", "श्लेष्म")),
+)
+
+BODY_SYSTEMS: _Vocabulary = (
+    ("digestive", (r"digest\w*", r"agni", r"stomach\w*", r"bowel\w*", r"constipat\w*", r"diarrh\w*",
+                   r"acidity", r"indigestion", r"liver", r"grahani", r"amlapitta", r"ajirna"), ("अग्नि", "अजीर्ण")),
+    ("respiratory", (r"cough\w*", r"asthma\w*", r"breath\w*", r"lungs?", r"kasa", r"shwasa", r"swasa",
+                     r"sinus\w*"), ("कास", "श्वास")),
+    ("skin", (r"skin", r"kushtha", r"eczema", r"psoriasis", r"itch\w*", r"acne", r"rash\w*", r"pimples?"),
+     ("कुष्ठ", "त्वच")),
+    ("hair", (r"hair", r"scalp", r"dandruff", r"bald\w*", r"greying", r"khalitya", r"palitya"), ("केश",)),
+    ("musculoskeletal", (r"joints?", r"bones?", r"arthritis", r"sandhivata", r"muscles?", r"back\s+pain",
+                         r"amavata", r"gout"), ("संधि", "अस्थि")),
+    ("nervous", (r"sleep\w*", r"insomnia", r"anxiety", r"stress", r"memory", r"headaches?", r"epilep\w*",
+                 r"nerves?", r"nidra"), ("निद्रा", "अपस्मार")),
+    ("circulatory", (r"heart", r"blood", r"h[ry]daya", r"an(a)?emia", r"rakta\w*", r"hypertension"),
+     ("हृदय", "रक्त")),
+    ("urinary", (r"urin\w*", r"kidneys?", r"bladder", r"mutra\w*", r"prameha"), ("मूत्र", "प्रमेह")),
+    ("reproductive", (r"menstru\w*", r"fertility", r"infertil\w*", r"pregnan\w*", r"shukra", r"vajikarana",
+                      r"uter\w*"), ("शुक्र", "गर्भ")),
+    ("metabolic", (r"diabet\w*", r"obes\w*", r"madhumeha", r"thyroid", r"sthaulya", r"weight"), ("मधुमेह",)),
+)
+
+TOPICS: _Vocabulary = (
+    ("diagnosis", (r"symptoms?", r"signs?", r"diagnos\w*", r"nidana", r"lakshana", r"causes?"), ("निदान", "लक्षण")),
+    ("treatment", (r"treat\w*", r"therap\w*", r"remed\w*", r"chikitsa", r"cure\w*"), ("चिकित्सा",)),
+    ("formulation", (r"taila\w*", r"tailam", r"ghrita\w*", r"kwatha", r"kashaya\w*", r"vati", r"churna\w*",
+                     r"decoction\w*", r"preparations?", r"dosage"), ("तैल", "घृत", "चूर्ण", "क्वाथ")),
+    ("diet", (r"diet\w*", r"foods?", r"eat\w*", r"ahara", r"pathya", r"meals?"), ("आहार", "पथ्य")),
+    ("regimen", (r"routine", r"dinacharya", r"ritucharya", r"exercise", r"yoga", r"seasons?", r"massage"),
+     ("दिनचर्या", "व्यायाम")),
+)
+
+_DEVANAGARI = re.compile(r"[ऀ-ॿ]")
+_LATIN = re.compile(r"[A-Za-z]")
+
+
+def _compile(vocabulary: _Vocabulary) -> Sequence[Tuple[str, Pattern[str]]]:
+    compiled = []
+    for label, latin, devanagari in vocabulary:
+        alternatives = [r"\b(?:%s)\b" % "|".join(latin)] + [re.escape(term) for term in devanagari]
+        compiled.append((label, re.compile("|".join(alternatives), re.IGNORECASE)))
+    return compiled
+
+
+_TAGGERS = {
+    "body_system": _compile(BODY_SYSTEMS),
+    "dosha": _compile(DOSHAS),
+    "topic": _compile(TOPICS),
+}
+
+
+def _dominant(text: str, field: str) -> str:
+    best, best_count = "", 0
+    for label, pattern in _TAGGERS[field]:
+        count = len(pattern.findall(text))
+        if count > best_count:
+            best, best_count = label, count
+    return best
+
+
+def _mentioned(text: str, field: str) -> Sequence[str]:
+    return [label for label, pattern in _TAGGERS[field] if pattern.search(text)]
+
+
+def detect_language(text: str) -> str:
+    """
+    Classify a text by script.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: "devanagari" or "english" if at least 80% of its letters are in
+        that script, otherwise "mixed".
+    """
+    devanagari = len(_DEVANAGARI.findall(text))
+    latin = len(_LATIN.findall(text))
+    if devanagari + latin == 0:
+        return "mixed"
+    if devanagari >= 0.8 * (devanagari + latin):
+        return "devanagari"
+    if latin >= 0.8 * (devanagari + latin):
+        return "english"
+    return "mixed"
+
+
+def tag_chunk(text: str) -> Dict[str, str]:
+    """
+    The language and vocabulary tags of a chunk's text.
+
+    Args:
+        text (str): The chunk's text.
+
+    Returns:
+        Dict[str, str]: The "language", "body_system", "dosha" and "topic" fields.
+    """
+    return {
+        "language": detect_language(text),
+        "body_system": _dominant(text, "body_system"),
+        "dosha": _dominant(text, "dosha"),
+        "topic": _dominant(text, "topic"),
+    }
+
+
+def book_name(source: str) -> str:
+    """
+    The book name of a source document: its file name without the extension.
+
+    Args:
+        source (str): The document's path.
+
+    Returns:
+        str: The book name, e.g. "charaka_samhita" for "output_xmls/charaka_samhita.tei.xml".
+    """
+    return os.path.basename(source).split(".", 1)[0]
+
+
+def parse_filters(raw: Any) -> Dict[str, str]:
+    """
+    Validate the filters of a request.
+
+    Args:
+        raw (Any): The request's "filters" value: None, or an object mapping
+            filter fields to string values.
+
+    Returns:
+        Dict[str, str]: The filters, without empty values.
+
+    Raises:
+        ValueError: If the filters are not an object of known fields and string values.
+    """
+    if raw is None:
+        return {}
+    if not isinstance(raw, Mapping):
+        raise ValueError("filters must be an object")
+    filters: Dict[str, str] = {}
+    for field, value in raw.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}; expected one of {', '.join(FILTER_FIELDS)}")
+        if not isinstance(value, str):
+            raise ValueError(f"Filter {field} must be a string")
+        if value.strip():
+            filters[field] = value.strip()
+    return filters
+
+
+def infer_filters(question: str) -> Dict[str, str]:
+    """
+    Filters implied by the terms of a question.
+
+    A field is inferred only if the question mentions exactly one of its labels.
+
+    Args:
+        question (str): The user's question.
+
+    Returns:
+        Dict[str, str]: The inferred body system and dosha filters.
+    """
+    filters: Dict[str, str] = {}
+    for field in INFERRED_FIELDS:
+        labels = _mentioned(question, field)
+        if len(labels) == 1:
+            filters[field] = labels[0]
+    return filters
+
+
+def milvus_expr(filters: Mapping[str, str]) -> str:
+    """
+    A Milvus boolean expression selecting the chunks that satisfy filters.
+
+    Args:
+        filters (Mapping[str, str]): Filter fields and values.
+
+    Returns:
+        str: The expression, e.g. `book == "charaka_samhita" and dosha == "vata"`;
+        empty if there are no filters.
+    """
+    clauses = []
+    for field in FILTER_FIELDS:
+        if field in filters:
+            value = filters[field].replace("\\", "\\\\").replace('"', '\\"')
+            clauses.append(f'{field} == "{value}"')
+    return " and ".join(clauses)
+
+
+def matches(metadata: Mapping[str, Any], filters: Optional[Mapping[str, str]]) -> bool:
+    """
+    Whether a chunk's metadata satisfies filters.
+
+    Args:
+        metadata (Mapping[str, Any]): The chunk's metadata.
+        filters (Optional[Mapping[str, str]]): Filter fields and values.
+
+    Returns:
+        bool: True if every filtered field has the filter's value.
+    """
+    return not filters or all(metadata.get(field) == value for field, value in filters.items())
+
+
+def filters_key(filters: Optional[Mapping[str, str]]) -> str:
+    """A stable string form of filters, for cache and coalescing keys."""
+    return "&".join(f"{field}={value}" for field, value in sorted((filters or {}).items()))
@@ -0,0 +1,256 @@
+"""
+Module assembling retrieved chunks into the context of a completion.
+
+Retrieval returns overlapping chunks, often the same verse from several
+editions of a text, and joining them all wastes prompt tokens on every
+completion. `pack_context` instead:
+
+  1. Drops near-duplicate chunks, comparing MinHash signatures of their
+     word shingles, and keeps the best-ranked copy with the titles of all
+     copies.
+  2. Orders the rest by maximal marginal relevance (MMR), trading retrieval
+     rank against similarity to the chunks already chosen.
+  3. Packs chunks in that order into the token budget of the target model,
+     each under a source line naming its title and page for attribution.
+
+The result reports how many tokens were saved against joining every
+retrieved chunk.
+
+Classes:
+  PackedContext: The packed context and its token accounting.
+
+Functions:
+  minhash_signature: Returns the MinHash signature of a text's shingles.
+  token_budget: Returns the context token budget of a model.
+  pack_context: Packs retrieved chunks into a token budget.
+
+Environment Variables:
+  CONTEXT_TOKEN_BUDGET: Context tokens allowed for any model (default: 2000).
+  CONTEXT_TOKEN_BUDGETS: Per-model budgets overriding it, as "gpt-4o=3000,gpt-4o-mini=1500".
+  CONTEXT_MMR_LAMBDA: Weight of relevance against diversity in MMR (default: 0.7).
+  CONTEXT_DUPLICATE_THRESHOLD: Estimated Jaccard similarity above which
+    chunks are duplicates (default: 0.8).
+"""
+
+import dataclasses
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.utils.tokens import count_tokens
+
+SHINGLE_SIZE = 3
+
+NUM_PERMUTATIONS = 64
+
+DEFAULT_TOKEN_BUDGET = 2000
+
+# Universal hashing (a * h + b) mod p over 32-bit shingle hashes; p is the
+# smallest prime above 2 ** 32, so no product overflows 64 bits.
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r"[\w\u0900-\u097F]+")
+
+
+@dataclasses.dataclass
+class PackedContext:
+    """
+    The packed context and its token accounting.
+
+    Attributes:
+        text (str): The context to put in the prompt.
+        documents (List[Document]): The chunks included, in prompt order.
+        sources (List[str]): The distinct source titles of the included chunks.
+        retrieved_tokens (int): Tokens of all retrieved chunks joined together.
+        context_tokens (int): Tokens of the packed context.
+        chunks_retrieved (int): Non-empty chunks retrieved.
+        duplicates_removed (int): Chunks dropped as near-duplicates.
+    """
+
+    text: str
+    documents: List[Document]
+    sources: List[str]
+    retrieved_tokens: int
+    context_tokens: int
+    chunks_retrieved: int
+    duplicates_removed: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.retrieved_tokens - self.context_tokens)
+
+    def report(self) -> Dict[str, int]:
+        """The token accounting, in the shape of a usage entry."""
+        return {
+            "retrieved_tokens": self.retrieved_tokens,
+            "context_tokens": self.context_tokens,
+            "tokens_saved": self.tokens_saved,
+            "chunks_retrieved": self.chunks_retrieved,
+            "chunks_used": len(self.documents),
+            "duplicates_removed": self.duplicates_removed,
+        }
+
+
+def _shingles(text: str) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Returns the MinHash signature of a text's word shingles.
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the texts' shingle sets.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        np.ndarray: NUM_PERMUTATIONS minimum hash values.
+    """
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+         for shingle in set(_shingles(text))),
+        dtype=np.uint64,
+    )
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0)
+
+
+def token_budget(model: str) -> int:
+    """
+    Returns the context token budget of a model.
+
+    Args:
+        model (str): The model the context is sent to.
+
+    Returns:
+        int: The budget from CONTEXT_TOKEN_BUDGETS, else CONTEXT_TOKEN_BUDGET.
+    """
+    for entry in os.environ.get("CONTEXT_TOKEN_BUDGETS", "").split(","):
+        name, _, budget = entry.partition("=")
+        if name.strip() == model and budget.strip():
+            return int(budget)
+    return int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+
+def _source_label(titles: Sequence[str], metadata: dict) -> str:
+    label = "; ".join(titles) or "Unknown source"
+    if metadata.get("page"):
+        label += f", p. {metadata['page']}"
+    return label
+
+
+def _relevance(documents: Sequence[Document]) -> np.ndarray:
+    scores = [document.metadata.get("rrf_score") for document in documents]
+    numeric = [score for score in scores if isinstance(score, (int, float))]
+    if len(numeric) == len(scores) and max(numeric, default=0) > 0:
+        relevance = np.asarray(numeric, dtype=np.float64)
+    else:
+        # Retrievers return the best match first.
+        relevance = 1.0 / np.arange(1, len(documents) + 1, dtype=np.float64)
+    return relevance / relevance.max()
+
+
+def _truncate(text: str, header: str, budget: int, model: str) -> str:
+    words = text.split()
+    while words:
+        piece = f"{header}\n{' '.join(words)}"
+        tokens = count_tokens(piece, model)
+        if tokens <= budget:
+            return piece
+        words = words[:max(0, min(len(words) - 1, int(len(words) * budget / tokens)))]
+    return ""
+
+
+def pack_context(
+        documents: Sequence[Document],
+        model: str = "gpt-4o",
+        budget: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        duplicate_threshold: Optional[float] = None,
+) -> PackedContext:
+    """
+    Packs retrieved chunks into the context token budget of a model.
+
+    Args:
+        documents (Sequence[Document]): Retrieved chunks, best first.
+        model (str): The model the context is sent to.
+        budget (Optional[int]): Context tokens allowed; defaults to `token_budget(model)`.
+        mmr_lambda (Optional[float]): Relevance weight in MMR; defaults to CONTEXT_MMR_LAMBDA.
+        duplicate_threshold (Optional[float]): Similarity at which chunks are
+            duplicates; defaults to CONTEXT_DUPLICATE_THRESHOLD.
+
+    Returns:
+        PackedContext: The context and its token accounting.
+    """
+    budget = token_budget(model) if budget is None else budget
+    if mmr_lambda is None:
+        mmr_lambda = float(os.environ.get("CONTEXT_MMR_LAMBDA", 0.7))
+    if duplicate_threshold is None:
+        duplicate_threshold = float(os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", 0.8))
+
+    documents = [document for document in documents if document.page_content.strip()]
+    retrieved_tokens = count_tokens(" ".join(document.page_content for document in documents), model)
+    if not documents:
+        return PackedContext("", [], [], retrieved_tokens, 0, 0, 0)
+
+    signatures = np.stack([minhash_signature(document.page_content) for document in documents])
+    similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    relevance = _relevance(documents)
+
+    kept: List[int] = []
+    titles: Dict[int, List[str]] = {}
+    for i, document in enumerate(documents):
+        title = str(document.metadata.get("title") or "").strip()
+        original = next((j for j in kept if similarity[i, j] >= duplicate_threshold), None)
+        if original is None:
+            kept.append(i)
+            titles[i] = [title] if title else []
+        elif title and title not in titles[original]:
+            titles[original].append(title)
+
+    pieces: List[str] = []
+    included: List[int] = []
+    used = 0
+    separator_tokens = count_tokens("\n\n", model)
+    candidates = list(kept)
+    while candidates:
+        redundancy = similarity[np.ix_(candidates, included)].max(axis=1) if included else np.zeros(len(candidates))
+        scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * redundancy
+        best = candidates.pop(int(np.argmax(scores)))
+
+        header = f"[Source: {_source_label(titles[best], documents[best].metadata)}]"
+        piece = f"{header}\n{documents[best].page_content.strip()}"
+        cost = count_tokens(piece, model) + (separator_tokens if pieces else 0)
+        if used + cost > budget:
+            if pieces:
+                continue
+            piece = _truncate(documents[best].page_content.strip(), header, budget, model)
+            if not piece:
+                continue
+            cost = count_tokens(piece, model)
+        pieces.append(piece)
+        included.append(best)
+        used += cost
+
+    text = "\n\n".join(pieces)
+    sources = list(dict.fromkeys(title for i in included for title in titles[i]))
+    return PackedContext(
+        text=text,
+        documents=[documents[i] for i in included],
+        sources=sources,
+        retrieved_tokens=retrieved_tokens,
+        context_tokens=count_tokens(text, model),
+        chunks_retrieved=len(documents),
+        duplicates_removed=len(documents) - len(kept),
+    )
@@ -0,0 +1,190 @@
+"""
+Module providing pooled access to the product catalog database.
+
+Each thread keeps one read-write and one read-only SQLite connection for
+as long as it runs instead of opening a connection per request, so
+SQLite's prepared-statement cache stays warm between requests. Read-write
+connections put the database in WAL mode, so searches are not blocked by
+catalog writes, and every connection waits on a busy timeout instead of
+failing when the database is locked. Read-only connections are opened with
+`mode=ro` and `query_only` and serve the search fast path.
+
+Connections are never shared between threads or inherited across `fork`:
+a thread in a new process opens its own. A thread's connections are closed
+when the thread exits, so thread-per-request servers and short-lived
+executor threads do not leak file handles.
+
+Classes:
+  Database: Per-thread connection pool for one SQLite file.
+
+Functions:
+  get_database: Returns the process-wide catalog database.
+
+Environment Variables:
+  PRODUCTS_DB: Path of the product catalog database (default: "products.db").
+  SQLITE_BUSY_TIMEOUT: Seconds to wait for a locked database (default: 5).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+
+class _ThreadConnections:
+    """The connections of one thread; closed when the thread's locals are released."""
+
+    __slots__ = ("rw", "ro", "opened", "__weakref__")
+
+    def __init__(self) -> None:
+        self.rw: Optional[sqlite3.Connection] = None
+        self.ro: Optional[sqlite3.Connection] = None
+        self.opened: List[sqlite3.Connection] = []
+
+
+class Database:
+    """
+    Per-thread connection pool for one SQLite file.
+
+    Args:
+        path (str): The database file.
+        busy_timeout (float): Seconds to wait for a lock before failing.
+        cached_statements (int): Prepared statements cached per connection.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, cached_statements: int = 256):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, List[sqlite3.Connection]] = {}
+        self._pid = os.getpid()
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        This thread's read-write connection, opened on first use.
+
+        Returns:
+            sqlite3.Connection: A connection in WAL mode with `sqlite3.Row` rows.
+        """
+        return self._thread_connection("rw", read_only=False)
+
+    def read_connection(self) -> sqlite3.Connection:
+        """
+        This thread's read-only connection, opened on first use.
+
+        Returns:
+            sqlite3.Connection: A `query_only` connection with `sqlite3.Row` rows.
+
+        Raises:
+            sqlite3.OperationalError: If the database file does not exist.
+        """
+        return self._thread_connection("ro", read_only=True)
+
+    def close(self) -> None:
+        """Close every connection this process opened."""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+            # Dropping the old locals runs _release, which takes the lock; do it after.
+            released, self._local = self._local, threading.local()
+            if self._pid != os.getpid():
+                return
+        del released
+        for opened in connections.values():
+            _close_all(opened)
+
+    def _thread_connection(self, kind: str, read_only: bool) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Connections inherited from the parent process belong to it.
+            released = None
+            with self._lock:
+                if self._pid != os.getpid():
+                    released, self._local = self._local, threading.local()
+                    self._connections = {}
+                    self._pid = os.getpid()
+            del released
+
+        holder: Optional[_ThreadConnections] = getattr(self._local, "connections", None)
+        if holder is None:
+            holder = _ThreadConnections()
+            self._local.connections = holder
+            with self._lock:
+                self._connections[id(holder)] = holder.opened
+            weakref.finalize(holder, self._release, id(holder), holder.opened, os.getpid())
+
+        conn: Optional[sqlite3.Connection] = getattr(holder, kind)
+        if conn is None:
+            conn = self._open(read_only)
+            setattr(holder, kind, conn)
+            holder.opened.append(conn)
+        return conn
+
+    def _release(self, key: int, opened: List[sqlite3.Connection], pid: int) -> None:
+        # Runs when a thread exits and its locals are dropped.
+        if pid != os.getpid():
+            return
+        with self._lock:
+            if self._connections.get(key) is opened:
+                del self._connections[key]
+        _close_all(opened)
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            conn = sqlite3.connect(
+                f"file:{quote(os.path.abspath(self.path))}?mode=ro",
+                uri=True,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        conn.row_factory = sqlite3.Row
+        logging.debug(f"Opened {'read-only' if read_only else 'read-write'} connection to {self.path}.")
+        return conn
+
+
+def _close_all(connections: List[sqlite3.Connection]) -> None:
+    # A connection is only used by the thread that opened it, but the thread
+    # that exits or calls close() is not always that one, hence check_same_thread=False.
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to close database connection: {e}")
+    connections.clear()
+
+
+_database: Optional[Database] = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """
+    Returns the process-wide product catalog database, creating it on first use.
+
+    Returns:
+        Database: The shared connection pool.
+    """
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database(
+                    os.environ.get("PRODUCTS_DB", "products.db"),
+                    busy_timeout=float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5)),
+                )
+    return _database
@@ -0,0 +1,280 @@
+"""
+Module providing a persistent, content-addressed embedding cache.
+
+Embeddings are keyed by the SHA-256 of the embedding model and the text, so
+identical text is embedded once no matter whether it comes from ingestion
+(`gen_milvus.create_db`) or from a query (`util.get_context`). Vectors are
+stored as float32 or float16 blobs in SQLite, which any number of processes
+can share, with a bounded in-memory LRU tier in front. Lookups are batched:
+a list of texts costs one memory pass, one SQLite query per few hundred
+misses and a single call to the wrapped embeddings for what is left.
+
+Classes:
+  CachedEmbeddings: LangChain `Embeddings` wrapper backed by the cache.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.utils.metrics import CACHE_REQUESTS
+from app.utils.timing import span
+
+# Keys per SQLite `IN (...)` lookup, below SQLite's variable limit.
+_LOOKUP_BATCH_SIZE = 500
+
+
+def embedding_key(model: str, text: str) -> str:
+    """
+    Content address of an embedding.
+
+    Args:
+        model (str): The embedding model.
+        text (str): The embedded text.
+
+    Returns:
+        str: The hex SHA-256 of the model and text.
+    """
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain `Embeddings` that consults the cache before the wrapped model.
+
+    Args:
+        embeddings (Embeddings): The embeddings to wrap.
+        path (Optional[str]): SQLite file for persistent vectors; memory only if None.
+        model (Optional[str]): Name used in cache keys; defaults to the wrapped
+            embeddings' `model` attribute.
+        dtype (str): Storage precision, "float32" or "float16".
+        max_memory_entries (int): Vectors kept in the in-memory LRU tier.
+    """
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            path: Optional[str] = None,
+            model: Optional[str] = None,
+            dtype: str = "float32",
+            max_memory_entries: int = 10000,
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.embeddings = embeddings
+        self.path = path
+        self.model = model or str(getattr(embeddings, "model", type(embeddings).__name__))
+        self.dtype = np.dtype(dtype)
+        self.max_memory_entries = max_memory_entries
+
+        # Guards the in-memory tier and counters; SQLite I/O runs under its own lock, so
+        # memory hits are not held up by disk reads and writes.
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, calling the wrapped embeddings once for all cache misses.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text, in order.
+        """
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = self._lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            self._store(computed)
+            found.update(computed)
+        return [found[key].astype(np.float32).tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, sharing cache entries with identical document text.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The embedding.
+        """
+        with span("embedding"):
+            return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts like `embed_documents`, awaiting the wrapped embeddings' async API.
+
+        Cache lookups and stores run on a worker thread, since they may read SQLite.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text, in order.
+        """
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = await asyncio.to_thread(self._lookup, keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            await asyncio.to_thread(self._store, computed)
+            found.update(computed)
+        return [found[key].astype(np.float32).tolist() for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embed a query like `embed_query`, without blocking the event loop.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The embedding.
+        """
+        with span("embedding"):
+            return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit-rate statistics since the cache was created.
+
+        Returns:
+            Dict[str, float]: Memory and disk hits, misses, hit rate and
+            the number of vectors held in memory.
+        """
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (self._memory_hits + self._disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        # A connection inherited from a parent process must not be used.
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dtype TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        memory_hits = 0
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    memory_hits += 1
+
+        pending = list(dict.fromkeys(key for key in keys if key not in found))
+        from_disk: Dict[str, np.ndarray] = {}
+        if self.path and pending:
+            try:
+                with self._db_lock:
+                    conn = self._connection()
+                    assert conn is not None
+                    for start in range(0, len(pending), _LOOKUP_BATCH_SIZE):
+                        batch = pending[start:start + _LOOKUP_BATCH_SIZE]
+                        rows = conn.execute(
+                            f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                            batch,
+                        ).fetchall()
+                        for key, dtype, blob in rows:
+                            from_disk[key] = np.frombuffer(blob, dtype=dtype)
+            except sqlite3.Error as e:
+                logging.error(f"Failed to read embedding cache {self.path}: {e}")
+        found.update(from_disk)
+
+        disk_hits = len(from_disk)
+        misses = len(pending) - disk_hits
+        with self._lock:
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            self._memory_hits += memory_hits
+            self._disk_hits += disk_hits
+            self._misses += misses
+        for result, count in (("memory_hit", memory_hits), ("disk_hit", disk_hits), ("miss", misses)):
+            if count:
+                CACHE_REQUESTS.inc(count, cache="embedding", result=result)
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector.astype(self.dtype))
+        if not self.path:
+            return
+        rows = [
+            (key, self.model, self.dtype.name, vector.astype(self.dtype).tobytes())
+            for key, vector in vectors.items()
+        ]
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                assert conn is not None
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, model, dtype, vector) VALUES (?, ?, ?, ?)", rows
+                    )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write embedding cache {self.path}: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,126 @@
+"""
+Module providing hybrid lexical + vector retrieval.
+
+`HybridRetriever` sends a query to the vector retriever and the BM25 index
+concurrently and merges their rankings with weighted reciprocal-rank fusion
+(RRF): a chunk scores `weight / (rrf_k + rank)` in each ranking it appears
+in. Chunks found by both retrievers rise to the top, so a small final k
+keeps the recall of a much larger vector-only k. A query's `filters` restrict
+the BM25 search, and its other keyword arguments (the vector store's own
+filter, e.g. a Milvus `expr`) are passed to the vector retriever.
+
+Classes:
+  HybridRetriever: LangChain retriever fusing vector and BM25 results.
+
+Functions:
+  reciprocal_rank_fusion: Merges ranked document lists.
+"""
+
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Shared by every HybridRetriever; each query runs one lexical search on it.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bm25")
+
+
+def _document_key(document: Document) -> str:
+    chunk_id = document.metadata.get("id") or document.metadata.get("pk")
+    if chunk_id:
+        return str(chunk_id)
+    return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(
+        rankings: Sequence[Tuple[Sequence[Document], float]],
+        k: int,
+        rrf_k: int = 60,
+) -> List[Document]:
+    """
+    Merge ranked document lists with weighted reciprocal-rank fusion.
+
+    Args:
+        rankings (Sequence[Tuple[Sequence[Document], float]]): Each ranking,
+            best first, with its weight.
+        k (int): Number of documents to return.
+        rrf_k (int): Rank offset damping the influence of top ranks.
+
+    Returns:
+        List[Document]: The fused ranking, with the fused score in the
+        "rrf_score" metadata field.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in rankings:
+        for rank, document in enumerate(ranking, 1):
+            key = _document_key(document)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            documents.setdefault(key, document)
+    best = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+    return [
+        Document(page_content=documents[key].page_content,
+                 metadata={**documents[key].metadata, "rrf_score": scores[key]})
+        for key in best
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    LangChain retriever fusing vector and BM25 results.
+
+    Attributes:
+        vector_retriever (BaseRetriever): Returns the vector search candidates.
+        bm25_index (Any): Object with `search(query, k, filters)` returning (Document, score) pairs.
+        k (int): Number of fused documents returned.
+        candidate_k (int): Candidates taken from each retriever.
+        vector_weight (float): RRF weight of the vector ranking.
+        bm25_weight (float): RRF weight of the BM25 ranking.
+        rrf_k (int): RRF rank offset.
+    """
+
+    vector_retriever: BaseRetriever
+    bm25_index: Any
+    k: int = 5
+    candidate_k: int = 20
+    vector_weight: float = 1.0
+    bm25_weight: float = 1.0
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+            self,
+            query: str,
+            *,
+            run_manager: CallbackManagerForRetrieverRun,
+            filters: Optional[Mapping[str, str]] = None,
+            **search_kwargs: Any,
+    ) -> List[Document]:
+        lexical = self.submit_lexical(query, filters)
+        semantic = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()}, **search_kwargs)
+        return self.fuse(semantic, lexical.result())
+
+    def submit_lexical(
+            self, query: str, filters: Optional[Mapping[str, str]] = None
+    ) -> "Future[List[Tuple[Document, float]]]":
+        """Start the BM25 search of a query on the shared executor."""
+        return _executor.submit(self.bm25_index.search, query, self.candidate_k, filters)
+
+    def fuse(self, semantic: Sequence[Document], lexical: Sequence[Tuple[Document, float]]) -> List[Document]:
+        """
+        Fuse the vector candidates and BM25 results of one query.
+
+        Args:
+            semantic (Sequence[Document]): The vector search candidates, best first.
+            lexical (Sequence[Tuple[Document, float]]): The BM25 results, best first.
+
+        Returns:
+            List[Document]: The top k fused documents.
+        """
+        return reciprocal_rank_fusion(
+            [(semantic, self.vector_weight), ([document for document, _ in lexical], self.bm25_weight)],
+            k=self.k,
+            rrf_k=self.rrf_k,
+        )
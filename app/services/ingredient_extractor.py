@@ -0,0 +1,159 @@
+"""
+Module for finding catalog ingredients mentioned in chat responses.
+
+The vocabulary is every ingredient name in the product catalog, a set of
+well-known herbs, and the synonym table, which maps Sanskrit, Hindi and
+English names to one canonical ingredient; a name that products use is
+reported as itself so that it can be searched for. It is compiled into an
+Aho-Corasick automaton, so a response is scanned in linear time however
+large the vocabulary grows. Matches must start and end on word boundaries,
+and overlapping matches resolve to the leftmost, longest name.
+
+The automaton is rebuilt when the catalog version changes. A new automaton
+is built next to the old one and swapped in with a single assignment, so
+concurrent requests always scan with a complete vocabulary.
+
+Classes:
+  IngredientExtractor: Catalog-driven ingredient matcher.
+
+Environment Variables:
+  INGREDIENT_VOCABULARY_REFRESH: Seconds between catalog version checks (default: 30).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services import product_catalog
+from app.utils.aho_corasick import AhoCorasick
+
+# Ingredients recognised even when no product contains them yet.
+BUILTIN_INGREDIENTS = [
+    'Mahanila Taila', 'bibhitaka', 'amalaka', 'triphala', 'neem', 'honey', 'lemon', 'cinnamon',
+    'dmalaka juice', 'pippali', 'candana', 'utpala', 'lotus pollens', 'madhuka', 'ghee', 'rock salt',
+    'triphala water', 'bhallataka', 'guktamla', 'sesamum', 'iron powder', 'rice', 'cyavanapraga',
+    'trivrt', 'haritaki', 'danti'
+]
+
+# Common alternative names, extended or overridden by the catalog's synonym table.
+BUILTIN_SYNONYMS = {
+    'amla': 'amalaka', 'amalaki': 'amalaka', 'indian gooseberry': 'amalaka',
+    'harad': 'haritaki', 'harar': 'haritaki', 'chebulic myrobalan': 'haritaki',
+    'baheda': 'bibhitaka', 'bahera': 'bibhitaka', 'belleric myrobalan': 'bibhitaka',
+    'nimba': 'neem', 'madhu': 'honey', 'ghrita': 'ghee', 'ghritam': 'ghee',
+    'long pepper': 'pippali', 'pipli': 'pippali',
+    'chandan': 'candana', 'chandana': 'candana', 'sandalwood': 'candana',
+    'yashtimadhu': 'madhuka', 'mulethi': 'madhuka', 'licorice': 'madhuka', 'liquorice': 'madhuka',
+    'saindhava lavana': 'rock salt', 'sendha namak': 'rock salt',
+    'til': 'sesamum', 'sesame': 'sesamum', 'tila': 'sesamum',
+    'chyawanprash': 'cyavanapraga', 'chyavanprash': 'cyavanapraga',
+    'nishoth': 'trivrt', 'trivrit': 'trivrt', 'bhilawa': 'bhallataka', 'marking nut': 'bhallataka',
+}
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class IngredientExtractor:
+    """
+    Catalog-driven ingredient matcher.
+
+    Args:
+        connect (Callable[[], sqlite3.Connection]): Returns a connection to the
+            catalog; the connection is not closed by the extractor.
+        refresh_seconds (float): Minimum seconds between catalog version checks.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], refresh_seconds: Optional[float] = None):
+        self._connect = connect
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None
+            else float(os.environ.get("INGREDIENT_VOCABULARY_REFRESH", 30))
+        )
+        self._build_lock = threading.Lock()
+        # (catalog version, automaton), replaced as a whole on rebuild.
+        self._state: Optional[Tuple[Optional[int], AhoCorasick[str]]] = None
+        self._checked_at = 0.0
+
+    def extract(self, text: str) -> List[str]:
+        """
+        Find the ingredients mentioned in a text.
+
+        Args:
+            text (str): The text to scan, e.g. a chat response.
+
+        Returns:
+            List[str]: Canonical names of the ingredients found, in order of
+            first mention.
+        """
+        automaton = self._automaton()
+        lowered = text.lower()
+        # Leftmost-longest selection: for each start offset keep the longest match.
+        longest: Dict[int, Tuple[int, str]] = {}
+        for start, end, canonical in automaton.iter_matches(lowered):
+            if start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            if end < len(lowered) and _is_word_char(lowered[end]):
+                continue
+            if end > longest.get(start, (0, ""))[0]:
+                longest[start] = (end, canonical)
+
+        found: Dict[str, None] = {}
+        covered = 0
+        for start in sorted(longest):
+            if start < covered:
+                continue
+            end, canonical = longest[start]
+            found[canonical] = None
+            covered = end
+        logging.debug(f"Ingredients extracted: {list(found)}")
+        return list(found)
+
+    def refresh(self) -> None:
+        """Rebuild the automaton if the catalog changed since it was built."""
+        self._checked_at = time.monotonic()
+        version = self._catalog_version()
+        state = self._state
+        if state is not None and state[0] == version:
+            return
+        with self._build_lock:
+            state = self._state
+            if state is not None and state[0] == version:
+                return
+            self._state = (version, self._build())
+
+    def _automaton(self) -> AhoCorasick[str]:
+        if self._state is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh()
+        assert self._state is not None
+        return self._state[1]
+
+    def _catalog_version(self) -> Optional[int]:
+        try:
+            return product_catalog.catalog_version(self._connect())
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read the catalog version, using the built-in vocabulary: {e}")
+            return None
+
+    def _build(self) -> AhoCorasick[str]:
+        started = time.perf_counter()
+        patterns = {product_catalog.normalize_ingredient(name): product_catalog.normalize_ingredient(name)
+                    for name in BUILTIN_INGREDIENTS}
+        patterns.update(BUILTIN_SYNONYMS)
+        try:
+            conn = self._connect()
+            patterns.update(product_catalog.ingredient_synonyms(conn))
+            # Names used by products are reported as they are, so they can be searched for.
+            patterns.update((name, name) for name in product_catalog.ingredient_vocabulary(conn))
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read the catalog vocabulary, using the built-in vocabulary: {e}")
+        automaton = AhoCorasick(patterns)
+        logging.info(
+            f"Built ingredient matcher with {len(automaton)} names "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms."
+        )
+        return automaton
@@ -8,16 +8,25 @@ embeddings by default, but can be extended to support other LLMs and embeddings.
 Functions:
   get_llm: Retrieves the specified language model (LLM).
   get_embeddings: Retrieves the specified embeddings.
+  get_cached_embeddings: Wraps embeddings in the persistent embedding cache.
 
 Environment Variables:
   LLM_TYPE: The type of LLM to use (default: "openai").
   EMBEDDINGS_TYPE: The type of embeddings to use (default: "openai").
   OPENAI_API_KEY: The API key for OpenAI's services.
+  EMBEDDING_CACHE_ENABLED: Set to "false" to disable the embedding cache (default: "true").
+  EMBEDDING_CACHE_PATH: SQLite file of cached embeddings (default: "embedding_cache.db").
+  EMBEDDING_CACHE_DTYPE: Storage precision, "float32" or "float16" (default: "float32").
+  EMBEDDING_CACHE_MEMORY_ENTRIES: Embeddings kept in memory (default: 10000).
 """
 
 import os
+from typing import Optional
 from langchain_community.chat_models import ChatOpenAI
 from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_cache import CachedEmbeddings
 
 
 def get_llm(temperature: float) -> ChatOpenAI:
@@ -58,3 +67,24 @@ def get_embeddings() -> OpenAIEmbeddings:
     return OpenAIEmbeddings(openai_api_key=os.environ.get("OPENAI_API_KEY"))
   else:
     raise ValueError(f"Unsupported embeddings type: {embeddings_type}")
+
+
+def get_cached_embeddings(embeddings: Optional[Embeddings] = None) -> Embeddings:
+  """
+  Wraps embeddings in the persistent, content-addressed embedding cache.
+
+    Args:
+      embeddings: The embeddings to wrap (default: `get_embeddings()`).
+
+    Returns:
+      The cached embeddings, or the embeddings themselves if the cache is disabled.
+  """
+  embeddings = embeddings if embeddings is not None else get_embeddings()
+  if os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "false":
+    return embeddings
+  return CachedEmbeddings(
+      embeddings,
+      path=os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.db"),
+      dtype=os.environ.get("EMBEDDING_CACHE_DTYPE", "float32"),
+      max_memory_entries=int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", 10000)),
+  )
@@ -0,0 +1,323 @@
+"""
+Module providing an embedded vector index as an alternative to Milvus.
+
+The corpus is small enough to search in process. The ingestion pipeline
+exports every chunk's text, metadata and normalized embedding to a
+versioned directory:
+
+    <path>/CURRENT                  name of the live version
+    <path>/<version>/vectors.npy    float32 matrix, one row per chunk
+    <path>/<version>/documents.jsonl
+    <path>/<version>/manifest.json
+
+`LocalVectorStore` memory-maps the live version's vectors and answers top-k
+queries by inner product, through FAISS when it is installed and NumPy
+otherwise. A `filter` of chunk metadata values (see
+app.services.chunk_metadata) restricts a search to the matching rows. Exports write a new version and then atomically replace
+`CURRENT`, and the store checks `CURRENT` at most every few seconds, so a
+running worker picks up a new index without a restart and never sees a
+half-written one.
+
+Classes:
+  LocalVectorStore: Read-only LangChain vector store over an exported index.
+
+Functions:
+  write_local_index: Exports chunks and their embeddings as a new index version.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.services.chunk_metadata import filters_key, matches
+
+CURRENT_POINTER = "CURRENT"
+
+# Index versions kept on disk, so a worker still reading the previous one is not broken.
+KEEP_VERSIONS = 2
+
+# Distinct filters whose matching rows each snapshot remembers.
+MAX_CACHED_FILTERS = 256
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_local_index(
+        path: str,
+        texts: Sequence[str],
+        metadatas: Sequence[dict],
+        vectors: Union[Sequence[Sequence[float]], np.ndarray],
+        ids: Optional[Sequence[str]] = None,
+) -> str:
+    """
+    Export chunks and their embeddings as a new version of a local index.
+
+    Args:
+        path (str): The index directory.
+        texts (Sequence[str]): The chunk texts.
+        metadatas (Sequence[dict]): JSON-serializable metadata per chunk.
+        vectors (Union[Sequence[Sequence[float]], np.ndarray]): The embedding of each chunk.
+        ids (Optional[Sequence[str]]): Chunk IDs, stored in the metadata as "id".
+
+    Returns:
+        str: The directory of the new version.
+    """
+    if not (len(texts) == len(metadatas) == len(vectors)):
+        raise ValueError("texts, metadatas and vectors must have the same length")
+    if not texts:
+        raise ValueError("Cannot export an empty local vector index")
+    os.makedirs(path, exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+    matrix = _normalize_rows(matrix)
+
+    version = f"{time.time_ns():020d}"
+    version_dir = os.path.join(path, version)
+    os.makedirs(version_dir)
+    np.save(os.path.join(version_dir, "vectors.npy"), matrix)
+    with open(os.path.join(version_dir, "documents.jsonl"), "w", encoding="utf-8") as file:
+        for index, (text, metadata) in enumerate(zip(texts, metadatas)):
+            if ids is not None:
+                metadata = {**metadata, "id": ids[index]}
+            file.write(json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+    with open(os.path.join(version_dir, "manifest.json"), "w", encoding="utf-8") as file:
+        json.dump({"count": int(matrix.shape[0]), "dimension": int(matrix.shape[1]), "created_at": time.time()}, file)
+
+    with tempfile.NamedTemporaryFile("w", dir=path, delete=False, encoding="utf-8") as file:
+        file.write(version)
+        pointer_temp = file.name
+    os.replace(pointer_temp, os.path.join(path, CURRENT_POINTER))
+
+    versions = sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+    for stale in versions[:-KEEP_VERSIONS]:
+        if stale == version:
+            continue
+        shutil.rmtree(os.path.join(path, stale), ignore_errors=True)
+    logging.info(f"Exported local vector index with {matrix.shape[0]} chunks to {version_dir}.")
+    return version_dir
+
+
+class _Snapshot:
+    """One loaded index version."""
+
+    def __init__(self, version_dir: str, use_faiss: bool):
+        self.version = os.path.basename(version_dir)
+        self.vectors = np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r")
+        self.documents: List[Document] = []
+        with open(os.path.join(version_dir, "documents.jsonl"), "r", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                self.documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        self._rows: Dict[str, np.ndarray] = {}
+        self.faiss_index = None
+        if use_faiss and len(self.documents):
+            import faiss
+
+            self.faiss_index = faiss.IndexFlatIP(self.vectors.shape[1])
+            self.faiss_index.add(np.ascontiguousarray(self.vectors))
+
+    def rows(self, filters: Mapping[str, str]) -> np.ndarray:
+        """The indices of the documents matching filters."""
+        key = filters_key(filters)
+        rows = self._rows.get(key)
+        if rows is None:
+            rows = np.fromiter(
+                (i for i, document in enumerate(self.documents) if matches(document.metadata, filters)), dtype=np.int64
+            )
+            if len(self._rows) < MAX_CACHED_FILTERS:
+                self._rows[key] = rows
+        return rows
+
+    def search(self, query: np.ndarray, k: int, filters: Optional[Mapping[str, str]] = None) -> List[Tuple[int, float]]:
+        return self.search_many(query.reshape(1, -1), k, filters)[0]
+
+    def search_many(
+            self, queries: np.ndarray, k: int, filters: Optional[Mapping[str, str]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if filters:
+            return self._search_rows(queries, k, self.rows(filters))
+        k = min(k, len(self.documents))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        if self.faiss_index is not None:
+            scores, indices = self.faiss_index.search(np.ascontiguousarray(queries), k)
+            return [
+                [(int(i), float(s)) for i, s in zip(row_indices, row_scores) if i >= 0]
+                for row_indices, row_scores in zip(indices, scores)
+            ]
+        scores = queries @ self.vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, row_top in zip(scores, top):
+            row_top = row_top[np.argsort(-row_scores[row_top])]
+            results.append([(int(i), float(row_scores[i])) for i in row_top])
+        return results
+
+    def _search_rows(self, queries: np.ndarray, k: int, rows: np.ndarray) -> List[List[Tuple[int, float]]]:
+        # Filtered searches scan only the matching rows, which FAISS's flat index cannot do.
+        k = min(k, len(rows))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ self.vectors[rows].T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, row_top in zip(scores, top):
+            row_top = row_top[np.argsort(-row_scores[row_top])]
+            results.append([(int(rows[i]), float(row_scores[i])) for i in row_top])
+        return results
+
+
+def _faiss_available() -> bool:
+    try:
+        import faiss  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only LangChain vector store over an exported local index.
+
+    Args:
+        embedding (Embeddings): Embeds queries; must match the exported vectors.
+        path (str): The index directory written by `write_local_index`.
+        reload_interval (float): Minimum seconds between checks for a new version.
+        use_faiss (Optional[bool]): Search with FAISS; defaults to whether it is installed.
+    """
+
+    def __init__(
+            self,
+            embedding: Embeddings,
+            path: str,
+            reload_interval: float = 5.0,
+            use_faiss: Optional[bool] = None,
+    ):
+        self._embedding = embedding
+        self.path = path
+        self.reload_interval = reload_interval
+        self.use_faiss = _faiss_available() if use_faiss is None else use_faiss
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._snapshot: Optional[_Snapshot] = None
+        self.reload()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def version(self) -> Optional[str]:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    @property
+    def count(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.documents) if snapshot else 0
+
+    def reload(self) -> bool:
+        """
+        Load the live index version if it differs from the loaded one.
+
+        Returns:
+            bool: Whether a new version was loaded.
+
+        Raises:
+            FileNotFoundError: If no index has been exported to the path.
+        """
+        self._checked_at = time.monotonic()
+        with open(os.path.join(self.path, CURRENT_POINTER), "r", encoding="utf-8") as file:
+            version = file.read().strip()
+        if self._snapshot is not None and self._snapshot.version == version:
+            return False
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.version == version:
+                return False
+            snapshot = _Snapshot(os.path.join(self.path, version), self.use_faiss)
+            self._snapshot = snapshot
+        logging.info(f"Loaded local vector index {version} with {len(snapshot.documents)} chunks.")
+        return True
+
+    def _current(self) -> _Snapshot:
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to reload local vector index, keeping {self.version}: {e}")
+        assert self._snapshot is not None
+        return self._snapshot
+
+    def similarity_search_with_score_by_vector(
+            self, embedding: List[float], k: int = 4, filter: Optional[Mapping[str, str]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        snapshot = self._current()
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+        return [(snapshot.documents[i], score) for i, score in snapshot.search(query, k, filter)]
+
+    def similarity_search_by_vectors(
+            self, embeddings: Sequence[List[float]], k: int = 4, filter: Optional[Mapping[str, str]] = None
+    ) -> List[List[Document]]:
+        """
+        Search for several query embeddings with one matrix product.
+
+        Args:
+            embeddings (Sequence[List[float]]): The query embeddings.
+            k (int): Documents per query.
+            filter (Optional[Mapping[str, str]]): Metadata values the documents must have.
+
+        Returns:
+            List[List[Document]]: The top documents of each query, in order.
+        """
+        if not embeddings:
+            return []
+        snapshot = self._current()
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        return [[snapshot.documents[i] for i, _ in hits] for hits in snapshot.search_many(queries, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("LocalVectorStore is read-only; export a new index from the ingestion pipeline.")
+
+    @classmethod
+    def from_texts(
+            cls,
+            texts: List[str],
+            embedding: Embeddings,
+            metadatas: Optional[List[dict]] = None,
+            path: Optional[str] = None,
+            **kwargs: Any,
+    ) -> "LocalVectorStore":
+        """Embed texts, export them as a new index version at `path` and open it."""
+        if path is None:
+            raise ValueError("LocalVectorStore.from_texts requires a path")
+        write_local_index(path, texts, metadatas or [{} for _ in texts], embedding.embed_documents(texts))
+        return cls(embedding, path, **kwargs)
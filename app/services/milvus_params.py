@@ -0,0 +1,150 @@
+"""
+Module describing the Milvus vector index and how it is searched.
+
+The index type trades recall for latency and memory:
+
+  FLAT: Exact search over raw vectors; the recall reference.
+  IVF_FLAT: Vectors clustered into `nlist` lists; a query scans `nprobe` of them.
+  IVF_SQ8: IVF_FLAT with vectors quantized to 8 bits, about a quarter of the memory.
+  IVF_PQ: IVF with product quantization into `pq_m` sub-vectors, the smallest index.
+  HNSW: A proximity graph with `hnsw_m` links per node; a query explores `ef` candidates.
+
+Ingestion builds the collection's index from these settings, and retrieval
+searches with the matching `nprobe` or `ef`. `benchmarks.tune_vector_index`
+measures recall and latency for candidate settings, and
+`python gen_milvus.py --reindex` rebuilds an existing collection's index
+after they change.
+
+Classes:
+  MilvusIndexConfig: Index type, metric and build and search parameters.
+
+Environment Variables:
+  MILVUS_INDEX_TYPE: FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ or HNSW (default: "HNSW").
+  MILVUS_METRIC_TYPE: L2, IP or COSINE (default: "L2").
+  MILVUS_NLIST: IVF cluster count (default: 1024).
+  MILVUS_PQ_M: IVF_PQ sub-vectors; must divide the dimension (default: 16).
+  MILVUS_HNSW_M: HNSW links per node (default: 8).
+  MILVUS_EF_CONSTRUCTION: HNSW build candidates (default: 64).
+  MILVUS_NPROBE: IVF lists scanned per query (default: 16).
+  MILVUS_EF: HNSW candidates explored per query; raised to k if lower (default: 64).
+"""
+
+import dataclasses
+import logging
+import os
+from typing import Any, Dict, Optional
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+METRIC_TYPES = ("L2", "IP", "COSINE")
+
+
+@dataclasses.dataclass(frozen=True)
+class MilvusIndexConfig:
+    """
+    Index type, metric and build and search parameters of a Milvus vector field.
+
+    The build defaults match what LangChain's Milvus store uses when it
+    creates a collection. The search `ef` is higher than LangChain's 10,
+    since Milvus rejects an `ef` below the number of results requested and
+    hybrid retrieval requests 20 candidates.
+
+    Raises:
+        ValueError: If the index or metric type is not supported.
+    """
+
+    index_type: str = "HNSW"
+    metric_type: str = "L2"
+    nlist: int = 1024
+    pq_m: int = 16
+    hnsw_m: int = 8
+    ef_construction: int = 64
+    nprobe: int = 16
+    ef: int = 64
+
+    def __post_init__(self) -> None:
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported Milvus index type: {self.index_type}")
+        if self.metric_type not in METRIC_TYPES:
+            raise ValueError(f"Unsupported Milvus metric type: {self.metric_type}")
+
+    @classmethod
+    def from_env(cls) -> "MilvusIndexConfig":
+        """
+        Build the configuration from environment variables, falling back to defaults.
+
+        Returns:
+            MilvusIndexConfig: The configuration for the current environment.
+        """
+        return cls(
+            index_type=os.environ.get("MILVUS_INDEX_TYPE", cls.index_type).upper(),
+            metric_type=os.environ.get("MILVUS_METRIC_TYPE", cls.metric_type).upper(),
+            nlist=int(os.environ.get("MILVUS_NLIST", cls.nlist)),
+            pq_m=int(os.environ.get("MILVUS_PQ_M", cls.pq_m)),
+            hnsw_m=int(os.environ.get("MILVUS_HNSW_M", cls.hnsw_m)),
+            ef_construction=int(os.environ.get("MILVUS_EF_CONSTRUCTION", cls.ef_construction)),
+            nprobe=int(os.environ.get("MILVUS_NPROBE", cls.nprobe)),
+            ef=int(os.environ.get("MILVUS_EF", cls.ef)),
+        )
+
+    def index_params(self) -> Dict[str, Any]:
+        """
+        The `create_index` parameters of this configuration.
+
+        Returns:
+            Dict[str, Any]: Index type, metric type and build parameters.
+        """
+        if self.index_type == "HNSW":
+            params: Dict[str, Any] = {"M": self.hnsw_m, "efConstruction": self.ef_construction}
+        elif self.index_type == "IVF_PQ":
+            params = {"nlist": self.nlist, "m": self.pq_m, "nbits": 8}
+        elif self.index_type.startswith("IVF"):
+            params = {"nlist": self.nlist}
+        else:
+            params = {}
+        return {"index_type": self.index_type, "metric_type": self.metric_type, "params": params}
+
+    def search_params(self, k: int = 0) -> Dict[str, Any]:
+        """
+        The search parameters of this configuration.
+
+        Args:
+            k (int): The largest number of results a search requests.
+
+        Returns:
+            Dict[str, Any]: Metric type and search parameters.
+        """
+        if self.index_type == "HNSW":
+            params: Dict[str, Any] = {"ef": max(self.ef, k)}
+        elif self.index_type.startswith("IVF"):
+            params = {"nprobe": min(self.nprobe, self.nlist)}
+        else:
+            params = {}
+        return {"metric_type": self.metric_type, "params": params}
+
+    def matching(self, collection: Any, field: str = "vector") -> "MilvusIndexConfig":
+        """
+        This configuration with the index and metric type of a collection's existing index.
+
+        Search parameters must suit the index that was built, which only
+        changes when the collection is reindexed; until then, the configured
+        `nprobe` and `ef` apply to the existing index.
+
+        Args:
+            collection (Any): A pymilvus Collection.
+            field (str): The vector field.
+
+        Returns:
+            MilvusIndexConfig: The configuration to search the collection with.
+        """
+        built: Optional[Dict[str, Any]] = None
+        for index in getattr(collection, "indexes", None) or []:
+            if index.field_name == field:
+                built = index.params
+        if not built or built.get("index_type") not in INDEX_TYPES or built.get("metric_type") not in METRIC_TYPES:
+            return self
+        if (built["index_type"], built["metric_type"]) != (self.index_type, self.metric_type):
+            logging.warning(
+                f"Collection index is {built['index_type']}/{built['metric_type']}, not the configured "
+                f"{self.index_type}/{self.metric_type}; run `python gen_milvus.py --reindex` to apply the configuration."
+            )
+        return dataclasses.replace(self, index_type=built["index_type"], metric_type=built["metric_type"])
@@ -0,0 +1,654 @@
+"""
+Module providing a shared HTTP client for the OpenAI API.
+
+All chat completion calls go through one `requests.Session` per process, so
+TLS connections are pooled and kept alive between requests. Failed calls are
+retried with jittered exponential backoff, honouring the `Retry-After` header
+of 429 and 5xx responses up to the same cap. A token-bucket limiter for
+requests per minute and tokens per minute queues bursts briefly instead of
+letting them fail. The limiter is shared by every thread of a worker and, when given a SQLite file,
+by every worker on the host.
+
+Classes:
+  OpenAIError: Raised when the API cannot be reached or returns an error.
+  OpenAIRateLimitError: Raised when requests stay rate limited.
+  TokenBucket: Thread-safe in-memory token bucket.
+  SqliteTokenBucket: Token bucket shared between processes through SQLite.
+  RateLimiter: Request and token budgets for the API.
+  OpenAIClient: Pooled, retrying, rate-limited client.
+  AsyncOpenAIClient: The same client on asyncio and httpx, for the async request path.
+
+Functions:
+  get_openai_client: Returns the process-wide OpenAIClient.
+  get_async_openai_client: Returns the AsyncOpenAIClient of the running event loop.
+
+Environment Variables:
+  OPENAI_API_BASE: Base URL of the API (default: "https://api.openai.com/v1").
+  OPENAI_CONNECT_TIMEOUT: Seconds to wait for a connection (default: 5).
+  OPENAI_READ_TIMEOUT: Seconds to wait for response data (default: 60).
+  OPENAI_MAX_RETRIES: Retries after the first attempt (default: 4).
+  OPENAI_POOL_SIZE: Maximum pooled connections (default: 20).
+  OPENAI_ASYNC_POOL_SIZE: Maximum pooled connections of the async client (default: 100).
+  OPENAI_REQUESTS_PER_MINUTE: Request budget, 0 to disable (default: 0).
+  OPENAI_TOKENS_PER_MINUTE: Token budget, 0 to disable (default: 0).
+  OPENAI_RATE_LIMIT_DB: SQLite file sharing the budgets between workers, e.g. "rate_limit.db".
+  OPENAI_RATE_LIMIT_MAX_WAIT: Longest a call queues for budget (default: 30).
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class OpenAIError(requests.exceptions.RequestException):
+    """Raised when the OpenAI API cannot be reached or returns an error."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class OpenAIRateLimitError(OpenAIError):
+    """Raised when requests are still rate limited after all retries."""
+
+
+class TokenBucket:
+    """
+    Thread-safe in-memory token bucket.
+
+    Callers reserve tokens up front and then wait until the reservation is
+    covered, so concurrent callers are served in arrival order.
+
+    Args:
+        name (str): The name of the bucket, used in error messages.
+        rate_per_minute (float): Tokens added to the bucket per minute.
+        capacity (Optional[float]): Maximum burst size, defaults to one minute of tokens.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, capacity: Optional[float] = None):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """
+        Reserve tokens from the bucket.
+
+        Args:
+            amount (float): The number of tokens to take.
+            max_wait (float): The longest acceptable wait, in seconds.
+
+        Returns:
+            Optional[float]: Seconds to wait before using the tokens, or None
+            if that would exceed `max_wait` (nothing is reserved then).
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        """
+        Return tokens taken by a reservation that was not used.
+
+        Args:
+            amount (float): The number of tokens reserved.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class SqliteTokenBucket:
+    """
+    Token bucket whose state lives in a SQLite file shared between processes.
+
+    Args:
+        path (str): The SQLite file.
+        name (str): The name of the bucket within the file.
+        rate_per_minute (float): Tokens added to the bucket per minute.
+        capacity (Optional[float]): Maximum burst size, defaults to one minute of tokens.
+    """
+
+    def __init__(self, path: str, name: str, rate_per_minute: float, capacity: Optional[float] = None):
+        self.path = path
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets "
+                "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """
+        Reserve tokens from the bucket; see TokenBucket.reserve.
+
+        Args:
+            amount (float): The number of tokens to take.
+            max_wait (float): The longest acceptable wait, in seconds.
+
+        Returns:
+            Optional[float]: Seconds to wait, or None if that exceeds `max_wait`.
+        """
+        amount = min(amount, self.capacity)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            wait = max(0.0, (amount - tokens) / self.rate)
+            if wait > max_wait:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens - amount, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+    def refund(self, amount: float) -> None:
+        """
+        Return tokens taken by a reservation that was not used; see TokenBucket.refund.
+
+        Args:
+            amount (float): The number of tokens reserved.
+        """
+        amount = min(amount, self.capacity)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE token_buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+                (self.capacity, amount, self.name),
+            )
+        finally:
+            conn.close()
+
+
+Bucket = Union[TokenBucket, SqliteTokenBucket]
+
+
+class RateLimiter:
+    """
+    Request and token budgets for the API.
+
+    Args:
+        requests_per_minute (float): Request budget, 0 to disable.
+        tokens_per_minute (float): Token budget, 0 to disable.
+        path (Optional[str]): SQLite file to share the budgets through, if any.
+        max_wait (float): Longest a call may queue for budget, in seconds.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: float = 0,
+            tokens_per_minute: float = 0,
+            path: Optional[str] = None,
+            max_wait: float = 30.0,
+    ):
+        self.max_wait = max_wait
+        self.requests = self._bucket(path, "requests", requests_per_minute)
+        self.tokens = self._bucket(path, "tokens", tokens_per_minute)
+
+    @staticmethod
+    def _bucket(path: Optional[str], name: str, rate_per_minute: float) -> Optional[Bucket]:
+        if rate_per_minute <= 0:
+            return None
+        if path:
+            return SqliteTokenBucket(path, name, rate_per_minute)
+        return TokenBucket(name, rate_per_minute)
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Wait until one request of the given token size fits the budgets.
+
+        Args:
+            tokens (int): Estimated tokens used by the request.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            OpenAIRateLimitError: If the wait would exceed `max_wait`.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserve budget for one request of the given token size without waiting.
+
+        Args:
+            tokens (int): Estimated tokens used by the request.
+
+        Returns:
+            float: Seconds to wait before sending the request.
+
+        Raises:
+            OpenAIRateLimitError: If the wait would exceed `max_wait`.
+        """
+        waits = []
+        reserved: List[Tuple[Bucket, float]] = []
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None:
+                continue
+            wait = bucket.reserve(amount, self.max_wait)
+            if wait is None:
+                # A rejected call must not use up the budgets it did get.
+                for reserved_bucket, reserved_amount in reserved:
+                    reserved_bucket.refund(reserved_amount)
+                raise OpenAIRateLimitError(
+                    f"Local {bucket.name} budget exhausted for more than {self.max_wait}s",
+                    status_code=429,
+                    retry_after=self.max_wait,
+                )
+            reserved.append((bucket, amount))
+            waits.append(wait)
+        wait = max(waits, default=0.0)
+        if wait > 0:
+            logging.info(f"Rate limiter queued an OpenAI request for {wait:.2f}s.")
+        return wait
+
+    async def areserve(self, tokens: int) -> float:
+        """
+        Async version of `reserve`, for the asyncio request path.
+
+        Budgets shared through SQLite may wait on the file lock, so they are
+        reserved on a worker thread rather than on the event loop.
+
+        Args:
+            tokens (int): Estimated tokens used by the request.
+
+        Returns:
+            float: Seconds to wait before sending the request.
+
+        Raises:
+            OpenAIRateLimitError: If the wait would exceed `max_wait`.
+        """
+        if isinstance(self.requests, SqliteTokenBucket) or isinstance(self.tokens, SqliteTokenBucket):
+            return await asyncio.to_thread(self.reserve, tokens)
+        return self.reserve(tokens)
+
+
+class OpenAIClient:
+    """
+    Pooled, retrying, rate-limited client for the OpenAI API.
+
+    Args:
+        api_key (Optional[str]): The API key.
+        api_base (str): Base URL of the API.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for response data.
+        max_retries (int): Retries after the first attempt.
+        pool_size (int): Maximum pooled connections.
+        rate_limiter (Optional[RateLimiter]): Budgets to respect, if any.
+        backoff_base (float): Delay before the first retry, in seconds.
+        backoff_max (float): Longest delay between retries, in seconds.
+    """
+
+    def __init__(
+            self,
+            api_key: Optional[str],
+            api_base: str = "https://api.openai.com/v1",
+            connect_timeout: float = 5.0,
+            read_timeout: float = 60.0,
+            max_retries: int = 4,
+            pool_size: int = 20,
+            rate_limiter: Optional[RateLimiter] = None,
+            backoff_base: float = 0.5,
+            backoff_max: float = 20.0,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = self._new_session()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        })
+        return session
+
+    def post(self, path: str, payload: Dict[str, Any], estimated_tokens: int = 0, stream: bool = False) -> requests.Response:
+        """
+        POST a JSON payload, retrying transient failures.
+
+        Args:
+            path (str): The API path, e.g. "/chat/completions".
+            payload (Dict[str, Any]): The JSON body.
+            estimated_tokens (int): Tokens the request will use, for the token budget.
+            stream (bool): Whether to stream the response body.
+
+        Returns:
+            requests.Response: The successful response. Streamed responses
+            must be closed by the caller.
+
+        Raises:
+            OpenAIRateLimitError: If the request stays rate limited.
+            OpenAIError: If the request fails for any other reason.
+        """
+        url = f"{self.api_base}{path}"
+        body = json.dumps(payload)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimated_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                response = self.session.post(url, data=body, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error: OpenAIError = OpenAIError(f"Could not reach the OpenAI API: {e}")
+            else:
+                if response.status_code < 400:
+                    return response
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                detail = response.text[:200]
+                response.close()
+                error_class = OpenAIRateLimitError if response.status_code == 429 else OpenAIError
+                error = error_class(
+                    f"OpenAI API returned status code {response.status_code}: {detail}",
+                    status_code=response.status_code,
+                    retry_after=retry_after,
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+
+            if attempt == self.max_retries:
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            logging.warning(f"{error}; retrying in {delay:.2f}s (attempt {attempt + 1} of {self.max_retries}).")
+            time.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        return _backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+    def check(self, timeout: float = 5.0) -> None:
+        """
+        Check that the API is reachable and accepts the key by listing models.
+
+        Args:
+            timeout (float): Seconds to wait for the response.
+
+        Raises:
+            OpenAIError: If the API cannot be reached or returns an error.
+        """
+        try:
+            response = self.session.get(f"{self.api_base}/models", timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            raise OpenAIError(f"Could not reach the OpenAI API: {e}")
+        with response:
+            if response.status_code >= 400:
+                raise OpenAIError(
+                    f"OpenAI API returned status code {response.status_code}", status_code=response.status_code
+                )
+
+    def reset(self) -> None:
+        """Replace the session, e.g. after a fork, dropping pooled connections."""
+        self.session = self._new_session()
+
+
+class AsyncOpenAIClient:
+    """
+    Pooled, retrying, rate-limited client for the OpenAI API on asyncio.
+
+    Behaves like OpenAIClient, but waits for responses, retries and rate
+    limit budget without holding a thread, so one event loop can keep
+    thousands of requests waiting. An instance belongs to the event loop it
+    is first used on.
+
+    Args:
+        api_key (Optional[str]): The API key.
+        api_base (str): Base URL of the API.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for response data.
+        max_retries (int): Retries after the first attempt.
+        pool_size (int): Maximum pooled connections; further requests queue for one.
+        rate_limiter (Optional[RateLimiter]): Budgets to respect, if any.
+        backoff_base (float): Delay before the first retry, in seconds.
+        backoff_max (float): Longest delay between retries, in seconds.
+        transport (Optional[httpx.AsyncBaseTransport]): Transport to send requests with, e.g. in tests.
+    """
+
+    def __init__(
+            self,
+            api_key: Optional[str],
+            api_base: str = "https://api.openai.com/v1",
+            connect_timeout: float = 5.0,
+            read_timeout: float = 60.0,
+            max_retries: int = 4,
+            pool_size: int = 100,
+            rate_limiter: Optional[RateLimiter] = None,
+            backoff_base: float = 0.5,
+            backoff_max: float = 20.0,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"},
+            # Requests beyond the pool wait for a connection instead of failing.
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=None),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=transport,
+        )
+
+    async def post(self, path: str, payload: Dict[str, Any], estimated_tokens: int = 0) -> Dict[str, Any]:
+        """
+        POST a JSON payload, retrying transient failures.
+
+        Args:
+            path (str): The API path, e.g. "/chat/completions".
+            payload (Dict[str, Any]): The JSON body.
+            estimated_tokens (int): Tokens the request will use, for the token budget.
+
+        Returns:
+            Dict[str, Any]: The decoded JSON response.
+
+        Raises:
+            OpenAIRateLimitError: If the request stays rate limited.
+            OpenAIError: If the request fails for any other reason.
+        """
+        url = f"{self.api_base}{path}"
+        body = json.dumps(payload)
+        if self.rate_limiter is not None:
+            wait = await self.rate_limiter.areserve(estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                response = await self.client.post(url, content=body)
+            except httpx.TransportError as e:
+                error: OpenAIError = OpenAIError(f"Could not reach the OpenAI API: {e}")
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                error_class = OpenAIRateLimitError if response.status_code == 429 else OpenAIError
+                error = error_class(
+                    f"OpenAI API returned status code {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code,
+                    retry_after=retry_after,
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+
+            if attempt == self.max_retries:
+                raise error
+            delay = _backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+            logging.warning(f"{error}; retrying in {delay:.2f}s (attempt {attempt + 1} of {self.max_retries}).")
+            await asyncio.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        await self.client.aclose()
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[float], base: float, maximum: float) -> float:
+    # Full jitter keeps retries from many threads from synchronising.
+    delay = random.uniform(0, min(maximum, base * 2 ** attempt))
+    if retry_after is not None:
+        # A server-sent delay is honoured up to the same cap, so one header cannot stall a worker.
+        delay = min(retry_after, maximum) + random.uniform(0, base)
+    return delay
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+_client: Optional[OpenAIClient] = None
+_client_lock = threading.Lock()
+# Shared by the synchronous and async clients, so both count against the same budgets.
+_rate_limiter: Optional[RateLimiter] = None
+_async_client: Optional[Tuple[asyncio.AbstractEventLoop, AsyncOpenAIClient]] = None
+
+
+def get_openai_client() -> OpenAIClient:
+    """
+    Returns the process-wide OpenAIClient, creating it on first use.
+
+    The client is recreated if the API key or base URL in the environment
+    has changed since it was built.
+
+    Returns:
+        OpenAIClient: The shared client.
+    """
+    global _client, _rate_limiter
+    env = os.environ
+    api_base = env.get("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+    if _client is None or _client.api_key != env.get("OPENAI_API_KEY") or _client.api_base != api_base:
+        with _client_lock:
+            if _client is None or _client.api_key != env.get("OPENAI_API_KEY") or _client.api_base != api_base:
+                _rate_limiter = _rate_limiter or _new_rate_limiter()
+                _client = OpenAIClient(
+                    api_key=env.get("OPENAI_API_KEY"),
+                    api_base=api_base,
+                    connect_timeout=float(env.get("OPENAI_CONNECT_TIMEOUT", 5)),
+                    read_timeout=float(env.get("OPENAI_READ_TIMEOUT", 60)),
+                    max_retries=int(env.get("OPENAI_MAX_RETRIES", 4)),
+                    pool_size=int(env.get("OPENAI_POOL_SIZE", 20)),
+                    rate_limiter=_rate_limiter,
+                )
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAIClient:
+    """
+    Returns the AsyncOpenAIClient of the running event loop, creating it on first use.
+
+    It shares its rate limit budgets with the synchronous client, and is
+    recreated for a new event loop or when the API key or base URL in the
+    environment has changed.
+
+    Returns:
+        AsyncOpenAIClient: The event loop's client.
+    """
+    global _async_client, _rate_limiter
+    env = os.environ
+    loop = asyncio.get_running_loop()
+    api_base = env.get("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+    current = _async_client
+    if current is None or current[0] is not loop or current[1].api_key != env.get("OPENAI_API_KEY") \
+            or current[1].api_base != api_base:
+        with _client_lock:
+            _rate_limiter = _rate_limiter or _new_rate_limiter()
+        client = AsyncOpenAIClient(
+            api_key=env.get("OPENAI_API_KEY"),
+            api_base=api_base,
+            connect_timeout=float(env.get("OPENAI_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(env.get("OPENAI_READ_TIMEOUT", 60)),
+            max_retries=int(env.get("OPENAI_MAX_RETRIES", 4)),
+            pool_size=int(env.get("OPENAI_ASYNC_POOL_SIZE", 100)),
+            rate_limiter=_rate_limiter,
+        )
+        current = _async_client = (loop, client)
+    return current[1]
+
+
+def _new_rate_limiter() -> RateLimiter:
+    env = os.environ
+    return RateLimiter(
+        requests_per_minute=float(env.get("OPENAI_REQUESTS_PER_MINUTE", 0)),
+        tokens_per_minute=float(env.get("OPENAI_TOKENS_PER_MINUTE", 0)),
+        path=env.get("OPENAI_RATE_LIMIT_DB"),
+        max_wait=float(env.get("OPENAI_RATE_LIMIT_MAX_WAIT", 30)),
+    )
+
+
+def _reset_in_child() -> None:
+    global _client_lock, _async_client
+    _client_lock = threading.Lock()
+    _async_client = None
+    if _client is not None:
+        _client.reset()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
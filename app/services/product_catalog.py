@@ -0,0 +1,384 @@
+"""
+Module for storing and searching the product catalog.
+
+Products keep their ingredients as free text (e.g. "Triphala, Til Tail,
+Neel"), which can only be searched with a full-table `LIKE` scan that also
+matches substrings ("rice" in "licorice"). This module maintains an inverted
+index next to the `products` table: `product_ingredients` maps each
+normalized ingredient, and each word of a multi-word ingredient, to the
+products that contain it. Search is then an indexed lookup that ranks
+products by how many of the requested ingredients they contain.
+
+The catalog also holds a synonym table mapping alternative names of an
+ingredient (Sanskrit, Hindi, English) to its canonical name, and a version
+number that triggers bump on every change to products or synonyms, so
+caches built from the vocabulary know when to rebuild.
+
+The index is written whenever a product is added or its ingredients change
+through this module, or, for bulk loads (see `catalog_loader`), once the
+products are in. Triggers drop the entries of deleted products and of
+products whose ingredients are changed by other means; such products, and
+products inserted by other means, are indexed the next time `ensure_schema`
+runs.
+
+Functions:
+  ensure_schema: Creates the catalog tables and indexes any unindexed products.
+  add_product: Inserts a product and indexes its ingredients.
+  set_product_ingredients: Replaces a product's ingredients and index entries.
+  index_ingredients: Writes the index entries of products, in bulk.
+  drop_lookup_indexes: Drops the index's secondary indexes before a bulk load.
+  create_lookup_indexes: Creates the index's secondary indexes.
+  search_by_ingredients: Ranked, paginated search by ingredients.
+  iter_products: Streams every product, for debugging and exports.
+  add_synonym: Maps an alternative ingredient name to its canonical name.
+  ingredient_vocabulary: Returns every ingredient name in the catalog.
+  ingredient_synonyms: Returns the alias to canonical name mapping.
+  catalog_version: Returns the catalog's change counter.
+"""
+
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+_SEPARATORS = re.compile(r"[,;\n]+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Secondary indexes of the ingredient index, which bulk loads build once at the end.
+_LOOKUP_INDEXES = {
+    "idx_product_ingredients_product": "ON product_ingredients (product_id)",
+    "idx_product_ingredients_names": "ON product_ingredients (term) WHERE is_name = 1",
+}
+
+
+def normalize_ingredient(name: str) -> str:
+    """Lower-case an ingredient name and collapse its whitespace."""
+    return _WHITESPACE.sub(" ", name).strip().lower()
+
+
+def ingredient_names(ingredients: str) -> List[str]:
+    """
+    Normalized ingredient names of a free-text ingredient list.
+
+    Args:
+        ingredients (str): Comma- or semicolon-separated ingredient names.
+
+    Returns:
+        List[str]: The distinct names, in order.
+    """
+    names = (normalize_ingredient(name) for name in _SEPARATORS.split(ingredients))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def ingredient_terms(ingredients: str) -> Set[str]:
+    """
+    Index terms of a free-text ingredient list.
+
+    Each ingredient is indexed by its full normalized name and by each of its
+    words, so "rice" finds "rice bran" but not "licorice".
+
+    Args:
+        ingredients (str): Comma- or semicolon-separated ingredient names.
+
+    Returns:
+        Set[str]: The normalized terms.
+    """
+    terms: Set[str] = set()
+    for name in ingredient_names(ingredients):
+        terms.add(name)
+        terms.update(name.split(" "))
+    return terms
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """
+    Create the catalog tables and index products that have no index entries.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+    """
+    with conn:
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_category TEXT NOT NULL,
+                product_name TEXT NOT NULL,
+                price REAL NOT NULL,
+                link TEXT NOT NULL,
+                ingredients TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_products_link ON products (link);
+            CREATE TABLE IF NOT EXISTS product_ingredients (
+                term TEXT NOT NULL,
+                product_id INTEGER NOT NULL,
+                is_name INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (term, product_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS ingredient_synonyms (
+                alias TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0);
+            CREATE TRIGGER IF NOT EXISTS products_insert_version
+                AFTER INSERT ON products
+            BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_delete_ingredients
+                AFTER DELETE ON products
+            BEGIN
+                DELETE FROM product_ingredients WHERE product_id = OLD.id;
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_update_ingredients
+                AFTER UPDATE OF ingredients ON products
+            BEGIN
+                DELETE FROM product_ingredients WHERE product_id = OLD.id;
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS synonyms_insert_version
+                AFTER INSERT ON ingredient_synonyms
+            BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS synonyms_update_version
+                AFTER UPDATE ON ingredient_synonyms
+            BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS synonyms_delete_version
+                AFTER DELETE ON ingredient_synonyms
+            BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END;
+            """
+        )
+        create_lookup_indexes(conn)
+        unindexed = conn.execute(
+            "SELECT id, ingredients FROM products "
+            "WHERE id NOT IN (SELECT DISTINCT product_id FROM product_ingredients)"
+        ).fetchall()
+        index_ingredients(conn, unindexed)
+
+
+def add_product(
+        conn: sqlite3.Connection,
+        product_category: str,
+        product_name: str,
+        price: float,
+        link: str,
+        ingredients: str,
+) -> int:
+    """
+    Insert a product and index its ingredients.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+        product_category (str): The product's category.
+        product_name (str): The product's name.
+        price (float): The product's price.
+        link (str): URL of the product page.
+        ingredients (str): Comma-separated ingredient names.
+
+    Returns:
+        int: The new product's ID.
+    """
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO products (product_category, product_name, price, link, ingredients) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (product_category, product_name, price, link, ingredients),
+        )
+        product_id = cursor.lastrowid
+        if product_id is None:
+            raise sqlite3.DatabaseError(f"No row ID for the inserted product {product_name!r}")
+        index_ingredients(conn, [(product_id, ingredients)])
+    return product_id
+
+
+def set_product_ingredients(conn: sqlite3.Connection, product_id: int, ingredients: str) -> None:
+    """
+    Replace a product's ingredients and its index entries.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+        product_id (int): The product to update.
+        ingredients (str): Comma-separated ingredient names.
+    """
+    with conn:
+        # The update trigger removes the old index entries.
+        conn.execute("UPDATE products SET ingredients = ? WHERE id = ?", (ingredients, product_id))
+        index_ingredients(conn, [(product_id, ingredients)])
+
+
+def index_ingredients(conn: sqlite3.Connection, products: Iterable[Tuple[int, str]]) -> int:
+    """
+    Write the index entries of products in one statement.
+
+    Entries are written in term order, which keeps inserts into the index's
+    primary key sequential. The caller owns the transaction.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+        products (Iterable[Tuple[int, str]]): ID and ingredients of each product.
+
+    Returns:
+        int: The number of index entries written.
+    """
+    entries: List[Tuple[str, int, int]] = []
+    for product_id, ingredients in products:
+        names = set(ingredient_names(ingredients))
+        entries.extend((term, product_id, int(term in names)) for term in ingredient_terms(ingredients))
+    entries.sort()
+    conn.executemany(
+        "INSERT OR IGNORE INTO product_ingredients (term, product_id, is_name) VALUES (?, ?, ?)", entries
+    )
+    return len(entries)
+
+
+def drop_lookup_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Drop the ingredient index's secondary indexes, so a bulk load does not maintain them row by row.
+
+    Searches fall back to slower plans until `create_lookup_indexes` runs.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+    """
+    with conn:
+        for name in _LOOKUP_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_lookup_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Create the ingredient index's secondary indexes if they are missing.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+    """
+    with conn:
+        for name, definition in _LOOKUP_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def search_by_ingredients(
+        conn: sqlite3.Connection,
+        ingredients: Sequence[str],
+        limit: int = 20,
+        offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Find products containing any of the ingredients, best matches first.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+        ingredients (Sequence[str]): Ingredient names to look for.
+        limit (int): Maximum number of products to return.
+        offset (int): Number of ranked products to skip.
+
+    Returns:
+        List[Dict[str, Any]]: Products with the number of requested
+        ingredients they matched, ordered by that number.
+    """
+    terms = sorted({normalize_ingredient(ingredient) for ingredient in ingredients} - {""})
+    if not terms:
+        return []
+    placeholders = ", ".join("?" * len(terms))
+    rows = conn.execute(
+        f"""
+        SELECT p.product_category, p.product_name, p.price, p.link, p.ingredients,
+               matches.matched_ingredients
+        FROM (
+            SELECT product_id, COUNT(*) AS matched_ingredients
+            FROM product_ingredients
+            WHERE term IN ({placeholders})
+            GROUP BY product_id
+            ORDER BY matched_ingredients DESC, product_id
+            LIMIT ? OFFSET ?
+        ) AS matches
+        JOIN products AS p ON p.id = matches.product_id
+        ORDER BY matches.matched_ingredients DESC, p.id
+        """,
+        [*terms, limit, offset],
+    ).fetchall()
+    columns = ("product_category", "product_name", "price", "link", "ingredients", "matched_ingredients")
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def iter_products(conn: sqlite3.Connection) -> Iterator[Dict[str, Any]]:
+    """
+    Stream every product without loading the whole table into memory.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+
+    Yields:
+        Dict[str, Any]: Each product's columns, in ID order.
+    """
+    cursor = conn.execute("SELECT * FROM products ORDER BY id")
+    columns = [description[0] for description in cursor.description]
+    for row in cursor:
+        yield dict(zip(columns, row))
+
+
+def add_synonym(conn: sqlite3.Connection, alias: str, canonical: str) -> None:
+    """
+    Map an alternative ingredient name to its canonical name.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+        alias (str): The alternative name, e.g. "amla".
+        canonical (str): The name used in the catalog, e.g. "amalaka".
+    """
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ingredient_synonyms (alias, canonical) VALUES (?, ?)",
+            (normalize_ingredient(alias), normalize_ingredient(canonical)),
+        )
+
+
+def ingredient_vocabulary(conn: sqlite3.Connection) -> List[str]:
+    """
+    Every normalized ingredient name used by a product in the catalog.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+
+    Returns:
+        List[str]: The distinct names, sorted.
+    """
+    rows = conn.execute("SELECT DISTINCT term FROM product_ingredients WHERE is_name = 1 ORDER BY term")
+    return [row[0] for row in rows]
+
+
+def ingredient_synonyms(conn: sqlite3.Connection) -> Dict[str, str]:
+    """
+    The synonym table.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+
+    Returns:
+        Dict[str, str]: Canonical name of each alias.
+    """
+    return dict(conn.execute("SELECT alias, canonical FROM ingredient_synonyms").fetchall())
+
+
+def catalog_version(conn: sqlite3.Connection) -> int:
+    """
+    The catalog's change counter, bumped on every product or synonym change.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the catalog database.
+
+    Returns:
+        int: The current version.
+    """
+    row = conn.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()
+    return int(row[0]) if row else 0
@@ -0,0 +1,345 @@
+"""
+Module orchestrating retrieval and completion for a chat question.
+
+Two pipeline modes are supported:
+
+  agent: Retrieves documents, runs the conversational retrieval agent over
+    them (which may retrieve again and makes one or more LLM calls), then asks
+    ChatGPT to simplify the agent's output.
+  single_pass: Retrieves documents once and makes a single grounded
+    completion that both answers in the diagnosis/remedy format and keeps
+    the treatment details unmodified.
+
+Both modes report per-stage timings and token usage so they can be compared.
+
+Classes:
+  PipelineResult: The answer and measurements of one pipeline run.
+
+Functions:
+  get_pipeline_mode: Resolves the pipeline mode to use.
+  build_conversation: Builds the simplify-without-modifying conversation.
+  build_grounded_conversation: Builds the single-pass conversation.
+  prepare_conversation: Runs the retrieval stages of a pipeline.
+  answer_question: Runs a pipeline end to end.
+  aprepare_conversation, aanswer_question: Their async versions, for the asyncio request path.
+
+Environment Variables:
+  RAG_PIPELINE_MODE: The default pipeline mode (default: "agent").
+"""
+
+import dataclasses
+import logging
+import os
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from langchain_community.callbacks.manager import get_openai_callback
+from langchain_core.documents import Document
+
+from app.services import chat_gpt_service
+from app.services.retrieval_service import get_retrieval_service
+from app.utils.logs import log_payload
+from app.utils.metrics import CONTEXT_TOKENS_SAVED, ERRORS, LLM_TOKENS
+from app.utils.timing import StageTimer
+from app.services.context_packer import pack_context
+from app.utils.util import aget_context, get_context
+
+PIPELINE_MODES = ("agent", "single_pass")
+
+CURE_NOT_FOUND = "CURE NOT FOUND IN DATABASE"
+
+
+@dataclasses.dataclass
+class PipelineResult:
+    """
+    The answer and measurements of one pipeline run.
+
+    Attributes:
+        message (str): The HTML-formatted answer.
+        mode (str): The pipeline mode that produced the answer.
+        timings (Dict[str, float]): Stage names mapped to durations in milliseconds.
+        usage (Dict[str, Dict[str, int]]): Token usage per LLM stage.
+        error (Optional[str]): The upstream error, if the completion failed.
+        retry_after (Optional[float]): Seconds to wait if the upstream was rate limited.
+    """
+
+    message: str
+    mode: str
+    timings: Dict[str, float]
+    usage: Dict[str, Dict[str, int]]
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+
+def get_pipeline_mode(requested: Optional[str] = None) -> str:
+    """
+    Resolves the pipeline mode to use.
+
+    Args:
+        requested (Optional[str]): The mode asked for by the client, if any.
+
+    Returns:
+        str: The pipeline mode.
+
+    Raises:
+        ValueError: If an unsupported pipeline mode is specified.
+    """
+    mode = requested or os.environ.get("RAG_PIPELINE_MODE", "agent")
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unsupported pipeline mode: {mode}")
+    return mode
+
+
+def build_conversation(message_content: str, milvus_context: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Builds the conversation asking ChatGPT to simplify the agent's answer.
+
+    Args:
+        message_content (str): The user's question.
+        milvus_context (Optional[str]): The agent's answer, or CURE_NOT_FOUND.
+
+    Returns:
+        List[Dict[str, str]]: The conversation to send to ChatGPT.
+    """
+    conversation: List[Dict[str, str]] = [{"role": "user", "content": message_content}]
+    if milvus_context and CURE_NOT_FOUND not in milvus_context:
+        logging.info("Cure found in Milvus, asking ChatGPT to simplify the response without modifying treatment.")
+        conversation.append({
+            "role": "system",
+            "content": (
+                """You are an assistant that helps explain Ayurvedic treatments in simple terms.
+                Your task is to simplify the following Ayurvedic text for a common person to understand.
+                Strictly ensure that you do not modify any treatment details or suggest any changes, even if the treatments appear incorrect.
+                Only simplify the names of herbs and concepts in plain language.\n\n"""
+                f"Original text:\n{milvus_context}"
+            )
+        })
+    else:
+        logging.info("Cure not found in Milvus, proceeding with normal ChatGPT conversation.")
+        conversation.append({
+            "role": "system",
+            "content": milvus_context or "No specific context found in Milvus. Proceeding with default conversation."
+        })
+
+    return conversation
+
+
+def build_grounded_conversation(message_content: str, retrieved_context: str) -> List[Dict[str, str]]:
+    """
+    Builds the single-pass conversation that answers from retrieved text.
+
+    The instructions combine the agent's answer format with the simplification
+    step, so one completion replaces both.
+
+    Args:
+        message_content (str): The user's question.
+        retrieved_context (str): The packed text of the retrieved documents.
+
+    Returns:
+        List[Dict[str, str]]: The conversation to send to ChatGPT.
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                """Answer the user's question strictly from the Ayurvedic text below, which was retrieved from the Milvus database.
+                Do not alter the meaning or intent of the question, and do not add treatments that are not in the text.
+                Follow this format:
+                - WHAT IS THE DIAGNOSIS: The diagnostic information from the text.
+                - HOW TO FIX IT: The treatment or remedy from the text, naming every herb or ingredient with its Sanskrit and common names, primary uses, dosage and preparation, and contraindications or precautions where the text gives them.
+                Explain the answer in simple terms for a common person. Strictly ensure that you do not modify any treatment details or suggest any changes, even if the treatments appear incorrect. Only simplify the names of herbs and concepts in plain language.\n\n"""
+                f"Retrieved text:\n{retrieved_context}"
+            )
+        },
+        {"role": "user", "content": message_content},
+    ]
+
+
+def prepare_conversation(
+        message_content: str,
+        mode: str,
+        timer: StageTimer,
+        usage: Dict[str, Dict[str, int]],
+        model: str = "gpt-4o",
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Runs the stages of a pipeline that precede the final completion.
+
+    Args:
+        message_content (str): The user's question.
+        mode (str): The pipeline mode.
+        timer (StageTimer): Records the duration of each stage.
+        usage (Dict[str, Dict[str, int]]): Receives the token usage of the agent
+            stage and the context packing report.
+        model (str): The model of the final completion, whose context budget applies.
+        retrieved_docs (Optional[List[Document]]): Documents already retrieved
+            for the question, e.g. by a batch; retrieved here if not given.
+        filters (Optional[Mapping[str, str]]): Chunk metadata values that narrow
+            the retrieval; inferred from the question if not given.
+
+    Returns:
+        List[Dict[str, str]]: The conversation for the final completion.
+    """
+    if mode == "single_pass":
+        if retrieved_docs is None:
+            with timer.stage("retrieval"):
+                retrieved_docs = get_retrieval_service().retrieve(message_content, filters)
+        return _single_pass_conversation(message_content, retrieved_docs, timer, usage, model)
+
+    with get_openai_callback() as callback:
+        milvus_context = get_context(
+            message_content, timer=timer, usage=usage, model=model, retrieved_docs=retrieved_docs, filters=filters
+        )
+    return _agent_conversation(message_content, milvus_context, callback, usage)
+
+
+async def aprepare_conversation(
+        message_content: str,
+        mode: str,
+        timer: StageTimer,
+        usage: Dict[str, Dict[str, int]],
+        model: str = "gpt-4o",
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Async version of `prepare_conversation`; takes the same arguments.
+
+    Returns:
+        List[Dict[str, str]]: The conversation for the final completion.
+    """
+    if mode == "single_pass":
+        if retrieved_docs is None:
+            with timer.stage("retrieval"):
+                retrieved_docs = await get_retrieval_service().aretrieve(message_content, filters)
+        return _single_pass_conversation(message_content, retrieved_docs, timer, usage, model)
+
+    # The callback's token counts live in a context variable, which the awaited calls share.
+    with get_openai_callback() as callback:
+        milvus_context = await aget_context(
+            message_content, timer=timer, usage=usage, model=model, retrieved_docs=retrieved_docs, filters=filters
+        )
+    return _agent_conversation(message_content, milvus_context, callback, usage)
+
+
+def _single_pass_conversation(
+        message_content: str,
+        retrieved_docs: List[Document],
+        timer: StageTimer,
+        usage: Dict[str, Dict[str, int]],
+        model: str,
+) -> List[Dict[str, str]]:
+    if not retrieved_docs:
+        return build_conversation(message_content, CURE_NOT_FOUND)
+    with timer.stage("context"):
+        context = pack_context(retrieved_docs, model)
+    usage["context"] = context.report()
+    logging.info(f"Packed context: {usage['context']}")
+    _record_usage(usage, ("context",))
+    return build_grounded_conversation(message_content, context.text)
+
+
+def _agent_conversation(
+        message_content: str,
+        milvus_context: str,
+        callback: Any,
+        usage: Dict[str, Dict[str, int]],
+) -> List[Dict[str, str]]:
+    usage["agent"] = {
+        "prompt_tokens": callback.prompt_tokens,
+        "completion_tokens": callback.completion_tokens,
+        "total_tokens": callback.total_tokens,
+    }
+    _record_usage(usage, ("context", "agent"))
+    log_payload("Context from Milvus", milvus_context)
+    return build_conversation(message_content, milvus_context)
+
+
+def answer_question(
+        message_content: str,
+        model: str,
+        mode: str,
+        timer: Optional[StageTimer] = None,
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> PipelineResult:
+    """
+    Runs a pipeline end to end.
+
+    Args:
+        message_content (str): The user's question.
+        model (str): The model used for the final completion.
+        mode (str): The pipeline mode.
+        timer (Optional[StageTimer]): The request's timer, to record the stages into.
+        retrieved_docs (Optional[List[Document]]): Documents already retrieved for the question.
+        filters (Optional[Mapping[str, str]]): Chunk metadata values that narrow the retrieval.
+
+    Returns:
+        PipelineResult: The answer with its timings and token usage.
+    """
+    timer = timer if timer is not None else StageTimer()
+    usage: Dict[str, Dict[str, int]] = {}
+    with timer.stage("total"):
+        conversation = prepare_conversation(message_content, mode, timer, usage, model, retrieved_docs, filters)
+        with timer.stage("completion"):
+            response: Dict[str, Any] = chat_gpt_service.chat_with_gpt(conversation, model)
+    return _pipeline_result(response, mode, timer, usage)
+
+
+async def aanswer_question(
+        message_content: str,
+        model: str,
+        mode: str,
+        timer: Optional[StageTimer] = None,
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> PipelineResult:
+    """
+    Async version of `answer_question`; takes the same arguments.
+
+    Returns:
+        PipelineResult: The answer with its timings and token usage.
+    """
+    timer = timer if timer is not None else StageTimer()
+    usage: Dict[str, Dict[str, int]] = {}
+    with timer.stage("total"):
+        conversation = await aprepare_conversation(
+            message_content, mode, timer, usage, model, retrieved_docs, filters
+        )
+        with timer.stage("completion"):
+            response: Dict[str, Any] = await chat_gpt_service.achat_with_gpt(conversation, model)
+    return _pipeline_result(response, mode, timer, usage)
+
+
+def _pipeline_result(
+        response: Dict[str, Any], mode: str, timer: StageTimer, usage: Dict[str, Dict[str, int]]
+) -> PipelineResult:
+    if response.get("usage"):
+        usage["completion"] = response["usage"]
+        _record_usage(usage, ("completion",))
+    if response.get("error"):
+        ERRORS.inc(stage="completion")
+
+    result = PipelineResult(
+        message=response["message"],
+        mode=mode,
+        timings=timer.as_milliseconds(),
+        usage=usage,
+        error=response.get("error"),
+        retry_after=response.get("retry_after"),
+    )
+    logging.info(f"Pipeline '{mode}' timings (ms): {result.timings}, usage: {usage}")
+    return result
+
+
+def _record_usage(usage: Dict[str, Dict[str, int]], stages: Tuple[str, ...]) -> None:
+    for stage in stages:
+        counts = usage.get(stage)
+        if not counts:
+            continue
+        if stage == "context":
+            CONTEXT_TOKENS_SAVED.inc(counts["tokens_saved"])
+            continue
+        LLM_TOKENS.inc(counts.get("prompt_tokens", 0), stage=stage, type="prompt")
+        LLM_TOKENS.inc(counts.get("completion_tokens", 0), stage=stage, type="completion")
@@ -0,0 +1,662 @@
+"""
+Module providing the long-lived retrieval stack used by the chat routes.
+
+Creating the LLM, embeddings, vector store and retriever tool costs a new
+gRPC connection and a collection describe/load round trip with Milvus, or
+loading the index with the local vector store. This module
+builds those clients once per worker process, lazily on first use, and shares
+them between request threads. A fork of the process (e.g. a preforking WSGI
+server) drops the inherited clients so each child opens its own connection.
+
+Classes:
+  RetrievalSettings: Connection and retrieval configuration.
+  RetrievalService: Thread-safe owner of the LLM, embeddings and vector store clients.
+
+Functions:
+  get_retrieval_service: Returns the process-wide RetrievalService.
+
+Environment Variables:
+  MILVUS_HOST: Host of the Milvus server (default: "localhost").
+  MILVUS_PORT: Port of the Milvus server (default: 19530).
+  MILVUS_COLLECTION: Collection to search (default: "ayurvedic_diagnosis").
+  RETRIEVER_K: Number of documents to retrieve per query (default: 5).
+  RETRIEVER_TYPE: "hybrid" (BM25 + vector with rank fusion) or "vector" (default: "hybrid").
+  RETRIEVER_CANDIDATE_K: Candidates taken from each retriever in hybrid mode (default: 20).
+  BM25_INDEX_PATH: BM25 index file written at ingestion (default: "vector_files/bm25_index.json").
+  RRF_VECTOR_WEIGHT, RRF_BM25_WEIGHT: Rank fusion weights (default: 1.0 each).
+  VECTOR_STORE_TYPE: "milvus" or "local" (default: "milvus").
+  LOCAL_INDEX_PATH: Directory of the local vector index (default: "vector_files/local_index").
+  MILVUS_INDEX_TYPE, MILVUS_METRIC_TYPE, MILVUS_NPROBE, MILVUS_EF: Index and search
+    parameters (see app.services.milvus_params).
+  RETRIEVAL_INFER_FILTERS: Whether to narrow a search with filters inferred from the
+    question when the request gives none (default: "true").
+"""
+
+import asyncio
+import dataclasses
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Protocol, Tuple, runtime_checkable
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent_toolkits import (
+    create_conversational_retrieval_agent,
+    create_retriever_tool,
+)
+from langchain.schema import Document, SystemMessage
+from langchain_community.vectorstores import Milvus
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.tools import BaseTool
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+
+from app.services.bm25_index import ReloadingBM25Index
+from app.services.chunk_metadata import infer_filters, milvus_expr
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.llm_interaction import get_cached_embeddings, get_llm
+from app.services.local_vector_store import LocalVectorStore
+from app.services.milvus_params import MilvusIndexConfig
+from app.utils.timing import span
+
+AGENT_SYSTEM_PROMPT = '''
+        You are a Virtual Ayurvedic Assistant, specialized in providing health diagnoses and remedies based on Ayurvedic principles. Your primary role is to deliver accurate Ayurvedic health information by leveraging the data stored in the Milvus database.
+
+        Guidelines for Interaction:
+
+        1. Primary Source of Information: Strictly and always use the Milvus database as your first source for retrieving information related to the user's query. Your responses should strictly reflect the content found within this database.
+
+        2. **Maintaining Query Integrity: When interpreting and responding to user queries, ensure that you do not alter the meaning or intent of the query. Use the exact wording and context provided by the user. Avoid substituting specific terms with broader or different ones unless explicitly instructed by the user.
+
+        3. Response Format: Follow this strict format when responding to a user query:
+           - WHAT IS THE DIAGNOSIS: Provide the diagnostic information as retrieved from the Milvus database.
+           - HOW TO FIX IT: Give detailed treatment or remedy information based on the retrieved data.
+
+        4. Herbs and Remedies:
+            Always provide specific names of herbs or natural ingredients recommended for the treatment, along with comprehensive information about each herb, such as:
+
+            Sanskrit and common names
+            Primary uses
+            Dosage and preparation methods
+            Contraindications or precautions This ensures that users receive full details of how to effectively use Ayurvedic remedies.
+
+        Remember, your effectiveness as an Ayurvedic Assistant depends on the accuracy, relevance, and reliability of the information you provide. Uphold these principles in all your interactions.
+        '''
+
+
+@runtime_checkable
+class _MilvusConnection(Protocol):
+    """A vector store holding a pymilvus connection (LangChain's Milvus), as opposed to a LocalVectorStore."""
+    alias: str
+
+
+@dataclasses.dataclass(frozen=True)
+class RetrievalSettings:
+    """
+    Configuration of the retrieval stack.
+
+    Attributes:
+        milvus_host (str): Host of the Milvus server.
+        milvus_port (int): Port of the Milvus server.
+        collection_name (str): Name of the Milvus collection to search.
+        k (int): Number of documents returned by the retriever.
+        llm_temperature (float): Temperature of the agent LLM.
+        max_token_limit (int): Token limit of the agent's conversation memory.
+        vector_store_type (str): "milvus", or "local" for the in-process index.
+        local_index_path (str): Directory of the local vector index.
+        retriever_type (str): "hybrid" to fuse BM25 and vector results, or "vector".
+        bm25_index_path (str): BM25 index file used in hybrid mode.
+        candidate_k (int): Candidates taken from each retriever in hybrid mode.
+        vector_weight (float): Rank fusion weight of the vector results.
+        bm25_weight (float): Rank fusion weight of the BM25 results.
+        rrf_k (int): Rank offset of reciprocal-rank fusion.
+        milvus_index (MilvusIndexConfig): Index and search parameters of the Milvus collection.
+        infer_filters (bool): Whether to infer filters from questions retrieved without any.
+    """
+
+    milvus_host: str = "localhost"
+    milvus_port: int = 19530
+    collection_name: str = "ayurvedic_diagnosis"
+    k: int = 5
+    llm_temperature: float = 0.1
+    max_token_limit: int = 16000
+    vector_store_type: str = "milvus"
+    local_index_path: str = "vector_files/local_index"
+    retriever_type: str = "hybrid"
+    bm25_index_path: str = "vector_files/bm25_index.json"
+    candidate_k: int = 20
+    vector_weight: float = 1.0
+    bm25_weight: float = 1.0
+    rrf_k: int = 60
+    milvus_index: MilvusIndexConfig = dataclasses.field(default_factory=MilvusIndexConfig)
+    infer_filters: bool = True
+
+    @classmethod
+    def from_env(cls) -> "RetrievalSettings":
+        """
+        Build settings from environment variables, falling back to defaults.
+
+        Returns:
+            RetrievalSettings: The settings for the current environment.
+        """
+        return cls(
+            milvus_host=os.environ.get("MILVUS_HOST", cls.milvus_host),
+            milvus_port=int(os.environ.get("MILVUS_PORT", cls.milvus_port)),
+            collection_name=os.environ.get("MILVUS_COLLECTION", cls.collection_name),
+            k=int(os.environ.get("RETRIEVER_K", cls.k)),
+            vector_store_type=os.environ.get("VECTOR_STORE_TYPE", cls.vector_store_type),
+            local_index_path=os.environ.get("LOCAL_INDEX_PATH", cls.local_index_path),
+            retriever_type=os.environ.get("RETRIEVER_TYPE", cls.retriever_type),
+            bm25_index_path=os.environ.get("BM25_INDEX_PATH", cls.bm25_index_path),
+            candidate_k=int(os.environ.get("RETRIEVER_CANDIDATE_K", cls.candidate_k)),
+            vector_weight=float(os.environ.get("RRF_VECTOR_WEIGHT", cls.vector_weight)),
+            bm25_weight=float(os.environ.get("RRF_BM25_WEIGHT", cls.bm25_weight)),
+            rrf_k=int(os.environ.get("RRF_K", cls.rrf_k)),
+            milvus_index=MilvusIndexConfig.from_env(),
+            infer_filters=os.environ.get("RETRIEVAL_INFER_FILTERS", "true").lower() != "false",
+        )
+
+
+class RetrievalService:
+    """
+    Thread-safe owner of the LLM, embeddings and vector store clients.
+
+    Clients are created lazily on first use and reused by every request
+    handled by the process. The agent executor is not shared because it
+    carries per-conversation memory; it is assembled from the shared clients
+    by `create_agent`, which makes no network calls.
+    """
+
+    def __init__(self, settings: Optional[RetrievalSettings] = None):
+        self._settings = settings or RetrievalSettings.from_env()
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._llm: Optional[BaseChatModel] = None
+        self._embeddings: Optional[Embeddings] = None
+        self._vector_db: Optional[VectorStore] = None
+        self._retriever: Optional[BaseRetriever] = None
+        self._tools: list[BaseTool] = []
+        self._system_message = SystemMessage(content=AGENT_SYSTEM_PROMPT)
+        # (event loop, client) of the async Milvus client used by `aretrieve`.
+        self._async_milvus: Optional[Tuple[asyncio.AbstractEventLoop, Any]] = None
+
+    @property
+    def settings(self) -> RetrievalSettings:
+        return self._settings
+
+    @property
+    def llm(self) -> BaseChatModel:
+        self._ensure_ready()
+        assert self._llm is not None
+        return self._llm
+
+    @property
+    def embeddings(self) -> Embeddings:
+        self._ensure_ready()
+        assert self._embeddings is not None
+        return self._embeddings
+
+    @property
+    def vector_db(self) -> VectorStore:
+        self._ensure_ready()
+        assert self._vector_db is not None
+        return self._vector_db
+
+    @property
+    def retriever(self) -> BaseRetriever:
+        self._ensure_ready()
+        assert self._retriever is not None
+        return self._retriever
+
+    def _ensure_ready(self) -> None:
+        if os.getpid() != self._pid:
+            self.reset_after_fork()
+        if self._retriever is not None:
+            return
+        with self._lock:
+            if self._retriever is None:
+                self._build()
+
+    def _build(self) -> None:
+        settings = self._settings
+        llm = get_llm(temperature=settings.llm_temperature)
+        embeddings = get_cached_embeddings()
+        vector_db = _create_vector_store(embeddings, settings, self._pid)
+        retriever = _create_retriever(vector_db, settings)
+        health_tool = create_retriever_tool(
+            retriever,
+            "search-for-ayurvedic-diagnosis-context",
+            "provides information about how to address health concerns using Ayurvedic principles",
+        )
+
+        self._llm = llm
+        self._embeddings = embeddings
+        self._vector_db = vector_db
+        self._tools = [health_tool]
+        # Published last: `_ensure_ready` treats a retriever as a complete stack.
+        self._retriever = retriever
+
+    def retrieve(self, query: str, filters: Optional[Mapping[str, str]] = None) -> list[Document]:
+        """
+        Retrieve the documents most relevant to a query.
+
+        Without filters, filters inferred from the query narrow the search,
+        unless that search fails (e.g. on a collection ingested before the
+        scalar fields existed) or returns fewer than k documents.
+
+        Args:
+            query (str): The user's question.
+            filters (Optional[Mapping[str, str]]): Chunk metadata values the
+                documents must have (see app.services.chunk_metadata); None to
+                infer them, empty to search everything.
+
+        Returns:
+            list[Document]: The retrieved documents, most relevant first.
+        """
+        if filters:
+            return self._retrieve(query, filters)
+        if filters is None and self._settings.infer_filters:
+            inferred = infer_filters(query)
+            if inferred:
+                try:
+                    documents = self._retrieve(query, inferred)
+                except Exception as e:
+                    logging.warning(f"Retrieval filtered by {inferred} failed, searching unfiltered: {e}")
+                else:
+                    if len(documents) >= self._settings.k:
+                        return documents
+                    logging.info(f"Retrieval filtered by {inferred} found {len(documents)} documents, searching unfiltered.")
+        return self.retriever.invoke(query)
+
+    def _retrieve(self, query: str, filters: Mapping[str, str]) -> list[Document]:
+        retriever = self.retriever
+        search_kwargs = _filter_kwargs(self.vector_db, filters)
+        if isinstance(retriever, HybridRetriever):
+            return retriever.invoke(query, filters=filters, **search_kwargs)
+        return retriever.invoke(query, **search_kwargs)
+
+    async def aretrieve(self, query: str, filters: Optional[Mapping[str, str]] = None) -> list[Document]:
+        """
+        Async version of `retrieve`, for the asyncio request path.
+
+        The query is embedded with the embeddings' async API while the BM25
+        search runs on its executor, and Milvus is searched with the async
+        Milvus client, so the event loop is never blocked on the network.
+        The local vector store, which searches in memory, runs on a worker
+        thread. Filters are inferred, and fall back, as in `retrieve`.
+
+        Args:
+            query (str): The user's question.
+            filters (Optional[Mapping[str, str]]): Chunk metadata values the
+                documents must have; None to infer them, empty to search everything.
+
+        Returns:
+            list[Document]: The retrieved documents, most relevant first.
+        """
+        await self._aensure_ready()
+        if filters:
+            return await self._aretrieve(query, filters)
+        if filters is None and self._settings.infer_filters:
+            inferred = infer_filters(query)
+            if inferred:
+                try:
+                    documents = await self._aretrieve(query, inferred)
+                except Exception as e:
+                    logging.warning(f"Retrieval filtered by {inferred} failed, searching unfiltered: {e}")
+                else:
+                    if len(documents) >= self._settings.k:
+                        return documents
+                    logging.info(f"Retrieval filtered by {inferred} found {len(documents)} documents, searching unfiltered.")
+        return await self._aretrieve(query, None)
+
+    async def aprefetch_embedding(self, query: str) -> bool:
+        """
+        Embed a query into the embedding cache, so the steps that embed it next share one request.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            bool: Whether the query was embedded; False if embeddings are not cached.
+        """
+        await self._aensure_ready()
+        if not isinstance(self.embeddings, CachedEmbeddings):
+            return False
+        await self.embeddings.aembed_query(query)
+        return True
+
+    async def _aensure_ready(self) -> None:
+        if self._retriever is None or os.getpid() != self._pid:
+            # Building the stack connects to Milvus; keep that off the event loop.
+            await asyncio.to_thread(self._ensure_ready)
+
+    async def _aretrieve(self, query: str, filters: Optional[Mapping[str, str]]) -> list[Document]:
+        retriever = self.retriever
+        vector_db = self.vector_db
+        if not isinstance(retriever, (HybridRetriever, VectorStoreRetriever)):
+            return await retriever.ainvoke(query, **_filter_kwargs(vector_db, filters))
+
+        lexical = None
+        if isinstance(retriever, HybridRetriever):
+            lexical = asyncio.wrap_future(retriever.submit_lexical(query, filters))
+        try:
+            vector = await self.embeddings.aembed_query(query)
+            k = retriever.candidate_k if isinstance(retriever, HybridRetriever) else self._settings.k
+            if isinstance(vector_db, Milvus):
+                semantic = await self._asearch_milvus(vector_db, vector, k, filters)
+            else:
+                semantic = (await asyncio.to_thread(_search_by_vectors, vector_db, [vector], k, filters))[0]
+        except BaseException:
+            if lexical is not None:
+                lexical.cancel()
+            raise
+        if lexical is None or not isinstance(retriever, HybridRetriever):
+            return semantic
+        return retriever.fuse(semantic, await lexical)
+
+    async def _asearch_milvus(
+            self, vector_db: Milvus, vector: List[float], k: int, filters: Optional[Mapping[str, str]]
+    ) -> List[Document]:
+        """Search one query embedding with this event loop's async Milvus client."""
+        if vector_db.col is None:
+            return []
+        output_fields = [field for field in vector_db.fields if field != vector_db._vector_field]
+        results = await self._async_milvus_client().search(
+            self._settings.collection_name,
+            data=[vector],
+            filter=milvus_expr(filters) if filters else "",
+            limit=k,
+            output_fields=output_fields,
+            search_params=vector_db.search_params,
+            anns_field=vector_db._vector_field,
+            timeout=vector_db.timeout,
+        )
+        return [
+            vector_db._parse_document({field: hit["entity"].get(field) for field in output_fields})
+            for hit in results[0]
+        ]
+
+    def _async_milvus_client(self) -> Any:
+        from pymilvus import AsyncMilvusClient
+
+        # The client's gRPC channel belongs to the event loop it was created on.
+        loop = asyncio.get_running_loop()
+        current = self._async_milvus
+        if current is None or current[0] is not loop:
+            settings = self._settings
+            current = self._async_milvus = (
+                loop, AsyncMilvusClient(uri=f"http://{settings.milvus_host}:{settings.milvus_port}")
+            )
+        return current[1]
+
+    def retrieve_many(self, queries: List[str], filters: Optional[Mapping[str, str]] = None) -> List[List[Document]]:
+        """
+        Retrieve the documents of several queries with batched upstream calls.
+
+        The queries are embedded in one embeddings request and searched in
+        one multi-vector search; hybrid retrieval runs their BM25 searches
+        concurrently and fuses each query's rankings as `retrieve` does.
+        Filters are not inferred, since one search serves every query.
+
+        Args:
+            queries (List[str]): The questions.
+            filters (Optional[Mapping[str, str]]): Chunk metadata values the documents must have.
+
+        Returns:
+            List[List[Document]]: The retrieved documents of each query, in order.
+        """
+        if not queries:
+            return []
+        self._ensure_ready()
+        retriever = self.retriever
+        lexical = [retriever.submit_lexical(query, filters) for query in queries] if isinstance(
+            retriever, HybridRetriever) else None
+        with span("embedding"):
+            vectors = self.embeddings.embed_documents(queries)
+        if lexical is None or not isinstance(retriever, HybridRetriever):
+            return _search_by_vectors(self.vector_db, vectors, self._settings.k, filters)
+        semantic = _search_by_vectors(self.vector_db, vectors, retriever.candidate_k, filters)
+        return [retriever.fuse(candidates, future.result()) for candidates, future in zip(semantic, lexical)]
+
+    def create_agent(self) -> AgentExecutor:
+        """
+        Assemble a conversational retrieval agent from the shared clients.
+
+        Returns:
+            AgentExecutor: An agent with fresh conversation memory.
+        """
+        self._ensure_ready()
+        return create_conversational_retrieval_agent(
+            llm=self.llm,
+            tools=self._tools,
+            system_message=self._system_message,
+            remember_intermediate_steps=True,
+            verbose=True,
+            max_token_limit=self._settings.max_token_limit,
+        )
+
+    def reconfigure(self, **changes: Any) -> RetrievalSettings:
+        """
+        Apply new settings; clients are rebuilt lazily on the next request.
+
+        Args:
+            **changes: Fields of RetrievalSettings to override.
+
+        Returns:
+            RetrievalSettings: The settings now in effect.
+        """
+        with self._lock:
+            self._settings = dataclasses.replace(self._settings, **changes)
+            self.close()
+        logging.info(f"Retrieval stack reconfigured: {self._settings}")
+        return self._settings
+
+    def health_check(self) -> Dict[str, Any]:
+        """
+        Check that Milvus is reachable and the collection exists.
+
+        Returns:
+            Dict[str, Any]: A status report with an "ok" flag.
+        """
+        from pymilvus import utility
+
+        report: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "vector_store": self._settings.vector_store_type,
+        }
+        try:
+            vector_db = self.vector_db
+            if isinstance(vector_db, LocalVectorStore):
+                report.update(index_path=vector_db.path, version=vector_db.version, count=vector_db.count)
+                report["ok"] = vector_db.count > 0
+                if not report["ok"]:
+                    report["error"] = "local index is empty"
+            else:
+                assert isinstance(vector_db, _MilvusConnection)
+                report["collection"] = self._settings.collection_name
+                report["ok"] = bool(
+                    utility.has_collection(self._settings.collection_name, using=vector_db.alias)
+                )
+                if not report["ok"]:
+                    report["error"] = "collection not found"
+        except Exception as e:
+            logging.error(f"Retrieval health check failed: {e}")
+            report["ok"] = False
+            report["error"] = str(e)
+        if isinstance(self._embeddings, CachedEmbeddings):
+            report["embedding_cache"] = self._embeddings.stats()
+        return report
+
+    def close(self) -> None:
+        """Disconnect from Milvus and drop all clients."""
+        with self._lock:
+            if isinstance(self._vector_db, _MilvusConnection):
+                from pymilvus import connections
+
+                try:
+                    connections.disconnect(self._vector_db.alias)
+                except Exception as e:
+                    logging.warning(f"Failed to disconnect from Milvus: {e}")
+            if isinstance(self._embeddings, CachedEmbeddings):
+                self._embeddings.close()
+            self._clear()
+
+    def reset_after_fork(self) -> None:
+        """
+        Forget clients inherited from a parent process.
+
+        gRPC channels cannot be used across a fork, so the inherited
+        connection is removed from the registry without being closed (closing
+        it would tear down the parent's channel) and a new one is opened on
+        the next request.
+        """
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        if isinstance(self._vector_db, _MilvusConnection):
+            from pymilvus import connections
+
+            try:
+                connections.remove_connection(self._vector_db.alias)
+            except Exception as e:
+                logging.warning(f"Failed to drop inherited Milvus connection: {e}")
+        self._clear()
+
+    def _clear(self) -> None:
+        # An async client is closed with its event loop; it is only forgotten here.
+        self._async_milvus = None
+        self._retriever = None
+        self._tools = []
+        self._vector_db = None
+        self._embeddings = None
+        self._llm = None
+
+
+def _create_vector_store(embeddings: Embeddings, settings: RetrievalSettings, pid: int) -> VectorStore:
+    """
+    Create the vector store selected by the settings.
+
+    Raises:
+        ValueError: If an unsupported vector store type is specified.
+    """
+    if settings.vector_store_type == "milvus":
+        logging.info(
+            f"Building retrieval stack for collection '{settings.collection_name}' "
+            f"at {settings.milvus_host}:{settings.milvus_port} (pid {pid})."
+        )
+        vector_db = Milvus(
+            embeddings,
+            connection_args={"host": settings.milvus_host, "port": settings.milvus_port},
+            collection_name=settings.collection_name,
+            index_params=settings.milvus_index.index_params(),
+        )
+        index = settings.milvus_index.matching(vector_db.col) if vector_db.col is not None else settings.milvus_index
+        vector_db.search_params = index.search_params(max(settings.k, settings.candidate_k))
+        logging.info(f"Searching '{settings.collection_name}' with {vector_db.search_params}.")
+        return vector_db
+    elif settings.vector_store_type == "local":
+        logging.info(f"Building retrieval stack for local index '{settings.local_index_path}' (pid {pid}).")
+        return LocalVectorStore(embeddings, settings.local_index_path)
+    else:
+        raise ValueError(f"Unsupported vector store type: {settings.vector_store_type}")
+
+
+def _create_retriever(vector_db: VectorStore, settings: RetrievalSettings) -> BaseRetriever:
+    """
+    Create the retriever selected by the settings.
+
+    Hybrid retrieval falls back to vector search if no BM25 index has been built.
+
+    Raises:
+        ValueError: If an unsupported retriever type is specified.
+    """
+    if settings.retriever_type == "vector":
+        return vector_db.as_retriever(search_kwargs={"k": settings.k})
+    elif settings.retriever_type == "hybrid":
+        try:
+            bm25_index = ReloadingBM25Index(settings.bm25_index_path)
+        except FileNotFoundError:
+            logging.warning(f"No BM25 index at {settings.bm25_index_path}, falling back to vector retrieval.")
+            return vector_db.as_retriever(search_kwargs={"k": settings.k})
+        return HybridRetriever(
+            vector_retriever=vector_db.as_retriever(search_kwargs={"k": settings.candidate_k}),
+            bm25_index=bm25_index,
+            k=settings.k,
+            candidate_k=settings.candidate_k,
+            vector_weight=settings.vector_weight,
+            bm25_weight=settings.bm25_weight,
+            rrf_k=settings.rrf_k,
+        )
+    else:
+        raise ValueError(f"Unsupported retriever type: {settings.retriever_type}")
+
+
+def _filter_kwargs(vector_db: VectorStore, filters: Optional[Mapping[str, str]]) -> Dict[str, Any]:
+    """The search keyword arguments applying chunk metadata filters in a vector store."""
+    if not filters:
+        return {}
+    if isinstance(vector_db, Milvus):
+        # Filtering on the "book" partition key also limits the search to that book's partition.
+        return {"expr": milvus_expr(filters)}
+    return {"filter": dict(filters)}
+
+
+def _search_by_vectors(
+        vector_db: VectorStore,
+        vectors: List[List[float]],
+        k: int,
+        filters: Optional[Mapping[str, str]] = None,
+) -> List[List[Document]]:
+    """Search several query embeddings, in one request where the store supports it."""
+    if isinstance(vector_db, LocalVectorStore):
+        return vector_db.similarity_search_by_vectors(vectors, k, filters)
+    if isinstance(vector_db, Milvus):
+        if vector_db.col is None:
+            return [[] for _ in vectors]
+        # LangChain's Milvus searches one vector per request; this mirrors its
+        # similarity_search_by_vector for a whole batch.
+        output_fields = [field for field in vector_db.fields if field != vector_db._vector_field]
+        results = vector_db.col.search(
+            data=vectors,
+            anns_field=vector_db._vector_field,
+            param=vector_db.search_params,
+            limit=k,
+            expr=milvus_expr(filters) if filters else None,
+            output_fields=output_fields,
+            timeout=vector_db.timeout,
+        )
+        return [
+            [vector_db._parse_document({field: hit.entity.get(field) for field in output_fields}) for hit in hits]
+            for hits in results
+        ]
+    return [vector_db.similarity_search_by_vector(vector, k, **_filter_kwargs(vector_db, filters)) for vector in vectors]
+
+
+_service: Optional[RetrievalService] = None
+_service_lock = threading.Lock()
+
+
+def get_retrieval_service() -> RetrievalService:
+    """
+    Returns the process-wide RetrievalService, creating it on first use.
+
+    Returns:
+        RetrievalService: The shared retrieval service.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService()
+    return _service
+
+
+def _reset_in_child() -> None:
+    global _service_lock
+    _service_lock = threading.Lock()
+    if _service is not None:
+        _service.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
@@ -0,0 +1,294 @@
+"""
+Module providing a semantic answer cache for the chat routes.
+
+Questions that mean the same thing ("hair fall remedy", "how to stop
+hairfall") rarely match as strings, so answers are keyed on the embedding of
+the question. A lookup returns the stored answer of the most similar previous
+question for the same model (and pipeline mode, in the chat routes), provided
+its cosine similarity reaches the configured threshold. Entries are evicted least-recently-used once the cache
+is full and expire after a time-to-live. An optional SQLite file, which
+several workers may share, keeps entries across restarts.
+
+Classes:
+  SemanticCache: Embedding-similarity cache of chat answers.
+
+Functions:
+  get_semantic_cache: Returns the process-wide cache, or None if disabled.
+
+Environment Variables:
+  SEMANTIC_CACHE_ENABLED: Set to "false" to disable the cache (default: "true").
+  SEMANTIC_CACHE_THRESHOLD: Minimum cosine similarity of a hit (default: 0.95).
+  SEMANTIC_CACHE_MAX_ENTRIES: Maximum number of cached answers (default: 1000).
+  SEMANTIC_CACHE_TTL: Seconds an answer stays valid (default: 86400).
+  SEMANTIC_CACHE_PATH: SQLite file for persistent entries, e.g. "semantic_cache.db" (default: in memory only).
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.services.retrieval_service import get_retrieval_service
+from app.utils.logs import log_payload
+
+
+class _Entry:
+    __slots__ = ("model", "query", "vector", "value", "created_at")
+
+    def __init__(self, model: str, query: str, vector: np.ndarray, value: Dict[str, Any], created_at: float):
+        self.model = model
+        self.query = query
+        self.vector = vector
+        self.value = value
+        self.created_at = created_at
+
+
+class SemanticCache:
+    """
+    Embedding-similarity cache of chat answers.
+
+    Args:
+        embed (Callable[[str], List[float]]): Function returning the embedding of a query.
+        threshold (float): Minimum cosine similarity for a lookup to hit.
+        max_entries (int): Maximum number of entries before LRU eviction.
+        ttl_seconds (float): Seconds after which an entry expires.
+        path (Optional[str]): SQLite file to persist entries to, if any.
+    """
+
+    _RECENT_EMBEDDINGS = 256
+
+    def __init__(
+            self,
+            embed: Callable[[str], List[float]],
+            threshold: float = 0.95,
+            max_entries: int = 1000,
+            ttl_seconds: float = 86400,
+            path: Optional[str] = None,
+    ):
+        self._embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # Creation time of each entry, oldest first; ids are assigned in creation order.
+        self._created: "OrderedDict[int, float]" = OrderedDict()
+        self._matrices: Dict[str, tuple[list[int], np.ndarray]] = {}
+        self._recent: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            self._load()
+
+    def lookup(self, query: str, model: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the stored answer of the most similar previous query.
+
+        Args:
+            query (str): The user's question.
+            model (str): The model the answer must have been produced with; callers
+                may add other settings that change the answer, e.g. "gpt-4o/agent".
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached answer, or None on a miss.
+        """
+        vector = self._vector(query)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            ids, matrix = self._matrix(model)
+            if ids:
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    entry = self._entries[entry_id]
+                    logging.info(f"Semantic cache hit ({similarities[best]:.3f}).")
+                    log_payload("Semantic cache hit", {"query": query, "matched": entry.query})
+                    return dict(entry.value)
+            self.misses += 1
+            return None
+
+    def store(self, query: str, model: str, value: Dict[str, Any]) -> None:
+        """
+        Cache the answer to a query.
+
+        Args:
+            query (str): The user's question.
+            model (str): The model the answer was produced with, as passed to `lookup`.
+            value (Dict[str, Any]): The JSON-serialisable answer to cache.
+        """
+        vector = self._vector(query)
+        now = time.time()
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(model, query, vector, dict(value), now)
+            self._created[entry_id] = now
+            self._matrices.pop(model, None)
+            while len(self._entries) > self.max_entries:
+                old_id, old_entry = self._entries.popitem(last=False)
+                del self._created[old_id]
+                self._matrices.pop(old_entry.model, None)
+        if self.path:
+            self._persist(model, query, vector, value, now)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters and the current size of the cache.
+
+        Returns:
+            Dict[str, Any]: The cache statistics.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "threshold": self.threshold,
+            }
+
+    def clear(self) -> None:
+        """Remove every entry, including persisted ones."""
+        with self._lock:
+            self._entries.clear()
+            self._created.clear()
+            self._matrices.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM semantic_cache")
+
+    def _vector(self, query: str) -> np.ndarray:
+        with self._lock:
+            vector = self._recent.get(query)
+            if vector is not None:
+                self._recent.move_to_end(query)
+                return vector
+        vector = _normalize(self._embed(query))
+        with self._lock:
+            self._recent[query] = vector
+            while len(self._recent) > self._RECENT_EMBEDDINGS:
+                self._recent.popitem(last=False)
+        return vector
+
+    def _matrix(self, model: str) -> tuple[list[int], np.ndarray]:
+        cached = self._matrices.get(model)
+        if cached is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry.model == model]
+            vectors = [self._entries[entry_id].vector for entry_id in ids]
+            matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+            cached = self._matrices[model] = (ids, matrix)
+        return cached
+
+    def _expire(self, now: float) -> None:
+        while self._created:
+            entry_id, created_at = next(iter(self._created.items()))
+            if now - created_at <= self.ttl_seconds:
+                return
+            del self._created[entry_id]
+            entry = self._entries.pop(entry_id)
+            self._matrices.pop(entry.model, None)
+
+    def _connect(self) -> sqlite3.Connection:
+        assert self.path is not None
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        return conn
+
+    def _load(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (cutoff,))
+                rows = conn.execute(
+                    "SELECT model, query, embedding, value, created_at FROM semantic_cache "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (self.max_entries,),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to load semantic cache from {self.path}: {e}")
+            return
+
+        for model, query, embedding, value, created_at in reversed(rows):
+            vector = np.frombuffer(embedding, dtype=np.float32)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(model, query, vector, json.loads(value), created_at)
+            self._created[entry_id] = created_at
+        logging.info(f"Loaded {len(self._entries)} semantic cache entries from {self.path}.")
+
+    def _persist(self, model: str, query: str, vector: np.ndarray, value: Dict[str, Any], created_at: float) -> None:
+        # Workers share the file: SQLite assigns the row ids, and the file keeps the
+        # newest `max_entries` rows of all workers rather than any one worker's LRU set.
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO semantic_cache (model, query, embedding, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (model, query, vector.tobytes(), json.dumps(value), created_at),
+                )
+                conn.execute(
+                    "DELETE FROM semantic_cache WHERE created_at < ? OR id IN "
+                    "(SELECT id FROM semantic_cache ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?)",
+                    (created_at - self.ttl_seconds, self.max_entries),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to persist semantic cache entry to {self.path}: {e}")
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Returns the process-wide semantic cache, creating it on first use.
+
+    Queries are embedded with the retrieval service's embeddings client.
+
+    Returns:
+        Optional[SemanticCache]: The shared cache, or None if it is disabled.
+    """
+    global _cache
+    if os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "false":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    embed=lambda query: get_retrieval_service().embeddings.embed_query(query),
+                    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95)),
+                    max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 1000)),
+                    ttl_seconds=float(os.environ.get("SEMANTIC_CACHE_TTL", 86400)),
+                    path=os.environ.get("SEMANTIC_CACHE_PATH"),
+                )
+    return _cache
@@ -0,0 +1,186 @@
+"""
+Module preparing the app for a preforking WSGI server.
+
+`gunicorn.conf.py` loads the app once in the master process and calls
+`preload`, which creates or upgrades the catalog schema, so request handlers
+only ever read the catalog, and builds read-only data (the ingredient
+matcher and the tokenizers) once to be shared copy-on-write by every worker. Clients holding sockets
+or SQLite connections are never shared: the retrieval service, the OpenAI
+client and the database pools drop what they inherited at fork and reconnect
+on first use. Each worker calls `warm_up` before it accepts requests, which
+connects to the vector store and runs one retrieval so that no user request
+pays for it.
+
+`check_readiness` reports the vector store, the catalog database and the
+OpenAI API, and is served at `/readyz`; `/healthz` reports liveness with the
+last readiness report. A worker that has been told to stop reports not ready
+while the server drains its in-flight requests.
+
+Functions:
+  preload: Creates the catalog schema and builds shared read-only data in the master process.
+  warm_up: Connects the worker's clients and runs one retrieval.
+  begin_drain: Marks the worker as shutting down.
+  check_readiness: Checks the worker's dependencies.
+  health_report: Reports liveness without checking dependencies.
+  shutdown: Closes the worker's clients.
+
+Environment Variables:
+  WARMUP_QUERY: Question retrieved at warm-up (default: "What is the Ayurvedic remedy for indigestion?").
+  READINESS_UPSTREAM_TTL: Seconds an OpenAI API check result is reused (default: 30).
+  READINESS_REQUIRE_UPSTREAM: Set to "true" to report not ready while the OpenAI API
+    is unreachable (default: "false").
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.services import product_catalog
+from app.services.database import get_database
+from app.services.openai_client import OpenAIError, get_openai_client
+from app.services.retrieval_service import get_retrieval_service
+from app.utils.tokens import count_tokens
+
+DEFAULT_WARMUP_QUERY = "What is the Ayurvedic remedy for indigestion?"
+
+_lock = threading.Lock()
+_warmed_up = False
+_warm_up_error: Optional[str] = None
+_draining = False
+_last_report: Optional[Dict[str, Any]] = None
+# (checked at, result) of the last OpenAI API check.
+_upstream: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
+def preload() -> None:
+    """
+    Create the catalog schema and build shared read-only data; called in the
+    master process before workers fork.
+
+    Connections opened while building are closed again, so no worker
+    inherits one.
+    """
+    from app.routes import chat_gpt_routes
+
+    started = time.perf_counter()
+    try:
+        product_catalog.ensure_schema(get_database().connection())
+    except sqlite3.Error as e:
+        logging.error(f"Failed to create the catalog schema: {e}")
+    chat_gpt_routes.preload()
+    for model in ("gpt-4o", "text-embedding-ada-002"):
+        count_tokens("", model)
+    get_database().close()
+    logging.info(f"Preloaded shared data in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+
+def warm_up() -> bool:
+    """
+    Connect this worker's clients and run one retrieval.
+
+    Failures are logged rather than raised: the worker then reports not
+    ready, and `/readyz` retries the warm-up.
+
+    Returns:
+        bool: Whether the warm-up succeeded.
+    """
+    global _warmed_up, _warm_up_error
+    with _lock:
+        if _warmed_up:
+            return True
+        started = time.perf_counter()
+        try:
+            get_retrieval_service().retrieve(os.environ.get("WARMUP_QUERY", DEFAULT_WARMUP_QUERY))
+            product_catalog.catalog_version(get_database().read_connection())
+            get_openai_client()
+        except Exception as e:
+            _warm_up_error = str(e)
+            logging.error(f"Warm-up failed in worker {os.getpid()}: {e}")
+            return False
+        _warmed_up, _warm_up_error = True, None
+    logging.info(f"Worker {os.getpid()} warmed up in {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return True
+
+
+def begin_drain() -> None:
+    """Report not ready from now on, while the server finishes in-flight requests."""
+    global _draining
+    _draining = True
+    logging.info(f"Worker {os.getpid()} is draining in-flight requests.")
+
+
+def check_readiness() -> Dict[str, Any]:
+    """
+    Check the vector store, the catalog database and the OpenAI API.
+
+    Returns:
+        Dict[str, Any]: A report with an "ok" flag and one entry per check.
+    """
+    global _last_report
+    if not _warmed_up and not _draining:
+        warm_up()
+    checks = {
+        "vector_store": get_retrieval_service().health_check(),
+        "database": _check_database(),
+        "upstream": _check_upstream(),
+    }
+    required = ["vector_store", "database"]
+    if os.environ.get("READINESS_REQUIRE_UPSTREAM", "false").lower() == "true":
+        required.append("upstream")
+    report: Dict[str, Any] = {
+        "ok": _warmed_up and not _draining and all(checks[name]["ok"] for name in required),
+        "pid": os.getpid(),
+        "warmed_up": _warmed_up,
+        "draining": _draining,
+        "checks": checks,
+    }
+    if _warm_up_error:
+        report["warm_up_error"] = _warm_up_error
+    _last_report = report
+    return report
+
+
+def health_report() -> Dict[str, Any]:
+    """
+    Report that the worker is alive, with its last readiness report.
+
+    Returns:
+        Dict[str, Any]: The liveness report; it makes no upstream calls.
+    """
+    return {"ok": True, "pid": os.getpid(), "warmed_up": _warmed_up, "draining": _draining, "readiness": _last_report}
+
+
+def shutdown() -> None:
+    """Close this worker's clients once it has stopped serving."""
+    get_retrieval_service().close()
+    get_database().close()
+    logging.info(f"Worker {os.getpid()} closed its clients.")
+
+
+def _check_database() -> Dict[str, Any]:
+    database = get_database()
+    try:
+        version = product_catalog.catalog_version(database.read_connection())
+    except sqlite3.Error as e:
+        logging.error(f"Catalog database check failed: {e}")
+        return {"ok": False, "path": database.path, "error": str(e)}
+    return {"ok": True, "path": database.path, "catalog_version": version}
+
+
+def _check_upstream() -> Dict[str, Any]:
+    global _upstream
+    ttl = float(os.environ.get("READINESS_UPSTREAM_TTL", 30))
+    cached = _upstream
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    try:
+        get_openai_client().check()
+        result: Dict[str, Any] = {"ok": True}
+    except OpenAIError as e:
+        logging.warning(f"OpenAI API check failed: {e}")
+        result = {"ok": False, "error": str(e)}
+    _upstream = (time.monotonic(), result)
+    return result
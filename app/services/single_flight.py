@@ -0,0 +1,176 @@
+"""
+Module providing request coalescing for identical in-flight work.
+
+When the same question arrives several times within seconds, only the
+first request (the leader) runs the pipeline. Identical requests arriving
+while it runs wait for it and share its result, or its exception. Nothing
+is kept once the leader finishes, so a later identical request runs
+again; answers are reused across time by the semantic cache instead.
+
+Classes:
+  SingleFlight: Runs one call per key at a time and shares its outcome.
+  AsyncSingleFlight: The same for coroutines on one event loop.
+
+Functions:
+  coalescing_key: Normalizes a chat question into a coalescing key.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from app.utils.metrics import COALESCED_REQUESTS
+
+T = TypeVar("T")
+
+
+def coalescing_key(message: str, *parts: str) -> str:
+    """
+    Normalizes a chat question into a coalescing key.
+
+    Case and whitespace differences do not change the key.
+
+    Args:
+        message (str): The user's question.
+        *parts (str): Further request fields the answer depends on, such as the model.
+
+    Returns:
+        str: The key.
+    """
+    return "\x1f".join((" ".join(message.lower().split()),) + parts)
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Runs one call per key at a time and shares its outcome with identical callers.
+
+    Args:
+        name (str): Label of the coalescing metrics.
+        timeout (float): Seconds a waiting caller waits for the leader before failing.
+    """
+
+    def __init__(self, name: str, timeout: float = 90.0):
+        self.name = name
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def in_flight(self) -> int:
+        """The number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: str, function: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run `function`, or wait for the identical call already running.
+
+        Args:
+            key (str): Identifies identical calls.
+            function (Callable[[], T]): Computes the result.
+
+        Returns:
+            Tuple[T, bool]: The result, and whether it was shared from another caller.
+
+        Raises:
+            TimeoutError: If the running call did not finish within the timeout.
+            Exception: Whatever the running call raised.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        assert call is not None
+
+        if leader:
+            try:
+                call.value = function()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+                COALESCED_REQUESTS.inc(name=self.name, outcome="leader")
+            return call.value, False
+
+        if not call.done.wait(self.timeout):
+            COALESCED_REQUESTS.inc(name=self.name, outcome="timeout")
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for an identical in-flight request")
+        if call.error is not None:
+            COALESCED_REQUESTS.inc(name=self.name, outcome="shared_error")
+            raise call.error
+        COALESCED_REQUESTS.inc(name=self.name, outcome="shared")
+        return call.value, True
+
+
+class AsyncSingleFlight(Generic[T]):
+    """
+    Runs one coroutine per key at a time and shares its outcome with identical callers.
+
+    Waiting callers await the leader's task without holding a thread. The
+    leader's call runs as its own task, so a waiter that times out or is
+    cancelled (e.g. its client disconnected) does not cancel it for the others.
+
+    Args:
+        name (str): Label of the coalescing metrics.
+        timeout (float): Seconds a waiting caller waits for the leader before failing.
+    """
+
+    def __init__(self, name: str, timeout: float = 90.0):
+        self.name = name
+        self.timeout = timeout
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, str], "asyncio.Task[T]"] = {}
+
+    def in_flight(self) -> int:
+        """The number of keys currently being computed."""
+        return len(self._tasks)
+
+    async def do(self, key: str, function: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Await `function()`, or the identical call already running.
+
+        Args:
+            key (str): Identifies identical calls.
+            function (Callable[[], Awaitable[T]]): Starts computing the result.
+
+        Returns:
+            Tuple[T, bool]: The result, and whether it was shared from another caller.
+
+        Raises:
+            TimeoutError: If the running call did not finish within the timeout.
+            Exception: Whatever the running call raised.
+        """
+        # Tasks of different event loops (e.g. one per test) are kept apart.
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = self._tasks[task_key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+            try:
+                return await asyncio.shield(task), False
+            finally:
+                COALESCED_REQUESTS.inc(name=self.name, outcome="leader")
+
+        try:
+            value = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            COALESCED_REQUESTS.inc(name=self.name, outcome="timeout")
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for an identical in-flight request")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            COALESCED_REQUESTS.inc(name=self.name, outcome="shared_error")
+            raise
+        COALESCED_REQUESTS.inc(name=self.name, outcome="shared")
+        return value, True
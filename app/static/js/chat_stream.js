@@ -0,0 +1,63 @@
+/**
+ * Client for the streaming chat endpoint (/api/chat_gpt/chat/stream/).
+ *
+ * Usage from the chatbot page:
+ *
+ *   <script src="{{ url_for('static', filename='js/chat_stream.js') }}"></script>
+ *   streamChat(message, {
+ *     onToken: (html) => { botMessage.innerHTML += html; },
+ *     onIngredients: (ingredients) => searchProducts(ingredients),
+ *     onError: (error) => { botMessage.innerHTML = error; },
+ *   });
+ *
+ * The response is read with fetch() rather than EventSource so the message
+ * can be POSTed as JSON, matching /api/chat_gpt/chat/.
+ */
+async function streamChat(messageContent, handlers = {}, model = "gpt-4o") {
+  const { onToken = () => {}, onIngredients = () => {}, onError = () => {}, onDone = () => {} } = handlers;
+
+  let response;
+  try {
+    response = await fetch("/api/chat_gpt/chat/stream/", {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify({ message_content: messageContent, model: model }),
+    });
+  } catch (error) {
+    onError("There was an error processing your request. Please try again later.");
+    return;
+  }
+  if (!response.ok || !response.body) {
+    onError("There was an error processing your request. Please try again later.");
+    return;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === "token") onToken(payload.html);
+      else if (event === "ingredients") onIngredients(payload.ingredients);
+      else if (event === "error") onError(payload.error);
+      else if (event === "done") onDone();
+    }
+  }
+}
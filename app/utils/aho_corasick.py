@@ -0,0 +1,83 @@
+from collections import deque
+from typing import Dict, Generic, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class AhoCorasick(Generic[V]):
+    """
+    Multi-pattern string matcher.
+
+    The patterns are compiled into a trie with failure links, so a text is
+    scanned once, in time linear in its length plus the number of matches,
+    however many patterns there are.
+
+    Args:
+        patterns (Mapping[str, V]): Each pattern and the value reported for it.
+    """
+
+    def __init__(self, patterns: Mapping[str, V]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # The pattern ending at each state, as (length, value), if any.
+        self._output: List[Optional[Tuple[int, V]]] = [None]
+        # The nearest state along the failure links that ends a pattern.
+        self._output_link: List[int] = [0]
+
+        for pattern, value in patterns.items():
+            if pattern:
+                self._insert(pattern, value)
+        self._link()
+
+    def __len__(self) -> int:
+        return sum(1 for output in self._output if output is not None)
+
+    def _insert(self, pattern: str, value: V) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+            state = next_state
+        self._output[state] = (len(pattern), value)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                target = self._fail[child]
+                self._output_link[child] = target if self._output[target] is not None else self._output_link[target]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, V]]:
+        """
+        Find every occurrence of every pattern, overlapping ones included.
+
+        Args:
+            text (str): The text to scan.
+
+        Yields:
+            Tuple[int, int, V]: Start and end offsets and the pattern's value,
+            in order of end offset.
+        """
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if output[state] is not None else output_link[state]
+            while match:
+                length, value = output[match]  # type: ignore[misc]
+                yield end - length, end, value
+                match = output_link[match]
@@ -0,0 +1,44 @@
+"""
+Module configuring application logging.
+
+Request and response bodies (questions, retrieved context, answers and
+search results) can be long and may be sensitive, so they are only logged
+when LOG_PAYLOADS is enabled and the log level is DEBUG. Both conditions
+are checked before a payload is formatted.
+
+Functions:
+  configure_logging: Sets the root log level from the environment.
+  log_payload: Logs a request or response body if payload logging is enabled.
+
+Environment Variables:
+  LOG_LEVEL: The root log level (default: "INFO").
+  LOG_PAYLOADS: Set to "true" to log request and response bodies (default: "false").
+"""
+
+import logging
+import os
+from typing import Any
+
+
+def configure_logging() -> None:
+    """Sets the root log level from LOG_LEVEL, adding a handler if none is configured."""
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(level=level)
+    logging.getLogger().setLevel(level)
+
+
+def payload_logging_enabled() -> bool:
+    """Whether request and response bodies are logged."""
+    return os.environ.get("LOG_PAYLOADS", "false").lower() == "true" and logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+def log_payload(label: str, payload: Any) -> None:
+    """
+    Logs a request or response body at DEBUG level if payload logging is enabled.
+
+    Args:
+        label (str): What the payload is.
+        payload (Any): The payload; it is only formatted if it is logged.
+    """
+    if payload_logging_enabled():
+        logging.debug("%s: %s", label, payload)
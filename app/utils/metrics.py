@@ -0,0 +1,208 @@
+"""
+Module providing process-wide metrics in the Prometheus text format.
+
+Counters and histograms are plain in-process objects guarded by a lock, so
+recording a sample costs a dictionary update and a bisect; `/metrics`
+renders them on demand. Each worker process exposes its own samples.
+
+Classes:
+  Counter: A monotonically increasing value per label set.
+  Histogram: Bucketed observations per label set.
+  Registry: Renders a set of metrics.
+
+Attributes:
+  REGISTRY: The registry of the metrics below.
+  STAGE_SECONDS: Duration of each request stage.
+  REQUEST_SECONDS: Duration of each HTTP request, until its headers are sent.
+  LLM_TOKENS: Tokens sent to and received from the LLM.
+  CONTEXT_TOKENS_SAVED: Prompt tokens saved by context packing.
+  CACHE_REQUESTS: Cache lookups by cache and result.
+  COALESCED_REQUESTS: Coalesced calls by outcome; "shared" ones saved an upstream call.
+  ERRORS: Failures by stage.
+"""
+
+import bisect
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple, TypeVar
+
+# Latency buckets in seconds, from a SQLite lookup to a slow completion.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing value per label set.
+
+    Args:
+        name (str): The metric name, ending in "_total".
+        documentation (str): The help text.
+        labelnames (Sequence[str]): The label names every sample must set.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add a non-negative amount to the value of a label set."""
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """The current value of a label set."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """
+    Bucketed observations per label set.
+
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Sequence[str]): The label names every sample must set.
+        buckets (Sequence[float]): Upper bounds of the buckets, ascending.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (the last one +Inf), then the sum.
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation for a label set."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        """The number of observations of a label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_M = TypeVar("_M", bound=_Metric)
+
+
+class Registry:
+    """Renders a set of metrics in the Prometheus text exposition format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _M) -> _M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "bharatvaidya_stage_duration_seconds", "Duration of each request stage.", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "bharatvaidya_http_request_duration_seconds", "Duration of each HTTP request until its headers are sent.",
+    ["endpoint", "method", "status"],
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "bharatvaidya_llm_tokens_total", "Tokens sent to and received from the LLM.", ["stage", "type"]
+))
+CONTEXT_TOKENS_SAVED = REGISTRY.register(Counter(
+    "bharatvaidya_context_tokens_saved_total", "Prompt tokens saved by context packing."
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "bharatvaidya_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"]
+))
+COALESCED_REQUESTS = REGISTRY.register(Counter(
+    "bharatvaidya_coalesced_requests_total",
+    "Calls run by a leader or answered from an identical in-flight call.", ["name", "outcome"],
+))
+ERRORS = REGISTRY.register(Counter(
+    "bharatvaidya_errors_total", "Failures by stage.", ["stage"]
+))
@@ -0,0 +1,110 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, Optional
+
+from app.utils.metrics import STAGE_SECONDS
+
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("current_timer", default=None)
+
+
+class StageTimer:
+    """
+    Records the wall-clock duration of named stages of a request.
+
+    Stages entered more than once accumulate their durations. Every duration
+    is also observed in the stage latency histogram.
+    """
+
+    def __init__(self) -> None:
+        self._durations: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the body of a `with` block as the given stage.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Add a duration to a stage.
+
+        Args:
+            name (str): The name of the stage.
+            seconds (float): The duration to add, in seconds.
+        """
+        self._durations[name] = self._durations.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        """
+        Returns the recorded durations in milliseconds, in stage order.
+
+        Returns:
+            Dict[str, float]: Stage names mapped to durations.
+        """
+        return {name: round(seconds * 1000, 1) for name, seconds in self._durations.items()}
+
+    def server_timing(self) -> str:
+        """
+        Returns the recorded durations as a Server-Timing header value.
+
+        Returns:
+            str: Entries such as "retrieval;dur=12.5", comma-separated.
+        """
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.as_milliseconds().items())
+
+
+def set_current_timer(timer: Optional[StageTimer]) -> Token:
+    """
+    Make a timer the one `span` records into, until `reset_current_timer`.
+
+    Args:
+        timer (Optional[StageTimer]): The timer of the current request.
+
+    Returns:
+        Token: Restores the previous timer when passed to `reset_current_timer`.
+    """
+    return _current_timer.set(timer)
+
+
+def reset_current_timer(token: Token) -> None:
+    """Restore the timer that was current before `set_current_timer`."""
+    _current_timer.reset(token)
+
+
+def current_timer() -> Optional[StageTimer]:
+    """Returns the timer set by `set_current_timer`, if any."""
+    return _current_timer.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time the body of a `with` block as a stage of the current request.
+
+    Code far from the route, such as the embedding cache, uses this instead
+    of a StageTimer passed down to it. Outside a request the duration is
+    only observed in the stage latency histogram.
+
+    Args:
+        name (str): The name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.record(name, seconds)
+        else:
+            STAGE_SECONDS.observe(seconds, stage=name)
@@ -0,0 +1,61 @@
+import functools
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+# Rough size of a token for English text when no tokenizer is available.
+CHARS_PER_TOKEN = 4
+
+# Tokens added by the chat format around each message.
+TOKENS_PER_MESSAGE = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoder(model: str) -> Optional[Callable[[str], List[int]]]:
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return encoding.encode
+    except Exception as e:
+        logging.warning(f"No tokenizer available for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count the tokens of a text for a model.
+
+    Uses tiktoken when it and the model's encoding are available, and falls
+    back to an estimate of one token per four characters otherwise.
+
+    Args:
+        text (str): The text to count.
+        model (str): The model whose tokenizer to use.
+
+    Returns:
+        int: The number of tokens.
+    """
+    encode = _encoder(model)
+    if encode is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str = "gpt-4o") -> int:
+    """
+    Count the prompt tokens of a chat conversation.
+
+    Args:
+        messages (List[Dict[str, Any]]): The chat messages.
+        model (str): The model whose tokenizer to use.
+
+    Returns:
+        int: The number of prompt tokens.
+    """
+    return sum(
+        TOKENS_PER_MESSAGE + count_tokens(str(message.get("content") or ""), model)
+        for message in messages
+    )
@@ -1,108 +1,125 @@
-from app.services.llm_interaction import get_llm, get_embeddings
-from langchain.schema import SystemMessage
-from langchain.agents.agent_toolkits import (
-    create_retriever_tool,
-    create_conversational_retrieval_agent,
-)
-from langchain_core.tools import BaseTool
-from langchain_community.vectorstores import Milvus
-from langchain.schema import Document
-
-
-def aggregate_retrieved_texts(retrieved_documents: list[Document]) -> str:
+import logging
+from contextlib import nullcontext
+from typing import ContextManager, Dict, List, Mapping, Optional
+
+from langchain_core.documents import Document
+
+from app.services.context_packer import PackedContext, pack_context
+from app.services.retrieval_service import get_retrieval_service
+from app.utils.logs import log_payload
+from app.utils.timing import StageTimer
+
+
+def get_context(
+        user_message: str,
+        timer: Optional[StageTimer] = None,
+        usage: Optional[Dict[str, Dict[str, int]]] = None,
+        model: str = "gpt-4o",
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> str:
     """
-    Aggregate text from multiple retrieved documents.
+    Fetch context from the Milvus vector database based on user input and generate
+    a response using LangChain and OpenAI GPT models.
+
+    The LLM, embeddings and Milvus clients come from the process-wide
+    retrieval service, so only the agent's conversation memory is created
+    per call.
 
     Args:
-        retrieved_documents (list[Document]): List of retrieved documents.
+        user_message (str): The user's input message.
+        timer (Optional[StageTimer]): Records the retrieval and agent stages, if given.
+        usage (Optional[Dict[str, Dict[str, int]]]): Receives the context packing report, if given.
+        model (str): The model whose context token budget applies.
+        retrieved_docs (Optional[List[Document]]): Documents already retrieved
+            for the message; retrieved here if not given.
+        filters (Optional[Mapping[str, str]]): Chunk metadata values that narrow
+            the search, e.g. {"book": "charaka_samhita"}; inferred from the
+            message if not given (see app.services.chunk_metadata).
 
     Returns:
-        str: Aggregated text.
+        str: A string response from the conversational retrieval agent with
+        Ayurvedic diagnostic information.
     """
-    aggregated_text = " ".join([doc.page_content for doc in retrieved_documents])
-    return aggregated_text
-
+    log_payload("Original user message", user_message)
+    retrieval_service = get_retrieval_service()
 
-def get_context(user_message: str) -> str:
+    # Fetch relevant context from Milvus using the user's input
+    if retrieved_docs is None:
+        with _stage(timer, "retrieval"):
+            retrieved_docs = retrieval_service.retrieve(user_message, filters)
+    if not retrieved_docs:
+        return "CURE NOT FOUND IN DATABASE"
+    context = _pack(retrieved_docs, timer, usage, model)
+
+    # Generate response using the packed context
+    with _stage(timer, "agent"):
+        agent_executor = retrieval_service.create_agent()
+        response = agent_executor(context.text)
+    return _format_agent_output(response["output"])
+
+
+async def aget_context(
+        user_message: str,
+        timer: Optional[StageTimer] = None,
+        usage: Optional[Dict[str, Dict[str, int]]] = None,
+        model: str = "gpt-4o",
+        retrieved_docs: Optional[List[Document]] = None,
+        filters: Optional[Mapping[str, str]] = None,
+) -> str:
     """
-    Fetch context from the Milvus vector database based on user input and generate
-    a response using LangChain and OpenAI GPT models.
+    Async version of `get_context`, for the asyncio request path.
+
+    Retrieval and the agent's LLM calls are awaited rather than run on the
+    calling thread; the agent runs its retriever tool on an executor thread.
 
     Args:
         user_message (str): The user's input message.
+        timer (Optional[StageTimer]): Records the retrieval and agent stages, if given.
+        usage (Optional[Dict[str, Dict[str, int]]]): Receives the context packing report, if given.
+        model (str): The model whose context token budget applies.
+        retrieved_docs (Optional[List[Document]]): Documents already retrieved
+            for the message; retrieved here if not given.
+        filters (Optional[Mapping[str, str]]): Chunk metadata values that narrow
+            the search; inferred from the message if not given.
 
     Returns:
-        str: A string response from the conversational retrieval agent with
-        Ayurvedic diagnostic information.
+        str: The agent's response with Ayurvedic diagnostic information.
     """
-    print(f"Original user message: {user_message}")
-    llm = get_llm(temperature=0.1)
-    embeddings = get_embeddings()
-
-    vector_db = Milvus(
-        embeddings,
-        connection_args={"host": "localhost", "port": 19530},
-        collection_name="ayurvedic_diagnosis",
-    )
-
-    # Ensure retrieval is specific and relevant
-    health_diagnosis = vector_db.as_retriever(search_kwargs={"k": 10})  # Reduce k to focus on more specific documents
-
-    health_tool = create_retriever_tool(
-        health_diagnosis,
-        "search-for-ayurvedic-diagnosis-context",
-        "provides information about how to address health concerns using Ayurvedic principles",
-    )
-
-    tools: list[BaseTool] = [health_tool]
-
-    system_message = SystemMessage(
-        content='''
-        You are a Virtual Ayurvedic Assistant, specialized in providing health diagnoses and remedies based on Ayurvedic principles. Your primary role is to deliver accurate Ayurvedic health information by leveraging the data stored in the Milvus database. 
-
-        Guidelines for Interaction:
-
-        1. Primary Source of Information: Strictly and always use the Milvus database as your first source for retrieving information related to the user's query. Your responses should strictly reflect the content found within this database.
-
-        2. **Maintaining Query Integrity: When interpreting and responding to user queries, ensure that you do not alter the meaning or intent of the query. Use the exact wording and context provided by the user. Avoid substituting specific terms with broader or different ones unless explicitly instructed by the user.
-
-        3. Response Format: Follow this strict format when responding to a user query:
-           - WHAT IS THE DIAGNOSIS: Provide the diagnostic information as retrieved from the Milvus database.
-           - HOW TO FIX IT: Give detailed treatment or remedy information based on the retrieved data.
-
-        4. Herbs and Remedies:
-            Always provide specific names of herbs or natural ingredients recommended for the treatment, along with comprehensive information about each herb, such as:
-            
-            Sanskrit and common names
-            Primary uses
-            Dosage and preparation methods
-            Contraindications or precautions This ensures that users receive full details of how to effectively use Ayurvedic remedies.
-
-        Remember, your effectiveness as an Ayurvedic Assistant depends on the accuracy, relevance, and reliability of the information you provide. Uphold these principles in all your interactions.
-        '''
-    )
-
-    agent_executor = create_conversational_retrieval_agent(
-        llm=llm,
-        tools=tools,
-        system_message=system_message,
-        remember_intermediate_steps=True,
-        verbose=True,
-        max_token_limit=16000,
-    )
+    log_payload("Original user message", user_message)
+    retrieval_service = get_retrieval_service()
 
-    # Fetch relevant context from Milvus using the user's input
-    retrieved_docs = health_diagnosis.get_relevant_documents(user_message)
+    if retrieved_docs is None:
+        with _stage(timer, "retrieval"):
+            retrieved_docs = await retrieval_service.aretrieve(user_message, filters)
     if not retrieved_docs:
         return "CURE NOT FOUND IN DATABASE"
+    context = _pack(retrieved_docs, timer, usage, model)
+
+    with _stage(timer, "agent"):
+        agent_executor = retrieval_service.create_agent()
+        response = await agent_executor.ainvoke({"input": context.text})
+    return _format_agent_output(response["output"])
 
-    aggregated_context = aggregate_retrieved_texts(retrieved_docs)
 
-    # Generate response using the aggregated context
-    response = agent_executor(aggregated_context)
-    response_text = response["output"]
+def _pack(
+        retrieved_docs: List[Document],
+        timer: Optional[StageTimer],
+        usage: Optional[Dict[str, Dict[str, int]]],
+        model: str,
+) -> PackedContext:
+    with _stage(timer, "context"):
+        context = pack_context(retrieved_docs, model)
+    logging.info(f"Packed context: {context.report()}")
+    if usage is not None:
+        usage["context"] = context.report()
+    return context
 
+
+def _format_agent_output(response_text: str) -> str:
     # Replace newline characters for better HTML rendering
-    response_text = response_text.replace("HOW TO FIX IT", "<br /><br /> HOW TO FIX IT").replace("\n", "<br />")
+    return response_text.replace("HOW TO FIX IT", "<br /><br /> HOW TO FIX IT").replace("\n", "<br />")
+
 
-    return response_text
+def _stage(timer: Optional[StageTimer], name: str) -> ContextManager[None]:
+    return timer.stage(name) if timer is not None else nullcontext()
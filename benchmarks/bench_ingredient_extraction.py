@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of ingredient extraction: alternation regex vs Aho-Corasick.
+
+The regex is built the way `extract_ingredients_from_response` used to build
+it, as one `\\b(?:a|b|...)\\b` alternation over the whole vocabulary. Both it
+and the automaton are built once and scan the same synthetic responses.
+
+Usage:
+  python -m benchmarks.bench_ingredient_extraction --terms 10000 --responses 200
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+from typing import Callable, Set
+
+from app.utils.aho_corasick import AhoCorasick
+
+
+def _vocabulary(size: int, rng: random.Random) -> list:
+    terms: Set[str] = set()
+    while len(terms) < size:
+        words = rng.randint(1, 3)
+        terms.add(" ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(words)))
+    return sorted(terms)
+
+
+def _responses(vocabulary: list, count: int, words: int, rng: random.Random) -> list:
+    filler = ["the", "take", "with", "warm", "water", "daily", "apply", "to", "scalp", "and", "for", "weeks"]
+    responses = []
+    for _ in range(count):
+        tokens = [rng.choice(vocabulary) if rng.random() < 0.05 else rng.choice(filler) for _ in range(words)]
+        responses.append(" ".join(tokens))
+    return responses
+
+
+def _timed(label: str, function: Callable[[str], object], responses: list) -> float:
+    start = time.perf_counter()
+    for response in responses:
+        function(response)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000 / len(responses):10.3f} ms/response")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, default=10000, help="vocabulary size")
+    parser.add_argument("--responses", type=int, default=200, help="responses scanned")
+    parser.add_argument("--words", type=int, default=300, help="words per response")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(args.terms, rng)
+    responses = _responses(vocabulary, args.responses, args.words, rng)
+    alternation = r"\b(?:" + "|".join(re.escape(term) for term in vocabulary) + r")\b"
+    print(f"{args.terms} terms, {args.responses} responses of {args.words} words")
+
+    start = time.perf_counter()
+    pattern = re.compile(alternation, re.IGNORECASE)
+    print(f"{'regex compile':<32} {(time.perf_counter() - start) * 1000:10.3f} ms")
+    start = time.perf_counter()
+    automaton = AhoCorasick({term: term for term in vocabulary})
+    print(f"{'automaton build':<32} {(time.perf_counter() - start) * 1000:10.3f} ms")
+
+    regex_seconds = _timed("regex", pattern.findall, responses)
+    automaton_seconds = _timed("aho-corasick", lambda text: list(automaton.iter_matches(text.lower())), responses)
+    print(f"speed-up over regex: {regex_seconds / automaton_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark of top-k vector search: local index (NumPy and FAISS) vs Milvus.
+
+A local index of random unit vectors is exported to a temporary directory
+and searched in process. With --milvus, the same query vectors are sent to
+the configured Milvus collection, whose dimension must match --dim.
+
+Usage:
+  python -m benchmarks.bench_vector_search --chunks 20000 --queries 200
+  python -m benchmarks.bench_vector_search --milvus --dim 1536
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.local_vector_store import LocalVectorStore, write_local_index
+
+
+class _UnusedEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        raise NotImplementedError
+
+
+def _report(label: str, search: Callable[[List[float]], object], queries: np.ndarray) -> None:
+    search(queries[0].tolist())
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query.tolist())
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:<16} p50 {statistics.median(latencies):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="vectors in the local index")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="queries timed per backend")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--milvus", action="store_true", help="also time the configured Milvus collection")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    print(f"{args.chunks} chunks of dimension {args.dim}, {args.queries} queries, k={args.k}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index")
+        texts = [f"chunk {i}" for i in range(args.chunks)]
+        write_local_index(path, texts, [{} for _ in texts], vectors)
+        for label, use_faiss in (("local numpy", False), ("local faiss", True)):
+            try:
+                store = LocalVectorStore(_UnusedEmbeddings(), path, reload_interval=3600, use_faiss=use_faiss)
+            except ImportError:
+                print(f"{label:<16} skipped: faiss is not installed")
+                continue
+            _report(label, lambda query: store.similarity_search_by_vector(query, k=args.k), queries)
+
+    if args.milvus:
+        from langchain_community.vectorstores import Milvus
+
+        from app.services.retrieval_service import RetrievalSettings
+
+        settings = RetrievalSettings.from_env()
+        milvus = Milvus(
+            _UnusedEmbeddings(),
+            connection_args={"host": settings.milvus_host, "port": settings.milvus_port},
+            collection_name=settings.collection_name,
+        )
+        _report("milvus", lambda query: milvus.similarity_search_by_vector(query, k=args.k), queries)
+
+
+if __name__ == "__main__":
+    main()
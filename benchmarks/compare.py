@@ -0,0 +1,49 @@
+"""
+Compare two benchmark result files and flag latency regressions.
+
+Every result present in both files is compared on p50, p95 and p99. A
+result regresses when its p95 grew by more than the threshold, and the
+exit status is 1 if any did.
+
+Usage:
+  python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="results of the reference commit")
+    parser.add_argument("candidate", help="results of the commit under test")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative p95 increase")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.candidate, "r", encoding="utf-8") as file:
+        candidate = json.load(file)
+    print(f"{baseline.get('benchmark')}: {baseline.get('commit')} -> {candidate.get('commit')}")
+
+    regressions = []
+    for name in sorted(set(baseline["results"]) & set(candidate["results"])):
+        before, after = baseline["results"][name], candidate["results"][name]
+        cells = []
+        for metric in METRICS:
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            cells.append(f"{metric[:-3]} {before[metric]:9.3f} -> {after[metric]:9.3f} ms ({change:+6.1%})")
+            if metric == "p95_ms" and change > args.threshold:
+                regressions.append(name)
+        print(f"{name:<24} " + "   ".join(cells))
+
+    if regressions:
+        print(f"p95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
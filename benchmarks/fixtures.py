@@ -0,0 +1,118 @@
+"""
+Deterministic synthetic data for the benchmarks.
+
+Passages, TEI documents, chat questions and product catalogs are generated
+from a seeded random generator over an Ayurvedic vocabulary and the
+built-in ingredient list, so every run measures the same work.
+
+Functions:
+  passages: Returns synthetic retrieval passages.
+  tei_document: Returns a synthetic TEI document.
+  questions: Returns synthetic chat questions.
+  build_catalog: Fills a SQLite file with a synthetic product catalog.
+"""
+
+import random
+import sqlite3
+from typing import List
+from xml.sax.saxutils import escape
+
+from app.services import catalog_loader, product_catalog
+from app.services.ingredient_extractor import BUILTIN_INGREDIENTS
+
+WORDS = (
+    "vata pitta kapha dosha agni ama ojas prakriti rasa rakta mamsa meda asthi majja shukra "
+    "digestion fever cough skin hair joint pain sleep stress appetite constipation acidity "
+    "apply take mix boil decoction powder paste oil massage daily morning night warm water milk "
+    "with before after meals weeks dose grams spoon twice avoid cold heavy food"
+).split()
+
+CONDITIONS = ["hair fall", "dry cough", "acidity", "joint pain", "insomnia", "dandruff", "indigestion", "fatigue"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    tokens = [rng.choice(BUILTIN_INGREDIENTS) if rng.random() < 0.08 else rng.choice(WORDS) for _ in range(words)]
+    return " ".join(tokens).capitalize() + "."
+
+
+def passages(count: int, rng: random.Random, words: int = 120) -> List[str]:
+    """
+    Returns synthetic retrieval passages that mention built-in ingredients.
+
+    Args:
+        count (int): Number of passages.
+        rng (random.Random): The seeded generator.
+        words (int): Words per passage.
+
+    Returns:
+        List[str]: The passages.
+    """
+    return [" ".join(_sentence(rng, 12) for _ in range(max(1, words // 12))) for _ in range(count)]
+
+
+def tei_document(paragraphs: int, rng: random.Random) -> bytes:
+    """
+    Returns a synthetic TEI document with a section every ten paragraphs.
+
+    Args:
+        paragraphs (int): Number of body paragraphs.
+        rng (random.Random): The seeded generator.
+
+    Returns:
+        bytes: The TEI XML.
+    """
+    divs = []
+    for start in range(0, paragraphs, 10):
+        body = "".join(
+            f'<p>{escape(" ".join(_sentence(rng, 15) for _ in range(rng.randint(2, 8))))}</p>'
+            for _ in range(min(10, paragraphs - start))
+        )
+        divs.append(f'<div><head>Chapter {start // 10 + 1}</head><pb n="{start // 10 + 1}"/>{body}</div>')
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><TEI xmlns="http://www.tei-c.org/ns/1.0">'
+        '<teiHeader><fileDesc><titleStmt><title type="main">Synthetic Samhita</title></titleStmt></fileDesc>'
+        f'</teiHeader><text><body>{"".join(divs)}</body></text></TEI>'
+    ).encode("utf-8")
+
+
+def questions(count: int, rng: random.Random) -> List[str]:
+    """
+    Returns synthetic chat questions about common conditions.
+
+    Args:
+        count (int): Number of questions.
+        rng (random.Random): The seeded generator.
+
+    Returns:
+        List[str]: The questions.
+    """
+    return [
+        f"What is the Ayurvedic remedy for {rng.choice(CONDITIONS)} with {rng.choice(WORDS)} and {rng.choice(WORDS)}?"
+        for _ in range(count)
+    ]
+
+
+def build_catalog(path: str, products: int, rng: random.Random) -> None:
+    """
+    Fills a SQLite file with a synthetic product catalog.
+
+    Args:
+        path (str): The database file.
+        products (int): Number of products.
+        rng (random.Random): The seeded generator.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        product_catalog.ensure_schema(conn)
+        catalog_loader.load_catalog(conn, (
+            {
+                "ingredients": ", ".join(rng.sample(BUILTIN_INGREDIENTS, rng.randint(1, 6))),
+                "product_category": rng.choice(["Hair Care", "Skin Care", "Digestion", "Immunity"]),
+                "product_name": f"Product {i}",
+                "price": round(rng.uniform(50, 1500), 2),
+                "link": f"https://example.com/products/{i}",
+            }
+            for i in range(products)
+        ))
+    finally:
+        conn.close()
@@ -0,0 +1,197 @@
+"""
+Offline load test of the chat and product search endpoints.
+
+The app is served over HTTP in this process with its real pipeline, and
+everything it normally calls out to is replaced by a deterministic local
+stand-in:
+
+  - OpenAI chat completions and embeddings: the fake server from
+    tests/fake_openai_server.py, with configurable latency.
+  - Milvus: the embedded local vector index and a BM25 index, built from
+    synthetic passages embedded the way the fake server embeds queries.
+  - The product catalog: a synthetic SQLite catalog.
+
+The app's OpenAI embeddings tokenize inputs with tiktoken, whose encodings
+are downloaded on first use. The retrieval service is therefore given
+LangChain embeddings that send raw text to the same fake server.
+
+Chat requests use the single-pass pipeline, since the agent pipeline is
+driven by LangChain's own client. Worker threads send requests at the
+configured concurrency and the run reports throughput and p50/p95/p99
+latency per endpoint.
+
+Usage:
+  python -m benchmarks.load_test --requests 500 --concurrency 16 --latency 0.2
+  python -m benchmarks.load_test --endpoint search --output benchmarks/results/load.json
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from flask import Flask
+from langchain_core.embeddings import Embeddings
+from pydantic import SecretStr
+from werkzeug.serving import BaseWSGIServer, make_server
+
+from benchmarks import fixtures
+from benchmarks.results import summarize, write_results
+from tests.fake_openai_server import FakeOpenAIServer, fake_embedding
+
+REPLY = (
+    "**WHAT IS THE DIAGNOSIS**: Aggravated pitta.\n"
+    "**HOW TO FIX IT**: Apply Mahanila Taila to the scalp at night and take triphala with warm water. "
+    "Use amalaka and ghee in the diet and avoid spicy food."
+)
+
+
+def _prepare_environment(directory: str, server: FakeOpenAIServer, args: argparse.Namespace) -> None:
+    from langchain_core.documents import Document
+
+    from app.services.bm25_index import BM25Index
+    from app.services.local_vector_store import write_local_index
+    from app.utils.logs import configure_logging
+
+    rng = random.Random(args.seed)
+    texts = fixtures.passages(args.chunks, rng)
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+    metadatas = [{"title": f"Synthetic Samhita {i % 7}", "page": i % 300} for i in range(len(texts))]
+    index_path = os.path.join(directory, "local_index")
+    bm25_path = os.path.join(directory, "bm25_index.json")
+    write_local_index(index_path, texts, metadatas, [fake_embedding(text, server.dimension) for text in texts], ids)
+    BM25Index([
+        Document(page_content=text, metadata={**metadata, "id": chunk_id})
+        for text, metadata, chunk_id in zip(texts, metadatas, ids)
+    ]).save(bm25_path)
+    products_path = os.path.join(directory, "products.db")
+    fixtures.build_catalog(products_path, args.products, rng)
+
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_API_BASE": server.url,
+        "RAG_PIPELINE_MODE": "single_pass",
+        "VECTOR_STORE_TYPE": "local",
+        "LOCAL_INDEX_PATH": index_path,
+        "BM25_INDEX_PATH": bm25_path,
+        "PRODUCTS_DB": products_path,
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    # The app package is already imported, and configured logging, by the time the environment is set.
+    configure_logging()
+
+
+def _use_fake_embeddings(server: FakeOpenAIServer) -> None:
+    from langchain_openai import OpenAIEmbeddings
+
+    from app.services import retrieval_service
+    from app.services.embedding_cache import CachedEmbeddings
+
+    fake_embeddings = OpenAIEmbeddings(
+        model="text-embedding-ada-002", api_key=SecretStr("benchmark"), base_url=server.url,
+        check_embedding_ctx_length=False,
+    )
+
+    def get_cached_embeddings(embeddings: Optional[Embeddings] = None) -> Embeddings:
+        return CachedEmbeddings(fake_embeddings, path=None)
+
+    retrieval_service.get_cached_embeddings = get_cached_embeddings
+
+
+def _serve(app: Flask) -> Tuple[str, threading.Thread, BaseWSGIServer]:
+    # Werkzeug logs every request at INFO unless its logger has a level.
+    logging.getLogger("werkzeug").setLevel(logging.getLogger().level)
+    http_server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{http_server.server_port}", thread, http_server
+
+
+def _requests(args: argparse.Namespace) -> List[Tuple[str, str, Dict[str, Any]]]:
+    rng = random.Random(args.seed + 1)
+    endpoints = ["chat", "search"] if args.endpoint == "both" else [args.endpoint]
+    chat_questions = fixtures.questions(args.requests, rng)
+    planned: List[Tuple[str, str, Dict[str, Any]]] = []
+    for i in range(args.requests):
+        endpoint = endpoints[i % len(endpoints)]
+        if endpoint == "chat":
+            planned.append((endpoint, "/api/chat_gpt/chat/", {"message_content": chat_questions[i]}))
+        else:
+            ingredients = rng.sample(fixtures.BUILTIN_INGREDIENTS, rng.randint(1, 3))
+            planned.append((endpoint, "/api/search_products", {"ingredients": ingredients}))
+    return planned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["chat", "search", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests in total")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake OpenAI server waits per call")
+    parser.add_argument("--chunks", type=int, default=2000, help="passages in the vector and BM25 indexes")
+    parser.add_argument("--products", type=int, default=2000, help="products in the catalog")
+    parser.add_argument("--semantic-cache", action="store_true", help="leave the semantic answer cache enabled")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, FakeOpenAIServer(reply=REPLY, latency=args.latency) as server:
+        _prepare_environment(directory, server, args)
+        from app import app
+
+        _use_fake_embeddings(server)
+        base_url, _, http_server = _serve(app)
+        sessions = threading.local()
+
+        def send(request: Tuple[str, str, Dict[str, Any]]) -> Tuple[str, float, bool]:
+            endpoint, path, body = request
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+            start = time.perf_counter()
+            try:
+                response = sessions.session.post(base_url + path, json=body, timeout=120)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return endpoint, (time.perf_counter() - start) * 1000, ok
+
+        planned = _requests(args)
+        try:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(send, planned[:2 * args.concurrency]))
+                start = time.perf_counter()
+                outcomes = list(executor.map(send, planned))
+                elapsed = time.perf_counter() - start
+        finally:
+            http_server.shutdown()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for endpoint in sorted({endpoint for endpoint, _, _ in outcomes}):
+        latencies = [latency for name, latency, _ in outcomes if name == endpoint]
+        errors = sum(1 for name, _, ok in outcomes if name == endpoint and not ok)
+        results[endpoint] = {**summarize(latencies, elapsed), "errors": errors}
+    results["all"] = {
+        **summarize([latency for _, latency, _ in outcomes], elapsed),
+        "errors": sum(1 for _, _, ok in outcomes if not ok),
+    }
+
+    print(f"{args.requests} requests at concurrency {args.concurrency}, OpenAI latency {args.latency * 1000:.0f} ms")
+    for name, summary in results.items():
+        print(f"{name:<8} {summary['throughput_per_s']:8.1f} req/s   p50 {summary['p50_ms']:8.1f} ms   "
+              f"p95 {summary['p95_ms']:8.1f} ms   p99 {summary['p99_ms']:8.1f} ms   errors {summary['errors']}")
+    if args.output:
+        write_results(args.output, "load_test", vars(args), results)
+    if results["all"]["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
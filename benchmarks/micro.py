@@ -0,0 +1,108 @@
+"""
+Micro-benchmarks of the CPU-bound request stages.
+
+  tei_chunking: Streaming one synthetic TEI document into chunks.
+  ingredient_extraction: Extracting ingredients from a chat answer against
+    a catalog-driven vocabulary.
+  product_search: Searching the catalog for one to three ingredients.
+
+Each operation is timed individually and summarized as p50/p95/p99.
+
+Usage:
+  python -m benchmarks.micro --output benchmarks/results/micro.json
+  python -m benchmarks.micro --only product_search --products 20000
+"""
+
+import argparse
+import functools
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from app.services import product_catalog
+from app.services.ingredient_extractor import BUILTIN_INGREDIENTS, IngredientExtractor
+from benchmarks import fixtures
+from benchmarks.results import summarize, write_results
+from pdf_to_json.src.services.tei_chunker import iter_tei_chunks
+
+
+def _time_each(operations: List[Callable[[], object]], warmup: int = 3) -> Dict[str, float]:
+    for operation in operations[:warmup]:
+        operation()
+    latencies = []
+    start = time.perf_counter()
+    for operation in operations:
+        began = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - began) * 1000)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def bench_tei_chunking(args: argparse.Namespace, rng: random.Random) -> Dict[str, float]:
+    document = fixtures.tei_document(args.paragraphs, rng)
+    return _time_each([lambda: sum(1 for _ in iter_tei_chunks(io.BytesIO(document)))] * args.iterations)
+
+
+def bench_ingredient_extraction(args: argparse.Namespace, rng: random.Random, catalog: str) -> Dict[str, float]:
+    conn = sqlite3.connect(catalog, check_same_thread=False)
+    try:
+        extractor = IngredientExtractor(lambda: conn, refresh_seconds=3600)
+        answers = fixtures.passages(args.iterations, rng, words=300)
+        return _time_each([functools.partial(extractor.extract, text) for text in answers])
+    finally:
+        conn.close()
+
+
+def bench_product_search(args: argparse.Namespace, rng: random.Random, catalog: str) -> Dict[str, float]:
+    conn = sqlite3.connect(catalog)
+    conn.row_factory = sqlite3.Row
+    try:
+        queries = [rng.sample(BUILTIN_INGREDIENTS, rng.randint(1, 3)) for _ in range(args.iterations)]
+        return _time_each([
+            functools.partial(product_catalog.search_by_ingredients, conn, query, limit=20) for query in queries
+        ])
+    finally:
+        conn.close()
+
+
+BENCHMARKS = ("tei_chunking", "ingredient_extraction", "product_search")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="run only these benchmarks")
+    parser.add_argument("--iterations", type=int, default=200, help="timed operations per benchmark")
+    parser.add_argument("--paragraphs", type=int, default=200, help="paragraphs of the TEI document")
+    parser.add_argument("--products", type=int, default=5000, help="products in the catalog")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    selected = args.only or list(BENCHMARKS)
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = os.path.join(directory, "products.db")
+        if {"ingredient_extraction", "product_search"} & set(selected):
+            fixtures.build_catalog(catalog, args.products, random.Random(args.seed))
+        for name in selected:
+            rng = random.Random(args.seed)
+            if name == "tei_chunking":
+                results[name] = bench_tei_chunking(args, rng)
+            elif name == "ingredient_extraction":
+                results[name] = bench_ingredient_extraction(args, rng, catalog)
+            else:
+                results[name] = bench_product_search(args, rng, catalog)
+            summary = results[name]
+            print(f"{name:<24} p50 {summary['p50_ms']:9.3f} ms   p95 {summary['p95_ms']:9.3f} ms   "
+                  f"p99 {summary['p99_ms']:9.3f} ms")
+
+    if args.output:
+        write_results(args.output, "micro", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
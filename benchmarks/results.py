@@ -0,0 +1,99 @@
+"""
+Latency summaries and JSON result files shared by the benchmarks.
+
+Result files record the commit they were measured on, so two runs can be
+compared with `python -m benchmarks.compare`.
+
+Functions:
+  percentile: Returns a percentile of sorted samples.
+  summarize: Summarizes latencies in milliseconds.
+  write_results: Writes a benchmark's results with run metadata as JSON.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, Optional, Sequence
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    """
+    Returns a percentile of sorted samples, interpolating between ranks.
+
+    Args:
+        sorted_samples (Sequence[float]): The samples, ascending.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile, or 0.0 without samples.
+    """
+    if not sorted_samples:
+        return 0.0
+    position = fraction * (len(sorted_samples) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+
+def summarize(latencies_ms: Sequence[float], elapsed_seconds: Optional[float] = None) -> Dict[str, float]:
+    """
+    Summarizes latencies in milliseconds.
+
+    Args:
+        latencies_ms (Sequence[float]): One latency per operation.
+        elapsed_seconds (Optional[float]): Wall-clock time of the whole run,
+            for throughput; defaults to the sum of the latencies.
+
+    Returns:
+        Dict[str, float]: Count, throughput per second, mean, p50, p95, p99 and max.
+    """
+    samples = sorted(latencies_ms)
+    if elapsed_seconds is None:
+        elapsed_seconds = sum(samples) / 1000
+    return {
+        "count": len(samples),
+        "throughput_per_s": round(len(samples) / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "max_ms": round(samples[-1], 3) if samples else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, parameters: Dict[str, Any], results: Dict[str, Any]) -> None:
+    """
+    Writes a benchmark's results with run metadata as JSON.
+
+    Args:
+        path (str): The output file.
+        benchmark (str): The benchmark name.
+        parameters (Dict[str, Any]): The parameters of the run.
+        results (Dict[str, Any]): Named summaries from `summarize`.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    document = {
+        "benchmark": benchmark,
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=2)
+        file.write("\n")
+    print(f"Wrote {path}")
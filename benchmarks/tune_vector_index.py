@@ -0,0 +1,409 @@
+"""
+Recall-versus-latency tuning of the Milvus vector index.
+
+Candidate index configurations are built over the corpus embeddings and
+searched with a held-out query set. Ground truth comes from exact search in
+NumPy, and each configuration reports recall@k, p50/p99 query latency and
+index memory, so index and search parameters can be chosen for a recall
+target.
+
+The corpus is read from the local index export (`gen_milvus.py
+--export-local`), which holds the same embeddings as the Milvus collection,
+or generated (--synthetic). Queries are questions embedded the way the app
+embeds them (--queries, one per line), or corpus vectors held out of the
+index (--holdout).
+
+Two backends build the indexes:
+
+  faiss: The FAISS equivalents of the Milvus index types, in process and
+    without a server. Milvus builds its IVF indexes with FAISS as well, so
+    recall is close; latencies exclude Milvus's network and scheduling.
+  milvus: A scratch collection on the configured Milvus server, reindexed
+    for each configuration and dropped at the end. Memory is the size of
+    the loaded segments.
+
+The best configuration reaching --target-recall (lowest p99) is printed as
+the environment variables to apply with `python gen_milvus.py --reindex`.
+
+Usage:
+  python -m benchmarks.tune_vector_index --holdout 200 --k 20
+  python -m benchmarks.tune_vector_index --backend milvus --queries questions.txt --target-recall 0.95
+  python -m benchmarks.tune_vector_index --synthetic 50000 --dim 256 --index-types HNSW IVF_SQ8 --ef 32 64 128
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.services.local_vector_store import CURRENT_POINTER
+from app.services.milvus_params import INDEX_TYPES, METRIC_TYPES, MilvusIndexConfig
+from benchmarks.results import summarize, write_results
+
+# FAISS warns when an IVF index has fewer than this many training vectors per list.
+MIN_POINTS_PER_LIST = 39
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int, metric_type: str) -> np.ndarray:
+    """
+    Exact top-k search, the ground truth of the recall measurements.
+
+    Args:
+        corpus (np.ndarray): The indexed vectors, one per row.
+        queries (np.ndarray): The query vectors, one per row.
+        k (int): Neighbors per query.
+        metric_type (str): L2, IP or COSINE.
+
+    Returns:
+        np.ndarray: The row numbers of each query's neighbors, best first.
+    """
+    if metric_type == "COSINE":
+        corpus, queries = _normalized(corpus), _normalized(queries)
+    k = min(k, len(corpus))
+    squared_norms = np.einsum("ij,ij->i", corpus, corpus) if metric_type == "L2" else None
+    neighbors = []
+    for start in range(0, len(queries), 256):
+        block = queries[start:start + 256]
+        scores = block @ corpus.T
+        if squared_norms is not None:
+            # Smaller distance is better: rank by -(|x|^2 - 2 q.x), dropping the constant |q|^2.
+            scores = 2 * scores - squared_norms
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        neighbors.append(np.take_along_axis(top, order, axis=1))
+    return np.vstack(neighbors)
+
+
+def recall_at_k(found: Sequence[Sequence[int]], truth: np.ndarray) -> float:
+    """
+    The fraction of the true top-k neighbors that a search returned, averaged over queries.
+
+    Args:
+        found (Sequence[Sequence[int]]): The row numbers each search returned.
+        truth (np.ndarray): The exact neighbors from `exact_neighbors`.
+
+    Returns:
+        float: Recall@k between 0 and 1.
+    """
+    if not len(truth):
+        return 0.0
+    return float(np.mean([len(set(ids) & set(expected)) / len(expected) for ids, expected in zip(found, truth)]))
+
+
+def candidate_configs(
+        index_types: Sequence[str],
+        base: MilvusIndexConfig,
+        nprobes: Sequence[int],
+        efs: Sequence[int],
+) -> List[MilvusIndexConfig]:
+    """
+    The configurations to measure: FLAT once, IVF types per nprobe and HNSW per ef.
+
+    Args:
+        index_types (Sequence[str]): The index types to try.
+        base (MilvusIndexConfig): Metric and build parameters shared by all candidates.
+        nprobes (Sequence[int]): IVF lists scanned per query.
+        efs (Sequence[int]): HNSW candidates explored per query.
+
+    Returns:
+        List[MilvusIndexConfig]: The candidates, grouped by index build.
+    """
+    configs: List[MilvusIndexConfig] = []
+    for index_type in index_types:
+        if index_type == "HNSW":
+            configs.extend(dataclasses.replace(base, index_type=index_type, ef=ef) for ef in efs)
+        elif index_type.startswith("IVF"):
+            configs.extend(dataclasses.replace(base, index_type=index_type, nprobe=nprobe) for nprobe in nprobes)
+        else:
+            configs.append(dataclasses.replace(base, index_type=index_type))
+    return configs
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class FaissBackend:
+    """Builds the FAISS equivalent of each Milvus index in process."""
+
+    name = "faiss"
+
+    def __init__(self, corpus: np.ndarray):
+        self.corpus = np.ascontiguousarray(corpus, dtype=np.float32)
+        self.index: Any = None
+        self._quantizer: Any = None
+
+    def build(self, config: MilvusIndexConfig) -> int:
+        """Build the index of a configuration and return its size in bytes."""
+        import faiss
+
+        vectors = _normalized(self.corpus) if config.metric_type == "COSINE" else self.corpus
+        dimension = vectors.shape[1]
+        metric = faiss.METRIC_L2 if config.metric_type == "L2" else faiss.METRIC_INNER_PRODUCT
+        index: Any
+        if config.index_type == "FLAT":
+            index = faiss.IndexFlat(dimension, metric)
+        elif config.index_type == "HNSW":
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m, metric)
+            index.hnsw.efConstruction = config.ef_construction
+        else:
+            # IVF indexes do not own their coarse quantizer, so it is kept alive here.
+            self._quantizer = faiss.IndexFlat(dimension, metric)
+            if config.index_type == "IVF_FLAT":
+                index = faiss.IndexIVFFlat(self._quantizer, dimension, config.nlist, metric)
+            elif config.index_type == "IVF_SQ8":
+                index = faiss.IndexIVFScalarQuantizer(
+                    self._quantizer, dimension, config.nlist, faiss.ScalarQuantizer.QT_8bit, metric
+                )
+            else:
+                index = faiss.IndexIVFPQ(self._quantizer, dimension, config.nlist, config.pq_m, 8, metric)
+            index.train(vectors)
+        index.add(vectors)
+        self.index = index
+        return int(faiss.serialize_index(index).nbytes)
+
+    def search(self, queries: np.ndarray, config: MilvusIndexConfig, k: int) -> Tuple[List[List[int]], List[float]]:
+        """Search each query on its own; return the row numbers found and the latencies in milliseconds."""
+        params = config.search_params(k)["params"]
+        if "nprobe" in params:
+            self.index.nprobe = params["nprobe"]
+        if "ef" in params:
+            self.index.hnsw.efSearch = params["ef"]
+        if config.metric_type == "COSINE":
+            queries = _normalized(queries)
+        found, latencies = [], []
+        for query in np.ascontiguousarray(queries, dtype=np.float32):
+            start = time.perf_counter()
+            _, ids = self.index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([int(i) for i in ids[0] if i >= 0])
+        return found, latencies
+
+    def close(self) -> None:
+        self.index = None
+        self._quantizer = None
+
+
+class MilvusBackend:
+    """Builds each index on a scratch collection of the configured Milvus server."""
+
+    name = "milvus"
+
+    def __init__(self, corpus: np.ndarray, host: str, port: int, collection_name: str):
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+
+        self.alias = "vector_index_tuning"
+        self.collection_name = collection_name
+        connections.connect(alias=self.alias, host=host, port=port)
+        if utility.has_collection(collection_name, using=self.alias):
+            utility.drop_collection(collection_name, using=self.alias)
+        schema = CollectionSchema([
+            FieldSchema("id", DataType.INT64, is_primary=True),
+            FieldSchema("vector", DataType.FLOAT_VECTOR, dim=corpus.shape[1]),
+        ])
+        self.collection = Collection(collection_name, schema, using=self.alias)
+        for start in range(0, len(corpus), 5000):
+            block = corpus[start:start + 5000]
+            self.collection.insert([list(range(start, start + len(block))), block.tolist()])
+        self.collection.flush()
+
+    def build(self, config: MilvusIndexConfig) -> int:
+        """Rebuild the scratch collection's index and return the loaded segments' size in bytes."""
+        from pymilvus import utility
+
+        self.collection.release()
+        if self.collection.has_index():
+            self.collection.drop_index()
+        self.collection.create_index("vector", config.index_params())
+        self.collection.load()
+        segments = utility.get_query_segment_info(self.collection_name, using=self.alias)
+        return int(sum(segment.mem_size for segment in segments))
+
+    def search(self, queries: np.ndarray, config: MilvusIndexConfig, k: int) -> Tuple[List[List[int]], List[float]]:
+        """Search each query on its own; return the row numbers found and the latencies in milliseconds."""
+        found, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results = self.collection.search([query.tolist()], "vector", config.search_params(k), limit=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([int(hit.id) for hit in results[0]])
+        return found, latencies
+
+    def close(self) -> None:
+        from pymilvus import connections, utility
+
+        try:
+            utility.drop_collection(self.collection_name, using=self.alias)
+        finally:
+            connections.disconnect(self.alias)
+
+
+Backend = Union[FaissBackend, MilvusBackend]
+
+
+def tune(
+        backend: Backend,
+        corpus: np.ndarray,
+        queries: np.ndarray,
+        configs: Sequence[MilvusIndexConfig],
+        k: int,
+) -> List[Dict[str, Any]]:
+    """
+    Measure every configuration, building each distinct index once.
+
+    Args:
+        backend (Backend): A FaissBackend or MilvusBackend over the corpus.
+        corpus (np.ndarray): The indexed vectors.
+        queries (np.ndarray): The held-out query vectors.
+        configs (Sequence[MilvusIndexConfig]): The candidates, with one metric type.
+        k (int): Results per query.
+
+    Returns:
+        List[Dict[str, Any]]: Per configuration, its parameters, recall@k,
+        latency summary and index memory.
+    """
+    truth = exact_neighbors(corpus, queries, k, configs[0].metric_type)
+    rows: List[Dict[str, Any]] = []
+    built: Optional[str] = None
+    memory = 0
+    for config in configs:
+        build_key = json.dumps(config.index_params(), sort_keys=True)
+        if build_key != built:
+            start = time.perf_counter()
+            memory = backend.build(config)
+            print(f"Built {build_key} in {time.perf_counter() - start:.1f}s")
+            built = build_key
+        backend.search(queries[:min(len(queries), 10)], config, k)
+        found, latencies = backend.search(queries, config, k)
+        rows.append({
+            "index_params": config.index_params(),
+            "search_params": config.search_params(k),
+            "config": dataclasses.asdict(config),
+            "recall": round(recall_at_k(found, truth), 4),
+            "memory_bytes": memory,
+            **summarize(latencies),
+        })
+    return rows
+
+
+def best_config(rows: Sequence[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """
+    The configuration with the lowest p99 latency among those reaching the recall target.
+
+    Args:
+        rows (Sequence[Dict[str, Any]]): The results of `tune`.
+        target_recall (float): The minimum recall@k.
+
+    Returns:
+        Optional[Dict[str, Any]]: The best row, or None if no configuration reaches the target.
+    """
+    eligible = [row for row in rows if row["recall"] >= target_recall]
+    return min(eligible, key=lambda row: (row["p99_ms"], row["memory_bytes"])) if eligible else None
+
+
+def _environment(config: Dict[str, Any]) -> Dict[str, str]:
+    names = {
+        "index_type": "MILVUS_INDEX_TYPE", "metric_type": "MILVUS_METRIC_TYPE", "nlist": "MILVUS_NLIST",
+        "pq_m": "MILVUS_PQ_M", "hnsw_m": "MILVUS_HNSW_M", "ef_construction": "MILVUS_EF_CONSTRUCTION",
+        "nprobe": "MILVUS_NPROBE", "ef": "MILVUS_EF",
+    }
+    return {variable: str(config[field]) for field, variable in names.items()}
+
+
+def _load_corpus(args: argparse.Namespace, rng: np.random.Generator) -> np.ndarray:
+    if args.synthetic:
+        # Clustered vectors, so approximate indexes behave as on real embeddings rather than uniform noise.
+        centers = rng.standard_normal((max(1, args.synthetic // 100), args.dim), dtype=np.float32)
+        assignments = rng.integers(0, len(centers), args.synthetic)
+        return centers[assignments] + 0.3 * rng.standard_normal((args.synthetic, args.dim), dtype=np.float32)
+    with open(os.path.join(args.index_path, CURRENT_POINTER), "r", encoding="utf-8") as file:
+        version = file.read().strip()
+    return np.asarray(np.load(os.path.join(args.index_path, version, "vectors.npy")), dtype=np.float32)
+
+
+def _load_queries(args: argparse.Namespace, corpus: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    if args.queries:
+        from app.services.llm_interaction import get_cached_embeddings
+
+        with open(args.queries, "r", encoding="utf-8") as file:
+            questions = [line.strip() for line in file if line.strip()]
+        return corpus, np.asarray(get_cached_embeddings().embed_documents(questions), dtype=np.float32)
+    held_out = rng.choice(len(corpus), size=min(args.holdout, len(corpus) // 2), replace=False)
+    mask = np.ones(len(corpus), dtype=bool)
+    mask[held_out] = False
+    return corpus[mask], corpus[held_out]
+
+
+def main() -> None:
+    defaults = MilvusIndexConfig.from_env()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["faiss", "milvus"], default="faiss")
+    parser.add_argument("--index-path", default=os.environ.get("LOCAL_INDEX_PATH", "vector_files/local_index"),
+                        help="local index export to read the corpus embeddings from")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many synthetic vectors instead")
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of the synthetic vectors")
+    parser.add_argument("--queries", help="file of held-out questions, one per line, embedded with the app's model")
+    parser.add_argument("--holdout", type=int, default=200, help="corpus vectors held out as queries without --queries")
+    parser.add_argument("--k", type=int, default=20, help="results per query; hybrid retrieval takes 20 candidates")
+    parser.add_argument("--metric", choices=METRIC_TYPES, default=defaults.metric_type)
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--nlist", type=int, default=defaults.nlist)
+    parser.add_argument("--pq-m", type=int, default=defaults.pq_m)
+    parser.add_argument("--hnsw-m", type=int, default=defaults.hnsw_m)
+    parser.add_argument("--ef-construction", type=int, default=defaults.ef_construction)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--collection", default="ayurvedic_diagnosis_tuning", help="scratch collection of --backend milvus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus, queries = _load_queries(args, _load_corpus(args, rng), rng)
+    nlist = max(1, min(args.nlist, len(corpus) // MIN_POINTS_PER_LIST))
+    if nlist != args.nlist:
+        print(f"Using nlist={nlist}: {len(corpus)} vectors are too few to train {args.nlist} lists")
+    base = MilvusIndexConfig(metric_type=args.metric, nlist=nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m,
+                             ef_construction=args.ef_construction)
+    configs = candidate_configs(args.index_types, base, args.nprobe, args.ef)
+    print(f"{len(corpus)} vectors of dimension {corpus.shape[1]}, {len(queries)} queries, k={args.k}, {args.metric}")
+
+    backend: Backend
+    if args.backend == "milvus":
+        from app.services.retrieval_service import RetrievalSettings
+
+        settings = RetrievalSettings.from_env()
+        backend = MilvusBackend(corpus, settings.milvus_host, settings.milvus_port, args.collection)
+    else:
+        backend = FaissBackend(corpus)
+    try:
+        rows = tune(backend, corpus, queries, configs, args.k)
+    finally:
+        backend.close()
+
+    for row in rows:
+        search = row["search_params"]["params"]
+        label = f"{row['index_params']['index_type']} {' '.join(f'{k}={v}' for k, v in search.items())}"
+        print(f"{label:<22} recall@{args.k} {row['recall']:.3f}   p50 {row['p50_ms']:8.3f} ms   "
+              f"p99 {row['p99_ms']:8.3f} ms   memory {row['memory_bytes'] / 2 ** 20:9.1f} MiB")
+
+    best = best_config(rows, args.target_recall)
+    if best is None:
+        print(f"No configuration reached recall {args.target_recall}.")
+    else:
+        print(f"\nFastest configuration with recall >= {args.target_recall}; apply with `python gen_milvus.py --reindex`:")
+        for variable, value in _environment(best["config"]).items():
+            print(f"  export {variable}={value}")
+    if args.output:
+        write_results(args.output, "tune_vector_index", vars(args), {"configurations": rows, "best": best})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,52 @@
-import sqlite3
+import argparse
+import logging
+from typing import Any, Dict, Iterator, List, Optional
 
-# Connect to SQLite database (or create it if it doesn't exist)
-conn = sqlite3.connect('products.db')
-cursor = conn.cursor()
+from app.services.catalog_loader import DEFAULT_BATCH_SIZE, load_catalog, read_catalog
+from app.services.database import get_database
+from app.services.product_catalog import ensure_schema
+from app.utils.logs import configure_logging
 
-# Create the products table
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS products (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        product_category TEXT NOT NULL,
-        product_name TEXT NOT NULL,
-        price REAL NOT NULL,
-        link TEXT NOT NULL,
-        ingredients TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-''')
+SAMPLE_PRODUCT = {
+    'product_category': 'Hair Oil',
+    'product_name': 'Mahaneel Tailam',
+    'price': 900.00,
+    'link': 'https://ashtveda.org/product/anti-greying-anti-hairfall-oil-mahaneel-tailam/',
+    'ingredients': 'vast, Mainfal, katsraiya, bhringraj, Loh churan, Triphala, Arjun, Neel, Til Tail, Parad Bhasam, '
+                   'Mahanila Taila',
+}
 
-# Insert sample data into the products table
-cursor.execute('''
-    INSERT INTO products (product_category, product_name, price, link, ingredients)
-    VALUES (
-        'Hair Oil', 
-        'Mahaneel Tailam', 
-        900.00, 
-        'https://ashtveda.org/product/anti-greying-anti-hairfall-oil-mahaneel-tailam/', 
-        'vast, Mainfal, katsraiya, bhringraj, Loh churan, Triphala, Arjun, Neel, Til Tail, Parad Bhasam, Mahanila Taila'
-    )
-''')
 
-# Commit changes and close the connection
-conn.commit()
-conn.close()
+def _records(paths: List[str], format: Optional[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        logging.info(f"Loading {path}...")
+        yield from read_catalog(path, format)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create the product catalog and bulk load vendor catalogs into it.")
+    parser.add_argument("catalogs", nargs="*",
+                        help="CSV or JSON lines catalog files; without any, the sample product is loaded")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="format of the files, if not their extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    defer = parser.add_mutually_exclusive_group()
+    defer.add_argument("--defer-indexes", dest="defer_indexes", action="store_true", default=None,
+                       help="build the ingredient index after the load (default for an empty catalog)")
+    defer.add_argument("--no-defer-indexes", dest="defer_indexes", action="store_false",
+                       help="index each batch as it is loaded (default for a live catalog)")
+    args = parser.parse_args()
+    configure_logging()
+
+    # Connect to SQLite database (or create it if it doesn't exist)
+    database = get_database()
+    conn = database.connection()
+    try:
+        # Create the products table and its ingredient index
+        ensure_schema(conn)
+        records = _records(args.catalogs, args.format) if args.catalogs else [SAMPLE_PRODUCT]
+        report = load_catalog(conn, records, batch_size=args.batch_size, defer_indexes=args.defer_indexes,
+                              progress=lambda progress: logging.info(progress.summary()))
+        logging.info(f"Catalog loaded: {report.summary()}")
+    finally:
+        # Close the connection
+        database.close()
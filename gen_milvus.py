@@ -1,41 +1,371 @@
+import argparse
+import hashlib
 import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
 from langchain_community.vectorstores import Milvus
 from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+from app.services.bm25_index import BM25Index
+from app.services.chunk_metadata import book_name, tag_chunk
+from app.services.llm_interaction import get_cached_embeddings
+from app.services.local_vector_store import CURRENT_POINTER, write_local_index
+from app.services.milvus_params import MilvusIndexConfig
+from app.utils.tokens import count_tokens
+from pdf_to_json.src.services.batch_manifest import file_sha256
 from pdf_to_json.src.services.grobid_service import GrobidService
+from pdf_to_json.src.services.tei_chunker import iter_tei_chunks
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 
+COLLECTION_NAME = "ayurvedic_diagnosis"
+MILVUS_CONNECTION_ARGS = {"host": "localhost", "port": 19530}
+OUTPUT_XML_DIR = os.environ.get("OUTPUT_XML_DIR", "pdf_to_json/output_xmls")
+LOCAL_INDEX_PATH = os.environ.get("LOCAL_INDEX_PATH", "vector_files/local_index")
+VECTOR_STORE_TYPE = os.environ.get("VECTOR_STORE_TYPE", "milvus")
+BM25_INDEX_PATH = os.environ.get("BM25_INDEX_PATH", "vector_files/bm25_index.json")
+INGESTION_STATE_PATH = os.environ.get("INGESTION_STATE_PATH", os.path.join(OUTPUT_XML_DIR, "ingestion_state.db"))
+
+# Chunk sizes are counted with the embedding model's tokenizer.
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 500))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 50))
+# Bump when the chunker's output changes for the same input.
+CHUNKER_VERSION = 3
+
+# Chunks embedded and inserted per Milvus request.
+INSERT_BATCH_SIZE = 256
+
+
 class Document:
     def __init__(self, content, metadata=None):
         self.page_content = content
         self.metadata = metadata if metadata is not None else {}
 
-def custom_text_splitter(documents, chunk_size=2000, max_length=65535):
-    chunks = []
-    for doc in documents:
-        text = doc.page_content
-        title = doc.metadata.get('title', '')  # Get the title from metadata if available
-        for i in range(0, len(text), chunk_size):
-            chunk = text[i:i + chunk_size]
-            chunk_metadata = {'title': title}  # Include title in each chunk's metadata
-            if len(chunk) > max_length:
-                for j in range(0, len(chunk), max_length):
-                    sub_chunk = chunk[j:j + max_length]
-                    chunks.append(Document(sub_chunk, metadata=chunk_metadata))
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Stable ID of a chunk, derived from its source document and content.
+
+    Args:
+        source (str): The path of the document the chunk comes from.
+        text (str): The chunk's text.
+
+    Returns:
+        str: A hex content hash used as the Milvus primary key.
+    """
+    return hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()
+
+
+class IngestionState:
+    """
+    SQLite record of which documents and chunks are indexed in Milvus.
+
+    A document's hash is only recorded after all of its chunk changes have
+    been applied, so an interrupted run reprocesses that document next time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                doc_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source);
+            """
+        )
+
+    def document_hash(self, source: str) -> Optional[str]:
+        row = self.conn.execute("SELECT doc_hash FROM documents WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def sources(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT source FROM documents")}
+
+    def chunk_ids(self, source: str) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,))}
+
+    def add_chunks(self, source: str, ids: Iterable[str]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, source) VALUES (?, ?)",
+                [(i, source) for i in ids],
+            )
+
+    def remove_chunks(self, ids: Iterable[str]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(i,) for i in ids])
+
+    def set_document(self, source: str, doc_hash: Optional[str]) -> None:
+        with self.conn:
+            if doc_hash is None:
+                self.conn.execute("DELETE FROM documents WHERE source = ?", (source,))
             else:
-                chunks.append(Document(chunk, metadata=chunk_metadata))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO documents (source, doc_hash) VALUES (?, ?)",
+                    (source, doc_hash),
+                )
+
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM documents")
+            self.conn.execute("DELETE FROM chunks")
+
+
+@dataclass
+class DocumentChange:
+    """Chunk changes needed to bring one document's index up to date."""
+    source: str
+    doc_hash: Optional[str]
+    added: Dict[str, Document] = field(default_factory=dict)
+    deleted: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class IngestionPlan:
+    """What an ingestion run changes, per document and in total."""
+    new_documents: List[str] = field(default_factory=list)
+    changed_documents: List[str] = field(default_factory=list)
+    removed_documents: List[str] = field(default_factory=list)
+    unchanged_documents: List[str] = field(default_factory=list)
+    changes: List[DocumentChange] = field(default_factory=list)
+
+    @property
+    def chunks_to_add(self) -> int:
+        return sum(len(change.added) for change in self.changes)
+
+    @property
+    def chunks_to_delete(self) -> int:
+        return sum(len(change.deleted) for change in self.changes)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.new_documents)} new, {len(self.changed_documents)} changed, "
+            f"{len(self.removed_documents)} removed, {len(self.unchanged_documents)} unchanged documents; "
+            f"{self.chunks_to_add} chunks to embed and insert, {self.chunks_to_delete} chunks to delete"
+        )
+
+
+def chunk_tei(tei_path: str) -> List[Document]:
+    """
+    Split a TEI document's body text into chunks tagged with their source and content.
+
+    Every chunk has the same metadata fields, which Milvus stores as the
+    collection's scalar fields (see app.services.chunk_metadata).
+
+    Args:
+        tei_path (str): The TEI file to chunk.
+
+    Returns:
+        List[Document]: The chunks, with title, section, chapter, page, source,
+        book, language, body system, dosha and topic metadata.
+    """
+    chunks = []
+    for chunk in iter_tei_chunks(
+            tei_path,
+            max_tokens=CHUNK_MAX_TOKENS,
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            count_tokens=lambda text: count_tokens(text, EMBEDDING_MODEL),
+    ):
+        metadata = {**chunk.metadata, 'source': tei_path, 'book': book_name(tei_path), **tag_chunk(chunk.text)}
+        chunks.append(Document(chunk.text, metadata=metadata))
     return chunks
 
-def create_db(pdf_paths=None, use_ocr=False, ocr_lang='eng'):
+
+def plan_ingestion(tei_paths: List[str], state: IngestionState, full_scan: bool) -> IngestionPlan:
+    """
+    Compare TEI files with the ingestion state and work out the chunk changes.
+
+    Unchanged documents (same content hash) are not re-read into chunks.
+
+    Args:
+        tei_paths (List[str]): The TEI files to ingest.
+        state (IngestionState): What is already indexed.
+        full_scan (bool): Whether `tei_paths` is the whole corpus, in which
+            case indexed documents missing from it are removed.
+
+    Returns:
+        IngestionPlan: The documents and chunks to add and delete.
+    """
+    plan = IngestionPlan()
+    for tei_path in tei_paths:
+        # The chunking settings are part of the hash, so changing them re-chunks every document.
+        doc_hash = hashlib.sha256(
+            f"{file_sha256(tei_path)}:{CHUNKER_VERSION}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}".encode("utf-8")
+        ).hexdigest()
+        previous_hash = state.document_hash(tei_path)
+        if previous_hash == doc_hash:
+            plan.unchanged_documents.append(tei_path)
+            continue
+
+        try:
+            chunks = chunk_tei(tei_path)
+        except ET.ParseError as e:
+            logging.error(f"Skipping {tei_path}, not well-formed TEI: {e}")
+            continue
+        (plan.changed_documents if previous_hash else plan.new_documents).append(tei_path)
+        current = {chunk_id(tei_path, chunk.page_content): chunk for chunk in chunks}
+        indexed = state.chunk_ids(tei_path)
+        plan.changes.append(DocumentChange(
+            source=tei_path,
+            doc_hash=doc_hash,
+            added={i: chunk for i, chunk in current.items() if i not in indexed},
+            deleted=indexed - current.keys(),
+        ))
+
+    if full_scan:
+        for source in sorted(state.sources() - set(tei_paths)):
+            plan.removed_documents.append(source)
+            plan.changes.append(DocumentChange(source=source, doc_hash=None, deleted=state.chunk_ids(source)))
+    return plan
+
+
+def apply_ingestion(plan: IngestionPlan, state: IngestionState, vector_db: Milvus) -> None:
+    """
+    Apply an ingestion plan to Milvus and record it in the state store.
+
+    Inserted chunks are first deleted by ID, so replaying a partially applied
+    plan never creates duplicates.
+
+    Args:
+        plan (IngestionPlan): The changes to apply.
+        state (IngestionState): The state store to update.
+        vector_db (Milvus): The target collection.
+    """
+    for change in plan.changes:
+        deleted = sorted(change.deleted)
+        for start in range(0, len(deleted), INSERT_BATCH_SIZE):
+            deleted_ids = deleted[start:start + INSERT_BATCH_SIZE]
+            if vector_db.col is not None:
+                vector_db.delete(ids=deleted_ids)
+            state.remove_chunks(deleted_ids)
+
+        added = list(change.added.items())
+        for start in range(0, len(added), INSERT_BATCH_SIZE):
+            added_chunks = added[start:start + INSERT_BATCH_SIZE]
+            ids = [i for i, _ in added_chunks]
+            if vector_db.col is not None:
+                vector_db.delete(ids=ids)
+            vector_db.add_texts(
+                [chunk.page_content for _, chunk in added_chunks],
+                metadatas=[chunk.metadata for _, chunk in added_chunks],
+                ids=ids,
+            )
+            state.add_chunks(change.source, ids)
+
+        state.set_document(change.source, change.doc_hash)
+        logging.info(f"Indexed {change.source}: +{len(added)} / -{len(deleted)} chunks.")
+
+
+def corpus_chunks(tei_paths: List[str]) -> Dict[str, Document]:
+    """
+    Chunk every document of the corpus.
+
+    Args:
+        tei_paths (List[str]): The whole corpus.
+
+    Returns:
+        Dict[str, Document]: Each chunk by its ID, in corpus order.
+    """
+    chunks = {}
+    for tei_path in tei_paths:
+        try:
+            for chunk in chunk_tei(tei_path):
+                chunks[chunk_id(tei_path, chunk.page_content)] = chunk
+        except ET.ParseError as e:
+            logging.error(f"Skipping {tei_path}, not well-formed TEI: {e}")
+    return chunks
+
+
+def build_bm25_index(tei_paths: List[str], path: str = BM25_INDEX_PATH) -> BM25Index:
+    """
+    Build the lexical index used by hybrid retrieval from the whole corpus.
+
+    Args:
+        tei_paths (List[str]): The whole corpus.
+        path (str): The BM25 index file to write.
+
+    Returns:
+        BM25Index: The new index.
+    """
+    index = BM25Index([
+        LangchainDocument(page_content=chunk.page_content, metadata={**chunk.metadata, 'id': i})
+        for i, chunk in corpus_chunks(tei_paths).items()
+    ])
+    index.save(path)
+    return index
+
+
+def export_local_index(tei_paths: List[str], embeddings: Embeddings, path: str = LOCAL_INDEX_PATH) -> str:
+    """
+    Export every chunk of the corpus as a new version of the local vector index.
+
+    Chunks already embedded for Milvus come from the embedding cache, so an
+    export after an ingestion run makes no embedding calls.
+
+    Args:
+        tei_paths (List[str]): The whole corpus.
+        embeddings (Embeddings): The embeddings used at query time.
+        path (str): The local index directory.
+
+    Returns:
+        str: The directory of the new index version.
+    """
+    chunks = corpus_chunks(tei_paths)
+    ids = list(chunks)
+    texts = [chunk.page_content for chunk in chunks.values()]
+    metadatas = [chunk.metadata for chunk in chunks.values()]
+
+    vectors = []
+    for start in range(0, len(texts), INSERT_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[start:start + INSERT_BATCH_SIZE]))
+    return write_local_index(path, texts, metadatas, vectors, ids)
+
+
+def rebuild_vector_index(vector_db: Milvus, index: MilvusIndexConfig) -> None:
+    """
+    Replace a collection's vector index with one built from `index`, without re-embedding.
+
+    The collection cannot be searched while the new index is built.
+
+    Args:
+        vector_db (Milvus): The collection.
+        index (MilvusIndexConfig): The index to build.
+    """
+    if vector_db.col is None:
+        logging.info("No Milvus collection to reindex.")
+        return
+    logging.info(f"Rebuilding the vector index of {COLLECTION_NAME} as {index.index_params()}...")
+    vector_db.col.release()
+    vector_db.col.drop_index()
+    vector_db.col.create_index(vector_db._vector_field, index.index_params())
+    vector_db.col.load()
+    logging.info("Vector index rebuilt.")
+
+
+def create_db(pdf_paths: Optional[List[str]] = None, use_ocr: bool = False, ocr_lang: str = 'eng', dry_run: bool = False,
+              rebuild: bool = False, state_path: str = INGESTION_STATE_PATH, vector_store_type: str = VECTOR_STORE_TYPE,
+              export_local: bool = False, reindex: bool = False) -> IngestionPlan:
     logging.info("Starting database creation process...")
-    documents = []
 
     if pdf_paths:  # Check if pdf_paths is not None and not empty
         grobid_service = GrobidService()
         tei_paths = [
-            f"/Users/rohitrathi/Downloads/Ayurvedic ayush portal bot/BharatVaidya/BharatVaidya/pdf_to_json/output_xmls/{os.path.basename(pdf_path).replace('.pdf', '.xml')}"
+            os.path.join(OUTPUT_XML_DIR, os.path.basename(pdf_path).replace('.pdf', '.xml'))
             for pdf_path in pdf_paths
         ]
 
@@ -46,39 +376,96 @@ def create_db(pdf_paths=None, use_ocr=False, ocr_lang='eng'):
             logging.info("XML files already exist. Skipping PDF to XML conversion...")
         else:
             logging.info("Converting PDFs to TEI XML...")
-            grobid_service.process_multiple_pdfs(pdf_paths, tei_paths, use_ocr=use_ocr, lang=ocr_lang)
+            manifest_path = os.path.join(os.path.dirname(tei_paths[0]), "manifest.json")
+            summary = grobid_service.process_batch(pdf_paths, tei_paths, manifest_path, use_ocr=use_ocr, lang=ocr_lang)
+            logging.info(f"PDF to XML conversion: {summary}")
 
-        for tei_path in tei_paths:
-            if os.path.exists(tei_path):
-                with open(tei_path, "r") as file:
-                    documents.append(Document(file.read()))
+        tei_paths = [tei_path for tei_path in tei_paths if os.path.exists(tei_path)]
 
     else:
-        output_xml_dir = "//pdf_to_json/output_xmls/"
-        tei_paths = [os.path.join(output_xml_dir, filename) for filename in os.listdir(output_xml_dir) if filename.endswith('.xml')]
+        tei_paths = sorted(os.path.join(OUTPUT_XML_DIR, filename) for filename in os.listdir(OUTPUT_XML_DIR) if filename.endswith('.xml'))
 
         logging.info("No PDF paths provided. Using existing XML files...")
 
-        for tei_path in tei_paths:
-            with open(tei_path, "r") as file:
-                documents.append(Document(file.read()))
+    state = IngestionState(state_path)
+    if rebuild and not dry_run and vector_store_type == "milvus":
+        logging.info("Rebuilding: dropping the Milvus collection and ingestion state...")
+        state.clear()
+
+    logging.info("Comparing documents with the ingestion state...")
+    plan = plan_ingestion(tei_paths, state, full_scan=not pdf_paths)
+    logging.info(f"Ingestion plan: {plan}")
+
+    if dry_run:
+        for label, sources in (("New", plan.new_documents), ("Changed", plan.changed_documents),
+                               ("Removed", plan.removed_documents)):
+            for source in sources:
+                logging.info(f"{label}: {source}")
+        logging.info("Dry run: Milvus and the ingestion state were not modified.")
+        return plan
 
-    logging.info("Splitting documents into chunks...")
-    texts = custom_text_splitter(documents, chunk_size=2000, max_length=65535)
+    # The API key is read from OPENAI_API_KEY.
+    embeddings = get_cached_embeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+    corpus = sorted(os.path.join(OUTPUT_XML_DIR, filename) for filename in os.listdir(OUTPUT_XML_DIR) if filename.endswith('.xml'))
+    # The ingestion state tracks the Milvus collection, so an unchanged plan means the corpus is the one
+    # the BM25 index and local export were last built from. Local-only runs do not record the state.
+    corpus_changed = rebuild or vector_store_type != "milvus" or plan.chunks_to_add > 0 or plan.chunks_to_delete > 0
 
-    logging.info("Creating embeddings and storing them in Milvus...")
-    embeddings = OpenAIEmbeddings(openai_api_key=os.environ.get("OPENAI_API_KEY"))
+    if corpus_changed or not os.path.exists(BM25_INDEX_PATH):
+        logging.info("Building the BM25 index of the corpus...")
+        build_bm25_index(corpus)
+    else:
+        logging.info("No chunks changed: keeping the BM25 index.")
+
+    if vector_store_type == "local":
+        logging.info("Exporting the corpus to the local vector index...")
+        export_local_index(corpus, embeddings)
+        logging.info("Database creation process completed.")
+        return plan
+    elif vector_store_type != "milvus":
+        raise ValueError(f"Unsupported vector store type: {vector_store_type}")
 
-    # Attempt to create the Milvus collection
+    logging.info("Creating embeddings for new chunks and storing them in Milvus...")
+    index = MilvusIndexConfig.from_env()
     try:
-        milvus_collection = Milvus.from_documents(texts, embeddings, collection_name="ayurvedic_diagnosis", connection_args={"host": "localhost", "port": 19530})
+        # The index parameters apply when the collection is created; --reindex applies them to an existing one.
+        # So do the scalar fields and the book partition key: --rebuild adds them to an older collection.
+        vector_db = Milvus(
+            embeddings,
+            collection_name=COLLECTION_NAME,
+            connection_args=MILVUS_CONNECTION_ARGS,
+            auto_id=False,
+            drop_old=rebuild,
+            index_params=index.index_params(),
+            search_params=index.search_params(),
+            partition_key_field="book",
+        )
+        apply_ingestion(plan, state, vector_db)
         logging.info("Embeddings successfully stored in Milvus.")
+        if reindex:
+            rebuild_vector_index(vector_db, index)
     except Exception as e:
         logging.error(f"Failed to create Milvus collection or store data: {e}")
 
+    if export_local and (corpus_changed or not os.path.exists(os.path.join(LOCAL_INDEX_PATH, CURRENT_POINTER))):
+        logging.info("Exporting the corpus to the local vector index...")
+        export_local_index(corpus, embeddings)
+    elif export_local:
+        logging.info("No chunks changed: keeping the local vector index.")
+
     logging.info("Database creation process completed.")
+    return plan
+
 
 if __name__ == '__main__':
-    pdf_files = None  # Set this to None or [] to skip PDF processing and use existing XMLs
+    parser = argparse.ArgumentParser(description="Incrementally index TEI documents in Milvus.")
+    parser.add_argument("pdf_files", nargs="*", help="PDFs to convert and index; defaults to every XML in OUTPUT_XML_DIR")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without modifying anything")
+    parser.add_argument("--rebuild", action="store_true", help="drop the collection and re-index everything")
+    parser.add_argument("--export-local", action="store_true", help="also export the corpus to the local vector index")
+    parser.add_argument("--reindex", action="store_true",
+                        help="rebuild the collection's vector index with the MILVUS_INDEX_TYPE/MILVUS_METRIC_TYPE settings")
+    args = parser.parse_args()
 
-    create_db(pdf_files, use_ocr=True, ocr_lang='eng+hin')
+    create_db(args.pdf_files or None, use_ocr=True, ocr_lang='eng+hin', dry_run=args.dry_run, rebuild=args.rebuild,
+              export_local=args.export_local, reindex=args.reindex)
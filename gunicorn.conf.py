@@ -0,0 +1,84 @@
+"""
+Gunicorn configuration for serving the app in production.
+
+    gunicorn --config gunicorn.conf.py run:app    (or ./run_app.sh --production)
+
+or, with the chat route on asyncio (see app.asgi):
+
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker run:application    (or ./run_app.sh --async)
+
+The app is loaded once in the master process and forked into preforked
+workers, each serving requests on a pool of threads, since chat requests
+spend most of their time waiting on OpenAI and Milvus. The hooks below
+build shared read-only data before the fork, warm each worker up before it
+accepts requests, and close its clients when it exits. On SIGTERM a worker
+stops reporting ready and gets `graceful_timeout` seconds to finish its
+in-flight requests.
+
+Environment Variables:
+  GUNICORN_BIND: Address to listen on (default: "0.0.0.0:$PORT", PORT defaulting to 5000).
+  WEB_CONCURRENCY: Worker processes (default: 2 per CPU plus 1, at most 8).
+  GUNICORN_WORKER_CLASS: Worker class (default: "gthread").
+  GUNICORN_THREADS: Request threads per gthread worker (default: 16).
+  GUNICORN_TIMEOUT: Seconds a silent worker is allowed before it is restarted (default: 120).
+  GUNICORN_GRACEFUL_TIMEOUT: Seconds a stopping worker has to drain (default: 60).
+  GUNICORN_MAX_REQUESTS: Requests after which a worker is replaced, 0 for never (default: 0).
+"""
+
+import multiprocessing
+import os
+import signal
+from types import FrameType
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from gunicorn.arbiter import Arbiter
+    from gunicorn.workers.base import Worker
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = 5
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+
+def when_ready(server: "Arbiter") -> None:
+    """Build shared read-only data in the master, after the app is loaded and before workers fork."""
+    from app.services import serving
+
+    serving.preload()
+
+
+def post_fork(server: "Arbiter", worker: "Worker") -> None:
+    # The retrieval service, OpenAI client and database pools drop inherited
+    # connections in their own at-fork hooks; they reconnect during warm-up.
+    server.log.info(f"Worker {worker.pid} forked.")
+
+
+def post_worker_init(worker: "Worker") -> None:
+    """Warm the worker up before it accepts requests, and report not ready once it is told to stop."""
+    from app.services import serving
+
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum: int, frame: Optional[FrameType]) -> None:
+        serving.begin_drain()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+    serving.warm_up()
+
+
+def worker_exit(server: "Arbiter", worker: "Worker") -> None:
+    """Close the worker's clients after it has finished its in-flight requests."""
+    from app.services import serving
+
+    serving.shutdown()
@@ -27,3 +27,11 @@ fi
 if [ -f "requires/dev.txt" ]; then
     python3.11 -m pip install -r requires/dev.txt
 fi
+
+# Check the system tools used to ingest PDFs: poppler (pdftotext reads text layers,
+# pdftoppm renders pages) and tesseract, which OCRs pages without a text layer.
+for tool in pdftotext pdftoppm tesseract; do
+    if ! command -v "$tool" > /dev/null; then
+        echo "Warning: $tool not found. Install poppler-utils and tesseract-ocr to ingest PDFs."
+    fi
+done
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file's contents.
+
+    Args:
+        path (str): The file to hash.
+        chunk_size (int): Bytes read at a time.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchManifest:
+    """
+    A JSON record of the conversion status of each PDF in a batch.
+
+    Entries are keyed by the PDF's content hash (with the OCR settings, if it
+    is OCRed), so a renamed or moved file is still recognised as converted,
+    and an edited file is converted again.
+    The file is rewritten atomically after every update, so an interrupted
+    batch can be resumed from the last completed file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self._entries = json.load(file).get("files", {})
+            logging.info(f"Loaded manifest with {len(self._entries)} entries from: {path}")
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(sha256)
+            return dict(entry) if entry else None
+
+    def is_done(self, sha256: str, tei_path: str) -> bool:
+        """
+        Check whether a PDF was converted to `tei_path` and that file still exists.
+
+        Args:
+            sha256 (str): The content hash of the PDF.
+            tei_path (str): Where the PDF's TEI is requested.
+
+        Returns:
+            bool: True if the PDF can be skipped.
+        """
+        converted = self.converted_tei_path(sha256)
+        return bool(converted and os.path.abspath(converted) == os.path.abspath(tei_path))
+
+    def converted_tei_path(self, sha256: str) -> Optional[str]:
+        """
+        Find the TEI output of an earlier conversion of a PDF, wherever it was saved.
+
+        Args:
+            sha256 (str): The content hash of the PDF.
+
+        Returns:
+            Optional[str]: The recorded TEI path if the PDF was converted and it still exists.
+        """
+        entry = self.get(sha256)
+        if entry and entry["status"] == STATUS_DONE and os.path.exists(entry["tei_path"]):
+            return entry["tei_path"]
+        return None
+
+    def update(self, sha256: str, **fields: Any) -> None:
+        """
+        Update a PDF's entry and write the manifest to disk.
+
+        Args:
+            sha256 (str): The content hash of the PDF.
+            **fields: The entry fields to set.
+        """
+        with self._lock:
+            self._entries.setdefault(sha256, {}).update(fields)
+            self._save()
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8"
+        ) as file:
+            json.dump({"files": self._entries}, file, indent=2, sort_keys=True)
+            temp_path = file.name
+        os.replace(temp_path, self.path)
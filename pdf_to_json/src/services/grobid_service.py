@@ -1,31 +1,240 @@
 import logging
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import multiprocessing
 import os
+import re
+import shutil
+import subprocess
+import threading
+import time
 import requests
-from pdf2image import convert_from_path
+from PIL.Image import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
 from fpdf import FPDF
 import tempfile
 
+from pdf_to_json.src.services.batch_manifest import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    BatchManifest,
+    file_sha256,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Fewest pages rasterised and OCRed at a time by convert_pdf_to_ocr_pdf; the
+# default window is two pages per OCR worker, so every worker stays busy.
+OCR_WINDOW_SIZE = 8
+
+# Word characters a page's text layer needs for the page to skip OCR.
+MIN_TEXT_LAYER_CHARS = 100
+
+_WORD_CHARS = re.compile(r"\w", re.UNICODE)
+
+_ocr_executor: Optional[ProcessPoolExecutor] = None
+_ocr_executor_lock = threading.Lock()
+
+
+def _ocr_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _ocr_pool() -> ProcessPoolExecutor:
+    """Return the process pool shared by all OCR conversions, one worker per core."""
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ProcessPoolExecutor(
+                max_workers=_ocr_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _ocr_executor
+
+
+def _ocr_page(image: Image, lang: str) -> str:
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def _page_hash(image: Image, lang: str) -> str:
+    digest = hashlib.sha256(lang.encode())
+    digest.update(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _extract_text_layer(pdf_path: str, page_count: int) -> List[str]:
+    """Return the embedded text of every page, or empty strings if unavailable."""
+    try:
+        result = subprocess.run(
+            ["pdftotext", "-layout", pdf_path, "-"],
+            capture_output=True, check=True, timeout=600,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning(f"Could not read the text layer of {pdf_path}, OCRing every page: {e}")
+        return [""] * page_count
+    pages = result.stdout.decode("utf-8", "replace").split("\f")[:page_count]
+    return pages + [""] * (page_count - len(pages))
+
+
+def _contiguous_runs(page_numbers: List[int]) -> Iterator[Tuple[int, int]]:
+    """Yield (first, last) ranges covering sorted page numbers."""
+    start = previous = page_numbers[0]
+    for number in page_numbers[1:]:
+        if number != previous + 1:
+            yield start, previous
+            start = number
+        previous = number
+    yield start, previous
+
+
+def _manifest_key(sha256: str, use_ocr: bool, lang: str) -> str:
+    """The manifest key of a PDF: its content hash, plus the OCR languages if it is OCRed."""
+    return f"{sha256}:ocr:{lang}" if use_ocr else sha256
+
+
+class GrobidError(Exception):
+    """Raised when the GROBID server fails to convert a PDF."""
+
+
+@dataclass
+class BatchSummary:
+    """
+    Outcome of a batch conversion.
+
+    Attributes:
+        total (int): Number of PDFs in the batch.
+        converted (int): PDFs converted in this run.
+        skipped (int): PDFs not sent to the server, their TEI already saved or copied from an earlier conversion.
+        failed (Dict[str, str]): PDFs that could not be converted, with the last error.
+        elapsed_seconds (float): Wall-clock duration of the batch.
+        bytes_converted (int): Total size of the PDFs converted in this run.
+    """
+    total: int = 0
+    converted: int = 0
+    skipped: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed_seconds: float = 0.0
+    bytes_converted: int = 0
+
+    @property
+    def files_per_minute(self) -> float:
+        return self.converted * 60 / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes_converted / 1e6 / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.converted} converted, {self.skipped} skipped, {len(self.failed)} failed "
+            f"of {self.total} PDFs in {self.elapsed_seconds:.1f}s "
+            f"({self.files_per_minute:.2f} files/min, {self.megabytes_per_second:.2f} MB/s)"
+        )
+
+
 class GrobidService:
     """
     A service class for interacting with a GROBID server to process PDF
     documents and convert them into structured TEI format.
+
+    Requests to the same server are capped at `max_concurrency` in flight
+    across all GrobidService instances of the process, since GROBID answers
+    503 when its own pool is exhausted; every instance for one server must
+    use the same cap. OCR output is cached per page in `ocr_cache_dir`.
+
+    Raises:
+        ValueError: If another instance uses a different `max_concurrency` for the same server.
     """
-    def __init__(self, base_url: str = "http://34.100.191.240:8070"):
+    _server_slots: Dict[str, Tuple[int, threading.BoundedSemaphore]] = {}
+    _server_slots_lock = threading.Lock()
+
+    def __init__(
+            self,
+            base_url: str = "http://34.100.191.240:8070",
+            max_concurrency: int = 4,
+            ocr_cache_dir: Optional[str] = None,
+    ):
         self.base_url: str = base_url
+        self.ocr_cache_dir: str = ocr_cache_dir or os.path.join(tempfile.gettempdir(), "grobid_ocr_cache")
+        os.makedirs(self.ocr_cache_dir, exist_ok=True)
+        with self._server_slots_lock:
+            if base_url not in self._server_slots:
+                self._server_slots[base_url] = (max_concurrency, threading.BoundedSemaphore(max_concurrency))
+            limit, self._slots = self._server_slots[base_url]
+        if limit != max_concurrency:
+            raise ValueError(
+                f"GROBID server {base_url} is already capped at {limit} concurrent requests, not {max_concurrency}"
+            )
+
+    def convert_pdf_to_ocr_pdf(
+            self,
+            pdf_path: str,
+            output_path: str,
+            lang: str = 'eng',
+            dpi: int = 300,
+            window_size: Optional[int] = None,
+    ) -> None:
+        """
+        Produce a text PDF from a scanned PDF, one output page per input page.
+
+        Pages that already carry a usable text layer are copied as text
+        without OCR. The remaining pages are rasterised `window_size` at a
+        time, so memory stays bounded regardless of book length, and OCRed in
+        parallel on a process pool. OCR output is cached by the hash of the
+        rendered page, so a rerun only OCRs pages that changed.
 
-    def convert_pdf_to_ocr_pdf(self, pdf_path: str, output_path: str, lang: str = 'eng'):
+        Args:
+            pdf_path (str): The scanned PDF.
+            output_path (str): Where to write the text PDF.
+            lang (str): Tesseract language(s).
+            dpi (int): Resolution of rasterised pages.
+            window_size (Optional[int]): Pages rasterised at a time; defaults to
+                two per OCR worker, and at least OCR_WINDOW_SIZE.
+        """
+        window_size = window_size or max(OCR_WINDOW_SIZE, 2 * _ocr_workers())
         logging.info(f"Starting OCR conversion for: {pdf_path}")
-        pages = convert_from_path(pdf_path, 300)
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        text_pages = _extract_text_layer(pdf_path, page_count)
+        ocr_page_numbers = [
+            number for number, text in enumerate(text_pages, start=1)
+            if len(_WORD_CHARS.findall(text)) < MIN_TEXT_LAYER_CHARS
+        ]
+        logging.info(
+            f"{page_count - len(ocr_page_numbers)} of {page_count} pages have a text layer; "
+            f"OCRing {len(ocr_page_numbers)} pages in windows of {window_size}."
+        )
 
-        text_pages = []
-        for page in pages:
-            text = pytesseract.image_to_string(page, lang=lang)
-            text_pages.append(text)
+        cache_hits = 0
+        for window_start in range(0, len(ocr_page_numbers), window_size):
+            window = ocr_page_numbers[window_start:window_start + window_size]
+            images: Dict[int, Image] = {}
+            for first_page, last_page in _contiguous_runs(window):
+                rendered = convert_from_path(pdf_path, dpi, first_page=first_page, last_page=last_page)
+                images.update(zip(range(first_page, last_page + 1), rendered))
+
+            pending = {}
+            for number, image in images.items():
+                cache_path = os.path.join(self.ocr_cache_dir, f"{_page_hash(image, lang)}.txt")
+                if os.path.exists(cache_path):
+                    with open(cache_path, "r", encoding="utf-8") as cache_file:
+                        text_pages[number - 1] = cache_file.read()
+                    cache_hits += 1
+                else:
+                    pending[number] = (cache_path, _ocr_pool().submit(_ocr_page, image, lang))
+            del images
+
+            for number, (cache_path, future) in pending.items():
+                text = future.result()
+                text_pages[number - 1] = text
+                with open(cache_path, "w", encoding="utf-8") as cache_file:
+                    cache_file.write(text)
+            logging.info(f"OCRed pages {window[0]}-{window[-1]} of {pdf_path}")
 
         pdf = FPDF()
         pdf.set_auto_page_break(auto=True, margin=15)
@@ -39,9 +248,31 @@ class GrobidService:
             pdf.multi_cell(0, 10, text.encode('latin-1', 'replace').decode('latin-1'))
 
         pdf.output(output_path)
-        logging.info(f"OCR conversion completed for: {pdf_path}, saved to: {output_path}")
+        logging.info(
+            f"OCR conversion completed for: {pdf_path}, saved to: {output_path} "
+            f"({cache_hits} pages from the OCR cache)"
+        )
 
-    def process_pdf(
+    def _request_tei(self, input_pdf_path: str, timeout: Tuple[int, int]) -> str:
+        with self._slots:
+            try:
+                with open(input_pdf_path, "rb") as file:
+                    files = {"input": (input_pdf_path, file, "application/pdf")}
+                    response = requests.post(
+                        f"{self.base_url}/api/processFulltextDocument",
+                        files=files,
+                        timeout=timeout
+                    )
+            except requests.exceptions.Timeout:
+                raise GrobidError("The request timed out.")
+            except requests.exceptions.RequestException as e:
+                raise GrobidError(str(e))
+
+        if response.status_code != 200:
+            raise GrobidError(f"GROBID server returned status code: {response.status_code}")
+        return response.text
+
+    def convert_pdf(
             self,
             input_pdf_path: str,
             output_tei_path: str,
@@ -49,36 +280,46 @@ class GrobidService:
             use_ocr: bool = False,
             lang: str = 'eng'
     ) -> str:
+        """
+        Convert a PDF to TEI and save it, raising on failure.
+
+        Returns:
+            str: The TEI XML.
+
+        Raises:
+            GrobidError: If the server fails to convert the PDF.
+        """
         logging.info(f"Processing PDF: {input_pdf_path}")
+        ocr_pdf_path = None
         if use_ocr:
             with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
                 ocr_pdf_path = temp_file.name
             self.convert_pdf_to_ocr_pdf(input_pdf_path, ocr_pdf_path, lang=lang)
-            input_pdf_path = ocr_pdf_path
 
         try:
-            with open(input_pdf_path, "rb") as file:
-                files = {"input": (input_pdf_path, file, "application/pdf")}
-                response = requests.post(
-                    f"{self.base_url}/api/processFulltextDocument",
-                    files=files,
-                    timeout=timeout
-                )
-
-            if response.status_code == 200:
-                with open(output_tei_path, "w", encoding="utf-8") as output_file:
-                    output_file.write(response.text)
-                logging.info(f"Successfully processed PDF: {input_pdf_path}, TEI saved to: {output_tei_path}")
-                return response.text
-            else:
-                error_message = f"GROBID server returned status code: {response.status_code}"
-                logging.error(error_message)
-                return error_message
-
-        except requests.exceptions.Timeout:
-            error_message = "The request timed out."
-            logging.error(error_message)
-            return error_message
+            tei = self._request_tei(ocr_pdf_path or input_pdf_path, timeout)
+        finally:
+            if ocr_pdf_path:
+                os.remove(ocr_pdf_path)
+
+        with open(output_tei_path, "w", encoding="utf-8") as output_file:
+            output_file.write(tei)
+        logging.info(f"Successfully processed PDF: {input_pdf_path}, TEI saved to: {output_tei_path}")
+        return tei
+
+    def process_pdf(
+            self,
+            input_pdf_path: str,
+            output_tei_path: str,
+            timeout: Tuple[int, int] = (120, 1200),
+            use_ocr: bool = False,
+            lang: str = 'eng'
+    ) -> str:
+        try:
+            return self.convert_pdf(input_pdf_path, output_tei_path, timeout, use_ocr, lang)
+        except GrobidError as e:
+            logging.error(str(e))
+            return str(e)
         except Exception as e:
             logging.error(f"An error occurred while processing PDF: {input_pdf_path}, Error: {e}")
             return str(e)
@@ -98,3 +339,115 @@ class GrobidService:
             results.append(result)
         logging.info("Batch processing completed.")
         return results
+
+    def process_batch(
+            self,
+            input_pdf_paths: List[str],
+            output_tei_paths: List[str],
+            manifest_path: str,
+            max_workers: int = 4,
+            retries: int = 2,
+            retry_delay: float = 10.0,
+            timeout: Tuple[int, int] = (120, 1200),
+            use_ocr: bool = False,
+            lang: str = 'eng'
+    ) -> BatchSummary:
+        """
+        Convert PDFs concurrently, recording progress in a resumable manifest.
+
+        PDFs whose content hash and OCR settings the manifest already lists as
+        converted to the requested TEI file, with that file still present, are
+        skipped. If the PDF was converted with the same settings to another TEI
+        file that still exists, that file is copied to the requested path
+        instead of converting again. Identical PDFs in one batch are converted
+        once. Failed PDFs are retried up to
+        `retries` times with a linearly growing delay, and again on the next
+        run.
+
+        Args:
+            input_pdf_paths (List[str]): The PDFs to convert.
+            output_tei_paths (List[str]): Where to save each PDF's TEI.
+            manifest_path (str): The JSON manifest to read and update.
+            max_workers (int): PDFs converted at once; requests to the server
+                are further capped by the service's `max_concurrency`.
+            retries (int): Extra attempts per PDF after a failure.
+            retry_delay (float): Seconds to wait before the first retry.
+            timeout (Tuple[int, int]): Connect and read timeouts per request.
+            use_ocr (bool): Whether to OCR the PDFs before conversion.
+            lang (str): Tesseract language(s) for OCR.
+
+        Returns:
+            BatchSummary: Counts, failures and throughput of the batch.
+        """
+        manifest = BatchManifest(manifest_path)
+        summary = BatchSummary(total=len(input_pdf_paths))
+        summary_lock = threading.Lock()
+        # One lock per content hash, so identical PDFs are not converted concurrently.
+        hash_locks: Dict[str, threading.Lock] = {}
+        start = time.monotonic()
+        logging.info(f"Starting concurrent batch of {summary.total} PDFs with {max_workers} workers...")
+
+        def convert(input_pdf_path: str, output_tei_path: str) -> None:
+            key = _manifest_key(file_sha256(input_pdf_path), use_ocr, lang)
+            with summary_lock:
+                hash_lock = hash_locks.setdefault(key, threading.Lock())
+            with hash_lock:
+                convert_once(input_pdf_path, output_tei_path, key)
+
+        def convert_once(input_pdf_path: str, output_tei_path: str, key: str) -> None:
+            if manifest.is_done(key, output_tei_path):
+                logging.info(f"Skipping already converted PDF: {input_pdf_path}")
+                with summary_lock:
+                    summary.skipped += 1
+                return
+            converted_tei_path = manifest.converted_tei_path(key)
+            if converted_tei_path:
+                shutil.copyfile(converted_tei_path, output_tei_path)
+                logging.info(f"Copied TEI of already converted PDF: {input_pdf_path} from {converted_tei_path}")
+                with summary_lock:
+                    summary.skipped += 1
+                return
+
+            error: Optional[str] = None
+            for attempt in range(1, retries + 2):
+                manifest.update(key, pdf_path=input_pdf_path, tei_path=output_tei_path,
+                                status=STATUS_PENDING, attempts=attempt)
+                attempt_start = time.monotonic()
+                try:
+                    self.convert_pdf(input_pdf_path, output_tei_path, timeout, use_ocr, lang)
+                except Exception as e:
+                    error = str(e)
+                    logging.warning(f"Attempt {attempt} failed for PDF: {input_pdf_path}, Error: {error}")
+                    if attempt <= retries:
+                        time.sleep(retry_delay * attempt)
+                    continue
+
+                manifest.update(key, status=STATUS_DONE, error=None,
+                                seconds=round(time.monotonic() - attempt_start, 2))
+                with summary_lock:
+                    summary.converted += 1
+                    summary.bytes_converted += os.path.getsize(input_pdf_path)
+                return
+
+            manifest.update(key, status=STATUS_FAILED, error=error)
+            with summary_lock:
+                summary.failed[input_pdf_path] = error or "unknown error"
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(convert, input_pdf_path, output_tei_path): input_pdf_path
+                for input_pdf_path, output_tei_path in zip(input_pdf_paths, output_tei_paths)
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"An error occurred while processing PDF: {futures[future]}, Error: {e}")
+                    with summary_lock:
+                        summary.failed[futures[future]] = str(e)
+
+        summary.elapsed_seconds = time.monotonic() - start
+        logging.info(f"Batch processing completed: {summary}")
+        for input_pdf_path, error in summary.failed.items():
+            logging.error(f"Failed to convert PDF: {input_pdf_path}, Error: {error}")
+        return summary
@@ -0,0 +1,214 @@
+"""
+Module for splitting GROBID TEI documents into retrieval chunks.
+
+The TEI file is stream-parsed with `iterparse` and elements are cleared as
+soon as they are consumed, so memory stays constant regardless of document
+size. Only the text of `<head>` and `<p>` elements in the `<body>` is kept;
+tags, the `<teiHeader>` and the bibliography in `<back>` are never embedded.
+Chunks never span two sections: a `<div>` or `<head>` starts a new chunk.
+Within a section, paragraphs are packed up to a token budget, oversized
+paragraphs are split at sentence and then word boundaries, and consecutive
+chunks share a configurable token overlap.
+
+Each chunk carries the document title (from the TEI header), the heading of
+its section, the chapter it belongs to (the latest heading that names a
+chapter or adhyaya; empty before the first) and the page it starts on (from
+`<pb>` milestones or GROBID `coords` attributes; 0 if unknown).
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Iterator, List, Tuple, Union
+
+DEFAULT_MAX_TOKENS = 500
+DEFAULT_OVERLAP_TOKENS = 50
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।॥])\s+")
+_WHITESPACE = re.compile(r"\s+")
+_CHAPTER_HEAD = re.compile(r"^\W*(?:chapter|adhy[aā]ya|अध्याय)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate tokens as one per four characters."""
+    return -(-len(text) // 4)
+
+
+@dataclass
+class TeiChunk:
+    """A chunk of TEI body text and its metadata (title, section, chapter, page)."""
+    text: str
+    metadata: Dict[str, Any]
+
+
+class _ChunkBuilder:
+    def __init__(self, max_tokens: int, overlap_tokens: int, count_tokens: Callable[[str], int]):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens
+        self.title = ""
+        self._units: List[Tuple[str, int]] = []
+        self._tokens = 0
+        self._fresh = False
+        self._section = ""
+        self._chapter = ""
+        self._page = 0
+
+    def add(self, text: str, section: str, page: int, chapter: str = "") -> Iterator[TeiChunk]:
+        for piece in self._split(text):
+            tokens = self.count_tokens(piece)
+            if self._fresh and self._tokens + tokens > self.max_tokens:
+                yield self._emit()
+                self._carry_overlap()
+            if not self._fresh:
+                self._section, self._chapter, self._page = section, chapter, page
+                # Drop carried overlap that would push the chunk over budget.
+                while self._units and self._tokens + tokens > self.max_tokens:
+                    self._tokens -= self._units.pop(0)[1]
+            self._units.append((piece, tokens))
+            self._tokens += tokens
+            self._fresh = True
+
+    def flush(self) -> Iterator[TeiChunk]:
+        if self._fresh:
+            yield self._emit()
+        self._units, self._tokens, self._fresh = [], 0, False
+
+    def _emit(self) -> TeiChunk:
+        text = " ".join(unit for unit, _ in self._units)
+        return TeiChunk(
+            text, {"title": self.title, "section": self._section, "chapter": self._chapter, "page": self._page}
+        )
+
+    def _carry_overlap(self) -> None:
+        carried: List[Tuple[str, int]] = []
+        budget = self.overlap_tokens
+        for unit, tokens in reversed(self._units):
+            if tokens > budget:
+                tail = self._tail(unit, budget)
+                if tail:
+                    carried.insert(0, (tail, self.count_tokens(tail)))
+                break
+            carried.insert(0, (unit, tokens))
+            budget -= tokens
+        self._units = carried
+        self._tokens = sum(tokens for _, tokens in carried)
+        self._fresh = False
+
+    def _tail(self, text: str, budget: int) -> str:
+        words = text.split(" ")
+        tail: List[str] = []
+        while words and self.count_tokens(" ".join([words[-1]] + tail)) <= budget:
+            tail.insert(0, words.pop())
+        return " ".join(tail)
+
+    def _split(self, text: str) -> List[str]:
+        if self.count_tokens(text) <= self.max_tokens:
+            return [text]
+        # Pieces of an oversized paragraph leave room for the carried overlap.
+        limit = max(1, self.max_tokens - self.overlap_tokens)
+        pieces: List[str] = []
+        for sentence in _SENTENCE_END.split(text):
+            if self.count_tokens(sentence) <= limit:
+                pieces.append(sentence)
+                continue
+            current: List[str] = []
+            for word in sentence.split(" "):
+                if current and self.count_tokens(" ".join(current + [word])) > limit:
+                    pieces.append(" ".join(current))
+                    current = []
+                current.append(word)
+            if current:
+                pieces.append(" ".join(current))
+        return pieces
+
+
+def _local_name(tag: Any) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _text_of(element: ET.Element) -> str:
+    return _WHITESPACE.sub(" ", "".join(element.itertext())).strip()
+
+
+def _page_of(element: ET.Element, default: int) -> int:
+    coords = element.get("coords")
+    if coords:
+        first = coords.split(";", 1)[0].split(",", 1)[0]
+        if first.isdigit():
+            return int(first)
+    return default
+
+
+def iter_tei_chunks(
+        source: Union[str, IO[bytes]],
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[TeiChunk]:
+    """
+    Stream-parse a TEI document and yield its body text as chunks.
+
+    Args:
+        source (Union[str, IO[bytes]]): Path or binary file object of the TEI XML.
+        max_tokens (int): Largest chunk size in tokens.
+        overlap_tokens (int): Tokens repeated from the end of the previous
+            chunk of the same section.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text.
+
+    Yields:
+        TeiChunk: The chunks, in document order.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the document is not well-formed XML.
+    """
+    builder = _ChunkBuilder(max_tokens, overlap_tokens, count_tokens)
+    in_header = in_body = False
+    section = chapter = ""
+    page = 0
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        tag = _local_name(element.tag)
+        if event == "start":
+            if tag == "teiHeader":
+                in_header = True
+            elif tag == "body":
+                in_body = True
+            elif in_body and tag == "div":
+                yield from builder.flush()
+                section = ""
+            elif in_body and tag == "pb":
+                number = element.get("n", "")
+                page = int(number) if number.isdigit() else page + 1
+            continue
+
+        if in_header:
+            if tag == "title" and not builder.title and element.get("type", "main") == "main":
+                builder.title = _text_of(element)
+            elif tag == "teiHeader":
+                in_header = False
+                element.clear()
+        elif in_body:
+            if tag == "head":
+                yield from builder.flush()
+                section = _text_of(element)
+                page = _page_of(element, page)
+                if _CHAPTER_HEAD.match(section):
+                    chapter = section
+                if section:
+                    yield from builder.add(section, section, page, chapter)
+                element.clear()
+            elif tag == "p":
+                page = _page_of(element, page)
+                text = _text_of(element)
+                if text:
+                    yield from builder.add(text, section, page, chapter)
+                element.clear()
+            elif tag == "div":
+                element.clear()
+            elif tag == "body":
+                in_body = False
+                yield from builder.flush()
+                element.clear()
+        elif tag in ("back", "front"):
+            element.clear()
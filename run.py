@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app import app
+from app.asgi import application
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -3,10 +3,20 @@
 # Navigate to the project root directory
 cd "$(dirname "$0")"
 
+# Production with the chat route on asyncio: preforked uvicorn workers (see app/asgi.py)
+if [ "$1" = "--async" ]; then
+    exec gunicorn --config gunicorn.conf.py --worker-class uvicorn.workers.UvicornWorker run:application
+fi
+
+# Production: preforked gunicorn workers (see gunicorn.conf.py)
+if [ "$1" = "--production" ] || [ "$APP_ENV" = "production" ]; then
+    exec gunicorn --config gunicorn.conf.py run:app
+fi
+
 # Set up the environment variables
 export FLASK_APP=run.py
 export FLASK_ENV=development  # Optional: Enables debug mode
 export FLASK_RUN_PORT=5000
 
 # Run the Flask app
-flask --app run.py --debug run
\ No newline at end of file
+flask --app run.py --debug run
@@ -0,0 +1,124 @@
+"""
+A local stand-in for the OpenAI chat completions and embeddings APIs.
+
+The server answers every chat completion with a fixed reply, either as one
+JSON body or, when the request sets "stream", as Server-Sent Events with one
+chunk per word. Embedding requests get `fake_embedding` of each input, so
+the same text always has the same vector. Responses queued in `failures` as
+(status, headers) pairs are returned first, one per request. Every request
+waits `latency` seconds. Point OPENAI_API_BASE at `FakeOpenAIServer.url` to
+use it; the benchmarks use it as well as the tests.
+
+Classes:
+  FakeOpenAIServer: Threaded HTTP server running in the background.
+
+Functions:
+  fake_embedding: Deterministic bag-of-words embedding of a text.
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSION = 64
+
+
+def fake_embedding(text, dimension=EMBEDDING_DIMENSION):
+  """Hash each word of the text into one of `dimension` buckets and normalize."""
+  vector = [0.0] * dimension
+  for word in re.findall(r"\w+", str(text).lower()):
+    vector[int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % dimension] += 1.0
+  norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+  return [value / norm for value in vector]
+
+
+class _Handler(BaseHTTPRequestHandler):
+  server: "FakeOpenAIServer"
+
+  def log_message(self, format, *args):
+    pass
+
+  def do_POST(self):
+    length = int(self.headers.get("Content-Length", 0))
+    body = json.loads(self.rfile.read(length) or b"{}")
+    self.server.requests.append(body)
+    if self.server.latency:
+      time.sleep(self.server.latency)
+
+    if not self.path.endswith(("/chat/completions", "/embeddings")):
+      self.send_error(404)
+      return
+
+    if self.server.failures:
+      status, headers = self.server.failures.pop(0)
+      self.send_response(status)
+      for name, value in headers.items():
+        self.send_header(name, value)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+
+    if self.path.endswith("/embeddings"):
+      inputs = body.get("input", [])
+      inputs = inputs if isinstance(inputs, list) else [inputs]
+      self._send_json({
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, self.server.dimension)}
+                 for i, text in enumerate(inputs)],
+        "model": body.get("model", ""),
+        "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+      })
+      return
+
+    if body.get("stream"):
+      self.send_response(200)
+      self.send_header("Content-Type", "text/event-stream")
+      self.end_headers()
+      for word in self.server.reply.split(" "):
+        chunk = {"choices": [{"delta": {"content": word + " "}}]}
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.flush()
+      self.wfile.write(b"data: [DONE]\n\n")
+      return
+
+    self._send_json({
+      "choices": [{"message": {"role": "assistant", "content": self.server.reply}}],
+      "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    })
+
+  def _send_json(self, body):
+    payload = json.dumps(body).encode()
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, reply="Hello", latency=0.0, dimension=EMBEDDING_DIMENSION):
+    super().__init__(("127.0.0.1", 0), _Handler)
+    self.reply = reply
+    self.latency = latency
+    self.dimension = dimension
+    self.requests = []
+    self.failures = []
+    self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+  @property
+  def url(self):
+    return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+  def __enter__(self):
+    self._thread.start()
+    return self
+
+  def __exit__(self, *exc):
+    self.shutdown()
+    self.server_close()
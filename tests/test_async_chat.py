@@ -0,0 +1,278 @@
+"""
+Unit tests for the asyncio request path and the ASGI application.
+
+Classes:
+  TestAsyncOpenAIClient: A test case class for AsyncOpenAIClient and achat_with_gpt.
+  TestAsyncSingleFlight: A test case class for the AsyncSingleFlight class.
+  TestAsyncRetrieval: A test case class for RetrievalService.aretrieve.
+  TestAsgiApp: A test case class for the async routes and the WSGI fallback.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+
+from app import app
+from app.asgi import application
+from app.routes import chat_gpt_routes
+from app.services import chat_gpt_service, retrieval_service
+from app.services.bm25_index import BM25Index
+from app.services.local_vector_store import write_local_index
+from app.services.openai_client import AsyncOpenAIClient, OpenAIError
+from app.services.rag_pipeline import PipelineResult
+from app.services.retrieval_service import RetrievalService, RetrievalSettings
+from app.services.single_flight import AsyncSingleFlight
+from tests.test_hybrid_retriever import DOCUMENTS, _ids
+from tests.test_local_vector_store import BagOfWordsEmbeddings
+
+
+def _completion(content):
+  return {"choices": [{"message": {"content": content}}], "usage": {"total_tokens": 3}}
+
+
+def _client(responses, requests):
+  def handler(request):
+    requests.append(json.loads(request.content))
+    status, headers, body = responses.pop(0)
+    return httpx.Response(status, headers=headers, json=body)
+
+  return AsyncOpenAIClient("key", "https://api.test/v1", transport=httpx.MockTransport(handler))
+
+
+@patch("app.services.openai_client.asyncio.sleep", new_callable=AsyncMock)
+class TestAsyncOpenAIClient(unittest.IsolatedAsyncioTestCase):
+  async def test_retries_honour_retry_after(self, sleep):
+    requests = []
+    client = _client([(429, {"Retry-After": "7"}, {}), (200, {}, _completion("ok"))], requests)
+    response = await client.post("/chat/completions", {"messages": []})
+    await client.aclose()
+
+    self.assertEqual(response["choices"][0]["message"]["content"], "ok")
+    self.assertEqual(len(requests), 2)
+    self.assertGreaterEqual(sleep.call_args.args[0], 7)
+
+  async def test_client_errors_are_not_retried(self, sleep):
+    client = _client([(400, {}, {"error": "bad"})], [])
+    with self.assertRaises(OpenAIError) as raised:
+      await client.post("/chat/completions", {"messages": []})
+    await client.aclose()
+    self.assertEqual(raised.exception.status_code, 400)
+    sleep.assert_not_called()
+
+  async def test_achat_with_gpt_formats_the_answer(self, sleep):
+    requests = []
+    client = _client([(200, {}, _completion("Apply **neem** oil"))], requests)
+    with patch.object(chat_gpt_service, "get_async_openai_client", return_value=client):
+      response = await chat_gpt_service.achat_with_gpt([{"role": "user", "content": "acne"}])
+    self.assertEqual(response["message"], "Apply <strong>neem</strong> oil")
+    self.assertEqual(requests[0]["messages"][-1]["content"], "acne")
+
+    client = _client([(429, {"Retry-After": "3"}, {})] * 5, [])
+    with patch.object(chat_gpt_service, "get_async_openai_client", return_value=client):
+      response = await chat_gpt_service.achat_with_gpt([{"role": "user", "content": "acne"}])
+    self.assertEqual(response["retry_after"], 3)
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+  async def test_concurrent_callers_share_one_call(self):
+    flight = AsyncSingleFlight("test_async_shared")
+    release = asyncio.Event()
+    calls = []
+
+    async def compute():
+      calls.append(1)
+      await release.wait()
+      return "answer"
+
+    callers = [asyncio.ensure_future(flight.do("key", compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    self.assertEqual(flight.in_flight(), 1)
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    self.assertEqual(calls, [1])
+    self.assertEqual([shared for _, shared in results], [False, True, True])
+    self.assertEqual(flight.in_flight(), 0)
+
+  async def test_errors_are_shared_and_cancelled_waiters_do_not_cancel_the_call(self):
+    flight = AsyncSingleFlight("test_async_error")
+    release = asyncio.Event()
+
+    async def fail():
+      await release.wait()
+      raise ValueError("upstream failed")
+
+    leader = asyncio.ensure_future(flight.do("key", fail))
+    follower = asyncio.ensure_future(flight.do("key", fail))
+    waiter = asyncio.ensure_future(flight.do("key", fail))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    release.set()
+    for caller in (leader, follower):
+      with self.assertRaises(ValueError):
+        await caller
+    self.assertTrue(waiter.cancelled())
+
+
+class TestAsyncRetrieval(unittest.IsolatedAsyncioTestCase):
+  async def test_matches_synchronous_retrieval(self):
+    embeddings = BagOfWordsEmbeddings()
+    texts = [document.page_content for document in DOCUMENTS]
+    metadatas = [{"body_system": system} for system in ("hair", "hair", "", "respiratory")]
+    with tempfile.TemporaryDirectory() as directory:
+      index_path = os.path.join(directory, "index")
+      bm25_path = os.path.join(directory, "bm25.json")
+      write_local_index(index_path, texts, metadatas, embeddings.embed_documents(texts), ids=_ids(DOCUMENTS))
+      BM25Index(DOCUMENTS).save(bm25_path)
+      for retriever_type in ("hybrid", "vector"):
+        settings = RetrievalSettings(vector_store_type="local", local_index_path=index_path,
+                                     bm25_index_path=bm25_path, k=2, candidate_k=4, retriever_type=retriever_type)
+        with patch.object(retrieval_service, "get_cached_embeddings", return_value=embeddings), \
+            patch.object(retrieval_service, "get_llm", MagicMock()):
+          service = RetrievalService(settings)
+          for query, filters in [("bhallataka", None), ("hair oil", None), ("vata hair", {"body_system": "hair"})]:
+            self.assertEqual(_ids(await service.aretrieve(query, filters)), _ids(service.retrieve(query, filters)))
+
+
+async def _request(method, path, body=None, headers=()):
+  """Run one request through the ASGI application and return its status, headers and body."""
+  payload = json.dumps(body).encode("utf-8") if body is not None else b""
+  request_headers = [(b"content-type", b"application/json")] + [
+    (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+  scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": request_headers}
+  messages = [{"type": "http.request", "body": payload, "more_body": False}]
+  done = asyncio.Event()
+  sent = []
+
+  async def receive():
+    if messages:
+      return messages.pop(0)
+    await done.wait()
+    return {"type": "http.disconnect"}
+
+  async def send(message):
+    sent.append(message)
+    if message["type"] == "http.response.body" and not message.get("more_body"):
+      done.set()
+
+  await application(scope, receive, send)
+  start = sent[0]
+  response_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in start["headers"]}
+  return start["status"], response_headers, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@patch.dict(os.environ, {"CHAT_COALESCING_ENABLED": "true"})
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+  def setUp(self):
+    extract = patch.object(chat_gpt_routes, "extract_ingredients_from_response", return_value=["neem"])
+    search = patch.object(chat_gpt_routes, "search_products_by_ingredients",
+                          return_value=[{"product_name": "Neem oil"}])
+    extract.start()
+    self.addCleanup(extract.stop)
+    self.search = search.start()
+    self.addCleanup(search.stop)
+
+  async def test_chat_answers_and_shares_the_session_with_flask(self):
+    result = PipelineResult(message="Apply <strong>neem</strong>", mode="agent", timings={}, usage={})
+    with patch.object(chat_gpt_routes, "get_semantic_cache", return_value=None), \
+        patch.object(chat_gpt_routes.rag_pipeline, "aanswer_question", AsyncMock(return_value=result)) as answer:
+      status, headers, body = await _request("POST", "/api/chat_gpt/chat/", {"message_content": "acne"})
+
+    self.assertEqual(status, 200)
+    self.assertEqual(json.loads(body)["ingredients"], ["neem"])
+    answer.assert_awaited_once()
+    self.assertEqual(headers["access-control-allow-origin"], "*")
+    cookie = headers["set-cookie"].split(";", 1)[0]
+
+    status, _, body = await _request("POST", "/api/search_products", {}, headers=[("cookie", cookie)])
+    self.assertEqual((status, json.loads(body)["results"]), (200, [{"product_name": "Neem oil"}]))
+    self.search.assert_called_with(["neem"], 20, 0)
+
+    client = app.test_client()
+    client.set_cookie("session", cookie.split("=", 1)[1])
+    self.assertEqual(client.post("/api/search_products", json={}).status_code, 200)
+    self.search.assert_called_with(["neem"], limit=20, offset=0)
+
+  async def test_cache_hit_cancels_the_concurrent_retrieval(self):
+    retrieving = threading.Event()
+    cancelled = []
+
+    async def aretrieve(query, filters):
+      retrieving.set()
+      try:
+        await asyncio.Event().wait()
+      except asyncio.CancelledError:
+        cancelled.append(query)
+        raise
+
+    service = MagicMock(aretrieve=aretrieve, aprefetch_embedding=AsyncMock(return_value=True))
+    cache = MagicMock()
+    # The lookup answers once the retrieval is running alongside it.
+    cache.lookup.side_effect = lambda *args: retrieving.wait(5) and {"message": "cached", "ingredients": ["amla"]}
+
+    with patch.object(chat_gpt_routes, "get_semantic_cache", return_value=cache), \
+        patch.object(chat_gpt_routes, "get_retrieval_service", return_value=service):
+      status, _, body = await _request("POST", "/api/chat_gpt/chat/", {"message_content": "hair fall"})
+      await asyncio.sleep(0)
+
+    self.assertEqual(status, 200)
+    self.assertTrue(json.loads(body)["cached"])
+    service.aprefetch_embedding.assert_awaited_once_with("hair fall")
+    self.assertEqual(cancelled, ["hair fall"])
+
+  async def test_cancelled_leader_does_not_cancel_the_coalesced_answer(self):
+    release = asyncio.Event()
+
+    async def aretrieve(query, filters):
+      await release.wait()
+      return DOCUMENTS[:1]
+
+    service = MagicMock(aretrieve=aretrieve, aprefetch_embedding=AsyncMock(return_value=True))
+    result = PipelineResult(message="Apply <strong>neem</strong>", mode="agent", timings={}, usage={})
+    answer = AsyncMock(return_value=(result, ["neem"]))
+    with patch.object(chat_gpt_routes, "get_semantic_cache", return_value=MagicMock(**{"lookup.return_value": None})), \
+        patch.object(chat_gpt_routes, "get_retrieval_service", return_value=service), \
+        patch.object(chat_gpt_routes, "_aanswer_and_cache", answer):
+      leader = asyncio.ensure_future(chat_gpt_routes.achat_with_gpt({"message_content": "acne"}, {}))
+      await asyncio.sleep(0.1)
+      follower = asyncio.ensure_future(chat_gpt_routes.achat_with_gpt({"message_content": "acne"}, {}))
+      await asyncio.sleep(0.1)
+      leader.cancel()
+      await asyncio.sleep(0)
+      release.set()
+      body, status, _ = await follower
+
+    self.assertEqual((status, body["message"], body["coalesced"]), (200, "Apply <strong>neem</strong>", True))
+    self.assertEqual(answer.await_args.args[4], DOCUMENTS[:1])
+
+  async def test_invalid_payload_is_rejected(self):
+    status, _, body = await _request("POST", "/api/chat_gpt/chat/", {"model": "gpt-4o"})
+    self.assertEqual((status, json.loads(body)), (400, {"error": "Missing field: message_content"}))
+
+  async def test_bodies_over_max_content_length_are_rejected(self):
+    with patch.dict(app.config, {"MAX_CONTENT_LENGTH": 64}):
+      for path in ("/api/chat_gpt/chat/", "/api/chat_gpt/batch/"):
+        with self.subTest(path=path):
+          status, _, _ = await _request("POST", path, {"message_content": "acne " * 20})
+          self.assertEqual(status, 413)
+
+  async def test_other_routes_are_served_by_flask(self):
+    status, headers, body = await _request("GET", "/metrics")
+    self.assertEqual(status, 200)
+    self.assertIn(b"# TYPE", body)
+    self.assertEqual(headers["access-control-allow-origin"], "*")
+    status, _, body = await _request("POST", "/api/chat_gpt/batch/", {"questions": [""]})
+    self.assertEqual(status, 400)
+    self.assertIn("non-empty strings", json.loads(body)["error"])
+    status, _, _ = await _request("GET", "/no-such-route")
+    self.assertEqual(status, 404)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the batch question endpoint.
+
+Classes:
+  TestBatchQuestions: A test case class for /api/chat_gpt/batch/.
+"""
+
+import json
+import os
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+
+from app import app
+from app.routes import chat_gpt_routes
+from app.services.rag_pipeline import PipelineResult
+
+
+@patch.dict(os.environ, {"SEMANTIC_CACHE_ENABLED": "false"})
+class TestBatchQuestions(unittest.TestCase):
+  def setUp(self):
+    self.client = app.test_client()
+    self.service = MagicMock()
+    self.service.retrieve_many.side_effect = lambda questions, filters=None: [
+      [Document(page_content=f"Context for {question}")] for question in questions
+    ]
+    self.answered = []
+    self.lock = threading.Lock()
+    patches = [
+      patch.object(chat_gpt_routes, "get_retrieval_service", return_value=self.service),
+      patch.object(chat_gpt_routes.rag_pipeline, "answer_question", side_effect=self.answer_question),
+      patch.object(chat_gpt_routes, "extract_ingredients_from_response", return_value=["neem"]),
+    ]
+    for patcher in patches:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def answer_question(self, message_content, model, mode, timer=None, retrieved_docs=None, filters=None):
+    with self.lock:
+      self.answered.append((message_content, retrieved_docs[0].page_content))
+    if message_content == "fail":
+      raise RuntimeError("retrieval failed")
+    return PipelineResult(message=f"Answer to {message_content}", mode=mode, timings={}, usage={})
+
+  def post(self, **body):
+    return self.client.post("/api/chat_gpt/batch/", json={"pipeline": "single_pass", **body})
+
+  def test_deduplicates_and_returns_answers_in_order(self):
+    response = self.post(questions=["Hair fall?", "Dry cough?", "hair  FALL?", "Acidity?"])
+
+    self.assertEqual(response.status_code, 200)
+    body = response.get_json()
+    self.assertEqual(body["unique_questions"], 3)
+    self.assertEqual([result["index"] for result in body["results"]], [0, 1, 2, 3])
+    self.assertEqual([result["message"] for result in body["results"]],
+                     ["Answer to Hair fall?", "Answer to Dry cough?", "Answer to Hair fall?", "Answer to Acidity?"])
+    self.service.retrieve_many.assert_called_once_with(["Hair fall?", "Dry cough?", "Acidity?"], None)
+    self.assertEqual(sorted(self.answered), [
+      ("Acidity?", "Context for Acidity?"),
+      ("Dry cough?", "Context for Dry cough?"),
+      ("Hair fall?", "Context for Hair fall?"),
+    ])
+
+  def test_streams_ndjson_and_isolates_failures(self):
+    response = self.post(questions=["Hair fall?", "fail", "Hair fall?"], stream=True)
+
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.mimetype, "application/x-ndjson")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    by_index = {line["index"]: line for line in lines}
+    self.assertEqual(sorted(by_index), [0, 1, 2])
+    self.assertEqual(by_index[0]["message"], "Answer to Hair fall?")
+    self.assertEqual(by_index[2]["message"], "Answer to Hair fall?")
+    self.assertIn("error", by_index[1])
+    self.assertEqual(len(self.answered), 2)
+
+  def test_falls_back_to_per_question_retrieval(self):
+    self.service.retrieve_many.side_effect = RuntimeError("milvus unavailable")
+    with patch.object(chat_gpt_routes.rag_pipeline, "answer_question",
+                      return_value=PipelineResult(message="ok", mode="single_pass", timings={}, usage={})) as answer:
+      response = self.post(questions=["Hair fall?"])
+    self.assertEqual(response.get_json()["results"][0]["message"], "ok")
+    self.assertIsNone(answer.call_args.kwargs["retrieved_docs"])
+
+  def test_applies_filters_to_every_question(self):
+    with patch.object(chat_gpt_routes.rag_pipeline, "answer_question",
+                      return_value=PipelineResult(message="ok", mode="single_pass", timings={}, usage={})) as answer:
+      response = self.post(questions=["Hair fall?"], filters={"book": "charaka_samhita"})
+    self.assertEqual(response.status_code, 200)
+    self.service.retrieve_many.assert_called_once_with(["Hair fall?"], {"book": "charaka_samhita"})
+    self.assertEqual(answer.call_args.kwargs["filters"], {"book": "charaka_samhita"})
+
+  def test_rejects_invalid_batches(self):
+    self.assertEqual(self.post(questions=[]).status_code, 400)
+    self.assertEqual(self.post(questions=["ok", " "]).status_code, 400)
+    self.assertEqual(self.post(questions="Hair fall?").status_code, 400)
+    self.assertEqual(self.post(questions=["q"] * (chat_gpt_routes.MAX_BATCH_QUESTIONS + 1)).status_code, 400)
+    self.assertEqual(self.post(questions=["q"], pipeline="unknown").status_code, 400)
+    self.assertEqual(self.post(questions=["q"], filters={"author": "Charaka"}).status_code, 400)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the benchmark helpers and the fake OpenAI embeddings API.
+
+Classes:
+  TestBenchmarkResults: A test case class for the benchmarks.results module.
+  TestFakeEmbeddings: A test case class for the fake server's embeddings endpoint.
+  TestVectorIndexTuning: A test case class for the benchmarks.tune_vector_index module.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import requests
+
+from app.services.milvus_params import MilvusIndexConfig
+from benchmarks.results import percentile, summarize, write_results
+from benchmarks.tune_vector_index import (
+  FaissBackend, best_config, candidate_configs, exact_neighbors, recall_at_k, tune,
+)
+from tests.fake_openai_server import FakeOpenAIServer, fake_embedding
+
+
+class TestBenchmarkResults(unittest.TestCase):
+  def test_percentiles_interpolate(self):
+    samples = [float(value) for value in range(1, 101)]
+    self.assertAlmostEqual(percentile(samples, 0.5), 50.5)
+    self.assertAlmostEqual(percentile(samples, 0.99), 99.01)
+    self.assertEqual(percentile([], 0.5), 0.0)
+
+  def test_summary_and_result_file(self):
+    summary = summarize([10.0, 20.0, 30.0, 40.0], elapsed_seconds=0.05)
+    self.assertEqual(summary["count"], 4)
+    self.assertEqual(summary["throughput_per_s"], 80.0)
+    self.assertEqual(summary["p50_ms"], 25.0)
+    self.assertEqual(summary["max_ms"], 40.0)
+
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "results", "micro.json")
+      write_results(path, "micro", {"iterations": 4}, {"product_search": summary})
+      with open(path, "r", encoding="utf-8") as file:
+        document = json.load(file)
+    self.assertEqual(document["benchmark"], "micro")
+    self.assertEqual(document["results"]["product_search"]["p95_ms"], summary["p95_ms"])
+    self.assertIn("commit", document)
+
+
+class TestFakeEmbeddings(unittest.TestCase):
+  def test_embeddings_are_deterministic(self):
+    with FakeOpenAIServer(dimension=16) as server:
+      response = requests.post(f"{server.url}/embeddings", json={"input": ["neem oil", "ghee"], "model": "m"})
+    data = response.json()["data"]
+    self.assertEqual([item["index"] for item in data], [0, 1])
+    self.assertEqual(data[0]["embedding"], fake_embedding("Neem oil", 16))
+    self.assertAlmostEqual(sum(value * value for value in data[1]["embedding"]), 1.0)
+
+
+class TestVectorIndexTuning(unittest.TestCase):
+  def test_exact_neighbors_per_metric(self):
+    corpus = np.array([[1.0, 0.0], [0.0, 1.0], [3.0, 3.0], [-1.0, 0.0]], dtype=np.float32)
+    query = np.array([[0.9, 0.1]], dtype=np.float32)
+    self.assertEqual(exact_neighbors(corpus, query, 2, "L2").tolist(), [[0, 1]])
+    self.assertEqual(exact_neighbors(corpus, query, 2, "IP").tolist(), [[2, 0]])
+    self.assertEqual(exact_neighbors(corpus, query, 2, "COSINE").tolist(), [[0, 2]])
+    self.assertEqual(recall_at_k([[0, 5]], np.array([[0, 1]])), 0.5)
+
+  def test_flat_index_is_exact_and_wins_on_recall(self):
+    rng = np.random.default_rng(3)
+    corpus = rng.standard_normal((400, 16), dtype=np.float32)
+    queries = rng.standard_normal((20, 16), dtype=np.float32)
+    configs = candidate_configs(["FLAT", "IVF_FLAT", "HNSW"], MilvusIndexConfig(nlist=8), [1, 8], [16])
+    self.assertEqual([(config.index_type, config.nprobe, config.ef) for config in configs],
+                     [("FLAT", 16, 64), ("IVF_FLAT", 1, 64), ("IVF_FLAT", 8, 64), ("HNSW", 16, 16)])
+
+    rows = tune(FaissBackend(corpus), corpus, queries, configs, k=5)
+
+    self.assertEqual(rows[0]["recall"], 1.0)
+    self.assertEqual(rows[2]["recall"], 1.0)
+    self.assertLessEqual(rows[1]["recall"], rows[2]["recall"])
+    self.assertGreater(rows[0]["memory_bytes"], 400 * 16 * 4 - 1)
+    self.assertIn(best_config(rows, 1.0)["config"]["index_type"], {"FLAT", "IVF_FLAT", "HNSW"})
+    self.assertIsNone(best_config(rows, 1.01))
+
+
+if __name__ == "__main__":
+  unittest.main()
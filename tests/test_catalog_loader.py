@@ -0,0 +1,106 @@
+"""
+Unit tests for the catalog_loader module.
+
+Classes:
+  TestCatalogLoader: A test case class for bulk catalog loads and delta upserts.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.services import catalog_loader, product_catalog
+
+
+def product(i, **fields):
+  return {
+      "product_category": "Hair Oil", "product_name": f"Product {i}", "price": 100.0 + i,
+      "link": f"https://example.com/{i}", "ingredients": "Bhringraj, Triphala", **fields,
+  }
+
+
+class TestCatalogLoader(unittest.TestCase):
+  def setUp(self):
+    self.conn = sqlite3.connect(":memory:")
+    self.addCleanup(self.conn.close)
+    product_catalog.ensure_schema(self.conn)
+
+  def names(self, ingredients):
+    return [row["product_name"] for row in product_catalog.search_by_ingredients(self.conn, ingredients)]
+
+  def indexes(self):
+    return {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+  def test_initial_load_defers_and_rebuilds_the_ingredient_index(self):
+    records = [product(i, ingredients="Neel" if i % 2 else "Triphala, Til Tail") for i in range(25)]
+    records.append({"product_name": "No link", "price": 1, "ingredients": "Neel", "product_category": "Oil"})
+    records.append(product(99, price="free"))
+    records.append(product(98, price="nan"))
+
+    report = catalog_loader.load_catalog(self.conn, records, batch_size=10)
+
+    self.assertEqual((report.rows, report.inserted, report.skipped, report.indexed), (28, 25, 3, 25))
+    self.assertGreater(report.rows_per_second, 0)
+    self.assertEqual(len(self.names(["til tail"])), 13)
+    self.assertLessEqual({"idx_product_ingredients_product", "idx_product_ingredients_names"}, self.indexes())
+    self.assertEqual(product_catalog.catalog_version(self.conn), 25)
+
+  def test_delta_load_upserts_by_link(self):
+    catalog_loader.load_catalog(self.conn, [product(i) for i in range(3)])
+    version = product_catalog.catalog_version(self.conn)
+
+    report = catalog_loader.load_catalog(self.conn, [
+        product(0),
+        product(1, price=150.0),
+        product(2, ingredients="Neel"),
+        product(2, ingredients="Neel, Amla"),
+        product(3, ingredients="Amla"),
+    ], batch_size=10)
+
+    self.assertEqual(
+        (report.inserted, report.updated, report.unchanged, report.duplicates), (1, 2, 1, 1))
+    self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0], 4)
+    self.assertEqual(self.names(["amla"]), ["Product 2", "Product 3"])
+    self.assertEqual(self.names(["triphala"]), ["Product 0", "Product 1"])
+    self.assertEqual(
+        self.conn.execute("SELECT price FROM products WHERE link = ?", ("https://example.com/1",)).fetchone()[0],
+        150.0)
+    self.assertGreater(product_catalog.catalog_version(self.conn), version)
+
+  def test_reloading_the_same_catalog_changes_nothing(self):
+    records = [product(i) for i in range(5)]
+    catalog_loader.load_catalog(self.conn, records, batch_size=2)
+    version = product_catalog.catalog_version(self.conn)
+
+    report = catalog_loader.load_catalog(self.conn, records, batch_size=2)
+
+    self.assertEqual((report.inserted, report.updated, report.unchanged), (0, 0, 5))
+    self.assertEqual(product_catalog.catalog_version(self.conn), version)
+
+  def test_reads_csv_and_json_lines(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    csv_path = os.path.join(directory.name, "catalog.csv")
+    with open(csv_path, "w", encoding="utf-8") as file:
+      file.write("product_category,product_name,price,link,ingredients\n")
+      file.write('Oil,Tailam,900,https://example.com/1,"Neel, Til Tail"\n')
+    jsonl_path = os.path.join(directory.name, "catalog.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as file:
+      file.write(json.dumps(product(2, ingredients=["Amla", "Honey"])) + "\n\n")
+
+    catalog_loader.load_catalog(self.conn, catalog_loader.read_catalog(csv_path))
+    catalog_loader.load_catalog(self.conn, catalog_loader.read_catalog(jsonl_path))
+
+    self.assertEqual(self.names(["til tail", "honey"]), ["Tailam", "Product 2"])
+    with open(jsonl_path, "a", encoding="utf-8") as file:
+      file.write("{not json\n")
+    with self.assertRaises(ValueError):
+      list(catalog_loader.read_catalog(jsonl_path))
+    with self.assertRaises(ValueError):
+      list(catalog_loader.read_catalog(os.path.join(directory.name, "catalog.xlsx")))
+
+
+if __name__ == "__main__":
+  unittest.main()
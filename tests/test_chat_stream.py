@@ -0,0 +1,92 @@
+"""
+Tests for the streaming chat endpoint.
+
+The OpenAI API is replaced by a local fake completion server and the Milvus
+context by a fixed string, so the whole SSE path runs offline.
+
+Classes:
+  TestHtmlStreamFormatter: Tests incremental HTML formatting.
+  TestChatStreamRoute: Tests the /api/chat_gpt/chat/stream/ endpoint.
+"""
+
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import app
+from app.services.chat_gpt_service import HtmlStreamFormatter, format_response_to_html
+from tests.fake_openai_server import FakeOpenAIServer
+
+
+def parse_events(body):
+  events = []
+  for raw_event in body.strip().split("\n\n"):
+    lines = dict(line.split(": ", 1) for line in raw_event.split("\n"))
+    events.append((lines["event"], json.loads(lines["data"])))
+  return events
+
+
+class TestHtmlStreamFormatter(unittest.TestCase):
+  def test_markers_split_across_chunks(self):
+    formatter = HtmlStreamFormatter()
+    chunks = ["Use *", "*neem", "*", "* oil\n", "daily"]
+    html = "".join(formatter.feed(chunk) for chunk in chunks) + formatter.flush()
+    self.assertEqual(html, "Use <strong>neem</strong> oil<br>daily")
+
+  def test_matches_non_streaming_formatting(self):
+    text = "**Diagnosis**: dry skin\n**Remedy**: apply ghee"
+    formatter = HtmlStreamFormatter()
+    streamed = "".join(formatter.feed(char) for char in text) + formatter.flush()
+    self.assertEqual(streamed, format_response_to_html(text))
+
+  def test_bold_markers_open_and_close(self):
+    # Markers alternate between opening and closing tags, and an unterminated section is closed.
+    self.assertEqual(format_response_to_html("Use **neem** and **amla"),
+                     "Use <strong>neem</strong> and <strong>amla</strong>")
+
+
+@patch.dict(os.environ, {"SEMANTIC_CACHE_ENABLED": "false", "OPENAI_API_KEY": "test_api_key"})
+class TestChatStreamRoute(unittest.TestCase):
+  def setUp(self):
+    self.client = app.test_client()
+
+  @patch("app.services.rag_pipeline.get_context", return_value="Apply Mahanila Taila to the scalp.")
+  def test_streams_tokens_then_ingredients(self, get_context):
+    with FakeOpenAIServer(reply="Massage **Mahanila Taila** with neem") as server, \
+        patch.dict(os.environ, {"OPENAI_API_BASE": server.url}):
+      response = self.client.post("/api/chat_gpt/chat/stream/", json={"message_content": "hair fall"})
+      events = parse_events(response.get_data(as_text=True))
+
+    self.assertEqual(response.mimetype, "text/event-stream")
+    self.assertTrue(server.requests[0]["stream"])
+    tokens = [data["html"] for event, data in events if event == "token"]
+    self.assertGreater(len(tokens), 1)
+    self.assertEqual("".join(tokens).strip(), "Massage <strong>Mahanila Taila</strong> with neem")
+    self.assertEqual(events[-2][0], "ingredients")
+    self.assertEqual(events[-2][1]["ingredients"], ["mahanila taila", "neem"])
+    self.assertEqual(events[-1][0], "done")
+
+  @patch("app.services.rag_pipeline.get_context", return_value="CURE NOT FOUND IN DATABASE")
+  def test_upstream_failure_emits_error_event(self, get_context):
+    with patch.dict(os.environ, {"OPENAI_API_BASE": "http://127.0.0.1:9/v1", "OPENAI_MAX_RETRIES": "0"}):
+      response = self.client.get("/api/chat_gpt/chat/stream/?message_content=cough")
+      events = parse_events(response.get_data(as_text=True))
+    self.assertEqual(events[-1][0], "error")
+
+  @patch("app.services.rag_pipeline.get_context", return_value="CURE NOT FOUND IN DATABASE")
+  def test_malformed_upstream_event_emits_error_event(self, get_context):
+    client = MagicMock()
+    client.post.return_value.__enter__.return_value.iter_lines.return_value = ['data: {"choices": [', "data: [DONE]"]
+    with patch("app.services.chat_gpt_service.get_openai_client", return_value=client):
+      response = self.client.post("/api/chat_gpt/chat/stream/", json={"message_content": "cough"})
+      events = parse_events(response.get_data(as_text=True))
+    self.assertEqual(events[-1][0], "error")
+
+  def test_missing_message_is_rejected(self):
+    response = self.client.post("/api/chat_gpt/chat/stream/", json={})
+    self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,74 @@
+"""
+Unit tests for the chunk_metadata module.
+
+Classes:
+  TestChunkTags: A test case class for chunk tagging.
+  TestFilters: A test case class for retrieval filters.
+"""
+
+import unittest
+
+from app.services.chunk_metadata import (
+  book_name,
+  detect_language,
+  filters_key,
+  infer_filters,
+  matches,
+  milvus_expr,
+  parse_filters,
+  tag_chunk,
+)
+
+
+class TestChunkTags(unittest.TestCase):
+  def test_tags_dominant_labels(self):
+    tags = tag_chunk("Vata dries the skin. Apply the taila to the skin twice a day to pacify vata; pitta is unaffected.")
+    self.assertEqual(tags, {"language": "english", "body_system": "skin", "dosha": "vata", "topic": "formulation"})
+
+  def test_untagged_text_has_empty_labels(self):
+    tags = tag_chunk("The author thanks the publisher.")
+    self.assertEqual((tags["body_system"], tags["dosha"], tags["topic"]), ("", "", ""))
+
+  def test_matches_whole_words_and_devanagari(self):
+    self.assertEqual(tag_chunk("The hairpin was lost.")["body_system"], "")
+    self.assertEqual(tag_chunk("वातव्याधि चिकित्सा")["dosha"], "vata")
+
+  def test_detects_language_by_script(self):
+    self.assertEqual(detect_language("Pitta governs digestion."), "english")
+    self.assertEqual(detect_language("वातपित्तकफा दोषाः"), "devanagari")
+    self.assertEqual(detect_language("Vata (वात) and pitta (पित्त)"), "mixed")
+
+  def test_book_name_is_the_file_stem(self):
+    self.assertEqual(book_name("pdf_to_json/output_xmls/charaka_samhita.xml"), "charaka_samhita")
+
+
+class TestFilters(unittest.TestCase):
+  def test_parse_filters_validates_fields_and_values(self):
+    self.assertEqual(parse_filters(None), {})
+    self.assertEqual(parse_filters({"book": " sushruta ", "dosha": ""}), {"book": "sushruta"})
+    with self.assertRaises(ValueError):
+      parse_filters({"author": "Charaka"})
+    with self.assertRaises(ValueError):
+      parse_filters({"page": 3})
+    with self.assertRaises(ValueError):
+      parse_filters(["book"])
+
+  def test_infers_only_unambiguous_labels(self):
+    self.assertEqual(infer_filters("Remedy for hair fall due to pitta?"), {"body_system": "hair", "dosha": "pitta"})
+    self.assertEqual(infer_filters("Is vata or kapha behind my cough?"), {"body_system": "respiratory"})
+    self.assertEqual(infer_filters("What is Ayurveda?"), {})
+
+  def test_milvus_expr_quotes_values(self):
+    self.assertEqual(milvus_expr({"dosha": "vata", "book": 'a"b'}), 'book == "a\\"b" and dosha == "vata"')
+    self.assertEqual(milvus_expr({}), "")
+
+  def test_matches_and_key(self):
+    metadata = {"book": "charaka", "dosha": "vata"}
+    self.assertTrue(matches(metadata, {"dosha": "vata"}))
+    self.assertTrue(matches(metadata, None))
+    self.assertFalse(matches(metadata, {"dosha": "vata", "body_system": "skin"}))
+    self.assertEqual(filters_key({"dosha": "vata", "book": "charaka"}), filters_key({"book": "charaka", "dosha": "vata"}))
+
+
+if __name__ == "__main__":
+  unittest.main()
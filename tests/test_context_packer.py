@@ -0,0 +1,81 @@
+"""
+Unit tests for the context_packer module.
+
+Classes:
+  TestContextPacker: A test case class for the pack_context function.
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+
+from app.services.context_packer import minhash_signature, pack_context, token_budget
+
+VERSE = ("Mahanila taila is prepared by boiling sesame oil with the juice of bhringaraja, "
+         "amalaki and neelini, and is massaged into the scalp every night to stop premature greying.")
+
+
+def _words(count, word):
+  return " ".join(f"{word}{i}" for i in range(count))
+
+
+class TestContextPacker(unittest.TestCase):
+  def test_minhash_estimates_similarity(self):
+    same = (minhash_signature(VERSE) == minhash_signature(VERSE.replace("night", "night."))).mean()
+    different = (minhash_signature(VERSE) == minhash_signature(_words(40, "kapha"))).mean()
+    self.assertEqual(same, 1.0)
+    self.assertLess(different, 0.1)
+
+  def test_removes_near_duplicates_and_keeps_their_titles(self):
+    documents = [
+      Document(page_content=VERSE, metadata={"title": "Sahasrayogam", "page": "12"}),
+      Document(page_content=VERSE + " Use for a month.", metadata={"title": "Bhaishajya Ratnavali"}),
+      Document(page_content="Kapha is pacified by dry ginger and long pepper.", metadata={"title": "Charaka"}),
+    ]
+    context = pack_context(documents, budget=1000)
+    self.assertEqual(context.duplicates_removed, 1)
+    self.assertEqual(len(context.documents), 2)
+    self.assertIn("[Source: Sahasrayogam; Bhaishajya Ratnavali, p. 12]", context.text)
+    self.assertEqual(context.sources, ["Sahasrayogam", "Bhaishajya Ratnavali", "Charaka"])
+    self.assertGreater(context.tokens_saved, 0)
+    self.assertEqual(context.report()["chunks_retrieved"], 3)
+
+  def test_packs_within_budget(self):
+    documents = [Document(page_content=_words(100, f"w{n}_"), metadata={"title": str(n)}) for n in range(6)]
+    context = pack_context(documents, budget=300)
+    self.assertLessEqual(context.context_tokens, 300)
+    self.assertLess(len(context.documents), 6)
+    self.assertEqual(context.documents[0].metadata["title"], "0")
+    self.assertGreaterEqual(context.report()["tokens_saved"], context.retrieved_tokens - 300)
+
+  def test_truncates_a_single_oversized_chunk(self):
+    context = pack_context([Document(page_content=_words(500, "vata"))], budget=50)
+    self.assertEqual(len(context.documents), 1)
+    self.assertLessEqual(context.context_tokens, 50)
+    self.assertTrue(context.text.startswith("[Source: Unknown source]\nvata0 vata1"))
+
+  def test_mmr_prefers_diverse_chunks(self):
+    base = _words(60, "pitta")
+    documents = [
+      Document(page_content=base, metadata={"title": "A"}),
+      Document(page_content=base[:len(base) * 2 // 3] + " " + _words(15, "extra"), metadata={"title": "B"}),
+      Document(page_content=_words(60, "kapha"), metadata={"title": "C"}),
+    ]
+    context = pack_context(documents, budget=1000, mmr_lambda=0.5, duplicate_threshold=0.95)
+    self.assertEqual([document.metadata["title"] for document in context.documents], ["A", "C", "B"])
+
+  def test_empty_retrieval(self):
+    context = pack_context([])
+    self.assertEqual(context.text, "")
+    self.assertEqual(context.tokens_saved, 0)
+
+  def test_token_budget_per_model(self):
+    with patch.dict(os.environ, {"CONTEXT_TOKEN_BUDGET": "1200", "CONTEXT_TOKEN_BUDGETS": "gpt-4o-mini=600"}):
+      self.assertEqual(token_budget("gpt-4o-mini"), 600)
+      self.assertEqual(token_budget("gpt-4o"), 1200)
+
+
+if __name__ == "__main__":
+  unittest.main()
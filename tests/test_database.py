@@ -0,0 +1,71 @@
+"""
+Unit tests for the database module.
+
+Classes:
+  TestDatabase: A test case class for the per-thread connection pool.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from app.services.database import Database
+
+
+class TestDatabase(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.database = Database(os.path.join(directory.name, "products.db"), busy_timeout=1)
+    self.addCleanup(self.database.close)
+
+  def test_reuses_one_connection_per_thread(self):
+    conn = self.database.connection()
+    self.assertIs(self.database.connection(), conn)
+    self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+    self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 1000)
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(self.database.connection()))
+    thread.start()
+    thread.join()
+    self.assertIsNot(other[0], conn)
+
+  def test_closes_connections_when_thread_exits(self):
+    main = self.database.connection()
+    opened = []
+
+    def read():
+      opened.append(self.database.connection())
+      opened.append(self.database.read_connection())
+
+    threads = [threading.Thread(target=read) for _ in range(20)]
+    for thread in threads:
+      thread.start()
+      thread.join()
+
+    self.assertEqual(len(opened), 40)
+    for conn in opened:
+      with self.assertRaises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    self.assertEqual(list(self.database._connections.values()), [[main]])
+    main.execute("SELECT 1")
+
+  def test_read_connection_is_read_only(self):
+    with self.database.connection() as conn:
+      conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY)")
+      conn.execute("INSERT INTO products (id) VALUES (1)")
+    reader = self.database.read_connection()
+    self.assertEqual(reader.execute("SELECT id FROM products").fetchone()["id"], 1)
+    with self.assertRaises(sqlite3.OperationalError):
+      reader.execute("DELETE FROM products")
+
+  def test_read_connection_requires_existing_database(self):
+    with self.assertRaises(sqlite3.OperationalError):
+      self.database.read_connection()
+
+
+if __name__ == "__main__":
+  unittest.main()
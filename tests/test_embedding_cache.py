@@ -0,0 +1,87 @@
+"""
+Unit tests for the embedding_cache module.
+
+Classes:
+  TestCachedEmbeddings: A test case class for the CachedEmbeddings class.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+  model = "fake-embedding"
+
+  def __init__(self):
+    self.calls = []
+
+  def embed_documents(self, texts):
+    self.calls.append(list(texts))
+    return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+  def embed_query(self, text):
+    return self.embed_documents([text])[0]
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.path = os.path.join(directory.name, "embeddings.db")
+    self.inner = CountingEmbeddings()
+
+  def cache(self, **kwargs):
+    cache = CachedEmbeddings(self.inner, path=self.path, **kwargs)
+    self.addCleanup(cache.close)
+    return cache
+
+  def test_embeds_each_distinct_text_once_in_one_batch(self):
+    cache = self.cache()
+    vectors = cache.embed_documents(["vata", "pitta", "vata"])
+    self.assertEqual(vectors[0], vectors[2])
+    self.assertEqual(self.inner.calls, [["vata", "pitta"]])
+
+    self.assertEqual(cache.embed_query("pitta"), vectors[1])
+    cache.embed_documents(["vata", "kapha"])
+    self.assertEqual(self.inner.calls[1:], [["kapha"]])
+    self.assertEqual(cache.stats()["memory_hits"], 2)
+
+  def test_memory_hits_do_not_wait_for_sqlite(self):
+    cache = self.cache()
+    cache.embed_documents(["vata"])
+    result = []
+    with cache._db_lock:
+      # A slow SQLite read or write elsewhere must not hold up a memory hit.
+      reader = threading.Thread(target=lambda: result.append(cache.embed_query("vata")))
+      reader.start()
+      reader.join(5)
+    self.assertEqual(result, [[4.0, 1.0, 0.5]])
+
+  def test_persists_across_instances(self):
+    self.cache().embed_documents(["vata", "pitta"])
+    cache = self.cache(dtype="float16")
+    self.assertEqual(cache.embed_documents(["pitta", "vata"]), [[5.0, 1.0, 0.5], [4.0, 1.0, 0.5]])
+    self.assertEqual(len(self.inner.calls), 1)
+    self.assertEqual(cache.stats()["disk_hits"], 2)
+    self.assertEqual(cache.stats()["hit_rate"], 1.0)
+
+  def test_memory_tier_is_bounded(self):
+    cache = CachedEmbeddings(self.inner, max_memory_entries=2)
+    cache.embed_documents(["a", "b", "c"])
+    self.assertEqual(cache.stats()["memory_entries"], 2)
+    cache.embed_documents(["a"])
+    self.assertEqual(self.inner.calls[-1], ["a"])
+
+  def test_rejects_unknown_dtype(self):
+    with self.assertRaises(ValueError):
+      CachedEmbeddings(self.inner, dtype="int8")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,213 @@
+"""
+Unit tests for incremental ingestion in gen_milvus.
+
+A fake vector store stands in for Milvus and the ingestion state lives in a
+temporary SQLite file, so the tests check which chunks a run adds and
+deletes without a Milvus server or embedding calls.
+
+Classes:
+  FakeVectorStore: An in-memory stand-in for the LangChain Milvus store.
+  TestIngestion: A test case class for plan_ingestion and apply_ingestion.
+  TestCreateDb: A test case class for the --dry-run and --rebuild modes of create_db and its index rebuilds.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import gen_milvus
+from gen_milvus import IngestionState, apply_ingestion, plan_ingestion
+
+TEI = """<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0">
+  <teiHeader><fileDesc><titleStmt><title>{title}</title></titleStmt></fileDesc></teiHeader>
+  <text>
+    <body>
+      <div><head>Vata</head><p>{vata}</p></div>
+      <div><head>Pitta</head><p>Pitta governs digestion and metabolism.</p></div>
+    </body>
+  </text>
+</TEI>
+"""
+
+
+def word_count(text, model=None):
+  return len(text.split())
+
+
+class FakeVectorStore:
+  def __init__(self):
+    self.col = None
+    self.chunks = {}
+    self.deleted = []
+
+  def add_texts(self, texts, metadatas=None, ids=None):
+    self.col = MagicMock()
+    for text, metadata, i in zip(texts, metadatas, ids):
+      self.chunks[i] = (text, metadata)
+    return ids
+
+  def delete(self, ids=None):
+    self.deleted.extend(ids)
+    for i in ids:
+      self.chunks.pop(i, None)
+
+
+class _CorpusTestCase(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.xml_dir = os.path.join(directory.name, "xmls")
+    os.mkdir(self.xml_dir)
+    self.state_path = os.path.join(directory.name, "state.db")
+    patcher = patch.object(gen_milvus, "count_tokens", word_count)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.write("charaka", "Vata governs all movement in the body.")
+    self.write("sushruta", "Vata is dry, light and cold.")
+
+  def write(self, name, vata):
+    path = os.path.join(self.xml_dir, f"{name}.xml")
+    with open(path, "w", encoding="utf-8") as file:
+      file.write(TEI.format(title=name, vata=vata))
+    return path
+
+  def corpus(self):
+    return sorted(os.path.join(self.xml_dir, filename) for filename in os.listdir(self.xml_dir))
+
+  def state(self):
+    state = IngestionState(self.state_path)
+    self.addCleanup(state.conn.close)
+    return state
+
+
+class TestIngestion(_CorpusTestCase):
+  def ingest(self, store):
+    state = self.state()
+    plan = plan_ingestion(self.corpus(), state, full_scan=True)
+    apply_ingestion(plan, state, store)
+    return plan
+
+  def test_first_run_adds_every_chunk(self):
+    store = FakeVectorStore()
+    plan = self.ingest(store)
+
+    self.assertEqual(len(plan.new_documents), 2)
+    self.assertEqual((plan.chunks_to_add, plan.chunks_to_delete), (4, 0))
+    self.assertEqual(len(store.chunks), 4)
+    self.assertEqual(len(self.state().chunk_ids(self.corpus()[0])), 2)
+
+  def test_unchanged_corpus_is_not_rechunked(self):
+    store = FakeVectorStore()
+    self.ingest(store)
+
+    with patch.object(gen_milvus, "chunk_tei") as chunk_tei:
+      plan = self.ingest(store)
+    chunk_tei.assert_not_called()
+    self.assertEqual(len(plan.unchanged_documents), 2)
+    self.assertEqual((plan.chunks_to_add, plan.chunks_to_delete), (0, 0))
+    self.assertEqual(len(store.chunks), 4)
+
+  def test_changed_document_replaces_only_changed_chunks(self):
+    store = FakeVectorStore()
+    self.ingest(store)
+    before = set(store.chunks)
+    path = self.write("charaka", "Vata is aggravated by fasting.")
+
+    plan = self.ingest(store)
+    self.assertEqual(plan.changed_documents, [path])
+    self.assertEqual((plan.chunks_to_add, plan.chunks_to_delete), (1, 1))
+    self.assertEqual(len(store.chunks), 4)
+    self.assertEqual(len(set(store.chunks) & before), 3)
+    texts = " ".join(text for text, _ in store.chunks.values())
+    self.assertIn("aggravated by fasting", texts)
+    self.assertNotIn("all movement", texts)
+
+  def test_removed_document_deletes_its_chunks(self):
+    store = FakeVectorStore()
+    self.ingest(store)
+    removed = self.corpus()[1]
+    indexed = self.state().chunk_ids(removed)
+    os.remove(removed)
+
+    plan = self.ingest(store)
+    self.assertEqual(plan.removed_documents, [removed])
+    self.assertEqual(plan.chunks_to_delete, 2)
+    self.assertFalse(indexed & set(store.chunks))
+    self.assertEqual(self.state().sources(), {self.corpus()[0]})
+    self.assertEqual(self.state().chunk_ids(removed), set())
+
+  def test_partial_corpus_does_not_remove_documents(self):
+    store = FakeVectorStore()
+    self.ingest(store)
+
+    plan = plan_ingestion(self.corpus()[:1], self.state(), full_scan=False)
+    self.assertEqual(plan.removed_documents, [])
+    self.assertEqual(plan.chunks_to_delete, 0)
+
+
+class TestCreateDb(_CorpusTestCase):
+  def setUp(self):
+    super().setUp()
+    self.store = FakeVectorStore()
+    self.milvus = MagicMock(return_value=self.store)
+    patches = [
+      patch.object(gen_milvus, "OUTPUT_XML_DIR", self.xml_dir),
+      patch.object(gen_milvus, "Milvus", self.milvus),
+      patch.object(gen_milvus, "OpenAIEmbeddings", MagicMock()),
+      patch.object(gen_milvus, "get_cached_embeddings", MagicMock()),
+      patch.object(gen_milvus, "build_bm25_index", MagicMock(side_effect=self.build_bm25_index)),
+      patch.object(gen_milvus, "BM25_INDEX_PATH", os.path.join(self.xml_dir, "..", "bm25_index.json")),
+    ]
+    for patcher in patches:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  @staticmethod
+  def build_bm25_index(tei_paths):
+    with open(gen_milvus.BM25_INDEX_PATH, "w", encoding="utf-8") as file:
+      file.write("{}")
+
+  def create_db(self, **kwargs):
+    return gen_milvus.create_db(state_path=self.state_path, vector_store_type="milvus", **kwargs)
+
+  def test_dry_run_changes_nothing(self):
+    plan = self.create_db(dry_run=True)
+
+    self.assertEqual((len(plan.new_documents), plan.chunks_to_add), (2, 4))
+    self.milvus.assert_not_called()
+    self.assertEqual(self.state().sources(), set())
+
+    self.create_db()
+    self.write("charaka", "Vata is aggravated by fasting.")
+    plan = self.create_db(dry_run=True, rebuild=True)
+    self.assertEqual(len(plan.changed_documents), 1)
+    self.assertEqual(self.milvus.call_count, 1)
+    self.assertEqual(len(self.state().sources()), 2)
+    self.assertEqual(len(self.store.chunks), 4)
+
+  def test_rebuild_reindexes_everything(self):
+    self.create_db()
+    self.assertFalse(self.milvus.call_args.kwargs["drop_old"])
+
+    self.store = FakeVectorStore()
+    self.milvus.return_value = self.store
+    plan = self.create_db(rebuild=True)
+    self.assertTrue(self.milvus.call_args.kwargs["drop_old"])
+    self.assertEqual((len(plan.new_documents), plan.chunks_to_add), (2, 4))
+    self.assertEqual(len(self.store.chunks), 4)
+    self.assertEqual(len(self.state().sources()), 2)
+
+  def test_unchanged_corpus_keeps_the_bm25_index(self):
+    self.create_db()
+    self.create_db()
+    self.assertEqual(gen_milvus.build_bm25_index.call_count, 1)
+
+    self.write("charaka", "Vata is aggravated by fasting.")
+    self.create_db()
+    self.assertEqual(gen_milvus.build_bm25_index.call_count, 2)
+
+
+if __name__ == "__main__":
+  unittest.main()
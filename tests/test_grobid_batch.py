@@ -0,0 +1,147 @@
+"""
+Tests for concurrent GROBID batch conversion.
+
+A local stub server stands in for GROBID. It records how many conversions
+are in flight and can be told to fail a PDF a number of times.
+
+Classes:
+  TestGrobidBatch: A test case class for GrobidService.process_batch and its server limit.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from pdf_to_json.src.services.grobid_service import GrobidService
+
+
+class _StubGrobidHandler(BaseHTTPRequestHandler):
+  def log_message(self, format, *args):
+    pass
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers["Content-Length"]))
+    server = self.server
+    with server.lock:
+      server.in_flight += 1
+      server.peak = max(server.peak, server.in_flight)
+      server.requests += 1
+      failing = next((name for name in server.failures if name.encode() in body), None)
+      if failing:
+        server.failures[failing] -= 1
+        if not server.failures[failing]:
+          del server.failures[failing]
+    time.sleep(0.05)
+    with server.lock:
+      server.in_flight -= 1
+
+    if failing:
+      self.send_response(503)
+      self.end_headers()
+      return
+    payload = b"<TEI><text>converted</text></TEI>"
+    self.send_response(200)
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+
+class TestGrobidBatch(unittest.TestCase):
+  def setUp(self):
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGrobidHandler)
+    self.server.lock = threading.Lock()
+    self.server.in_flight = self.server.peak = self.server.requests = 0
+    self.server.failures = {}
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.addCleanup(self.server.server_close)
+    self.addCleanup(self.server.shutdown)
+
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.pdfs = []
+    for index in range(6):
+      path = os.path.join(self.directory.name, f"book{index}.pdf")
+      with open(path, "w") as file:
+        file.write(f"%PDF book{index}")
+      self.pdfs.append(path)
+    self.teis = [path.replace(".pdf", ".xml") for path in self.pdfs]
+    self.manifest = os.path.join(self.directory.name, "manifest.json")
+    self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+  def run_batch(self, **kwargs):
+    service = GrobidService(base_url=self.base_url, max_concurrency=2)
+    return service.process_batch(self.pdfs, self.teis, self.manifest, max_workers=4, retry_delay=0, **kwargs)
+
+  def test_converts_concurrently_within_server_limit(self):
+    summary = self.run_batch()
+    self.assertEqual(summary.converted, 6)
+    self.assertEqual(self.server.peak, 2)
+    self.assertTrue(all(os.path.exists(tei) for tei in self.teis))
+
+  def test_rerun_skips_finished_and_resumes_failed(self):
+    self.server.failures = {"book3": 3}
+    first = self.run_batch(retries=1)
+    self.assertEqual(first.converted, 5)
+    self.assertIn(self.pdfs[3], first.failed)
+    with open(self.manifest) as file:
+      statuses = sorted(entry["status"] for entry in json.load(file)["files"].values())
+    self.assertEqual(statuses, ["done"] * 5 + ["failed"])
+
+    requests_before = self.server.requests
+    second = self.run_batch(retries=1)
+    self.assertEqual((second.skipped, second.converted, len(second.failed)), (5, 1, 0))
+    self.assertEqual(self.server.requests - requests_before, 2)
+
+  def test_changed_pdf_is_converted_again(self):
+    self.run_batch()
+    with open(self.pdfs[0], "a") as file:
+      file.write(" revised")
+    summary = self.run_batch()
+    self.assertEqual((summary.skipped, summary.converted), (5, 1))
+
+  def test_converted_pdf_is_copied_to_a_new_output(self):
+    self.run_batch()
+    requests_before = self.server.requests
+    self.teis = [os.path.join(self.directory.name, "out", os.path.basename(tei)) for tei in self.teis]
+    os.mkdir(os.path.join(self.directory.name, "out"))
+
+    summary = self.run_batch()
+    self.assertEqual((summary.skipped, summary.converted), (6, 0))
+    self.assertEqual(self.server.requests, requests_before)
+    for tei in self.teis:
+      with open(tei) as file:
+        self.assertIn("converted", file.read())
+
+  def test_identical_pdfs_in_one_batch_are_converted_once(self):
+    for pdf in self.pdfs:
+      with open(pdf, "w") as file:
+        file.write("%PDF same")
+
+    summary = self.run_batch()
+    self.assertEqual((summary.converted, summary.skipped), (1, 5))
+    self.assertEqual(self.server.requests, 1)
+    self.assertTrue(all(os.path.exists(tei) for tei in self.teis))
+
+  def test_ocr_settings_are_part_of_the_manifest_key(self):
+    self.run_batch()
+    with patch.object(GrobidService, "convert_pdf_to_ocr_pdf",
+                      side_effect=lambda pdf, output, lang: shutil.copyfile(pdf, output)):
+      ocr = self.run_batch(use_ocr=True, lang="eng+hin")
+      self.assertEqual((ocr.converted, ocr.skipped), (6, 0))
+      self.assertEqual(self.run_batch(use_ocr=True, lang="eng+hin").skipped, 6)
+      self.assertEqual(self.run_batch(use_ocr=True, lang="eng").converted, 6)
+
+  def test_server_limit_must_match_across_instances(self):
+    GrobidService(base_url=self.base_url, max_concurrency=2)
+    with self.assertRaises(ValueError):
+      GrobidService(base_url=self.base_url, max_concurrency=8)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,110 @@
+"""
+Tests for windowed OCR of scanned PDFs.
+
+pdf2image, pytesseract, pdftotext and FPDF are replaced by mocks, and the
+process pool by a thread pool so the mocks are seen by the OCR workers.
+Each rendered page is a small image whose pixel value is its page number.
+
+Classes:
+  TestOcrConversion: A test case class for GrobidService.convert_pdf_to_ocr_pdf.
+"""
+
+import subprocess
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+from pdf_to_json.src.services import grobid_service
+from pdf_to_json.src.services.grobid_service import GrobidService
+
+TEXT_LAYER = "This page already carries a text layer. " * 5
+
+
+def render(pdf_path, dpi, first_page, last_page):
+  return [Image.new("L", (8, 8), color=number) for number in range(first_page, last_page + 1)]
+
+
+def ocr(image, lang):
+  return f"OCR page {image.getpixel((0, 0))}"
+
+
+class TestOcrConversion(unittest.TestCase):
+  def setUp(self):
+    cache = tempfile.TemporaryDirectory()
+    self.addCleanup(cache.cleanup)
+    self.service = GrobidService(ocr_cache_dir=cache.name)
+    self.text_pages = [""] * 10
+    self.text_pages[2] = self.text_pages[6] = TEXT_LAYER
+    self.convert_from_path = MagicMock(side_effect=render)
+    self.image_to_string = MagicMock(side_effect=ocr)
+    self.pdf = MagicMock()
+    executor = ThreadPoolExecutor(max_workers=2)
+    self.addCleanup(executor.shutdown)
+    patches = [
+      patch.object(grobid_service, "pdfinfo_from_path", return_value={"Pages": 10}),
+      patch.object(grobid_service.subprocess, "run", side_effect=self.pdftotext),
+      patch.object(grobid_service, "convert_from_path", self.convert_from_path),
+      patch.object(grobid_service.pytesseract, "image_to_string", self.image_to_string),
+      patch.object(grobid_service, "FPDF", return_value=self.pdf),
+      patch.object(grobid_service, "_ocr_pool", return_value=executor),
+    ]
+    for patcher in patches:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def pdftotext(self, args, **kwargs):
+    self.assertEqual(args[0], "pdftotext")
+    return subprocess.CompletedProcess(args, 0, stdout="\f".join(self.text_pages).encode())
+
+  def convert(self):
+    self.service.convert_pdf_to_ocr_pdf("book.pdf", "book.ocr.pdf", window_size=3)
+    return [call.args[2] for call in self.pdf.multi_cell.call_args_list]
+
+  def test_windows_render_only_their_own_pages(self):
+    self.convert()
+
+    rendered = [(call.kwargs["first_page"], call.kwargs["last_page"])
+                for call in self.convert_from_path.call_args_list]
+    # Pages 3 and 7 have a text layer; the rest are OCRed three at a time.
+    self.assertEqual(rendered, [(1, 2), (4, 4), (5, 6), (8, 8), (9, 10)])
+    pages = [page for first, last in rendered for page in range(first, last + 1)]
+    self.assertEqual(pages, [1, 2, 4, 5, 6, 8, 9, 10])
+
+  def test_default_window_keeps_every_ocr_worker_busy(self):
+    self.text_pages = [""] * 10
+    for cpus, expected in ((2, [(1, 8), (9, 10)]), (8, [(1, 10)])):
+      with self.subTest(cpus=cpus), patch.object(grobid_service.os, "cpu_count", return_value=cpus):
+        self.convert_from_path.reset_mock()
+        self.service.convert_pdf_to_ocr_pdf("book.pdf", "book.ocr.pdf")
+        rendered = [(call.kwargs["first_page"], call.kwargs["last_page"])
+                    for call in self.convert_from_path.call_args_list]
+        self.assertEqual(rendered, expected)
+
+  def test_keeps_page_order_and_skips_text_layer_pages(self):
+    texts = self.convert()
+
+    expected = [TEXT_LAYER if number in (3, 7) else f"OCR page {number}" for number in range(1, 11)]
+    self.assertEqual(texts, expected)
+    self.assertEqual(self.image_to_string.call_count, 8)
+    self.pdf.output.assert_called_once_with("book.ocr.pdf")
+
+  def test_rerun_reads_pages_from_the_cache(self):
+    first = self.convert()
+    self.image_to_string.reset_mock()
+    self.pdf.reset_mock()
+
+    self.assertEqual(self.convert(), first)
+    self.image_to_string.assert_not_called()
+
+  def test_missing_pdftotext_ocrs_every_page(self):
+    with patch.object(grobid_service.subprocess, "run", side_effect=FileNotFoundError("pdftotext")):
+      texts = self.convert()
+
+    self.assertEqual(texts, [f"OCR page {number}" for number in range(1, 11)])
+
+
+if __name__ == "__main__":
+  unittest.main()
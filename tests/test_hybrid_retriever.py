@@ -0,0 +1,191 @@
+"""
+Unit tests for the bm25_index and hybrid_retriever modules.
+
+Classes:
+  TestBM25Index: A test case class for the BM25Index class.
+  TestReciprocalRankFusion: A test case class for the reciprocal_rank_fusion function.
+  TestHybridRetriever: A test case class for the HybridRetriever class.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+
+from app.services import retrieval_service
+from app.services.bm25_index import BM25Index, ReloadingBM25Index, tokenize
+from app.services.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+from app.services.local_vector_store import write_local_index
+from app.services.retrieval_service import RetrievalService, RetrievalSettings
+from tests.test_local_vector_store import BagOfWordsEmbeddings
+
+DOCUMENTS = [
+  Document(page_content="Mahaneel Tailam is applied to the scalp for hair", metadata={"id": "a"}),
+  Document(page_content="Oil massage balances vata and nourishes the hair", metadata={"id": "b"}),
+  Document(page_content="Bhallataka is purified before internal use", metadata={"id": "c"}),
+  Document(page_content="Kapha causes cough and heaviness", metadata={"id": "d"}),
+]
+
+
+def _ids(documents):
+  return [document.metadata["id"] for document in documents]
+
+
+class TestBM25Index(unittest.TestCase):
+  def test_tokenize_keeps_devanagari_and_drops_stopwords(self):
+    self.assertEqual(tokenize("The taila of महानील तैल"), ["taila", "महानील", "तैल"])
+
+  def test_ranks_exact_terms_first(self):
+    index = BM25Index(DOCUMENTS)
+    results = index.search("What is mahaneel tailam?", k=2)
+    self.assertEqual(_ids(document for document, _ in results), ["a"])
+    self.assertEqual(_ids(document for document, _ in index.search("hair oil", k=4))[0], "b")
+    self.assertEqual(index.search("unknown words", k=4), [])
+
+  def test_filters_restrict_results(self):
+    documents = [Document(page_content=document.page_content, metadata={**document.metadata, "book": book})
+                 for document, book in zip(DOCUMENTS, ["charaka", "sushruta", "charaka", "sushruta"])]
+    index = BM25Index(documents)
+    self.assertEqual(_ids(document for document, _ in index.search("hair", k=4, filters={"book": "sushruta"})),
+                     ["b"])
+    self.assertEqual(index.search("hair", k=4, filters={"book": "bhela"}), [])
+
+  def test_save_and_load_round_trip(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "bm25.json")
+      index = BM25Index(DOCUMENTS)
+      index.save(path)
+      loaded = BM25Index.load(path)
+    self.assertEqual(len(loaded), 4)
+    self.assertEqual(loaded.search("bhallataka purified", k=3), index.search("bhallataka purified", k=3))
+
+  def test_reloading_index_picks_up_new_file(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "bm25.json")
+      BM25Index(DOCUMENTS[:1]).save(path)
+      index = ReloadingBM25Index(path, reload_interval=0)
+      self.assertEqual(index.search("cough", k=1), [])
+      BM25Index(DOCUMENTS).save(path)
+      os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+      self.assertEqual(_ids(document for document, _ in index.search("cough", k=1)), ["d"])
+
+  def test_reloading_index_requires_file(self):
+    with self.assertRaises(FileNotFoundError):
+      ReloadingBM25Index("/nonexistent/bm25.json")
+
+
+class TestReciprocalRankFusion(unittest.TestCase):
+  def test_documents_in_both_rankings_rise(self):
+    a, b, c, d = DOCUMENTS
+    fused = reciprocal_rank_fusion([([a, b, c], 1.0), ([c, d], 1.0)], k=3)
+    self.assertEqual(_ids(fused), ["c", "a", "b"])
+    self.assertAlmostEqual(fused[0].metadata["rrf_score"], 1 / 63 + 1 / 61)
+    self.assertNotIn("rrf_score", c.metadata)
+
+  def test_weights_favor_a_ranking(self):
+    a, b, _, d = DOCUMENTS
+    self.assertEqual(_ids(reciprocal_rank_fusion([([a], 1.0), ([d], 2.0)], k=2)), ["d", "a"])
+
+  def test_matches_milvus_primary_keys(self):
+    vector = Document(page_content="same chunk", metadata={"pk": "x"})
+    lexical = Document(page_content="same chunk", metadata={"id": "x"})
+    self.assertEqual(len(reciprocal_rank_fusion([([vector], 1.0), ([lexical], 1.0)], k=5)), 1)
+
+
+class TestHybridRetriever(unittest.TestCase):
+  def test_fuses_both_retrievers(self):
+    vector_retriever = MagicMock()
+    vector_retriever.invoke.return_value = [DOCUMENTS[1], DOCUMENTS[3]]
+    retriever = HybridRetriever.model_construct(
+      vector_retriever=vector_retriever, bm25_index=BM25Index(DOCUMENTS), k=2, candidate_k=10,
+      vector_weight=1.0, bm25_weight=1.0, rrf_k=60,
+    )
+    documents = retriever.invoke("hair oil from mahaneel tailam")
+    vector_retriever.invoke.assert_called_once()
+    self.assertEqual(set(_ids(documents)), {"a", "b"})
+
+  def test_retrieval_service_fuses_local_index_and_bm25(self):
+    embeddings = BagOfWordsEmbeddings()
+    texts = [document.page_content for document in DOCUMENTS]
+    with tempfile.TemporaryDirectory() as directory:
+      index_path = os.path.join(directory, "index")
+      bm25_path = os.path.join(directory, "bm25.json")
+      write_local_index(index_path, texts, [{} for _ in texts], embeddings.embed_documents(texts),
+                        ids=_ids(DOCUMENTS))
+      BM25Index(DOCUMENTS).save(bm25_path)
+      settings = RetrievalSettings(vector_store_type="local", local_index_path=index_path,
+                                   bm25_index_path=bm25_path, k=1, candidate_k=4)
+      with patch.object(retrieval_service, "get_cached_embeddings", return_value=embeddings), \
+          patch.object(retrieval_service, "get_llm", MagicMock()):
+        service = RetrievalService(settings)
+        self.assertIsInstance(service.retriever, HybridRetriever)
+        documents = service.retrieve("bhallataka")
+    self.assertEqual(_ids(documents), ["c"])
+
+  def test_retrieve_many_embeds_once_and_matches_retrieve(self):
+    embeddings = MagicMock(wraps=BagOfWordsEmbeddings())
+    texts = [document.page_content for document in DOCUMENTS]
+    queries = ["bhallataka", "hair oil", "kapha cough", "vata hair"]
+    with tempfile.TemporaryDirectory() as directory:
+      index_path = os.path.join(directory, "index")
+      bm25_path = os.path.join(directory, "bm25.json")
+      write_local_index(index_path, texts, [{} for _ in texts], embeddings.embed_documents(texts),
+                        ids=_ids(DOCUMENTS))
+      BM25Index(DOCUMENTS).save(bm25_path)
+      for retriever_type in ("hybrid", "vector"):
+        settings = RetrievalSettings(vector_store_type="local", local_index_path=index_path,
+                                     bm25_index_path=bm25_path, k=2, candidate_k=4, retriever_type=retriever_type)
+        with patch.object(retrieval_service, "get_cached_embeddings", return_value=embeddings), \
+            patch.object(retrieval_service, "get_llm", MagicMock()):
+          service = RetrievalService(settings)
+          embeddings.embed_documents.reset_mock()
+          batched = service.retrieve_many(queries)
+          embeddings.embed_documents.assert_called_once_with(queries)
+          self.assertEqual([_ids(documents) for documents in batched],
+                           [_ids(service.retrieve(query)) for query in queries])
+
+  def test_retrieve_filters_explicitly_or_by_inference(self):
+    embeddings = BagOfWordsEmbeddings()
+    texts = [document.page_content for document in DOCUMENTS]
+    metadatas = [{"body_system": system} for system in ("hair", "hair", "", "respiratory")]
+    documents = [Document(page_content=text, metadata={**metadata, "id": document.metadata["id"]})
+                 for text, metadata, document in zip(texts, metadatas, DOCUMENTS)]
+    with tempfile.TemporaryDirectory() as directory:
+      index_path = os.path.join(directory, "index")
+      bm25_path = os.path.join(directory, "bm25.json")
+      write_local_index(index_path, texts, metadatas, embeddings.embed_documents(texts), ids=_ids(DOCUMENTS))
+      BM25Index(documents).save(bm25_path)
+      for retriever_type in ("hybrid", "vector"):
+        settings = RetrievalSettings(vector_store_type="local", local_index_path=index_path,
+                                     bm25_index_path=bm25_path, k=2, candidate_k=4, retriever_type=retriever_type)
+        with patch.object(retrieval_service, "get_cached_embeddings", return_value=embeddings), \
+            patch.object(retrieval_service, "get_llm", MagicMock()):
+          service = RetrievalService(settings)
+          self.assertEqual(set(_ids(service.retrieve("vata hair", {"body_system": "hair"}))), {"a", "b"})
+          self.assertEqual(_ids(service.retrieve("kapha cough", {"body_system": "respiratory"})), ["d"])
+          # The inferred respiratory filter leaves fewer than k documents, so the search is unfiltered.
+          self.assertEqual(len(service.retrieve("kapha cough")), 2)
+          self.assertEqual(set(_ids(service.retrieve("hair"))), {"a", "b"})
+          batched = service.retrieve_many(["kapha cough"], {"body_system": "respiratory"})
+          self.assertEqual([_ids(documents) for documents in batched], [["d"]])
+
+  def test_falls_back_to_vector_retrieval_without_bm25_index(self):
+    with patch.object(retrieval_service, "get_cached_embeddings", MagicMock()), \
+        patch.object(retrieval_service, "get_llm", MagicMock()), \
+        patch.object(retrieval_service, "Milvus") as milvus:
+      service = RetrievalService(RetrievalSettings(bm25_index_path="/nonexistent/bm25.json", k=4))
+      service.retriever
+    milvus.return_value.as_retriever.assert_called_once_with(search_kwargs={"k": 4})
+
+  def test_rejects_unknown_retriever_type(self):
+    with patch.object(retrieval_service, "get_cached_embeddings", MagicMock()), \
+        patch.object(retrieval_service, "get_llm", MagicMock()), \
+        patch.object(retrieval_service, "Milvus"):
+      with self.assertRaises(ValueError):
+        RetrievalService(RetrievalSettings(retriever_type="splade")).retriever
+
+
+if __name__ == "__main__":
+  unittest.main()
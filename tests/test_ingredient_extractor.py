@@ -0,0 +1,60 @@
+"""
+Unit tests for the ingredient_extractor module.
+
+Classes:
+  TestAhoCorasick: A test case class for the AhoCorasick matcher.
+  TestIngredientExtractor: A test case class for the IngredientExtractor class.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.services import product_catalog
+from app.services.ingredient_extractor import IngredientExtractor
+from app.utils.aho_corasick import AhoCorasick
+
+
+class TestAhoCorasick(unittest.TestCase):
+  def test_finds_overlapping_patterns(self):
+    automaton = AhoCorasick({"he": 1, "she": 2, "his": 3, "hers": 4})
+    matches = sorted(automaton.iter_matches("ushers"))
+    self.assertEqual(matches, [(1, 4, 2), (2, 4, 1), (2, 6, 4)])
+    self.assertEqual(len(automaton), 4)
+
+
+class TestIngredientExtractor(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.path = os.path.join(directory.name, "products.db")
+    with sqlite3.connect(self.path) as conn:
+      product_catalog.ensure_schema(conn)
+      product_catalog.add_product(conn, "Oil", "Kesh Oil", 300.0, "https://example.com/1", "Bhringraj, Brahmi")
+    conn.close()
+    self.extractor = IngredientExtractor(lambda: sqlite3.connect(self.path), refresh_seconds=0)
+
+  def test_matches_catalog_names_on_word_boundaries(self):
+    text = "Apply BHRINGRAJ oil with licorice, then drink triphala water. Eat rice."
+    self.assertEqual(self.extractor.extract(text), ["bhringraj", "madhuka", "triphala water", "rice"])
+    self.assertEqual(self.extractor.extract("Brahmin food"), [])
+
+  def test_maps_synonyms_to_canonical_names(self):
+    self.assertEqual(self.extractor.extract("Take amla and Harad daily, or amalaka."), ["amalaka", "haritaki"])
+
+  def test_rebuilds_when_the_catalog_changes(self):
+    self.assertEqual(self.extractor.extract("Use ashwagandha or winter cherry."), [])
+    conn = sqlite3.connect(self.path)
+    product_catalog.add_product(conn, "Tablet", "Calm", 200.0, "https://example.com/2", "Ashwagandha")
+    product_catalog.add_synonym(conn, "Winter Cherry", "ashwagandha")
+    conn.close()
+    self.assertEqual(self.extractor.extract("Use ashwagandha or winter cherry."), ["ashwagandha"])
+
+  def test_falls_back_to_builtin_vocabulary_without_catalog(self):
+    extractor = IngredientExtractor(lambda: sqlite3.connect("file:missing?mode=ro", uri=True), refresh_seconds=0)
+    self.assertEqual(extractor.extract("Neem and ghee."), ["neem", "ghee"])
+
+
+if __name__ == "__main__":
+  unittest.main()
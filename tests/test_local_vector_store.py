@@ -0,0 +1,108 @@
+"""
+Unit tests for the local_vector_store module.
+
+A deterministic bag-of-words embedder stands in for OpenAI, so the whole
+retrieval path runs offline.
+
+Classes:
+  TestLocalVectorStore: A test case class for the LocalVectorStore class.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.embeddings import Embeddings
+
+from app.services import retrieval_service
+from app.services.local_vector_store import LocalVectorStore, write_local_index
+from app.services.retrieval_service import RetrievalService, RetrievalSettings
+
+VOCABULARY = ["vata", "pitta", "kapha", "hair", "cough", "skin"]
+
+
+class BagOfWordsEmbeddings(Embeddings):
+  def embed_documents(self, texts):
+    return [self.embed_query(text) for text in texts]
+
+  def embed_query(self, text):
+    words = text.lower().split()
+    return [float(words.count(word)) for word in VOCABULARY]
+
+
+TEXTS = ["vata causes dry skin", "pitta heats the body", "kapha causes cough", "oil for hair and vata"]
+
+
+class TestLocalVectorStore(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.path = os.path.join(directory.name, "index")
+    self.embeddings = BagOfWordsEmbeddings()
+    write_local_index(self.path, TEXTS, [{"source": str(i)} for i in range(len(TEXTS))],
+                      self.embeddings.embed_documents(TEXTS), ids=[f"id{i}" for i in range(len(TEXTS))])
+
+  def test_returns_nearest_chunks_with_both_backends(self):
+    for use_faiss in (False, True):
+      store = LocalVectorStore(self.embeddings, self.path, use_faiss=use_faiss)
+      results = store.similarity_search_with_score("kapha cough", k=2)
+      self.assertEqual(results[0][0].page_content, "kapha causes cough")
+      self.assertEqual(results[0][0].metadata, {"source": "2", "id": "id2"})
+      self.assertAlmostEqual(results[0][1], 1.0, places=5)
+      self.assertEqual(len(store.similarity_search("vata", k=10)), 4)
+
+  def test_searches_several_vectors_at_once(self):
+    queries = ["kapha cough", "hair vata", "pitta"]
+    for use_faiss in (False, True):
+      store = LocalVectorStore(self.embeddings, self.path, use_faiss=use_faiss)
+      batched = store.similarity_search_by_vectors(self.embeddings.embed_documents(queries), k=2)
+      self.assertEqual(batched, [store.similarity_search(query, k=2) for query in queries])
+      self.assertEqual(store.similarity_search_by_vectors([], k=2), [])
+
+  def test_filters_restrict_the_search(self):
+    for use_faiss in (False, True):
+      store = LocalVectorStore(self.embeddings, self.path, use_faiss=use_faiss)
+      results = store.similarity_search("vata", k=4, filter={"source": "3"})
+      self.assertEqual([document.page_content for document in results], ["oil for hair and vata"])
+      batched = store.similarity_search_by_vectors(self.embeddings.embed_documents(["cough"]), k=2,
+                                                   filter={"source": "1"})
+      self.assertEqual([[document.page_content for document in documents] for documents in batched],
+                       [["pitta heats the body"]])
+      self.assertEqual(store.similarity_search("vata", k=4, filter={"source": "9"}), [])
+
+  def test_reloads_new_versions(self):
+    store = LocalVectorStore(self.embeddings, self.path, reload_interval=0, use_faiss=False)
+    first = store.version
+    write_local_index(self.path, ["hair fall remedy"], [{}], self.embeddings.embed_documents(["hair"]))
+    self.assertEqual(store.similarity_search("hair", k=5)[0].page_content, "hair fall remedy")
+    self.assertNotEqual(store.version, first)
+    self.assertEqual(store.count, 1)
+
+  def test_is_read_only(self):
+    store = LocalVectorStore(self.embeddings, self.path)
+    with self.assertRaises(NotImplementedError):
+      store.add_texts(["new"])
+
+  def test_retrieval_service_uses_local_index(self):
+    settings = RetrievalSettings(vector_store_type="local", local_index_path=self.path, k=1)
+    with patch.object(retrieval_service, "get_cached_embeddings", return_value=self.embeddings), \
+        patch.object(retrieval_service, "get_llm", MagicMock()), \
+        patch.object(retrieval_service, "Milvus") as milvus:
+      service = RetrievalService(settings)
+      documents = service.retrieve("pitta")
+      report = service.health_check()
+    milvus.assert_not_called()
+    self.assertEqual([document.page_content for document in documents], ["pitta heats the body"])
+    self.assertTrue(report["ok"])
+    self.assertEqual(report["count"], 4)
+
+  def test_rejects_unknown_vector_store_type(self):
+    with patch.object(retrieval_service, "get_cached_embeddings", MagicMock()), \
+        patch.object(retrieval_service, "get_llm", MagicMock()):
+      with self.assertRaises(ValueError):
+        RetrievalService(RetrievalSettings(vector_store_type="chroma")).retriever
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit tests for the metrics module, request timing and payload logging.
+
+Classes:
+  TestMetrics: A test case class for the Counter and Histogram classes.
+  TestRequestTiming: A test case class for the /metrics route and Server-Timing header.
+  TestPayloadLogging: A test case class for the log_payload function.
+"""
+
+import logging
+import os
+import unittest
+from unittest.mock import patch
+
+from app import app
+from app.routes import chat_gpt_routes
+from app.utils import metrics
+from app.utils.logs import log_payload
+from app.utils.metrics import Counter, Histogram, Registry
+from app.utils.timing import StageTimer, reset_current_timer, set_current_timer, span
+
+
+class TestMetrics(unittest.TestCase):
+  def test_renders_prometheus_text(self):
+    registry = Registry()
+    counter = registry.register(Counter("test_requests_total", "Requests.", ["result"]))
+    histogram = registry.register(Histogram("test_seconds", "Latency.", buckets=(0.1, 1.0)))
+    counter.inc(result="hit")
+    counter.inc(2, result="miss")
+    for value in (0.05, 0.1, 0.5, 3.0):
+      histogram.observe(value)
+
+    text = registry.render()
+    self.assertIn("# TYPE test_requests_total counter\n", text)
+    self.assertIn('test_requests_total{result="miss"} 2\n', text)
+    self.assertIn('test_seconds_bucket{le="0.1"} 2\n', text)
+    self.assertIn('test_seconds_bucket{le="1"} 3\n', text)
+    self.assertIn('test_seconds_bucket{le="+Inf"} 4\n', text)
+    self.assertIn("test_seconds_sum 3.65\ntest_seconds_count 4\n", text)
+
+  def test_rejects_wrong_labels_and_decrements(self):
+    counter = Counter("test_total", "Test.", ["stage"])
+    with self.assertRaises(ValueError):
+      counter.inc(kind="x")
+    with self.assertRaises(ValueError):
+      counter.inc(-1, stage="x")
+
+  def test_span_records_into_current_timer(self):
+    timer = StageTimer()
+    before = metrics.STAGE_SECONDS.count(stage="test_span")
+    token = set_current_timer(timer)
+    try:
+      with span("test_span"):
+        pass
+    finally:
+      reset_current_timer(token)
+    with span("test_span"):
+      pass
+    self.assertEqual(list(timer.as_milliseconds()), ["test_span"])
+    self.assertEqual(metrics.STAGE_SECONDS.count(stage="test_span"), before + 2)
+    self.assertRegex(timer.server_timing(), r"^test_span;dur=\d+(\.\d)?$")
+
+
+class TestRequestTiming(unittest.TestCase):
+  def setUp(self):
+    self.client = app.test_client()
+
+  def test_search_reports_server_timing_and_metrics(self):
+    with patch.object(chat_gpt_routes.product_catalog, "search_by_ingredients", return_value=[]), \
+        patch.object(chat_gpt_routes, "get_database"):
+      response = self.client.post("/api/search_products", json={"ingredients": ["neem"]})
+    self.assertEqual(response.status_code, 200)
+    self.assertRegex(response.headers["Server-Timing"], r"^product_search;dur=")
+
+    body = self.client.get("/metrics").get_data(as_text=True)
+    self.assertIn('bharatvaidya_stage_duration_seconds_count{stage="product_search"}', body)
+    self.assertIn(
+      'bharatvaidya_http_request_duration_seconds_count{endpoint="/api/search_products",method="POST",status="200"}',
+      body,
+    )
+    self.assertIn("# TYPE bharatvaidya_llm_tokens_total counter", body)
+
+
+class TestPayloadLogging(unittest.TestCase):
+  def test_payloads_are_logged_only_when_enabled(self):
+    with self.assertLogs(level=logging.DEBUG) as logs:
+      with patch.dict(os.environ, {"LOG_PAYLOADS": "false"}):
+        log_payload("Message", "hidden question")
+      with patch.dict(os.environ, {"LOG_PAYLOADS": "true"}):
+        log_payload("Message", "shown question")
+      logging.debug("marker")
+    output = "\n".join(logs.output)
+    self.assertNotIn("hidden question", output)
+    self.assertIn("Message: shown question", output)
+
+
+if __name__ == "__main__":
+  unittest.main()
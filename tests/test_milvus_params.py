@@ -0,0 +1,59 @@
+"""
+Unit tests for the milvus_params module.
+
+Classes:
+  TestMilvusIndexConfig: A test case class for the MilvusIndexConfig class.
+"""
+
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app.services import retrieval_service
+from app.services.milvus_params import MilvusIndexConfig
+from app.services.retrieval_service import RetrievalService, RetrievalSettings
+
+
+class TestMilvusIndexConfig(unittest.TestCase):
+  def test_index_and_search_params_per_index_type(self):
+    hnsw = MilvusIndexConfig(hnsw_m=16, ef_construction=200, ef=32)
+    self.assertEqual(hnsw.index_params(),
+                     {"index_type": "HNSW", "metric_type": "L2", "params": {"M": 16, "efConstruction": 200}})
+    self.assertEqual(hnsw.search_params(k=50), {"metric_type": "L2", "params": {"ef": 50}})
+
+    ivf_pq = MilvusIndexConfig(index_type="IVF_PQ", metric_type="IP", nlist=256, pq_m=32, nprobe=512)
+    self.assertEqual(ivf_pq.index_params()["params"], {"nlist": 256, "m": 32, "nbits": 8})
+    self.assertEqual(ivf_pq.search_params(), {"metric_type": "IP", "params": {"nprobe": 256}})
+    self.assertEqual(MilvusIndexConfig(index_type="FLAT").search_params(10)["params"], {})
+
+  @patch.dict(os.environ, {"MILVUS_INDEX_TYPE": "ivf_sq8", "MILVUS_METRIC_TYPE": "cosine", "MILVUS_NPROBE": "32"})
+  def test_reads_environment_and_rejects_unknown_types(self):
+    config = MilvusIndexConfig.from_env()
+    self.assertEqual((config.index_type, config.metric_type, config.nprobe), ("IVF_SQ8", "COSINE", 32))
+    with self.assertRaises(ValueError):
+      MilvusIndexConfig(index_type="DISKANN")
+    with self.assertRaises(ValueError):
+      MilvusIndexConfig(metric_type="HAMMING")
+
+  def test_search_params_follow_the_built_index(self):
+    collection = SimpleNamespace(indexes=[SimpleNamespace(
+        field_name="vector", params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 128}})])
+    with self.assertLogs(level="WARNING"):
+      config = MilvusIndexConfig(nprobe=8).matching(collection)
+    self.assertEqual(config.search_params(20), {"metric_type": "IP", "params": {"nprobe": 8}})
+    self.assertEqual(MilvusIndexConfig().matching(SimpleNamespace(indexes=[])).index_type, "HNSW")
+
+  def test_retrieval_service_searches_with_configured_params(self):
+    settings = RetrievalSettings(retriever_type="vector", k=5, candidate_k=20, milvus_index=MilvusIndexConfig(ef=8))
+    with patch.object(retrieval_service, "get_cached_embeddings", MagicMock()), \
+        patch.object(retrieval_service, "get_llm", MagicMock()), \
+        patch.object(retrieval_service, "Milvus") as milvus:
+      milvus.return_value.col = None
+      RetrievalService(settings).retriever
+    self.assertEqual(milvus.call_args.kwargs["index_params"]["index_type"], "HNSW")
+    self.assertEqual(milvus.return_value.search_params, {"metric_type": "L2", "params": {"ef": 20}})
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,122 @@
+"""
+Unit tests for the openai_client module.
+
+Retries are exercised against a local fake completion server that answers
+with queued error statuses before succeeding.
+
+Classes:
+  TestOpenAIClient: Tests retries and error reporting of OpenAIClient.
+  TestRateLimiter: Tests the in-memory and SQLite token buckets.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app.services.openai_client import (
+  OpenAIClient,
+  OpenAIError,
+  OpenAIRateLimitError,
+  RateLimiter,
+  SqliteTokenBucket,
+  TokenBucket,
+)
+from tests.fake_openai_server import FakeOpenAIServer
+
+
+@patch("app.services.openai_client.time.sleep")
+class TestOpenAIClient(unittest.TestCase):
+  def test_retries_honour_retry_after(self, sleep):
+    with FakeOpenAIServer(reply="ok") as server:
+      server.failures = [(429, {"Retry-After": "7"}), (503, {})]
+      client = OpenAIClient("key", server.url, backoff_base=0.1)
+      response = client.post("/chat/completions", {"messages": []})
+
+    self.assertEqual(response.json()["choices"][0]["message"]["content"], "ok")
+    self.assertEqual(len(server.requests), 3)
+    self.assertGreaterEqual(sleep.call_args_list[0].args[0], 7)
+    self.assertLess(sleep.call_args_list[1].args[0], 7)
+
+  def test_persistent_429_raises_rate_limit_error(self, sleep):
+    with FakeOpenAIServer() as server:
+      server.failures = [(429, {"Retry-After": "2"})] * 3
+      client = OpenAIClient("key", server.url, max_retries=2)
+      with self.assertRaises(OpenAIRateLimitError) as raised:
+        client.post("/chat/completions", {"messages": []})
+    self.assertEqual(raised.exception.retry_after, 2)
+
+  def test_retry_after_is_capped_by_backoff_max(self, sleep):
+    with FakeOpenAIServer(reply="ok") as server:
+      server.failures = [(503, {"Retry-After": "3600"})]
+      client = OpenAIClient("key", server.url, backoff_base=0.1, backoff_max=5)
+      client.post("/chat/completions", {"messages": []})
+
+    self.assertGreaterEqual(sleep.call_args_list[0].args[0], 5)
+    self.assertLessEqual(sleep.call_args_list[0].args[0], 5.1)
+
+  def test_client_errors_are_not_retried(self, sleep):
+    with FakeOpenAIServer() as server:
+      server.failures = [(400, {})]
+      with self.assertRaises(OpenAIError) as raised:
+        OpenAIClient("key", server.url).post("/chat/completions", {"messages": []})
+    self.assertEqual(raised.exception.status_code, 400)
+    self.assertEqual(len(server.requests), 1)
+    sleep.assert_not_called()
+
+
+class TestRateLimiter(unittest.TestCase):
+  def test_bucket_queues_bursts(self):
+    bucket = TokenBucket("requests", rate_per_minute=60, capacity=2)
+    self.assertEqual(bucket.reserve(1, max_wait=10), 0)
+    self.assertEqual(bucket.reserve(1, max_wait=10), 0)
+    self.assertAlmostEqual(bucket.reserve(1, max_wait=10), 1, places=1)
+    self.assertIsNone(bucket.reserve(1, max_wait=0.5))
+
+  @patch("app.services.openai_client.time.sleep")
+  def test_limiter_raises_when_wait_exceeds_max(self, sleep):
+    limiter = RateLimiter(tokens_per_minute=600, max_wait=1)
+    limiter.acquire(600)
+    with self.assertRaises(OpenAIRateLimitError):
+      limiter.acquire(100)
+
+  def test_rejected_call_refunds_request_budget(self):
+    with tempfile.TemporaryDirectory() as directory:
+      for path in (None, os.path.join(directory, "limits.db")):
+        with self.subTest(path=path):
+          limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=600, path=path, max_wait=0)
+          self.assertEqual(limiter.reserve(600), 0)
+          for _ in range(3):
+            with self.assertRaises(OpenAIRateLimitError):
+              limiter.reserve(100)
+          self.assertEqual(limiter.requests.reserve(1, max_wait=0), 0)
+
+  def test_async_reserve_keeps_sqlite_off_the_event_loop(self):
+    with tempfile.TemporaryDirectory() as directory:
+      for path, on_loop_thread in ((None, True), (os.path.join(directory, "limits.db"), False)):
+        with self.subTest(path=path):
+          limiter = RateLimiter(requests_per_minute=60, path=path)
+          threads = []
+          reserve = limiter.requests.reserve
+
+          def record(*args):
+            threads.append(threading.get_ident())
+            return reserve(*args)
+
+          limiter.requests.reserve = record
+          self.assertEqual(asyncio.run(limiter.areserve(1)), 0)
+          self.assertEqual(threads == [threading.get_ident()], on_loop_thread)
+
+  def test_sqlite_bucket_is_shared_between_instances(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "limits.db")
+      first = SqliteTokenBucket(path, "requests", rate_per_minute=60, capacity=1)
+      second = SqliteTokenBucket(path, "requests", rate_per_minute=60, capacity=1)
+      self.assertEqual(first.reserve(1, max_wait=10), 0)
+      self.assertGreater(second.reserve(1, max_wait=10), 0.9)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,61 @@
+"""
+Unit tests for the product_catalog module.
+
+Classes:
+  TestProductCatalog: A test case class for the ingredient index and search.
+"""
+
+import sqlite3
+import unittest
+
+from app.services import product_catalog
+
+
+class TestProductCatalog(unittest.TestCase):
+  def setUp(self):
+    self.conn = sqlite3.connect(":memory:")
+    self.addCleanup(self.conn.close)
+    product_catalog.ensure_schema(self.conn)
+    self.hair_oil = product_catalog.add_product(
+        self.conn, "Hair Oil", "Mahaneel Tailam", 900.0, "https://example.com/1",
+        "Bhringraj, Triphala, Til Tail, Mahanila Taila")
+    self.licorice = product_catalog.add_product(
+        self.conn, "Powder", "Yashtimadhu", 250.0, "https://example.com/2", "Licorice, Honey")
+    self.face_pack = product_catalog.add_product(
+        self.conn, "Face Pack", "Ubtan", 300.0, "https://example.com/3", "Rice flour; Triphala; Honey")
+
+  def names(self, ingredients, **kwargs):
+    return [row["product_name"] for row in product_catalog.search_by_ingredients(self.conn, ingredients, **kwargs)]
+
+  def test_matches_whole_ingredients_and_words_not_substrings(self):
+    self.assertEqual(self.names(["rice"]), ["Ubtan"])
+    self.assertEqual(self.names(["  MAHANILA taila "]), ["Mahaneel Tailam"])
+    self.assertEqual(self.names(["ashwagandha"]), [])
+
+  def test_ranks_by_matched_ingredients_and_paginates(self):
+    results = product_catalog.search_by_ingredients(self.conn, ["triphala", "honey", "rice"])
+    self.assertEqual([row["product_name"] for row in results], ["Ubtan", "Mahaneel Tailam", "Yashtimadhu"])
+    self.assertEqual([row["matched_ingredients"] for row in results], [3, 1, 1])
+    self.assertEqual(self.names(["triphala", "honey", "rice"], limit=1, offset=1), ["Mahaneel Tailam"])
+
+  def test_index_follows_updates_and_deletes(self):
+    product_catalog.set_product_ingredients(self.conn, self.licorice, "Ashwagandha")
+    self.assertEqual(self.names(["honey"]), ["Ubtan"])
+    self.assertEqual(self.names(["ashwagandha"]), ["Yashtimadhu"])
+
+    with self.conn:
+      self.conn.execute("DELETE FROM products WHERE id = ?", (self.face_pack,))
+    self.assertEqual(self.names(["honey"]), [])
+
+  def test_indexes_products_inserted_directly(self):
+    with self.conn:
+      self.conn.execute(
+          "INSERT INTO products (product_category, product_name, price, link, ingredients) "
+          "VALUES ('Tablet', 'Neem Ghan', 150, 'https://example.com/4', 'Neem')")
+    self.assertEqual(self.names(["neem"]), [])
+    product_catalog.ensure_schema(self.conn)
+    self.assertEqual(self.names(["neem"]), ["Neem Ghan"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,83 @@
+"""
+Unit tests for the rag_pipeline module.
+
+Retrieval is mocked and completions go to a local fake server, so the tests
+count how many LLM round trips each pipeline mode makes.
+
+Classes:
+  TestRagPipeline: A test case class for the rag_pipeline module.
+"""
+
+import asyncio
+import os
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain.schema import Document
+
+from app.services import rag_pipeline
+from app.services.context_packer import pack_context
+from app.utils.timing import StageTimer
+from tests.fake_openai_server import FakeOpenAIServer
+
+
+@patch.dict(os.environ, {"OPENAI_API_KEY": "test_api_key"})
+class TestRagPipeline(unittest.TestCase):
+  def setUp(self):
+    self.service = MagicMock()
+    self.service.retrieve.return_value = [Document(page_content="Apply Mahanila Taila.")]
+    patcher = patch.object(rag_pipeline, "get_retrieval_service", return_value=self.service)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_single_pass_makes_one_grounded_completion(self):
+    with FakeOpenAIServer(reply="Use **Mahanila Taila**") as server, \
+        patch.dict(os.environ, {"OPENAI_API_BASE": server.url}), \
+        patch.object(rag_pipeline, "get_context") as get_context:
+      result = rag_pipeline.answer_question("hair fall", "gpt-4o", "single_pass")
+
+    get_context.assert_not_called()
+    self.service.retrieve.assert_called_once_with("hair fall", None)
+    self.assertEqual(len(server.requests), 1)
+    self.assertIn("Apply Mahanila Taila.", server.requests[0]["messages"][1]["content"])
+    self.assertEqual(result.message, "Use <strong>Mahanila Taila</strong>")
+    self.assertEqual(result.usage["completion"]["total_tokens"], 15)
+    self.assertEqual(result.usage["context"]["chunks_used"], 1)
+    self.assertEqual(list(result.timings), ["retrieval", "context", "completion", "total"])
+
+  def test_single_pass_without_documents_falls_back(self):
+    self.service.retrieve.return_value = []
+    with FakeOpenAIServer() as server, patch.dict(os.environ, {"OPENAI_API_BASE": server.url}):
+      rag_pipeline.answer_question("hair fall", "gpt-4o", "single_pass")
+    self.assertIn(rag_pipeline.CURE_NOT_FOUND, server.requests[0]["messages"][2]["content"])
+
+  def test_agent_mode_packs_context_for_the_requested_model(self):
+    agent = MagicMock(return_value={"output": "Apply Mahanila Taila."})
+    agent.ainvoke = AsyncMock(return_value={"output": "Apply Mahanila Taila."})
+    self.service.create_agent.return_value = agent
+    self.service.aretrieve = AsyncMock(return_value=self.service.retrieve.return_value)
+    with patch("app.utils.util.get_retrieval_service", return_value=self.service), \
+        patch("app.utils.util.pack_context", wraps=pack_context) as packer:
+      for prepare in (rag_pipeline.prepare_conversation, self.aprepare_conversation):
+        with self.subTest(prepare=prepare.__name__):
+          packer.reset_mock()
+          usage = {}
+          prepare("hair fall", "agent", StageTimer(), usage, model="gpt-4o-mini")
+
+          packer.assert_called_once_with(self.service.retrieve.return_value, "gpt-4o-mini")
+          self.assertEqual(usage["context"]["chunks_used"], 1)
+
+  @staticmethod
+  def aprepare_conversation(*args, **kwargs):
+    return asyncio.run(rag_pipeline.aprepare_conversation(*args, **kwargs))
+
+  def test_pipeline_mode_defaults_from_environment(self):
+    with patch.dict(os.environ, {"RAG_PIPELINE_MODE": "single_pass"}):
+      self.assertEqual(rag_pipeline.get_pipeline_mode(), "single_pass")
+    self.assertEqual(rag_pipeline.get_pipeline_mode("agent"), "agent")
+    with self.assertRaises(ValueError):
+      rag_pipeline.get_pipeline_mode("invalid")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,77 @@
+"""
+Unit tests for the retrieval routes.
+
+Classes:
+  TestRetrievalConfig: A test case class for /api/retrieval/config.
+"""
+
+import dataclasses
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import app
+from app.routes import retrieval_routes
+from app.services.milvus_params import MilvusIndexConfig
+from app.services.retrieval_service import RetrievalSettings
+
+
+@patch.dict(os.environ, {"ADMIN_TOKEN": "secret"})
+class TestRetrievalConfig(unittest.TestCase):
+  def setUp(self):
+    self.client = app.test_client()
+    self.service = MagicMock()
+    self.service.settings = RetrievalSettings()
+    self.service.reconfigure.side_effect = self.reconfigure
+    patcher = patch.object(retrieval_routes, "get_retrieval_service", return_value=self.service)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def reconfigure(self, **changes):
+    self.service.settings = dataclasses.replace(self.service.settings, **changes)
+    return self.service.settings
+
+  def post(self, **body):
+    return self.client.post("/api/retrieval/config", json=body, headers={"X-Admin-Token": "secret"})
+
+  def test_requires_admin_token(self):
+    response = self.client.post("/api/retrieval/config", json={"k": 3})
+
+    self.assertEqual(response.status_code, 403)
+    self.service.reconfigure.assert_not_called()
+
+  def test_updates_milvus_index_over_current_config(self):
+    response = self.post(milvus_index={"index_type": "ivf_flat", "nprobe": "32"})
+
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self.service.settings.milvus_index,
+                     MilvusIndexConfig(index_type="IVF_FLAT", nprobe=32))
+    self.assertEqual(response.get_json()["milvus_index"]["nprobe"], 32)
+    self.assertEqual(self.service.settings.milvus_index.index_params()["index_type"], "IVF_FLAT")
+
+  def test_rejects_invalid_milvus_index(self):
+    for milvus_index in ("HNSW", {"index_type": "ANNOY"}, {"nlists": 10}, {"ef": "many"}, {"ef": True}):
+      with self.subTest(milvus_index=milvus_index):
+        response = self.post(milvus_index=milvus_index)
+
+        self.assertEqual(response.status_code, 400)
+    self.service.reconfigure.assert_not_called()
+    self.assertEqual(self.service.settings.milvus_index, MilvusIndexConfig())
+
+  def test_switches_filter_inference(self):
+    for infer_filters in (False, True):
+      with self.subTest(infer_filters=infer_filters):
+        response = self.post(infer_filters=infer_filters)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(self.service.settings.infer_filters, infer_filters)
+        self.assertIs(response.get_json()["infer_filters"], infer_filters)
+
+  def test_rejects_non_boolean_infer_filters(self):
+    for infer_filters in ("false", 0, None):
+      with self.subTest(infer_filters=infer_filters):
+        response = self.post(infer_filters=infer_filters)
+
+        self.assertEqual(response.status_code, 400)
+    self.service.reconfigure.assert_not_called()
+    self.assertIs(self.service.settings.infer_filters, True)
@@ -0,0 +1,75 @@
+"""
+Unit tests for the retrieval_service module.
+
+These tests replace the LLM, embeddings and Milvus constructors with mocks and
+check that the retrieval stack is built lazily, once per process, and rebuilt
+after a fork or a reconfiguration.
+
+Classes:
+  TestRetrievalService: A test case class for the RetrievalService class.
+"""
+
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.services import retrieval_service
+from app.services.retrieval_service import RetrievalService, RetrievalSettings
+
+
+@patch.object(retrieval_service, "create_retriever_tool", MagicMock())
+@patch.object(retrieval_service, "get_cached_embeddings", MagicMock())
+@patch.object(retrieval_service, "get_llm", MagicMock())
+class TestRetrievalService(unittest.TestCase):
+  def setUp(self):
+    patcher = patch.object(retrieval_service, "Milvus")
+    self.milvus = patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_clients_are_built_lazily_once(self):
+    service = RetrievalService(RetrievalSettings())
+    self.milvus.assert_not_called()
+
+    threads = [threading.Thread(target=lambda: service.retriever) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    service.retrieve("hair fall")
+
+    self.milvus.assert_called_once()
+    service.retriever.invoke.assert_called_once_with("hair fall")
+
+  def test_retriever_uses_configured_k(self):
+    service = RetrievalService(RetrievalSettings(k=3, retriever_type="vector"))
+    service.retriever
+    self.milvus.return_value.as_retriever.assert_called_once_with(search_kwargs={"k": 3})
+
+  def test_rebuilds_in_forked_child(self):
+    service = RetrievalService(RetrievalSettings())
+    service.retriever
+    with patch.object(retrieval_service.os, "getpid", return_value=-1), \
+        patch("pymilvus.connections.remove_connection") as remove_connection:
+      service.retriever
+    remove_connection.assert_called_once()
+    self.assertEqual(self.milvus.call_count, 2)
+
+  def test_reconfigure_rebuilds_with_new_settings(self):
+    service = RetrievalService(RetrievalSettings())
+    service.retriever
+    with patch("pymilvus.connections.disconnect"):
+      settings = service.reconfigure(collection_name="other", k=4)
+    service.retriever
+
+    self.assertEqual(settings.collection_name, "other")
+    self.assertEqual(self.milvus.call_args.kwargs["collection_name"], "other")
+
+  def test_health_check_reports_connection_errors(self):
+    self.milvus.side_effect = ConnectionError("milvus down")
+    report = RetrievalService(RetrievalSettings()).health_check()
+    self.assertFalse(report["ok"])
+    self.assertIn("milvus down", report["error"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for the semantic_cache module.
+
+The cache is driven with a deterministic bag-of-words embedder so that
+paraphrases share most of their vector and unrelated questions do not.
+
+Classes:
+  TestSemanticCache: A test case class for the SemanticCache class.
+  TestChatRouteCache: A test case class for the chat route's use of the cache.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import app
+from app.routes import chat_gpt_routes
+from app.services.rag_pipeline import PipelineResult
+from app.services.semantic_cache import SemanticCache
+
+VOCABULARY = ["hair", "fall", "remedy", "stop", "cough", "dry", "how", "to"]
+
+
+def embed(text):
+  words = text.lower().replace("hairfall", "hair fall").split()
+  return [float(words.count(term)) for term in VOCABULARY]
+
+
+class TestSemanticCache(unittest.TestCase):
+  def test_similar_query_hits(self):
+    cache = SemanticCache(embed, threshold=0.5)
+    cache.store("hair fall remedy", "gpt-4o", {"message": "Use Mahanila Taila", "ingredients": ["Mahanila Taila"]})
+
+    self.assertEqual(cache.lookup("how to stop hairfall", "gpt-4o")["message"], "Use Mahanila Taila")
+    self.assertIsNone(cache.lookup("dry cough", "gpt-4o"))
+    self.assertEqual(cache.stats()["hits"], 1)
+    self.assertEqual(cache.stats()["misses"], 1)
+
+  def test_entries_are_scoped_per_model(self):
+    cache = SemanticCache(embed, threshold=0.5)
+    cache.store("hair fall remedy", "gpt-4o", {"message": "a"})
+    self.assertIsNone(cache.lookup("hair fall remedy", "gpt-4o-mini"))
+
+  def test_least_recently_used_entry_is_evicted(self):
+    cache = SemanticCache(embed, threshold=0.99, max_entries=2)
+    cache.store("hair fall", "gpt-4o", {"message": "hair"})
+    cache.store("dry cough", "gpt-4o", {"message": "cough"})
+    cache.lookup("hair fall", "gpt-4o")
+    cache.store("stop", "gpt-4o", {"message": "stop"})
+
+    self.assertIsNotNone(cache.lookup("hair fall", "gpt-4o"))
+    self.assertIsNone(cache.lookup("dry cough", "gpt-4o"))
+
+  def test_entries_expire_after_ttl(self):
+    cache = SemanticCache(embed, ttl_seconds=60)
+    with patch("app.services.semantic_cache.time.time", return_value=1000.0):
+      cache.store("hair fall", "gpt-4o", {"message": "hair"})
+    with patch("app.services.semantic_cache.time.time", return_value=1061.0):
+      self.assertIsNone(cache.lookup("hair fall", "gpt-4o"))
+    self.assertEqual(cache.stats()["size"], 0)
+
+  def test_entries_survive_restart_with_disk_backend(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "cache.db")
+      SemanticCache(embed, path=path).store("hair fall", "gpt-4o", {"message": "hair", "ingredients": ["neem"]})
+
+      restored = SemanticCache(embed, path=path)
+      self.assertEqual(restored.lookup("hair fall", "gpt-4o"), {"message": "hair", "ingredients": ["neem"]})
+
+  def test_workers_sharing_a_file_keep_each_others_entries(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "cache.db")
+      first = SemanticCache(embed, threshold=0.99, max_entries=3, path=path)
+      second = SemanticCache(embed, threshold=0.99, max_entries=3, path=path)
+      first.store("hair fall", "gpt-4o", {"message": "hair"})
+      second.store("dry cough", "gpt-4o", {"message": "cough"})
+
+      restored = SemanticCache(embed, threshold=0.99, path=path)
+      self.assertEqual(restored.lookup("hair fall", "gpt-4o"), {"message": "hair"})
+      self.assertEqual(restored.lookup("dry cough", "gpt-4o"), {"message": "cough"})
+
+      # The file keeps the newest rows of all workers.
+      first.store("stop", "gpt-4o", {"message": "stop"})
+      second.store("remedy", "gpt-4o", {"message": "remedy"})
+      restored = SemanticCache(embed, threshold=0.99, path=path)
+      self.assertEqual(restored.stats()["size"], 3)
+      self.assertIsNone(restored.lookup("hair fall", "gpt-4o"))
+
+  def test_expiry_keeps_recently_used_older_entries_in_age_order(self):
+    cache = SemanticCache(embed, threshold=0.99, ttl_seconds=60)
+    with patch("app.services.semantic_cache.time.time", return_value=1000.0):
+      cache.store("hair fall", "gpt-4o", {"message": "hair"})
+    with patch("app.services.semantic_cache.time.time", return_value=1030.0):
+      cache.store("dry cough", "gpt-4o", {"message": "cough"})
+      cache.lookup("hair fall", "gpt-4o")
+    with patch("app.services.semantic_cache.time.time", return_value=1070.0):
+      self.assertIsNone(cache.lookup("hair fall", "gpt-4o"))
+      self.assertIsNotNone(cache.lookup("dry cough", "gpt-4o"))
+    self.assertEqual(cache.stats()["size"], 1)
+
+
+@patch.dict(os.environ, {"CHAT_COALESCING_ENABLED": "false"})
+class TestChatRouteCache(unittest.TestCase):
+  def setUp(self):
+    self.client = app.test_client()
+    self.cache = SemanticCache(embed, threshold=0.9)
+    patches = [
+      patch.object(chat_gpt_routes, "get_semantic_cache", return_value=self.cache),
+      patch.object(chat_gpt_routes.rag_pipeline, "answer_question", side_effect=self.answer_question),
+      patch.object(chat_gpt_routes, "extract_ingredients_from_response", return_value=["neem"]),
+    ]
+    for patcher in patches:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  @staticmethod
+  def answer_question(message_content, model, mode, timer=None, retrieved_docs=None, filters=None):
+    return PipelineResult(message=f"{mode} answer", mode=mode, timings={}, usage={})
+
+  def ask(self, pipeline):
+    response = self.client.post("/api/chat_gpt/chat/", json={"message_content": "hair fall", "pipeline": pipeline})
+    return response.get_json()
+
+  def test_answers_are_cached_per_pipeline_mode(self):
+    self.assertNotIn("cached", self.ask("agent"))
+    single_pass = self.ask("single_pass")
+    self.assertNotIn("cached", single_pass)
+    self.assertEqual(single_pass["message"], "single_pass answer")
+
+    cached = self.ask("agent")
+    self.assertTrue(cached["cached"])
+    self.assertEqual((cached["message"], cached["pipeline"]), ("agent answer", "agent"))
+    self.assertEqual(self.ask("single_pass")["pipeline"], "single_pass")
+
+
+if __name__ == "__main__":
+  unittest.main()
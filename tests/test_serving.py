@@ -0,0 +1,125 @@
+"""
+Unit tests for the serving module, the health routes and the gunicorn hooks.
+
+Classes:
+  TestServing: A test case class for warm-up, readiness and draining.
+  TestGunicornHooks: A test case class for gunicorn.conf.py.
+"""
+
+import importlib.util
+import os
+import signal
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import app
+from app.services import product_catalog, serving
+from app.services.database import Database
+from app.services.openai_client import OpenAIError
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+class TestServing(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.database = Database(os.path.join(directory.name, "products.db"))
+    self.addCleanup(self.database.close)
+    product_catalog.ensure_schema(self.database.connection())
+    self.service = MagicMock()
+    self.service.health_check.return_value = {"ok": True}
+    self.openai = MagicMock()
+    patches = [
+      patch.object(serving, "get_retrieval_service", return_value=self.service),
+      patch.object(serving, "get_database", return_value=self.database),
+      patch.object(serving, "get_openai_client", return_value=self.openai),
+      patch.object(serving, "_warmed_up", False),
+      patch.object(serving, "_warm_up_error", None),
+      patch.object(serving, "_draining", False),
+      patch.object(serving, "_last_report", None),
+      patch.object(serving, "_upstream", None),
+    ]
+    for patcher in patches:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    self.client = app.test_client()
+
+  def test_ready_after_warm_up(self):
+    response = self.client.get("/readyz")
+
+    self.assertEqual(response.status_code, 200)
+    body = response.get_json()
+    self.assertTrue(body["warmed_up"])
+    self.assertEqual(body["checks"]["database"]["catalog_version"], 0)
+    self.service.retrieve.assert_called_once_with(serving.DEFAULT_WARMUP_QUERY)
+    self.assertEqual(self.client.get("/healthz").get_json()["readiness"]["ok"], True)
+
+  def test_not_ready_until_warm_up_succeeds(self):
+    self.service.retrieve.side_effect = ConnectionError("milvus down")
+    response = self.client.get("/readyz")
+    self.assertEqual(response.status_code, 503)
+    self.assertIn("milvus down", response.get_json()["warm_up_error"])
+    self.assertEqual(self.client.get("/healthz").status_code, 200)
+
+    self.service.retrieve.side_effect = None
+    self.assertEqual(self.client.get("/readyz").status_code, 200)
+
+  def test_upstream_failure_is_reported_and_cached(self):
+    self.openai.check.side_effect = OpenAIError("OpenAI API returned status code 401", status_code=401)
+    body = self.client.get("/readyz").get_json()
+    self.assertTrue(body["ok"])
+    self.assertFalse(body["checks"]["upstream"]["ok"])
+    self.client.get("/readyz")
+    self.openai.check.assert_called_once()
+
+    with patch.dict(os.environ, {"READINESS_REQUIRE_UPSTREAM": "true", "READINESS_UPSTREAM_TTL": "0"}):
+      self.assertEqual(self.client.get("/readyz").status_code, 503)
+
+  def test_not_ready_while_draining(self):
+    self.assertEqual(self.client.get("/readyz").status_code, 200)
+    serving.begin_drain()
+    self.assertEqual(self.client.get("/readyz").status_code, 503)
+    self.assertTrue(self.client.get("/healthz").get_json()["draining"])
+
+  def test_preload_creates_catalog_schema(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    database = Database(os.path.join(directory.name, "new.db"))
+    self.addCleanup(database.close)
+    with patch.object(serving, "get_database", return_value=database), \
+        patch("app.routes.chat_gpt_routes.preload") as preload:
+      serving.preload()
+
+    preload.assert_called_once()
+    self.assertEqual(product_catalog.catalog_version(database.read_connection()), 0)
+
+
+class TestGunicornHooks(unittest.TestCase):
+  def setUp(self):
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", CONFIG_PATH)
+    self.config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(self.config)
+
+  def test_preloads_and_threads_workers(self):
+    self.assertTrue(self.config.preload_app)
+    self.assertEqual(self.config.worker_class, "gthread")
+    with patch.object(serving, "preload") as preload:
+      self.config.when_ready(MagicMock())
+    preload.assert_called_once()
+
+  def test_worker_warms_up_and_drains_on_sigterm(self):
+    received = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+    self.addCleanup(signal.signal, signal.SIGTERM, previous)
+    with patch.object(serving, "warm_up") as warm_up, patch.object(serving, "begin_drain") as begin_drain:
+      self.config.post_worker_init(MagicMock())
+      warm_up.assert_called_once()
+      signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+    begin_drain.assert_called_once()
+    self.assertEqual(received, [signal.SIGTERM])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for the single_flight module and chat request coalescing.
+
+Classes:
+  TestSingleFlight: A test case class for the SingleFlight class.
+  TestChatCoalescing: A test case class for coalescing in the chat route.
+"""
+
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from app import app
+from app.routes import chat_gpt_routes
+from app.services.rag_pipeline import PipelineResult
+from app.services.single_flight import SingleFlight, coalescing_key
+from app.utils.metrics import COALESCED_REQUESTS
+
+
+class TestSingleFlight(unittest.TestCase):
+  def _start_leader(self, flight, function):
+    started = threading.Event()
+
+    def leader():
+      started.set()
+      return function()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    self.addCleanup(executor.shutdown)
+    future = executor.submit(flight.do, "key", leader)
+    started.wait(5)
+    return future
+
+  def test_concurrent_callers_share_one_call(self):
+    flight = SingleFlight("test_shared")
+    release = threading.Event()
+    calls = []
+
+    def compute():
+      calls.append(1)
+      release.wait(5)
+      return "answer"
+
+    leader = self._start_leader(flight, compute)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+      followers = [executor.submit(flight.do, "key", compute) for _ in range(3)]
+      time.sleep(0.05)
+      release.set()
+      results = [future.result(5) for future in followers]
+
+    self.assertEqual(leader.result(5), ("answer", False))
+    self.assertEqual(results, [("answer", True)] * 3)
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(COALESCED_REQUESTS.value(name="test_shared", outcome="shared"), 3)
+    self.assertEqual(flight.in_flight(), 0)
+    self.assertEqual(flight.do("key", lambda: "again"), ("again", False))
+
+  def test_errors_reach_every_waiter(self):
+    flight = SingleFlight("test_error")
+    release = threading.Event()
+
+    def fail():
+      release.wait(5)
+      raise ValueError("upstream failed")
+
+    leader = self._start_leader(flight, fail)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+      follower = executor.submit(flight.do, "key", fail)
+      time.sleep(0.05)
+      release.set()
+      with self.assertRaises(ValueError):
+        follower.result(5)
+    with self.assertRaises(ValueError):
+      leader.result(5)
+    self.assertEqual(COALESCED_REQUESTS.value(name="test_error", outcome="shared_error"), 1)
+
+  def test_waiters_time_out(self):
+    flight = SingleFlight("test_timeout", timeout=0.05)
+    release = threading.Event()
+    leader = self._start_leader(flight, lambda: release.wait(5))
+    with self.assertRaises(TimeoutError):
+      flight.do("key", lambda: None)
+    release.set()
+    self.assertEqual(leader.result(5), (True, False))
+
+  def test_keys_ignore_case_and_whitespace(self):
+    self.assertEqual(coalescing_key("Hair  fall remedy ", "gpt-4o"), coalescing_key("hair fall REMEDY", "gpt-4o"))
+    self.assertNotEqual(coalescing_key("hair fall", "gpt-4o"), coalescing_key("hair fall", "gpt-4o-mini"))
+
+
+@patch.dict(os.environ, {"SEMANTIC_CACHE_ENABLED": "false"})
+class TestChatCoalescing(unittest.TestCase):
+  def test_identical_requests_share_one_pipeline_run(self):
+    release = threading.Event()
+    calls = []
+
+    def answer_question(message_content, model, mode, timer=None, retrieved_docs=None, filters=None):
+      calls.append(message_content)
+      release.wait(5)
+      return PipelineResult(message="Use neem", mode=mode, timings={}, usage={})
+
+    def post(message):
+      with app.test_client() as client:
+        return client.post("/api/chat_gpt/chat/", json={"message_content": message, "pipeline": "single_pass"})
+
+    with patch.object(chat_gpt_routes.rag_pipeline, "answer_question", side_effect=answer_question), \
+        patch.object(chat_gpt_routes, "extract_ingredients_from_response", return_value=["neem"]):
+      with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(post, message) for message in ("Hair fall?", "hair  fall?", "HAIR FALL?")]
+        deadline = time.monotonic() + 5
+        while chat_gpt_routes._in_flight_answers.in_flight() == 0 and time.monotonic() < deadline:
+          time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        responses = [future.result(5) for future in futures]
+
+    self.assertEqual(len(calls), 1)
+    self.assertEqual([response.status_code for response in responses], [200] * 3)
+    self.assertEqual(sum(1 for response in responses if response.get_json().get("coalesced")), 2)
+    self.assertTrue(all(response.get_json()["ingredients"] == ["neem"] for response in responses))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests for the streaming TEI chunker.
+
+Classes:
+  TestTeiChunker: A test case class for iter_tei_chunks.
+"""
+
+import io
+import unittest
+
+from pdf_to_json.src.services.tei_chunker import iter_tei_chunks
+
+TEI = b"""<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0">
+  <teiHeader>
+    <fileDesc><titleStmt><title level="a" type="main">Charaka Samhita</title></titleStmt></fileDesc>
+  </teiHeader>
+  <text>
+    <body>
+      <div>
+        <head coords="3,10,10,50,10">Vata Dosha</head>
+        <p>Vata governs all movement in the body. It is dry, light and cold.</p>
+        <pb n="4"/>
+        <p>Its seat is the colon, and it is aggravated by <ref>fasting</ref> and cold food.</p>
+      </div>
+      <div>
+        <head>Pitta Dosha</head>
+        <p>Pitta governs digestion and metabolism.</p>
+      </div>
+    </body>
+    <back><listBibl><biblStruct>Sharma, 1981</biblStruct></listBibl></back>
+  </text>
+</TEI>
+"""
+
+
+def word_count(text):
+  return len(text.split())
+
+
+class TestTeiChunker(unittest.TestCase):
+  def chunks(self, **kwargs):
+    return list(iter_tei_chunks(io.BytesIO(TEI), count_tokens=word_count, **kwargs))
+
+  def test_keeps_only_body_text_split_by_section(self):
+    chunks = self.chunks()
+    self.assertEqual([chunk.metadata["section"] for chunk in chunks], ["Vata Dosha", "Pitta Dosha"])
+    self.assertEqual(chunks[1].text, "Pitta Dosha Pitta governs digestion and metabolism.")
+    text = " ".join(chunk.text for chunk in chunks)
+    self.assertIn("aggravated by fasting and cold food.", text)
+    self.assertNotIn("<", text)
+    self.assertNotIn("Sharma", text)
+    self.assertTrue(all(chunk.metadata["title"] == "Charaka Samhita" for chunk in chunks))
+
+  def test_respects_token_budget_with_overlap(self):
+    chunks = self.chunks(max_tokens=10, overlap_tokens=3)
+    self.assertTrue(all(word_count(chunk.text) <= 10 for chunk in chunks))
+    vata = [chunk for chunk in chunks if chunk.metadata["section"] == "Vata Dosha"]
+    self.assertGreater(len(vata), 2)
+    for previous, current in zip(vata, vata[1:]):
+      tail = previous.text.split()[-3:]
+      self.assertEqual(current.text.split()[:len(tail)], tail)
+
+  def test_tracks_pages(self):
+    chunks = self.chunks(max_tokens=15, overlap_tokens=0)
+    self.assertEqual(chunks[0].metadata["page"], 3)
+    self.assertEqual(chunks[-1].metadata["page"], 4)
+
+  def test_tracks_chapters(self):
+    tei = TEI.replace(b"<head>Pitta Dosha</head>", b"<head>Chapter 2: Pitta</head>")
+    chunks = list(iter_tei_chunks(io.BytesIO(tei), count_tokens=word_count))
+    self.assertEqual([chunk.metadata["chapter"] for chunk in chunks], ["", "Chapter 2: Pitta"])
+
+
+if __name__ == "__main__":
+  unittest.main()